@@ -0,0 +1,40 @@
+import threading
+
+from fastapi import Depends, Request
+
+from app.core.config import settings
+from app.core.security import get_optional_user
+
+_edgar_service = None
+_edgar_service_lock = threading.Lock()
+
+
+def get_edgar_service():
+    """
+    返回共享的EDGAR服务实例
+
+    首次调用时才导入服务模块（pandas、BeautifulSoup等）并加载本地价格存储，
+    避免在应用导入阶段付出这些开销。解析后的持仓通过共享缓存在同一主机的worker间复用。
+    路由通过 Depends(get_edgar_service) 获取，测试可用 app.dependency_overrides 替换。
+    """
+    global _edgar_service
+    if _edgar_service is None:
+        with _edgar_service_lock:
+            if _edgar_service is None:
+                from app.services.edgar_service import EDGARService
+                from app.services.holdings_cache import build_holdings_cache
+                from app.services.price_store import load_price_store
+
+                _edgar_service = EDGARService(
+                    price_store=load_price_store(settings.PRICE_STORE_PATH),
+                    holdings_cache=build_holdings_cache(settings),
+                )
+    return _edgar_service
+
+
+def get_job_owner(request: Request, user=Depends(get_optional_user)) -> str:
+    """后台任务的所有者：登录用户为用户名，匿名请求按客户端地址区分（用于每用户并发限制和访问控制）"""
+    if user is not None:
+        return user.username
+    host = request.client.host if request.client else 'unknown'
+    return f"anonymous@{host}"
@@ -2,6 +2,7 @@ from datetime import timedelta
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordRequestForm
 from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
 from typing import Any
 
 from app.core.security import (
@@ -21,7 +22,10 @@ async def login_for_access_token(
     db: Session = Depends(get_db)
 ) -> Any:
     """用户登录获取令牌"""
-    user = user_crud.authenticate_user(db, form_data.username, form_data.password)
+    # bcrypt校验耗时较长，放到线程池中执行以免阻塞事件循环
+    user = await run_in_threadpool(
+        user_crud.authenticate_user, db, form_data.username, form_data.password
+    )
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -65,5 +69,5 @@ async def register_user(
             detail="Username already registered"
         )
     
-    # 创建新用户
-    return user_crud.create_user(db=db, user=user)
+    # 创建新用户（密码哈希在线程池中计算）
+    return await run_in_threadpool(user_crud.create_user, db=db, user=user)
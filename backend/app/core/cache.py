@@ -0,0 +1,71 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional
+
+
+class TTLCache:
+    """
+    线程安全的有界TTL缓存
+
+    超过maxsize时按最近最少使用淘汰；每个条目可以单独指定过期时间。
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 300.0, timer: Callable[[], float] = time.monotonic):
+        if maxsize <= 0:
+            raise ValueError("maxsize must be positive")
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._timer = timer
+        self._data: 'OrderedDict[Hashable, tuple]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._data)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return self.get(key, _MISSING) is not _MISSING
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return default
+            value, expires_at = item
+            if expires_at <= self._timer():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        ttl = self.ttl if ttl is None else ttl
+        if ttl <= 0:
+            self.pop(key)
+            return
+        with self._lock:
+            self._data[key] = (value, self._timer() + ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            item = self._data.pop(key, None)
+            return default if item is None else item[0]
+
+    def pop_where(self, predicate: Callable[[Hashable, Any], bool]) -> int:
+        """删除所有满足条件的条目，返回删除数量"""
+        with self._lock:
+            keys = [k for k, (v, _) in self._data.items() if predicate(k, v)]
+            for k in keys:
+                del self._data[k]
+            return len(keys)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+
+_MISSING = object()
@@ -12,9 +12,114 @@ class Settings(BaseSettings):
     SECRET_KEY: str = os.getenv("SECRET_KEY", "your-secret-key-here")
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 60 * 24 * 8  # 8 days
     BACKEND_CORS_ORIGINS: List[str] = ["http://localhost:3000"]
+
+    # HTTP caching
+    # Bump API_SCHEMA_VERSION whenever response fields change so cached ETags are invalidated
+    API_SCHEMA_VERSION: str = "1"
+    HTTP_CACHE_MAX_AGE: int = 300  # seconds
+    HTTP_CACHE_STALE_WHILE_REVALIDATE: int = 3600  # seconds
     
     # Database settings
     DATABASE_URL: str = os.getenv("DATABASE_URL", "sqlite:///./sql_app.db")
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: int = 30  # seconds
+    DB_POOL_RECYCLE: int = 1800  # seconds
+    DB_POOL_PRE_PING: bool = True
+    # Create missing tables on startup; otherwise run `python -m app.db.migrate` before deploying
+    DB_AUTO_MIGRATE: bool = False
+
+    # SQLite pragmas applied on every new connection
+    SQLITE_WAL: bool = True
+    SQLITE_SYNCHRONOUS: str = "NORMAL"
+    SQLITE_BUSY_TIMEOUT_MS: int = 5000
+    SQLITE_CACHE_SIZE_KB: int = 20000
+
+    # Auth caches
+    TOKEN_CACHE_TTL_SECONDS: int = 300
+    TOKEN_CACHE_MAXSIZE: int = 10000
+    USER_CACHE_TTL_SECONDS: int = 60
+    USER_CACHE_MAXSIZE: int = 10000
+
+    # SEC request limiter (shared by all EDGAR requests in a process): AIMD between the min and max
+    # request rate / concurrency, circuit breaker after consecutive 429/5xx responses
+    SEC_MAX_REQUESTS_PER_SECOND: float = 10
+    SEC_MIN_REQUESTS_PER_SECOND: float = 0.5
+    SEC_MAX_CONCURRENCY: int = 8
+    SEC_TARGET_LATENCY_SECONDS: float = 2.0
+    SEC_BREAKER_FAILURES: int = 5
+    SEC_BREAKER_COOLDOWN_SECONDS: float = 60
+    # Requests that would wait longer than this for the limiter fail fast instead
+    SEC_MAX_WAIT_SECONDS: float = 30
+    # Last good bodies of small opt-in SEC responses (submissions JSON), shared per process and
+    # served while the circuit is open
+    SEC_FALLBACK_CACHE_SIZE: int = 256
+    SEC_FALLBACK_TTL_SECONDS: int = 24 * 3600
+    SEC_FALLBACK_MAX_BYTES: int = 2 * 1024 * 1024
+
+    # 13F filing lists: served from cache up to the soft TTL, then served stale while a background
+    # refresh runs; past the hard TTL the request waits for SEC
+    FILINGS_CACHE_SOFT_TTL_SECONDS: float = 300
+    FILINGS_CACHE_HARD_TTL_SECONDS: float = 6 * 3600
+    FILINGS_CACHE_MAXSIZE: int = 4096
+    FILINGS_CACHE_REFRESH_WORKERS: int = 4
+
+    # Filer directory: refreshed from EDGAR quarterly form.idx in the background
+    FILER_DIRECTORY_AUTO_REFRESH: bool = True
+    FILER_DIRECTORY_REFRESH_HOURS: float = 24
+    FILER_DIRECTORY_QUARTERS: int = 2
+
+    # Historical backfill (python -m app.services.backfill): quarterly form.idx files enumerate every 13F
+    # filing; full submissions are downloaded by BACKFILL_WORKERS threads under the SEC limiter and each
+    # accession's outcome is appended to the checkpoint file so an interrupted run resumes
+    BACKFILL_START_YEAR: int = 2013
+    BACKFILL_WORKERS: int = 4
+    BACKFILL_CHECKPOINT_PATH: str = os.getenv("BACKFILL_CHECKPOINT_PATH", "./data/backfill_checkpoint.jsonl")
+    BACKFILL_MAX_ATTEMPTS: int = 3
+    BACKFILL_REPORT_SECONDS: float = 30
+
+    # New filing notifications (SSE)
+    FILING_WATCH_INTERVAL_SECONDS: float = 300
+    FILING_WATCH_CONCURRENCY: int = 4
+    SSE_HEARTBEAT_SECONDS: float = 15
+
+    # Background jobs: heavy requests return 202 and run on a bounded worker pool. Jobs are stored in the
+    # database with results under JOB_RESULTS_DIR; running jobs whose heartbeat is older than
+    # JOB_STALE_SECONDS (process exited) are requeued and resume from their checkpoint
+    JOB_WORKERS: int = 2
+    JOB_MAX_RUNNING_PER_USER: int = 1
+    JOB_MAX_QUEUED_PER_USER: int = 20
+    JOB_MAX_ATTEMPTS: int = 3
+    JOB_RESULTS_DIR: str = os.getenv("JOB_RESULTS_DIR", "./data/jobs")
+    JOB_HEARTBEAT_SECONDS: float = 10
+    JOB_STALE_SECONDS: float = 60
+    JOB_RETENTION_HOURS: float = 7 * 24
+
+    # Market data settings
+    # Directory of a saved price store, or a CSV/Parquet file of daily closes (date, id, close)
+    PRICE_STORE_PATH: str = os.getenv("PRICE_STORE_PATH", "./data/prices")
+    # Risk model: benchmark security key in the price store; shrinkage "auto" (Ledoit-Wolf), a 0-1 intensity or "none"
+    RISK_BENCHMARK: str = "SPY"
+    RISK_SHRINKAGE: str = "auto"
+    # CSV mapping CUSIP (9-char security or 6-char issuer) to sector/industry, optionally SIC
+    SECTOR_MAPPING_PATH: str = os.getenv("SECTOR_MAPPING_PATH", "./data/sector_map.csv")
+    # Fund style clustering: number of clusters, persisted model and hashed CUSIP feature dimension
+    STYLE_CLUSTERS: int = 12
+    STYLE_MODEL_PATH: str = os.getenv("STYLE_MODEL_PATH", "./data/style_model.npz")
+    STYLE_HASH_DIM: int = 64
+    # Similar-fund search: MinHash signatures of CUSIP sets and int8 weight sketches per (fund, period),
+    # one append-only file per period; NUM_PERM / BANDS rows per band sets the LSH candidate threshold
+    SIMILARITY_INDEX_DIR: str = os.getenv("SIMILARITY_INDEX_DIR", "./data/similarity")
+    SIMILARITY_NUM_PERM: int = 128
+    SIMILARITY_BANDS: int = 64
+    SIMILARITY_SKETCH_DIM: int = 256
+
+    # Parsed holdings cache shared by all workers: "file" (mmap, per host), "redis" or "none"
+    HOLDINGS_CACHE_BACKEND: str = "file"
+    HOLDINGS_CACHE_DIR: str = "./data/holdings_cache"
+    HOLDINGS_CACHE_MAX_MB: int = 2048
+    HOLDINGS_CACHE_REDIS_URL: str = "redis://localhost:6379/0"
+    HOLDINGS_CACHE_TTL_SECONDS: int = 0  # redis only; 0 keeps entries until evicted
     
     class Config:
         case_sensitive = True
@@ -0,0 +1,94 @@
+import hashlib
+from datetime import date, datetime, time, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Dict, Iterable, Optional, Union
+
+from fastapi import Request, Response
+
+from app.core.config import settings
+
+
+def compute_etag(*parts: Union[str, Iterable[str], None]) -> str:
+    """根据组成部分（如accession编号和schema版本）计算强ETag"""
+    digest = hashlib.sha256()
+    digest.update(f"schema:{settings.API_SCHEMA_VERSION}".encode())
+    for part in parts:
+        if part is None:
+            part = ''
+        if not isinstance(part, str):
+            part = ','.join(str(p) for p in part)
+        digest.update(b'\x1f')
+        digest.update(part.encode())
+    return f'"{digest.hexdigest()[:32]}"'
+
+
+def to_http_datetime(value: Union[str, date, datetime, None]) -> Optional[datetime]:
+    """将日期或YYYY-MM-DD字符串转换为UTC时间（HTTP日期精确到秒）"""
+    if value is None or value == '':
+        return None
+    if isinstance(value, str):
+        value = datetime.strptime(value[:10], '%Y-%m-%d')
+    elif not isinstance(value, datetime):
+        value = datetime.combine(value, time.min)
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc).replace(microsecond=0)
+
+
+def _etag_matches(header: str, etag: str) -> bool:
+    # GET请求使用弱比较：忽略W/前缀
+    if header.strip() == '*':
+        return True
+    candidates = [c.strip() for c in header.split(',')]
+    bare = etag[2:] if etag.startswith('W/') else etag
+    return any((c[2:] if c.startswith('W/') else c) == bare for c in candidates)
+
+
+def is_not_modified(request: Request, etag: str, last_modified: Optional[datetime] = None) -> bool:
+    """
+    判断条件请求是否可以返回304
+
+    存在If-None-Match时只比较ETag；否则在Last-Modified不晚于If-Modified-Since时视为未修改。
+    """
+    if_none_match = request.headers.get('if-none-match')
+    if if_none_match is not None:
+        return _etag_matches(if_none_match, etag)
+
+    if_modified_since = request.headers.get('if-modified-since')
+    if if_modified_since and last_modified is not None:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        if since.tzinfo is None:
+            since = since.replace(tzinfo=timezone.utc)
+        return last_modified <= since
+    return False
+
+
+def cache_headers(etag: str, last_modified: Optional[datetime] = None) -> Dict[str, str]:
+    """生成ETag、Last-Modified和Cache-Control响应头"""
+    headers = {
+        'ETag': etag,
+        'Cache-Control': (
+            f"public, max-age={settings.HTTP_CACHE_MAX_AGE}, "
+            f"stale-while-revalidate={settings.HTTP_CACHE_STALE_WHILE_REVALIDATE}"
+        ),
+    }
+    if last_modified is not None:
+        headers['Last-Modified'] = format_datetime(last_modified, usegmt=True)
+    return headers
+
+
+def apply_cache_headers(response: Response, etag: str, last_modified: Optional[datetime] = None) -> None:
+    response.headers.update(cache_headers(etag, last_modified))
+
+
+def not_modified(etag: str, last_modified: Optional[datetime] = None) -> Response:
+    """返回不带响应体的304"""
+    return Response(status_code=304, headers=cache_headers(etag, last_modified))
+
+
+def freshness_headers(age: float, status: str) -> Dict[str, str]:
+    """服务端缓存的数据年龄（秒）及命中状态（HIT/STALE/MISS）"""
+    return {'Age': str(int(age)), 'X-Cache-Status': status}
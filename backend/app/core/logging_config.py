@@ -0,0 +1,60 @@
+import logging
+import os
+import sys
+
+LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+LOG_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), 'logs')
+
+# 额外单独落盘的模块日志（同时也会写入api.log）
+MODULE_LOG_FILES = {
+    'app.routers.edgar': 'edgar_router.log',
+    'app.services.edgar_service': 'edgar_service.log',
+}
+
+_configured = False
+
+
+def _file_handler(filename: str, formatter: logging.Formatter):
+    try:
+        handler = logging.FileHandler(os.path.join(LOG_DIR, filename), encoding='utf-8')
+    except OSError as e:
+        print(f"Warning: Could not create file handler for {filename}: {e}")
+        return None
+    handler.setFormatter(formatter)
+    return handler
+
+
+def configure_logging(level: int = logging.DEBUG) -> None:
+    """
+    配置应用日志（幂等）
+
+    在应用启动时调用一次：所有 app.* 模块的日志输出到控制台和 logs/api.log，
+    EDGAR路由和服务另外写入各自的日志文件。模块导入时只获取logger，不创建处理器。
+    """
+    global _configured
+    if _configured:
+        return
+
+    formatter = logging.Formatter(LOG_FORMAT)
+    app_logger = logging.getLogger('app')
+    app_logger.setLevel(level)
+    app_logger.propagate = False
+
+    console_handler = logging.StreamHandler(sys.stdout)
+    console_handler.setFormatter(formatter)
+    app_logger.addHandler(console_handler)
+
+    try:
+        os.makedirs(LOG_DIR, exist_ok=True)
+    except OSError as e:
+        print(f"Warning: Could not create log directory: {e}")
+    else:
+        handler = _file_handler('api.log', formatter)
+        if handler:
+            app_logger.addHandler(handler)
+        for name, filename in MODULE_LOG_FILES.items():
+            handler = _file_handler(filename, formatter)
+            if handler:
+                logging.getLogger(name).addHandler(handler)
+
+    _configured = True
@@ -0,0 +1,236 @@
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, Optional
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class CircuitOpenError(Exception):
+    """上游处于限流/故障状态，请求被快速拒绝；retry_after为建议的重试等待秒数"""
+
+    def __init__(self, retry_after: float, reason: str = "circuit open"):
+        super().__init__(f"Upstream unavailable ({reason}), retry after {retry_after:.1f}s")
+        self.retry_after = max(retry_after, 0.0)
+        self.reason = reason
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """解析Retry-After头（秒数），无法解析时返回None"""
+    if value is None:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+class Ticket:
+    """一次已获准发出的请求，结束后通过record登记结果"""
+
+    __slots__ = ('started', 'probe', 'status', 'retry_after')
+
+    def __init__(self, started: float, probe: bool):
+        self.started = started
+        self.probe = probe
+        self.status: Optional[int] = None
+        self.retry_after: Optional[float] = None
+
+    def record(self, status: int, retry_after: Optional[float] = None) -> None:
+        self.status = status
+        self.retry_after = retry_after
+
+
+class AdaptiveLimiter:
+    """
+    AIMD自适应限流器与熔断器
+
+    同一进程内所有请求共享：
+    - 请求速率（令牌间隔 1/rate）和并发上限在成功且延迟低于目标时加性增长，
+      收到429/5xx时乘性下降；同一批在下降前已发出的请求再收到429不会重复下降
+    - 429的Retry-After作为全局暂停，所有调用方一起等待，而不是各自睡眠后同时重试
+    - 连续失败达到阈值后熔断：冷却期内直接拒绝（CircuitOpenError），
+      冷却结束后只放行一个探测请求，成功则恢复，失败则重新熔断
+    """
+
+    def __init__(self, max_rate: float = 10.0, min_rate: float = 0.5, max_concurrency: int = 8,
+                 min_concurrency: int = 1, target_latency: float = 2.0, decrease_factor: float = 0.5,
+                 failure_threshold: int = 5, cooldown: float = 60.0, max_wait: float = 30.0,
+                 timer: Callable[[], float] = time.monotonic, sleep: Callable[[float], None] = time.sleep):
+        if not 0 < decrease_factor < 1:
+            raise ValueError("decrease_factor must be between 0 and 1")
+        self.max_rate = max_rate
+        self.min_rate = min_rate
+        self.max_concurrency = max_concurrency
+        self.min_concurrency = min_concurrency
+        self.target_latency = target_latency
+        self.decrease_factor = decrease_factor
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.max_wait = max_wait
+        self._timer = timer
+        self._sleep = sleep
+        self._cond = threading.Condition()
+        self._reset_state()
+
+    def _reset_state(self) -> None:
+        self.rate = float(self.max_rate)
+        self.concurrency = float(self.max_concurrency)
+        self.state = CLOSED
+        self._in_flight = 0
+        self._next_slot = 0.0
+        self._resume_at = 0.0
+        self._last_decrease = float('-inf')
+        self._open_until = 0.0
+        self._probe_in_flight = False
+        self._consecutive_failures = 0
+        self._latency: Optional[float] = None
+        self._counters = {'requests': 0, 'successes': 0, 'throttled': 0, 'failures': 0,
+                          'rejected': 0, 'circuitOpens': 0}
+
+    @classmethod
+    def from_settings(cls, config) -> 'AdaptiveLimiter':
+        return cls(
+            max_rate=config.SEC_MAX_REQUESTS_PER_SECOND,
+            min_rate=config.SEC_MIN_REQUESTS_PER_SECOND,
+            max_concurrency=config.SEC_MAX_CONCURRENCY,
+            target_latency=config.SEC_TARGET_LATENCY_SECONDS,
+            failure_threshold=config.SEC_BREAKER_FAILURES,
+            cooldown=config.SEC_BREAKER_COOLDOWN_SECONDS,
+            max_wait=config.SEC_MAX_WAIT_SECONDS,
+        )
+
+    def _reject(self, retry_after: float, reason: str) -> CircuitOpenError:
+        self._counters['rejected'] += 1
+        return CircuitOpenError(retry_after, reason)
+
+    def acquire(self) -> Ticket:
+        """
+        等待并发名额和发送时间片
+
+        熔断期间、或需要等待超过max_wait（例如Retry-After很长）时抛出CircuitOpenError。
+        """
+        deadline = self._timer() + self.max_wait
+        with self._cond:
+            while True:
+                now = self._timer()
+                if self.state == OPEN:
+                    if now < self._open_until:
+                        raise self._reject(self._open_until - now, 'circuit open')
+                    self.state = HALF_OPEN
+                    logger.info("SEC circuit half-open, sending probe request")
+                if self.state == HALF_OPEN and self._probe_in_flight:
+                    raise self._reject(self.target_latency, 'probe in flight')
+
+                if self._in_flight < max(int(self.concurrency), self.min_concurrency):
+                    start = max(now, self._next_slot, self._resume_at)
+                    if start > deadline:
+                        raise self._reject(start - now, 'throttled')
+                    self._next_slot = start + 1.0 / self.rate
+                    self._in_flight += 1
+                    self._counters['requests'] += 1
+                    probe = self.state == HALF_OPEN
+                    self._probe_in_flight = self._probe_in_flight or probe
+                    break
+                if now >= deadline:
+                    raise self._reject(self.target_latency, 'concurrency limit')
+                self._cond.wait(deadline - now)
+
+        delay = start - self._timer()
+        if delay > 0:
+            self._sleep(delay)
+        return Ticket(start, probe)
+
+    def release(self, ticket: Ticket) -> None:
+        """登记请求结果并调整速率、并发和熔断状态；status为None表示连接错误或超时"""
+        now = self._timer()
+        latency = max(now - ticket.started, 0.0)
+        status = ticket.status
+        with self._cond:
+            self._in_flight -= 1
+            if ticket.probe:
+                self._probe_in_flight = False
+            self._latency = latency if self._latency is None else 0.8 * self._latency + 0.2 * latency
+            # 每个拥塞信号周期只做一次乘性下降：之前发出的请求携带的是旧信号
+            fresh_signal = ticket.started > self._last_decrease
+
+            if status == 429 or status is None or status >= 500:
+                if status == 429:
+                    self._counters['throttled'] += 1
+                    pause = ticket.retry_after if ticket.retry_after is not None else self.target_latency
+                    self._resume_at = max(self._resume_at, now + pause)
+                else:
+                    self._counters['failures'] += 1
+                if fresh_signal:
+                    self.rate = max(self.min_rate, self.rate * self.decrease_factor)
+                    self.concurrency = max(self.min_concurrency, self.concurrency * self.decrease_factor)
+                    self._last_decrease = now
+                self._consecutive_failures += 1
+                if self.state == HALF_OPEN or self._consecutive_failures >= self.failure_threshold:
+                    self._open(now, ticket.retry_after or 0.0)
+            else:
+                self._counters['successes'] += 1
+                self._consecutive_failures = 0
+                if self.state == HALF_OPEN and ticket.probe:
+                    self.state = CLOSED
+                    logger.info("SEC circuit closed")
+                if latency > self.target_latency:
+                    if fresh_signal:
+                        self.concurrency = max(self.min_concurrency, self.concurrency * self.decrease_factor)
+                        self._last_decrease = now
+                else:
+                    # 每经过约一个“窗口”的成功请求，速率和并发各增加1
+                    self.rate = min(self.max_rate, self.rate + 1.0 / self.rate)
+                    self.concurrency = min(self.max_concurrency, self.concurrency + 1.0 / self.concurrency)
+            self._cond.notify_all()
+
+    def _open(self, now: float, retry_after: float) -> None:
+        if self.state != OPEN:
+            self._counters['circuitOpens'] += 1
+            logger.warning(f"SEC circuit opened after {self._consecutive_failures} consecutive failures")
+        self.state = OPEN
+        self._open_until = now + max(self.cooldown, retry_after)
+
+    @contextmanager
+    def request(self) -> Iterator[Ticket]:
+        """获取发送许可；with块内调用ticket.record登记响应状态，未登记（异常）按失败处理"""
+        ticket = self.acquire()
+        try:
+            yield ticket
+        finally:
+            self.release(ticket)
+
+    def metrics(self) -> Dict:
+        with self._cond:
+            now = self._timer()
+            retry_after = 0.0
+            if self.state == OPEN:
+                retry_after = max(self._open_until - now, 0.0)
+            retry_after = max(retry_after, self._resume_at - now)
+            return {
+                'state': self.state,
+                'requestsPerSecond': round(self.rate, 3),
+                'concurrencyLimit': max(int(self.concurrency), self.min_concurrency),
+                'inFlight': self._in_flight,
+                'consecutiveFailures': self._consecutive_failures,
+                'retryAfterSeconds': round(retry_after, 3),
+                'latencySeconds': round(self._latency, 4) if self._latency is not None else None,
+                **self._counters,
+            }
+
+    def reset(self) -> None:
+        """恢复初始状态（测试或运维手动恢复时使用）"""
+        with self._cond:
+            self._reset_state()
+            self._cond.notify_all()
+
+
+# 进程内所有EDGARService实例共享同一个限流器
+sec_limiter = AdaptiveLimiter.from_settings(settings)
@@ -1,12 +1,19 @@
+import time
 from datetime import datetime, timedelta
+from functools import lru_cache
 from typing import Optional
-from jose import JWTError, jwt
-from passlib.context import CryptContext
 from fastapi.security import OAuth2PasswordBearer
 from fastapi import Depends, HTTPException, status
+from starlette.concurrency import run_in_threadpool
+from app.core.cache import TTLCache
+from app.core.config import settings
 
-# 配置密码哈希
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+@lru_cache(maxsize=None)
+def get_pwd_context():
+    """密码哈希上下文，首次使用时才导入passlib/bcrypt"""
+    from passlib.context import CryptContext
+
+    return CryptContext(schemes=["bcrypt"], deprecated="auto")
 
 # JWT相关配置
 SECRET_KEY = "your-secret-key-here"  # 在生产环境中应该使用环境变量
@@ -14,17 +21,24 @@ ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
+optional_oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token", auto_error=False)
+
+# 已验证令牌的声明缓存（令牌 -> payload）和已解析用户缓存（用户名 -> User）
+token_cache = TTLCache(maxsize=settings.TOKEN_CACHE_MAXSIZE, ttl=settings.TOKEN_CACHE_TTL_SECONDS)
+user_cache = TTLCache(maxsize=settings.USER_CACHE_MAXSIZE, ttl=settings.USER_CACHE_TTL_SECONDS)
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """验证密码"""
-    return pwd_context.verify(plain_password, hashed_password)
+    return get_pwd_context().verify(plain_password, hashed_password)
 
 def get_password_hash(password: str) -> str:
     """获取密码哈希"""
-    return pwd_context.hash(password)
+    return get_pwd_context().hash(password)
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     """创建访问令牌"""
+    from jose import jwt
+
     to_encode = data.copy()
     if expires_delta:
         expire = datetime.utcnow() + expires_delta
@@ -34,26 +48,78 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
+def decode_access_token(token: str) -> dict:
+    """验证并解码令牌，结果在令牌有效期内缓存"""
+    payload = token_cache.get(token)
+    if payload is not None:
+        exp = payload.get("exp")
+        if exp is None or exp > time.time():
+            return payload
+        token_cache.pop(token)
+
+    from jose import jwt
+
+    payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    ttl = settings.TOKEN_CACHE_TTL_SECONDS
+    exp = payload.get("exp")
+    if exp is not None:
+        # exp是UTC纪元秒，不能用naive的utcnow().timestamp()（会按本地时区解释）
+        ttl = min(ttl, exp - time.time())
+    token_cache.set(token, payload, ttl=ttl)
+    return payload
+
+def resolve_user(username: str):
+    """按用户名获取用户，结果缓存为脱离会话的对象"""
+    user = user_cache.get(username)
+    if user is not None:
+        return user
+
+    # 延迟导入，避免与crud模块循环依赖
+    from app.crud import user as user_crud
+    from app.db.session import SessionLocal
+
+    db = SessionLocal()
+    try:
+        user = user_crud.get_user_by_username(db, username)
+        if user is not None:
+            db.expunge(user)
+            user_cache.set(username, user)
+        return user
+    finally:
+        db.close()
+
+def invalidate_user(username: str) -> None:
+    """使用户缓存失效（用户被停用或修改后调用）"""
+    user_cache.pop(username)
+
 async def get_current_user(token: str = Depends(oauth2_scheme)):
     """获取当前用户"""
+    from jose import JWTError
+
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        payload = decode_access_token(token)
         username: str = payload.get("sub")
         if username is None:
             raise credentials_exception
     except JWTError:
         raise credentials_exception
     
-    # 这里需要从数据库获取用户
-    # user = get_user(username)
-    # if user is None:
-    #     raise credentials_exception
-    # return user
-    
-    # 临时返回用户名，后续需要修改为实际的用户对象
-    return {"username": username}
+    user = user_cache.get(username)
+    if user is None:
+        user = await run_in_threadpool(resolve_user, username)
+    if user is None:
+        raise credentials_exception
+    if not user.is_active:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Inactive user")
+    return user
+
+async def get_optional_user(token: Optional[str] = Depends(optional_oauth2_scheme)):
+    """获取当前用户；未携带令牌时返回None，携带无效令牌时仍返回401"""
+    if token is None:
+        return None
+    return await get_current_user(token)
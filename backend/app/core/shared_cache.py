@@ -0,0 +1,196 @@
+import contextlib
+import hashlib
+import logging
+import mmap
+import os
+import re
+import tempfile
+import threading
+import time
+from typing import Iterator, Optional, Union
+
+try:
+    import fcntl
+except ImportError:  # Windows：退化为进程内锁
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+Buffer = Union[bytes, memoryview]
+
+_SAFE_KEY = re.compile(r'[^A-Za-z0-9._-]')
+
+
+class SharedCacheBackend:
+    """
+    多进程共享的键值缓存后端
+
+    get返回的缓冲区只读；lock用于跨进程互斥，保证同一个键只由一个进程填充。
+    """
+
+    def get(self, key: str) -> Optional[Buffer]:
+        raise NotImplementedError
+
+    def set(self, key: str, value: bytes) -> None:
+        raise NotImplementedError
+
+    def delete(self, key: str) -> None:
+        raise NotImplementedError
+
+    def lock(self, key: str, timeout: float = 60.0):
+        raise NotImplementedError
+
+
+class FileCacheBackend(SharedCacheBackend):
+    """
+    本机磁盘上的共享缓存：每个键一个文件，读取时内存映射
+
+    同一主机上的所有worker映射同一个文件，操作系统页缓存只保留一份数据。
+    写入先落临时文件再原子替换，读者不会看到写了一半的条目；
+    已映射的旧文件在被替换或淘汰后依然有效。
+    """
+
+    def __init__(self, directory: str, max_bytes: Optional[int] = None):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock_dir = os.path.join(directory, '.locks')
+        os.makedirs(self._lock_dir, exist_ok=True)
+        # 按键哈希分片的线程锁，数量固定
+        self._thread_locks = [threading.Lock() for _ in range(64)]
+
+    def _filename(self, key: str) -> str:
+        safe = _SAFE_KEY.sub('_', key)
+        if safe != key:
+            # 替换过字符的键追加哈希，避免不同键映射到同一个文件
+            safe = f"{safe}-{hashlib.sha1(key.encode('utf-8')).hexdigest()[:12]}"
+        return safe
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, self._filename(key) + '.bin')
+
+    def get(self, key: str) -> Optional[Buffer]:
+        try:
+            with open(self._path(key), 'rb') as f:
+                size = os.fstat(f.fileno()).st_size
+                if size == 0:
+                    return None
+                mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except FileNotFoundError:
+            return None
+        return memoryview(mapped)
+
+    def set(self, key: str, value: bytes) -> None:
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, prefix='.tmp-')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(value)
+            os.replace(tmp_path, self._path(key))
+        except BaseException:
+            with contextlib.suppress(OSError):
+                os.remove(tmp_path)
+            raise
+        if self.max_bytes:
+            self.prune(self.max_bytes)
+
+    def delete(self, key: str) -> None:
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(self._path(key))
+
+    def prune(self, max_bytes: int) -> int:
+        """总大小超过max_bytes时按最近访问时间淘汰最旧的条目，返回删除的条目数"""
+        entries = []
+        total = 0
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if entry.is_file() and entry.name.endswith('.bin'):
+                    stat = entry.stat()
+                    entries.append((max(stat.st_atime, stat.st_mtime), stat.st_size, entry.path))
+                    total += stat.st_size
+        removed = 0
+        for _, size, path in sorted(entries):
+            if total <= max_bytes:
+                break
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(path)
+                removed += 1
+            total -= size
+        if removed:
+            logger.info(f"Pruned {removed} entries from shared cache {self.directory}")
+        return removed
+
+    @contextlib.contextmanager
+    def lock(self, key: str, timeout: float = 60.0) -> Iterator[bool]:
+        """
+        跨进程排他锁（flock），返回是否成功加锁
+
+        超时后不再等待（返回False），调用方自行填充，避免持锁进程卡死时所有worker阻塞。
+        """
+        thread_lock = self._thread_locks[hash(key) % len(self._thread_locks)]
+        # flock按打开的文件描述符生效，同进程内的线程另用线程锁串行
+        if not thread_lock.acquire(timeout=timeout):
+            yield False
+            return
+        try:
+            if fcntl is None:
+                yield True
+                return
+            path = os.path.join(self._lock_dir, self._filename(key) + '.lock')
+            with open(path, 'a+b') as f:
+                deadline = time.monotonic() + timeout
+                acquired = False
+                while True:
+                    try:
+                        fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                        acquired = True
+                        break
+                    except BlockingIOError:
+                        if time.monotonic() >= deadline:
+                            break
+                        time.sleep(0.05)
+                try:
+                    yield acquired
+                finally:
+                    if acquired:
+                        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+        finally:
+            thread_lock.release()
+
+
+class RedisCacheBackend(SharedCacheBackend):
+    """
+    Redis共享缓存（可选依赖redis），适合多台主机共享
+
+    读取需要把数据复制到本进程，本机多worker场景优先使用FileCacheBackend。
+    """
+
+    def __init__(self, url: str = 'redis://localhost:6379/0', prefix: str = 'hfa:',
+                 ttl: Optional[int] = None, client=None):
+        if client is None:
+            try:
+                import redis
+            except ImportError:
+                raise ValueError("Redis cache backend requires the 'redis' package")
+            client = redis.Redis.from_url(url)
+        self.client = client
+        self.prefix = prefix
+        self.ttl = ttl
+
+    def get(self, key: str) -> Optional[Buffer]:
+        return self.client.get(self.prefix + key)
+
+    def set(self, key: str, value: bytes) -> None:
+        self.client.set(self.prefix + key, value, ex=self.ttl)
+
+    def delete(self, key: str) -> None:
+        self.client.delete(self.prefix + key)
+
+    @contextlib.contextmanager
+    def lock(self, key: str, timeout: float = 60.0) -> Iterator[bool]:
+        lock = self.client.lock(f"{self.prefix}lock:{key}", timeout=timeout, blocking_timeout=timeout)
+        acquired = lock.acquire()
+        try:
+            yield bool(acquired)
+        finally:
+            if acquired:
+                with contextlib.suppress(Exception):
+                    lock.release()
@@ -0,0 +1,114 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Hashable, NamedTuple, Optional
+
+logger = logging.getLogger(__name__)
+
+HIT = 'HIT'
+STALE = 'STALE'
+MISS = 'MISS'
+
+
+class CacheResult(NamedTuple):
+    value: Any
+    age: float  # 距离数据加载完成的秒数
+    status: str  # HIT / STALE / MISS
+
+
+class StaleWhileRevalidateCache:
+    """
+    stale-while-revalidate 缓存
+
+    - age < soft_ttl：直接返回（HIT）
+    - soft_ttl <= age < hard_ttl：立即返回旧值（STALE），并在后台线程刷新；同一个键同时只有一个刷新任务
+    - age >= hard_ttl 或不存在：调用方同步加载（MISS），并发的同键请求共享同一次加载
+    后台刷新失败时保留旧值，直到超过hard_ttl。
+    """
+
+    def __init__(self, soft_ttl: float = 300.0, hard_ttl: float = 3600.0, maxsize: int = 4096,
+                 max_workers: int = 4, timer: Callable[[], float] = time.monotonic):
+        if hard_ttl < soft_ttl:
+            raise ValueError("hard_ttl must not be shorter than soft_ttl")
+        self.soft_ttl = soft_ttl
+        self.hard_ttl = hard_ttl
+        self.maxsize = maxsize
+        self.max_workers = max_workers
+        self._timer = timer
+        self._data: 'OrderedDict[Hashable, tuple]' = OrderedDict()
+        self._inflight: Dict[Hashable, Future] = {}
+        self._lock = threading.Lock()
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._data)
+
+    def _submit(self, fn: Callable, *args) -> None:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='swr-refresh')
+        self._executor.submit(fn, *args)
+
+    def _load(self, key: Hashable, loader: Callable[[], Any], future: Future) -> None:
+        try:
+            value = loader()
+        except BaseException as e:
+            with self._lock:
+                self._inflight.pop(key, None)
+            future.set_exception(e)
+            return
+        with self._lock:
+            self._data[key] = (value, self._timer())
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+            self._inflight.pop(key, None)
+        future.set_result(value)
+
+    def _refresh_in_background(self, key: Hashable, loader: Callable[[], Any], future: Future) -> None:
+        self._load(key, loader, future)
+        error = future.exception()
+        if error is not None:
+            logger.warning(f"Background refresh of {key!r} failed, serving stale value: {error}")
+
+    def get(self, key: Hashable, loader: Callable[[], Any]) -> CacheResult:
+        with self._lock:
+            item = self._data.get(key)
+            now = self._timer()
+            if item is not None:
+                value, loaded_at = item
+                age = now - loaded_at
+                if age < self.hard_ttl:
+                    self._data.move_to_end(key)
+                    if age < self.soft_ttl:
+                        return CacheResult(value, age, HIT)
+                    if key not in self._inflight:
+                        future = Future()
+                        self._inflight[key] = future
+                        self._submit(self._refresh_in_background, key, loader, future)
+                    return CacheResult(value, age, STALE)
+
+            future = self._inflight.get(key)
+            owner = future is None
+            if owner:
+                future = Future()
+                self._inflight[key] = future
+
+        if owner:
+            self._load(key, loader, future)
+        # 与正在进行的加载（包括后台刷新）共享结果
+        return CacheResult(future.result(), 0.0, MISS)
+
+    def invalidate(self, predicate: Callable[[Hashable], bool]) -> int:
+        """删除满足条件的键，下次访问同步加载；返回删除数量"""
+        with self._lock:
+            keys = [k for k in self._data if predicate(k)]
+            for k in keys:
+                del self._data[k]
+            return len(keys)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
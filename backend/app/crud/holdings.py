@@ -0,0 +1,278 @@
+import csv
+import io
+import logging
+from datetime import date, datetime
+from typing import Dict, Iterable, List, Optional
+
+import pandas as pd
+from sqlalchemy import case, delete, func, or_, select
+from sqlalchemy.orm import Session
+
+from app.models.holdings import Filer, Filing, Holding
+
+logger = logging.getLogger(__name__)
+
+# DataFrame列名 -> holdings表列名
+HOLDING_COLUMNS = {
+    'cusip': 'cusip',
+    'nameOfIssuer': 'name_of_issuer',
+    'titleOfClass': 'title_of_class',
+    'value': 'value',
+    'shares': 'shares',
+    'shareType': 'share_type',
+    'putCall': 'put_call',
+    'investmentDiscretion': 'investment_discretion',
+    'otherManager': 'other_manager',
+    'sole_voting': 'sole_voting',
+    'shared_voting': 'shared_voting',
+    'no_voting': 'no_voting',
+}
+
+INSERT_COLUMNS = ['accession_number', 'cik', 'period_of_report'] + list(HOLDING_COLUMNS.values())
+
+# 13F-HR/A的修正类型：重述文件替换整个报告期的持仓，新增持仓文件只列出原文件遗漏的持仓
+RESTATEMENT = 'RESTATEMENT'
+NEW_HOLDINGS = 'NEW HOLDINGS'
+AMENDMENT_TYPES = (RESTATEMENT, NEW_HOLDINGS)
+
+
+def to_date(value) -> Optional[date]:
+    if value is None or (isinstance(value, float) and pd.isna(value)) or value == '':
+        return None
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return datetime.strptime(str(value)[:10], '%Y-%m-%d').date()
+
+
+def normalize_amendment_type(value) -> Optional[str]:
+    """统一修正类型的写法（大小写、空白），无法识别时返回None"""
+    if value is None or (isinstance(value, float) and pd.isna(value)):
+        return None
+    value = ' '.join(str(value).split()).upper()
+    return value if value in AMENDMENT_TYPES else None
+
+
+def _dialect_insert(db: Session, table):
+    """返回支持ON CONFLICT的方言insert构造器"""
+    dialect = db.get_bind().dialect.name
+    if dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    elif dialect == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    else:
+        raise NotImplementedError(f"Upsert is not supported on {dialect}")
+    return dialect_insert(table)
+
+
+def upsert_filer(db: Session, cik: str, name: Optional[str] = None, manager: Optional[str] = None) -> None:
+    """插入申报机构，已存在时仅更新非空字段"""
+    values = {'cik': cik, 'name': name, 'manager': manager, 'updated_at': datetime.utcnow()}
+    stmt = _dialect_insert(db, Filer.__table__).values(**values)
+    updates = {k: stmt.excluded[k] for k in ('name', 'manager') if values[k] is not None}
+    updates['updated_at'] = stmt.excluded.updated_at
+    db.execute(stmt.on_conflict_do_update(index_elements=['cik'], set_=updates))
+
+
+def upsert_filers(db: Session, filers: Dict[str, str]) -> None:
+    """批量插入或更新申报机构名称（cik -> 名称）"""
+    if not filers:
+        return
+    now = datetime.utcnow()
+    stmt = _dialect_insert(db, Filer.__table__)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=['cik'],
+        set_={'name': stmt.excluded.name, 'updated_at': stmt.excluded.updated_at},
+    )
+    db.execute(stmt, [{'cik': cik, 'name': name, 'manager': None, 'updated_at': now}
+                      for cik, name in filers.items()])
+
+
+def holdings_records(holdings_df: pd.DataFrame, accession_number: str, cik: str,
+                     period_of_report: Optional[date]) -> pd.DataFrame:
+    """将解析得到的持仓DataFrame转换为holdings表的列"""
+    present = {src: dst for src, dst in HOLDING_COLUMNS.items() if src in holdings_df.columns}
+    frame = holdings_df[list(present)].rename(columns=present)
+    for column in HOLDING_COLUMNS.values():
+        if column not in frame.columns:
+            frame[column] = None
+    frame.insert(0, 'period_of_report', period_of_report)
+    frame.insert(0, 'cik', cik)
+    frame.insert(0, 'accession_number', accession_number)
+    frame = frame[INSERT_COLUMNS]
+    for column in ('sole_voting', 'shared_voting', 'no_voting'):
+        frame[column] = pd.to_numeric(frame[column], errors='coerce').fillna(0).astype('int64')
+    return frame
+
+
+def _copy_holdings(db: Session, frame: pd.DataFrame) -> None:
+    """PostgreSQL (psycopg2) 上通过COPY批量写入"""
+    buffer = io.StringIO()
+    frame.to_csv(buffer, index=False, header=False, quoting=csv.QUOTE_MINIMAL, na_rep='\\N')
+    buffer.seek(0)
+    raw = db.connection().connection.driver_connection
+    with raw.cursor() as cursor:
+        cursor.copy_expert(
+            f"COPY holdings ({', '.join(INSERT_COLUMNS)}) FROM STDIN WITH (FORMAT csv, NULL '\\N')",
+            buffer,
+        )
+
+
+def _insert_holdings(db: Session, frame: pd.DataFrame) -> None:
+    """通用路径：直接调用DBAPI的executemany，绕过逐行的ORM/参数处理"""
+    if frame.empty:
+        return
+
+    columns = []
+    for name in INSERT_COLUMNS:
+        values = frame[name].tolist()
+        if name == 'period_of_report':
+            # 同一文件只有一个报告期，按唯一值转换
+            iso = {v: v.isoformat() if isinstance(v, date) else v for v in set(values)}
+            values = [iso[v] for v in values]
+        elif frame[name].isna().any():
+            values = [None if v is None or v != v else v for v in values]
+        columns.append(values)
+    rows = list(zip(*columns))
+
+    paramstyle = db.get_bind().dialect.paramstyle
+    marker = '?' if paramstyle == 'qmark' else '%s'
+    sql = (
+        f"INSERT INTO holdings ({', '.join(INSERT_COLUMNS)}) "
+        f"VALUES ({', '.join([marker] * len(INSERT_COLUMNS))})"
+    )
+    db.connection().exec_driver_sql(sql, rows)
+
+
+def load_filing(db: Session, filing: Dict, holdings_df: pd.DataFrame, cik: str,
+                filer_name: Optional[str] = None, commit: bool = True) -> int:
+    """
+    批量写入一个13F文件及其持仓
+
+    filing为get_13f_filings返回的文件记录，修正文件可带amendmentType（RESTATEMENT / NEW HOLDINGS）。
+    按accession编号upsert：重复加载同一文件会替换原有持仓。返回写入的持仓条数。
+    """
+    accession_number = filing['accessionNumber']
+    period = to_date(filing.get('reportDate'))
+    filed_at = to_date(filing['date'])
+    is_amended = bool(filing.get('isAmended', False))
+    amendment_type = normalize_amendment_type(filing.get('amendmentType')) if is_amended else None
+
+    upsert_filer(db, cik, name=filer_name)
+
+    filing_values = {
+        'accession_number': accession_number,
+        'cik': cik,
+        'form_type': '13F-HR/A' if is_amended else '13F-HR',
+        'period_of_report': period,
+        'filed_at': filed_at,
+        'is_amended': is_amended,
+        'amendment_type': amendment_type,
+        'holdings_count': int(len(holdings_df)),
+        'total_value': float(holdings_df['value'].sum()) if 'value' in holdings_df.columns else 0.0,
+    }
+    stmt = _dialect_insert(db, Filing.__table__).values(**filing_values)
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=['accession_number'],
+        set_={k: stmt.excluded[k] for k in filing_values if k != 'accession_number'},
+    ))
+
+    db.execute(delete(Holding.__table__).where(Holding.accession_number == accession_number))
+
+    frame = holdings_records(holdings_df, accession_number, cik, period)
+    dialect = db.get_bind().dialect
+    if dialect.name == 'postgresql' and dialect.driver == 'psycopg2':
+        _copy_holdings(db, frame)
+    else:
+        _insert_holdings(db, frame)
+
+    if commit:
+        db.commit()
+    logger.info(f"Loaded {len(frame)} holdings for filing {accession_number}")
+    return len(frame)
+
+
+def read_holdings(db: Session, accession_numbers: Iterable[str]) -> pd.DataFrame:
+    """读取一个或多个文件的持仓"""
+    accession_numbers = list(accession_numbers)
+    stmt = select(Holding.__table__).where(Holding.accession_number.in_(accession_numbers))
+    return pd.read_sql(stmt, db.connection())
+
+
+def get_filings(db: Session, cik: str) -> List[Filing]:
+    """按报告期和提交日期升序返回基金的全部文件"""
+    return (
+        db.query(Filing)
+        .filter(Filing.cik == cik)
+        .order_by(Filing.period_of_report, Filing.filed_at)
+        .all()
+    )
+
+
+def get_latest_filing(db: Session, cik: str, period_of_report: Optional[date] = None) -> Optional[Filing]:
+    """返回基金最新报告期（或指定报告期）最新提交的文件；本期完整持仓见get_period_filings"""
+    query = db.query(Filing).filter(Filing.cik == cik)
+    if period_of_report is not None:
+        query = query.filter(Filing.period_of_report == period_of_report)
+    return query.order_by(Filing.period_of_report.desc(), Filing.filed_at.desc()).first()
+
+
+def _is_base_filing():
+    """原始文件、重述文件和类型未知的修正文件都包含完整持仓"""
+    return or_(Filing.amendment_type.is_(None), Filing.amendment_type != NEW_HOLDINGS)
+
+
+def get_period_filings(db: Session, cik: str, period_of_report: Optional[date] = None) -> List[Filing]:
+    """
+    构成基金最新报告期（或指定报告期）完整持仓的文件，按提交顺序排列
+
+    即最新提交的原始或重述文件，加上其后提交的新增持仓（NEW HOLDINGS）修正文件；
+    最后一个元素是该期最新提交的文件。没有文件时返回空列表。
+    """
+    if period_of_report is None:
+        period_of_report = db.execute(
+            select(func.max(Filing.period_of_report)).where(Filing.cik == cik)
+        ).scalar()
+        if period_of_report is None:
+            return []
+    filings = (
+        db.query(Filing)
+        .filter(Filing.cik == cik, Filing.period_of_report == period_of_report)
+        .order_by(Filing.filed_at, Filing.accession_number)
+        .all()
+    )
+    bases = [i for i, f in enumerate(filings) if f.amendment_type != NEW_HOLDINGS]
+    return filings[bases[-1]:] if bases else filings
+
+
+def latest_filings_in_period(period_of_report: date):
+    """
+    报告期内构成每个基金完整持仓的文件（见get_period_filings）
+
+    返回包含 accession_number、cik、filed_at、is_latest 列的子查询，可用于 in_() 或 join；
+    有新增持仓修正文件时一个基金对应多行，is_latest标记该基金最新提交的文件。
+    """
+    order = (Filing.filed_at, Filing.accession_number)
+    ranked = (
+        select(
+            Filing.accession_number,
+            Filing.cik,
+            Filing.filed_at,
+            case((_is_base_filing(), 1), else_=0).label('is_base'),
+            func.row_number().over(partition_by=Filing.cik, order_by=order).label('seq'),
+            func.count().over(partition_by=Filing.cik).label('filings'),
+        )
+        .where(Filing.period_of_report == period_of_report)
+        .subquery()
+    )
+    based = select(
+        ranked,
+        func.max(case((ranked.c.is_base == 1, ranked.c.seq), else_=0)).over(partition_by=ranked.c.cik).label('base_seq'),
+    ).subquery()
+    return select(
+        based.c.accession_number,
+        based.c.cik,
+        based.c.filed_at,
+        (based.c.seq == based.c.filings).label('is_latest'),
+    ).where(based.c.seq >= based.c.base_seq).subquery()
@@ -1,7 +1,7 @@
 from sqlalchemy.orm import Session
 from app.models.user import User
 from app.schemas.user import UserCreate
-from app.core.security import get_password_hash, verify_password
+from app.core.security import get_password_hash, verify_password, invalidate_user
 from typing import Optional
 
 def get_user_by_email(db: Session, email: str) -> Optional[User]:
@@ -24,6 +24,13 @@ def create_user(db: Session, user: UserCreate) -> User:
     db.refresh(db_user)
     return db_user
 
+def deactivate_user(db: Session, user: User) -> User:
+    user.is_active = False
+    db.commit()
+    db.refresh(user)
+    invalidate_user(user.username)
+    return user
+
 def authenticate_user(db: Session, username: str, password: str) -> Optional[User]:
     user = get_user_by_username(db, username)
     if not user:
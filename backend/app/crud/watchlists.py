@@ -0,0 +1,191 @@
+import re
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+
+from sqlalchemy import delete, select, update
+from sqlalchemy.orm import Session
+
+from app.models.watchlists import Alert, AlertRule, Watchlist, WatchlistItem
+
+ITEM_KINDS = ('fund', 'security')
+RULE_KINDS = ('position_change', 'new_holder', 'closed_position')
+
+_CUSIP = re.compile(r'^[0-9A-Z]{9}$')
+
+
+def normalize_cik(cik: str) -> str:
+    """去掉非数字字符并补齐10位"""
+    digits = ''.join(filter(str.isdigit, str(cik)))
+    if not digits or len(digits) > 10:
+        raise ValueError(f"Invalid CIK: {cik}")
+    return digits.zfill(10)
+
+
+def normalize_cusip(cusip: str) -> str:
+    value = str(cusip).strip().upper()
+    if not _CUSIP.match(value):
+        raise ValueError(f"Invalid CUSIP: {cusip}")
+    return value
+
+
+def normalize_item(kind: str, value: str) -> str:
+    if kind not in ITEM_KINDS:
+        raise ValueError(f"kind must be one of {', '.join(ITEM_KINDS)}")
+    return normalize_cik(value) if kind == 'fund' else normalize_cusip(value)
+
+
+def get_watchlist(db: Session, user_id: int, watchlist_id: int) -> Optional[Watchlist]:
+    return db.query(Watchlist).filter(Watchlist.id == watchlist_id, Watchlist.user_id == user_id).first()
+
+
+def watchlist_items(db: Session, watchlist_ids: Iterable[int]) -> Dict[int, List[WatchlistItem]]:
+    items: Dict[int, List[WatchlistItem]] = {}
+    rows = (
+        db.query(WatchlistItem)
+        .filter(WatchlistItem.watchlist_id.in_(list(watchlist_ids)))
+        .order_by(WatchlistItem.id)
+        .all()
+    )
+    for item in rows:
+        items.setdefault(item.watchlist_id, []).append(item)
+    return items
+
+
+def list_watchlists(db: Session, user_id: int) -> List[Dict]:
+    """用户的全部关注列表及其条目"""
+    watchlists = db.query(Watchlist).filter(Watchlist.user_id == user_id).order_by(Watchlist.id).all()
+    items = watchlist_items(db, [w.id for w in watchlists])
+    return [{'id': w.id, 'name': w.name, 'created_at': w.created_at, 'items': items.get(w.id, [])}
+            for w in watchlists]
+
+
+def create_watchlist(db: Session, user_id: int, name: str, funds: Iterable[str] = (),
+                     securities: Iterable[str] = ()) -> Dict:
+    """新建关注列表；同一用户的列表名称不能重复"""
+    name = name.strip()
+    if not name:
+        raise ValueError("Watchlist name is required")
+    if db.query(Watchlist.id).filter(Watchlist.user_id == user_id, Watchlist.name == name).first():
+        raise ValueError(f"Watchlist '{name}' already exists")
+    values = {('fund', normalize_cik(c)) for c in funds} | {('security', normalize_cusip(c)) for c in securities}
+
+    now = datetime.utcnow()
+    watchlist = Watchlist(user_id=user_id, name=name, created_at=now)
+    db.add(watchlist)
+    db.flush()
+    items = [WatchlistItem(watchlist_id=watchlist.id, kind=kind, value=value, created_at=now)
+             for kind, value in sorted(values)]
+    db.add_all(items)
+    db.commit()
+    return {'id': watchlist.id, 'name': watchlist.name, 'created_at': watchlist.created_at, 'items': items}
+
+
+def delete_watchlist(db: Session, user_id: int, watchlist_id: int) -> bool:
+    """删除关注列表及其条目、限定于该列表的提醒规则和这些规则触发的提醒"""
+    watchlist = get_watchlist(db, user_id, watchlist_id)
+    if watchlist is None:
+        return False
+    rule_ids = select(AlertRule.id).where(AlertRule.watchlist_id == watchlist_id)
+    db.execute(delete(Alert.__table__).where(Alert.rule_id.in_(rule_ids)))
+    db.execute(delete(AlertRule.__table__).where(AlertRule.watchlist_id == watchlist_id))
+    db.execute(delete(WatchlistItem.__table__).where(WatchlistItem.watchlist_id == watchlist_id))
+    db.delete(watchlist)
+    db.commit()
+    return True
+
+
+def add_item(db: Session, user_id: int, watchlist_id: int, kind: str, value: str,
+             label: Optional[str] = None) -> Optional[WatchlistItem]:
+    """向关注列表添加基金或证券，列表不存在时返回None"""
+    if get_watchlist(db, user_id, watchlist_id) is None:
+        return None
+    value = normalize_item(kind, value)
+    exists = db.query(WatchlistItem.id).filter(
+        WatchlistItem.watchlist_id == watchlist_id, WatchlistItem.kind == kind, WatchlistItem.value == value
+    ).first()
+    if exists:
+        raise ValueError(f"{value} is already in the watchlist")
+    item = WatchlistItem(watchlist_id=watchlist_id, kind=kind, value=value, label=label,
+                         created_at=datetime.utcnow())
+    db.add(item)
+    db.commit()
+    db.refresh(item)
+    return item
+
+
+def remove_item(db: Session, user_id: int, watchlist_id: int, item_id: int) -> bool:
+    if get_watchlist(db, user_id, watchlist_id) is None:
+        return False
+    result = db.execute(delete(WatchlistItem.__table__).where(
+        WatchlistItem.id == item_id, WatchlistItem.watchlist_id == watchlist_id
+    ))
+    db.commit()
+    return result.rowcount > 0
+
+
+def create_rule(db: Session, user_id: int, kind: str, cik: Optional[str] = None, cusip: Optional[str] = None,
+                watchlist_id: Optional[int] = None, threshold_pct: Optional[float] = None) -> AlertRule:
+    """
+    新建提醒规则
+
+    至少需要限定基金、证券或关注列表之一；position_change需要正的阈值。
+    """
+    if kind not in RULE_KINDS:
+        raise ValueError(f"kind must be one of {', '.join(RULE_KINDS)}")
+    if cik is None and cusip is None and watchlist_id is None:
+        raise ValueError("A rule needs a cik, a cusip or a watchlist_id")
+    if kind == 'position_change':
+        if threshold_pct is None or threshold_pct <= 0:
+            raise ValueError("position_change rules need a positive threshold_pct")
+    else:
+        threshold_pct = None
+    if watchlist_id is not None and get_watchlist(db, user_id, watchlist_id) is None:
+        raise ValueError(f"Watchlist {watchlist_id} not found")
+
+    rule = AlertRule(
+        user_id=user_id,
+        kind=kind,
+        cik=normalize_cik(cik) if cik is not None else None,
+        cusip=normalize_cusip(cusip) if cusip is not None else None,
+        watchlist_id=watchlist_id,
+        threshold_pct=threshold_pct,
+        is_active=True,
+        created_at=datetime.utcnow(),
+    )
+    db.add(rule)
+    db.commit()
+    db.refresh(rule)
+    return rule
+
+
+def list_rules(db: Session, user_id: int) -> List[AlertRule]:
+    return db.query(AlertRule).filter(AlertRule.user_id == user_id).order_by(AlertRule.id).all()
+
+
+def delete_rule(db: Session, user_id: int, rule_id: int) -> bool:
+    """删除规则及其触发的提醒"""
+    rule = db.query(AlertRule).filter(AlertRule.id == rule_id, AlertRule.user_id == user_id).first()
+    if rule is None:
+        return False
+    db.execute(delete(Alert.__table__).where(Alert.rule_id == rule_id))
+    db.delete(rule)
+    db.commit()
+    return True
+
+
+def list_alerts(db: Session, user_id: int, unread_only: bool = False, limit: int = 100) -> List[Alert]:
+    """用户最近的提醒，按时间降序"""
+    query = db.query(Alert).filter(Alert.user_id == user_id)
+    if unread_only:
+        query = query.filter(Alert.read_at.is_(None))
+    return query.order_by(Alert.created_at.desc(), Alert.id.desc()).limit(limit).all()
+
+
+def mark_alerts_read(db: Session, user_id: int, alert_ids: Optional[Iterable[int]] = None) -> int:
+    """把指定（为空时为全部）未读提醒标记为已读，返回更新条数"""
+    stmt = update(Alert.__table__).where(Alert.user_id == user_id, Alert.read_at.is_(None))
+    if alert_ids is not None:
+        stmt = stmt.where(Alert.id.in_(list(alert_ids)))
+    result = db.execute(stmt.values(read_at=datetime.utcnow()))
+    db.commit()
+    return result.rowcount
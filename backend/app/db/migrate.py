@@ -0,0 +1,58 @@
+import logging
+
+from typing import Optional
+
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+
+def run_migrations(bind: Optional[Engine] = None) -> None:
+    """
+    创建缺失的数据库表，并为已有的表补上新增的可空列
+
+    作为独立的部署步骤执行（python -m app.db.migrate），不在应用导入时运行；
+    开发环境可设置 DB_AUTO_MIGRATE=True 在应用启动时自动执行。
+    """
+    from app.db.session import engine
+    from app.models.user import Base
+    from app.models import holdings, jobs, leaderboards, sectors, styles, watchlists  # noqa: F401  注册持仓、后台任务、排行榜、板块汇总、风格聚类和关注列表表
+
+    bind = bind or engine
+    Base.metadata.create_all(bind=bind)
+    add_missing_columns(bind, Base.metadata)
+    logger.info(f"Database schema is up to date ({len(Base.metadata.tables)} tables)")
+
+
+def add_missing_columns(bind: Engine, metadata) -> int:
+    """
+    为已存在的表补上模型中新增的可空列
+
+    create_all不会修改已有的表；只处理可空且无服务端默认值的列，其他结构变化需要单独迁移。
+    """
+    inspector = inspect(bind)
+    added = 0
+    with bind.begin() as conn:
+        for table in metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {c['name'] for c in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing or not column.nullable or column.server_default is not None:
+                    continue
+                column_type = column.type.compile(dialect=bind.dialect)
+                conn.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}'))
+                logger.info(f"Added column {table.name}.{column.name}")
+                added += 1
+    return added
+
+
+if __name__ == '__main__':
+    from app.core.logging_config import configure_logging
+
+    from app.db import migrate
+
+    configure_logging()
+    # 通过包路径调用，使日志记录器名称落在 app.* 下
+    migrate.run_migrations()
@@ -1,8 +1,57 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine, make_url
 from sqlalchemy.orm import sessionmaker
-from app.core.config import settings
+from sqlalchemy.pool import StaticPool
+from app.core.config import Settings, settings
 
-engine = create_engine(settings.DATABASE_URL)
+
+def _set_sqlite_pragmas(dbapi_connection, config: Settings) -> None:
+    """在每个新的SQLite连接上应用PRAGMA设置"""
+    cursor = dbapi_connection.cursor()
+    try:
+        if config.SQLITE_WAL:
+            cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute(f"PRAGMA synchronous={config.SQLITE_SYNCHRONOUS}")
+        cursor.execute(f"PRAGMA busy_timeout={int(config.SQLITE_BUSY_TIMEOUT_MS)}")
+        cursor.execute(f"PRAGMA cache_size=-{int(config.SQLITE_CACHE_SIZE_KB)}")
+        cursor.execute("PRAGMA foreign_keys=ON")
+    finally:
+        cursor.close()
+
+
+def build_engine(config: Settings = settings) -> Engine:
+    """根据配置创建数据库引擎：SQLite使用PRAGMA和跨线程连接，其他数据库使用可配置的连接池"""
+    url = make_url(config.DATABASE_URL)
+
+    if url.get_backend_name() == 'sqlite':
+        connect_args = {"check_same_thread": False}
+        if url.database in (None, '', ':memory:'):
+            # 内存数据库只能共享同一个连接
+            db_engine = create_engine(url, connect_args=connect_args, poolclass=StaticPool)
+        else:
+            db_engine = create_engine(
+                url,
+                connect_args=connect_args,
+                pool_size=config.DB_POOL_SIZE,
+                max_overflow=config.DB_MAX_OVERFLOW,
+                pool_timeout=config.DB_POOL_TIMEOUT,
+                pool_pre_ping=config.DB_POOL_PRE_PING,
+            )
+        event.listen(db_engine, "connect",
+                     lambda dbapi_connection, connection_record: _set_sqlite_pragmas(dbapi_connection, config))
+        return db_engine
+
+    return create_engine(
+        url,
+        pool_size=config.DB_POOL_SIZE,
+        max_overflow=config.DB_MAX_OVERFLOW,
+        pool_timeout=config.DB_POOL_TIMEOUT,
+        pool_recycle=config.DB_POOL_RECYCLE,
+        pool_pre_ping=config.DB_POOL_PRE_PING,
+    )
+
+
+engine = build_engine()
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 def get_db():
@@ -1,74 +1,68 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, HTTPException
+import asyncio
 from fastapi.middleware.cors import CORSMiddleware
-from app.routers import edgar
+from app.routers import edgar, analytics, jobs, watchlists
+from app.api.deps import get_edgar_service
 from app.api.endpoints import auth
 from app.core.config import settings
-from app.models.user import Base
-from app.db.session import engine
+from app.core.logging_config import configure_logging
+from app.services.filer_directory import filer_directory
+from app.services.filing_watcher import filing_watcher
+from app.services.job_queue import job_queue
 import logging
-import sys
-import os
 from fastapi.responses import JSONResponse
 from fastapi.exceptions import RequestValidationError
 from starlette.exceptions import HTTPException as StarletteHTTPException
 
-# 配置日志记录
-try:
-    log_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'logs')
-    os.makedirs(log_dir, exist_ok=True)
-
-    # 创建日志记录器
-    logger = logging.getLogger(__name__)
-    logger.setLevel(logging.DEBUG)
-
-    # 创建文件处理器
-    log_file = os.path.join(log_dir, 'api.log')
-    try:
-        # 测试文件是否可写
-        with open(log_file, 'a', encoding='utf-8') as f:
-            f.write('')
-        file_handler = logging.FileHandler(log_file, encoding='utf-8')
-        file_handler.setLevel(logging.DEBUG)
-    except Exception as e:
-        print(f"Warning: Could not create file handler: {str(e)}")
-        file_handler = None
-
-    # 创建控制台处理器
-    console_handler = logging.StreamHandler(sys.stdout)
-    console_handler.setLevel(logging.DEBUG)
-
-    # 创建格式化器
-    formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-    
-    if file_handler:
-        file_handler.setFormatter(formatter)
-        logger.addHandler(file_handler)
-    
-    console_handler.setFormatter(formatter)
-    logger.addHandler(console_handler)
-
-    # 防止日志重复
-    logger.propagate = False
-
-except Exception as e:
-    print(f"Warning: Failed to configure logging: {str(e)}")
-    # 创建一个基本的控制台日志记录器
-    logger = logging.getLogger(__name__)
-    logger.setLevel(logging.DEBUG)
-    console_handler = logging.StreamHandler(sys.stdout)
-    console_handler.setLevel(logging.DEBUG)
-    formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-    console_handler.setFormatter(formatter)
-    logger.addHandler(console_handler)
-    logger.propagate = False
-
-# Create database tables
-Base.metadata.create_all(bind=engine)
+logger = logging.getLogger(__name__)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    应用生命周期：导入阶段只注册路由，日志、数据库迁移和后台任务在这里初始化
+    """
+    configure_logging()
+    loop = asyncio.get_running_loop()
+    if settings.DB_AUTO_MIGRATE:
+        from app.db.migrate import run_migrations
+        await loop.run_in_executor(None, run_migrations)
+
+    filer_directory_task = None
+    if settings.FILER_DIRECTORY_AUTO_REFRESH:
+        filer_directory_task = asyncio.create_task(
+            filer_directory.run_background_refresh(
+                get_edgar_service,
+                interval_hours=settings.FILER_DIRECTORY_REFRESH_HOURS,
+                quarters=settings.FILER_DIRECTORY_QUARTERS,
+            )
+        )
+    else:
+        await loop.run_in_executor(None, filer_directory.reload)
+
+    filing_watcher.interval = settings.FILING_WATCH_INTERVAL_SECONDS
+    filing_watcher.concurrency = settings.FILING_WATCH_CONCURRENCY
+    filing_watcher.start(get_edgar_service)
+
+    job_queue.configure(settings)
+    if settings.JOB_WORKERS > 0:
+        job_queue.start()
+    logger.info("Application startup complete")
+
+    yield
+
+    if filer_directory_task is not None:
+        filer_directory_task.cancel()
+    await filing_watcher.stop()
+    # 未在超时内完成的任务重新排队，下次启动时从断点继续
+    await loop.run_in_executor(None, job_queue.stop, 10)
 
 app = FastAPI(
     title=settings.PROJECT_NAME,
     description="API for analyzing hedge fund holdings and strategies",
     version=settings.VERSION,
+    lifespan=lifespan,
 )
 
 # Configure CORS
@@ -86,6 +80,7 @@ async def http_exception_handler(request, exc):
     return JSONResponse(
         status_code=exc.status_code,
         content={"detail": exc.detail},
+        headers=getattr(exc, "headers", None),
     )
 
 @app.exception_handler(RequestValidationError)
@@ -106,41 +101,30 @@ async def general_exception_handler(request, exc):
 
 # Include routers
 app.include_router(edgar.router, prefix="/api/v1/edgar", tags=["edgar"])
+app.include_router(analytics.router, prefix=settings.API_V1_STR + "/analytics", tags=["analytics"])
 app.include_router(auth.router, prefix=settings.API_V1_STR + "/auth", tags=["auth"])
+app.include_router(jobs.router, prefix=settings.API_V1_STR + "/jobs", tags=["jobs"])
+app.include_router(watchlists.router, prefix=settings.API_V1_STR, tags=["watchlists"])
 
 @app.get("/")
 async def root():
     return {"message": "Welcome to Hedge Fund Analytics API"}
 
 @app.get("/api/v1/funds")
-async def get_funds():
+async def get_funds(q: str = "", page: int = 1, page_size: int = 20):
+    """
+    搜索13F申报机构
+
+    参数:
+    - q: 机构或管理人名称（支持前缀和模糊匹配）或CIK前缀，为空时按AUM降序列出
+    - page / page_size: 分页参数，page_size最大100
+
+    返回:
+    - funds: 机构列表（cik、名称、管理人、最新入库文件的持仓总市值aum）
+    - total: 匹配总数
+    """
     try:
-        # Temporary mock data
-        return {
-            "funds": [
-                {
-                    "id": 1,
-                    "name": "Citadel Advisors LLC",
-                    "manager": "Kenneth Griffin",
-                    "cik": "0001423053",
-                    "aum": 234000000000
-                },
-                {
-                    "id": 2,
-                    "name": "Renaissance Technologies",
-                    "manager": "James Simons",
-                    "cik": "0001037389",
-                    "aum": 130000000000
-                },
-                {
-                    "id": 3,
-                    "name": "Bridgewater Associates",
-                    "manager": "Ray Dalio",
-                    "cik": "0001350694",
-                    "aum": 140000000000
-                }
-            ]
-        }
+        return filer_directory.search(q, page=page, page_size=page_size)
     except Exception as e:
         logger.error(f"Error in get_funds: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail="Internal server error")
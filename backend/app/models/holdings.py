@@ -0,0 +1,73 @@
+from sqlalchemy import (
+    BigInteger, Boolean, Column, Date, DateTime, Float, ForeignKey, Index, Integer, String,
+)
+from app.models.user import Base
+
+# SQLite只对INTEGER主键自增，PostgreSQL使用BIGINT
+BigIntegerPK = BigInteger().with_variant(Integer, "sqlite")
+
+
+class Filer(Base):
+    """13F申报机构"""
+    __tablename__ = "filers"
+
+    cik = Column(String(10), primary_key=True)
+    name = Column(String, index=True)
+    manager = Column(String, nullable=True)
+    updated_at = Column(DateTime, nullable=True)
+
+
+class Filing(Base):
+    """13F-HR / 13F-HR/A 文件"""
+    __tablename__ = "filings"
+
+    accession_number = Column(String(20), primary_key=True)
+    cik = Column(String(10), ForeignKey("filers.cik"), nullable=False)
+    form_type = Column(String(10), nullable=False, default="13F-HR")
+    period_of_report = Column(Date, nullable=True)
+    filed_at = Column(Date, nullable=False)
+    is_amended = Column(Boolean, default=False)
+    # 修正文件的类型：RESTATEMENT（完整重述）或 NEW HOLDINGS（只列出新增持仓）；原始文件或未知时为空
+    amendment_type = Column(String(20), nullable=True)
+    holdings_count = Column(Integer, default=0)
+    total_value = Column(Float, default=0.0)
+
+    __table_args__ = (
+        Index("ix_filings_cik_period", "cik", "period_of_report", "filed_at"),
+        Index("ix_filings_period", "period_of_report"),
+    )
+
+
+class Holding(Base):
+    """13F信息表中的单条持仓"""
+    __tablename__ = "holdings"
+
+    id = Column(BigIntegerPK, primary_key=True, autoincrement=True)
+    accession_number = Column(
+        String(20), ForeignKey("filings.accession_number", ondelete="CASCADE"), nullable=False
+    )
+    # 冗余存储cik和报告期，便于按基金或证券跨期查询时走索引
+    cik = Column(String(10), nullable=False)
+    period_of_report = Column(Date, nullable=True)
+    cusip = Column(String(9), nullable=False)
+    name_of_issuer = Column(String)
+    title_of_class = Column(String)
+    value = Column(Float)
+    shares = Column(Float)
+    share_type = Column(String(10))
+    put_call = Column(String(10), nullable=True)
+    investment_discretion = Column(String(10))
+    other_manager = Column(String, nullable=True)
+    sole_voting = Column(BigInteger, default=0)
+    shared_voting = Column(BigInteger, default=0)
+    no_voting = Column(BigInteger, default=0)
+
+    __table_args__ = (
+        Index("ix_holdings_accession", "accession_number"),
+        Index("ix_holdings_cik_period", "cik", "period_of_report"),
+        # PostgreSQL上为覆盖索引：按证券跨基金查询时无需回表
+        Index(
+            "ix_holdings_cusip_period", "cusip", "period_of_report",
+            postgresql_include=["cik", "shares", "value"],
+        ),
+    )
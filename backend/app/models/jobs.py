@@ -0,0 +1,36 @@
+from sqlalchemy import Boolean, Column, DateTime, Float, Index, Integer, String, Text
+from app.models.user import Base
+
+
+class Job(Base):
+    """后台任务：参数、状态、进度及结果文件位置（结果本身写在结果目录中）"""
+    __tablename__ = "jobs"
+
+    id = Column(String(32), primary_key=True)
+    kind = Column(String(50), nullable=False)
+    # JSON编码的任务参数
+    params = Column(Text, nullable=False, default='{}')
+    owner = Column(String(100), nullable=False)
+    # 数值越大越先执行
+    priority = Column(Integer, nullable=False, default=0)
+    # queued / running / succeeded / failed / cancelled
+    status = Column(String(20), nullable=False, default='queued')
+    progress = Column(Float, nullable=False, default=0.0)
+    message = Column(String, nullable=True)
+    error = Column(Text, nullable=True)
+    # JSON编码的断点状态，进程重启后任务从这里继续
+    checkpoint = Column(Text, nullable=True)
+    result_path = Column(String, nullable=True)
+    attempts = Column(Integer, nullable=False, default=0)
+    cancel_requested = Column(Boolean, nullable=False, default=False)
+    # 执行该任务的进程及其最近一次心跳；心跳过期的running任务会被重新排队
+    worker_id = Column(String(100), nullable=True)
+    heartbeat_at = Column(DateTime, nullable=True)
+    created_at = Column(DateTime, nullable=False)
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+
+    __table_args__ = (
+        Index("ix_jobs_status_priority", "status", "priority", "created_at"),
+        Index("ix_jobs_owner_status", "owner", "status"),
+    )
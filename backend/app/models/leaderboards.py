@@ -0,0 +1,45 @@
+from sqlalchemy import Boolean, Column, Date, DateTime, Float, Index, Integer, String
+from app.models.user import Base
+
+
+class FundPositionChange(Base):
+    """基金在某个报告期相对其上一报告期的逐证券持仓变化（排行榜的增量来源）"""
+    __tablename__ = "fund_position_changes"
+
+    period_of_report = Column(Date, primary_key=True)
+    cik = Column(String(10), primary_key=True)
+    cusip = Column(String(9), primary_key=True)
+    accession_number = Column(String(20), nullable=False)
+    name_of_issuer = Column(String, nullable=True)
+    shares = Column(Float, default=0.0)
+    value = Column(Float, default=0.0)
+    shares_change = Column(Float, default=0.0)
+    # 按持仓价格估算的买卖金额（剔除价格变动）
+    value_change = Column(Float, default=0.0)
+    is_new = Column(Boolean, default=False)
+    is_closed = Column(Boolean, default=False)
+    # 没有上一报告期可比较时只计入持有数，不计买卖
+    has_baseline = Column(Boolean, default=True)
+
+    __table_args__ = (
+        Index("ix_fund_position_changes_cik_period", "cik", "period_of_report"),
+    )
+
+
+class SecurityPeriodActivity(Base):
+    """每个报告期每只证券的全市场（已入库基金）持仓变化汇总"""
+    __tablename__ = "security_period_activity"
+
+    period_of_report = Column(Date, primary_key=True)
+    cusip = Column(String(9), primary_key=True)
+    name_of_issuer = Column(String, nullable=True)
+    holders = Column(Integer, default=0)
+    new_positions = Column(Integer, default=0)
+    closed_positions = Column(Integer, default=0)
+    shares_bought = Column(Float, default=0.0)
+    shares_sold = Column(Float, default=0.0)
+    value_bought = Column(Float, default=0.0)
+    value_sold = Column(Float, default=0.0)
+    total_shares = Column(Float, default=0.0)
+    total_value = Column(Float, default=0.0)
+    updated_at = Column(DateTime, nullable=True)
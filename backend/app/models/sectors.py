@@ -0,0 +1,40 @@
+from sqlalchemy import Column, Date, DateTime, Float, ForeignKey, Index, Integer, String
+from app.models.user import Base
+
+
+class FundSectorWeight(Base):
+    """单个13F文件按行业汇总的持仓（入库时物化）"""
+    __tablename__ = "fund_sector_weights"
+
+    accession_number = Column(
+        String(20), ForeignKey("filings.accession_number", ondelete="CASCADE"), primary_key=True
+    )
+    # level为sector或industry；industry行的sector列为所属板块
+    level = Column(String(10), primary_key=True)
+    name = Column(String, primary_key=True)
+    sector = Column(String, nullable=True)
+    cik = Column(String(10), nullable=False)
+    period_of_report = Column(Date, nullable=False)
+    value = Column(Float, default=0.0)
+    weight = Column(Float, default=0.0)
+    positions = Column(Integer, default=0)
+
+    __table_args__ = (
+        Index("ix_fund_sector_weights_cik_period", "cik", "period_of_report", "level"),
+        Index("ix_fund_sector_weights_period", "period_of_report", "level"),
+    )
+
+
+class SectorPeriodTotal(Base):
+    """全市场（已入库基金）每个报告期按行业汇总的持仓"""
+    __tablename__ = "sector_period_totals"
+
+    period_of_report = Column(Date, primary_key=True)
+    level = Column(String(10), primary_key=True)
+    name = Column(String, primary_key=True)
+    sector = Column(String, nullable=True)
+    value = Column(Float, default=0.0)
+    weight = Column(Float, default=0.0)
+    funds = Column(Integer, default=0)
+    positions = Column(Integer, default=0)
+    updated_at = Column(DateTime, nullable=True)
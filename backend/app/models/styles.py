@@ -0,0 +1,19 @@
+from sqlalchemy import Column, Date, Float, Index, Integer, LargeBinary, String
+from app.models.user import Base
+
+
+class FundStyle(Base):
+    """基金在某个报告期的风格特征向量及所属聚类"""
+    __tablename__ = "fund_styles"
+
+    cik = Column(String(10), primary_key=True)
+    period_of_report = Column(Date, primary_key=True)
+    accession_number = Column(String(20), nullable=False)
+    cluster = Column(Integer, nullable=False)
+    distance = Column(Float, default=0.0)
+    # float32特征向量的原始字节，用于计算相似基金
+    features = Column(LargeBinary, nullable=False)
+
+    __table_args__ = (
+        Index("ix_fund_styles_period_cluster", "period_of_report", "cluster"),
+    )
@@ -0,0 +1,91 @@
+from sqlalchemy import (
+    Boolean, Column, Date, DateTime, Float, ForeignKey, Index, Integer, String, UniqueConstraint,
+)
+from app.models.holdings import BigIntegerPK
+from app.models.user import Base
+
+
+class Watchlist(Base):
+    """用户的关注列表"""
+    __tablename__ = "watchlists"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    name = Column(String(100), nullable=False)
+    created_at = Column(DateTime, nullable=False)
+
+    __table_args__ = (
+        UniqueConstraint("user_id", "name", name="uq_watchlists_user_name"),
+    )
+
+
+class WatchlistItem(Base):
+    """关注列表中的基金（cik）或证券（cusip）"""
+    __tablename__ = "watchlist_items"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    watchlist_id = Column(Integer, ForeignKey("watchlists.id", ondelete="CASCADE"), nullable=False)
+    # fund / security
+    kind = Column(String(10), nullable=False)
+    value = Column(String(10), nullable=False)
+    label = Column(String, nullable=True)
+    created_at = Column(DateTime, nullable=False)
+
+    __table_args__ = (
+        UniqueConstraint("watchlist_id", "kind", "value", name="uq_watchlist_items_value"),
+        Index("ix_watchlist_items_kind_value", "kind", "value"),
+    )
+
+
+class AlertRule(Base):
+    """
+    提醒规则
+
+    范围由cik、cusip和watchlist_id限定（为空表示不限）：关注列表中的基金限定cik，证券限定cusip。
+    """
+    __tablename__ = "alert_rules"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    # position_change / new_holder / closed_position
+    kind = Column(String(20), nullable=False)
+    cik = Column(String(10), nullable=True)
+    cusip = Column(String(9), nullable=True)
+    watchlist_id = Column(Integer, ForeignKey("watchlists.id", ondelete="CASCADE"), nullable=True)
+    # position_change：股数变化幅度阈值（%）
+    threshold_pct = Column(Float, nullable=True)
+    is_active = Column(Boolean, nullable=False, default=True)
+    created_at = Column(DateTime, nullable=False)
+
+    __table_args__ = (
+        Index("ix_alert_rules_cik", "cik"),
+        Index("ix_alert_rules_cusip", "cusip"),
+        Index("ix_alert_rules_user", "user_id"),
+    )
+
+
+class Alert(Base):
+    """入库时触发的提醒"""
+    __tablename__ = "alerts"
+
+    id = Column(BigIntegerPK, primary_key=True, autoincrement=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    rule_id = Column(Integer, ForeignKey("alert_rules.id", ondelete="CASCADE"), nullable=False)
+    kind = Column(String(20), nullable=False)
+    cik = Column(String(10), nullable=False)
+    cusip = Column(String(9), nullable=False)
+    name_of_issuer = Column(String, nullable=True)
+    accession_number = Column(String(20), nullable=False)
+    period_of_report = Column(Date, nullable=False)
+    shares_before = Column(Float, default=0.0)
+    shares_after = Column(Float, default=0.0)
+    # 新建仓时为空
+    change_pct = Column(Float, nullable=True)
+    created_at = Column(DateTime, nullable=False)
+    read_at = Column(DateTime, nullable=True)
+
+    __table_args__ = (
+        # 同一文件重复入库不重复提醒
+        UniqueConstraint("rule_id", "accession_number", "cusip", name="uq_alerts_rule_filing_cusip"),
+        Index("ix_alerts_user_created", "user_id", "created_at"),
+    )
@@ -0,0 +1,519 @@
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+from typing import Dict, Optional
+from datetime import datetime
+from app.api.deps import get_edgar_service, get_job_owner
+from app.core.config import settings
+from app.db.session import get_db
+from app.routers.jobs import submit_job
+from app.services.job_queue import job_queue
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+_backtest_engine = None
+
+
+def get_backtest_engine(edgar_service):
+    """返回共享的回测引擎（依赖本地价格存储）"""
+    global _backtest_engine
+    from app.services.backtest_service import BacktestEngine
+
+    if edgar_service.price_store is None:
+        raise HTTPException(status_code=503, detail="Price history is not available")
+    if _backtest_engine is None or _backtest_engine.price_store is not edgar_service.price_store:
+        _backtest_engine = BacktestEngine(edgar_service.price_store)
+    return _backtest_engine
+
+
+_risk_engine = None
+_risk_engine_lock = threading.Lock()
+
+
+def get_risk_engine(edgar_service):
+    """
+    返回共享的风险引擎；价格存储更新后增量合并新的交易日
+
+    首次调用会估计全部证券的协方差，耗时较长，需在线程池中调用。
+    """
+    global _risk_engine
+    from app.services.risk_service import RiskEngine
+
+    store = edgar_service.price_store
+    if store is None:
+        raise HTTPException(status_code=503, detail="Price history is not available")
+    if _risk_engine is None:
+        with _risk_engine_lock:
+            if _risk_engine is None:
+                shrinkage = settings.RISK_SHRINKAGE.lower()
+                if shrinkage == 'none':
+                    shrinkage = None
+                elif shrinkage != 'auto':
+                    shrinkage = float(shrinkage)
+                _risk_engine = RiskEngine(store, shrinkage=shrinkage, benchmark=settings.RISK_BENCHMARK)
+                return _risk_engine
+    _risk_engine.refresh(store)
+    return _risk_engine
+
+
+def reload_price_store(edgar_service) -> Dict:
+    """重新打开本地价格存储，已建立的风险引擎只合并新增的交易日"""
+    from app.services.price_store import load_price_store
+
+    store = load_price_store(settings.PRICE_STORE_PATH)
+    if store is None:
+        raise HTTPException(status_code=503, detail="Price history is not available")
+    edgar_service.price_store = store
+    new_days = _risk_engine.refresh(store) if _risk_engine is not None else 0
+    return {
+        'securities': len(store.keys),
+        'lastDate': str(store.dates[-1]) if len(store.dates) else None,
+        'riskModelNewDays': new_days,
+    }
+
+
+def _fund_risk(edgar_service, cik: str, year: int, benchmark: Optional[str], top: int) -> Dict:
+    engine = get_risk_engine(edgar_service)
+    holdings_df = edgar_service.get_fund_holdings(cik, year)
+    result = engine.fund_risk(holdings_df, benchmark=benchmark, top=top)
+    result['cik'] = edgar_service.validate_cik(cik)
+    return result
+
+
+def _run_backtest(edgar_service, cik: str, start_year: int, end_year: Optional[int], rebalance: str,
+                  lag_days: int, weighting: str, start: Optional[str], end: Optional[str],
+                  include_series: bool, progress=None) -> Dict:
+    from app.services.backtest_service import BacktestParams
+
+    end_year = end_year or datetime.now().year
+    params = BacktestParams(rebalance=rebalance, lag_days=lag_days, weighting=weighting,
+                            start=start, end=end)
+    engine = get_backtest_engine(edgar_service)
+
+    history = edgar_service.get_holdings_history(cik, start_year, end_year)
+    if progress is not None:
+        progress(0.5, f"Loaded {len(history)} reporting periods")
+    result = engine.run(edgar_service.validate_cik(cik), history, params)
+    logger.info(f"Backtest for CIK {cik} covered {len(result.returns)} days")
+    return result.to_dict(include_series=include_series)
+
+
+@router.get("/backtest/{cik}")
+async def backtest_fund(
+    cik: str,
+    start_year: int,
+    end_year: Optional[int] = None,
+    rebalance: str = 'filing',
+    lag_days: int = 0,
+    weighting: str = 'value',
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    include_series: bool = True,
+    background: bool = False,
+    priority: int = 0,
+    edgar_service=Depends(get_edgar_service),
+    owner: str = Depends(get_job_owner),
+):
+    """
+    回测基金13F克隆组合
+
+    参数:
+    - cik: SEC CIK编号
+    - start_year / end_year: 持仓历史的提交年份区间
+    - rebalance: filing（提交日调仓）或 period（报告期末加 lag_days 调仓）
+    - lag_days: 调仓延迟天数
+    - weighting: value（市值加权）或 equal（等权）
+    - background: 为True时作为后台任务执行，立即返回202及任务信息（见 /api/v1/jobs）
+    - priority: 后台任务优先级
+
+    返回:
+    - 每日收益、净值曲线和汇总统计
+    """
+    try:
+        arguments = {'cik': cik, 'start_year': start_year, 'end_year': end_year, 'rebalance': rebalance,
+                     'lag_days': lag_days, 'weighting': weighting, 'start': start, 'end': end,
+                     'include_series': include_series}
+        if background:
+            return await submit_job('backtest', arguments, owner, priority)
+        return await run_in_threadpool(_run_backtest, edgar_service, **arguments)
+
+    except HTTPException:
+        raise
+    except ValueError as e:
+        logger.error(f"Validation error: {e}", exc_info=True)
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Unexpected error in backtest_fund: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+
+def _validate_backtest_job(params: Dict) -> Dict:
+    from app.services.backtest_service import BacktestParams
+
+    edgar_service = get_edgar_service()
+    end_year = params.get('end_year')
+    arguments = {
+        'cik': edgar_service.validate_cik(params.get('cik', '')),
+        'start_year': edgar_service.validate_year(params.get('start_year')),
+        'end_year': edgar_service.validate_year(end_year) if end_year is not None else None,
+        'rebalance': params.get('rebalance', 'filing'),
+        'lag_days': int(params.get('lag_days', 0)),
+        'weighting': params.get('weighting', 'value'),
+        'start': params.get('start'),
+        'end': params.get('end'),
+        'include_series': bool(params.get('include_series', True)),
+    }
+    # 参数组合非法时在提交阶段就返回400
+    BacktestParams(rebalance=arguments['rebalance'], lag_days=arguments['lag_days'],
+                   weighting=arguments['weighting'], start=arguments['start'], end=arguments['end'])
+    return arguments
+
+
+def run_backtest_job(ctx) -> Dict:
+    """后台任务：回测（结果与同步接口相同）"""
+    return _run_backtest(get_edgar_service(), progress=ctx.progress, **ctx.params)
+
+
+job_queue.register('backtest', run_backtest_job, validate=_validate_backtest_job)
+
+
+@router.get("/sectors")
+async def get_market_sector_trends(
+    level: str = 'sector',
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    db: Session = Depends(get_db),
+):
+    """
+    全市场板块/行业权重趋势
+
+    参数:
+    - level: sector（板块）或 industry（行业）
+    - start / end: 报告期区间 (YYYY-MM-DD)
+
+    返回:
+    - 每个报告期各板块的持仓市值、权重（%）及相对上一报告期的变化，数据来自入库时物化的汇总表
+    """
+    from app.services import sector_rollup
+
+    try:
+        start_date = datetime.strptime(start, '%Y-%m-%d').date() if start else None
+        end_date = datetime.strptime(end, '%Y-%m-%d').date() if end else None
+        return await run_in_threadpool(sector_rollup.market_sector_trends, db, level, start_date, end_date)
+
+    except HTTPException:
+        raise
+    except ValueError as e:
+        logger.error(f"Validation error: {e}", exc_info=True)
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Unexpected error in get_market_sector_trends: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+
+@router.get("/sectors/{cik}")
+async def get_fund_sector_trends(
+    cik: str,
+    level: str = 'sector',
+    db: Session = Depends(get_db),
+    edgar_service=Depends(get_edgar_service),
+):
+    """
+    单个基金的板块/行业权重趋势
+
+    参数:
+    - cik: SEC CIK编号
+    - level: sector（板块）或 industry（行业）
+
+    返回:
+    - 各报告期（取最新提交的文件）的板块权重及季度变化；基金持仓需已入库
+    """
+    from app.services import sector_rollup
+
+    try:
+        cik = edgar_service.validate_cik(cik)
+        result = await run_in_threadpool(sector_rollup.fund_sector_trends, db, cik, level)
+        if not result['periods']:
+            raise HTTPException(status_code=404, detail=f"No ingested filings found for {cik}")
+        return result
+
+    except HTTPException:
+        raise
+    except ValueError as e:
+        logger.error(f"Validation error: {e}", exc_info=True)
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Unexpected error in get_fund_sector_trends: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+
+@router.get("/risk/{cik}")
+async def get_fund_risk(
+    cik: str,
+    year: Optional[int] = None,
+    benchmark: Optional[str] = None,
+    top: int = 20,
+    edgar_service=Depends(get_edgar_service),
+):
+    """
+    基金13F组合的风险分析
+
+    参数:
+    - cik: SEC CIK编号
+    - year: 持仓所属提交年份，默认当前年份
+    - benchmark: 基准证券标识，默认使用配置的RISK_BENCHMARK
+    - top: 返回风险贡献最大的证券数量
+
+    返回:
+    - 年化波动率、beta、跟踪误差、可定价持仓覆盖率和主要风险贡献证券
+    """
+    try:
+        year = year or datetime.now().year
+        return await run_in_threadpool(_fund_risk, edgar_service, cik, year, benchmark, top)
+
+    except HTTPException:
+        raise
+    except ValueError as e:
+        logger.error(f"Validation error: {e}", exc_info=True)
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Unexpected error in get_fund_risk: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+
+@router.post("/prices/reload")
+async def reload_prices(edgar_service=Depends(get_edgar_service)):
+    """
+    重新加载本地价格存储（价格数据追加新的交易日后调用）
+
+    返回:
+    - 证券数量、最后交易日和风险模型新合并的交易日数
+    """
+    try:
+        return await run_in_threadpool(reload_price_store, edgar_service)
+
+    except HTTPException:
+        raise
+    except ValueError as e:
+        logger.error(f"Validation error: {e}", exc_info=True)
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Unexpected error in reload_prices: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+
+@router.post("/styles/refresh")
+async def refresh_fund_styles(
+    period: str,
+    db: Session = Depends(get_db),
+):
+    """
+    用一个报告期的入库数据增量更新基金风格聚类
+
+    参数:
+    - period: 报告期 (YYYY-MM-DD)，每个季度数据入库后调用一次
+
+    返回:
+    - 参与聚类的基金数量及各聚类的规模
+    """
+    from app.services.style_clustering import style_clustering
+
+    try:
+        period_date = datetime.strptime(period, '%Y-%m-%d').date()
+        return await run_in_threadpool(style_clustering.refresh, db, period_date)
+
+    except HTTPException:
+        raise
+    except ValueError as e:
+        logger.error(f"Validation error: {e}", exc_info=True)
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Unexpected error in refresh_fund_styles: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+
+@router.get("/styles/clusters/{cluster}")
+async def get_style_cluster(
+    cluster: int,
+    period: Optional[str] = None,
+    db: Session = Depends(get_db),
+):
+    """
+    某个风格聚类的成员基金，按到聚类中心的距离排序
+
+    参数:
+    - cluster: 聚类编号
+    - period: 报告期 (YYYY-MM-DD)，默认最近一次聚类的报告期
+    """
+    from app.services.style_clustering import style_clustering
+
+    try:
+        period_date = datetime.strptime(period, '%Y-%m-%d').date() if period else None
+        return await run_in_threadpool(style_clustering.cluster_members, db, cluster, period_date)
+
+    except HTTPException:
+        raise
+    except ValueError as e:
+        logger.error(f"Validation error: {e}", exc_info=True)
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Unexpected error in get_style_cluster: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+
+@router.get("/styles/{cik}")
+async def get_fund_style(
+    cik: str,
+    period: Optional[str] = None,
+    neighbors: int = 10,
+    db: Session = Depends(get_db),
+    edgar_service=Depends(get_edgar_service),
+):
+    """
+    基金的风格聚类及最相似的基金
+
+    参数:
+    - cik: SEC CIK编号
+    - period: 报告期 (YYYY-MM-DD)，默认该基金最近一次聚类的报告期
+    - neighbors: 返回的相似基金数量
+
+    返回:
+    - 所属聚类、到中心的距离、聚类规模，以及按风格特征距离排序的相似基金
+    """
+    from app.services.style_clustering import style_clustering
+
+    try:
+        cik = edgar_service.validate_cik(cik)
+        period_date = datetime.strptime(period, '%Y-%m-%d').date() if period else None
+
+        def load():
+            membership = style_clustering.membership(db, cik, period_date)
+            if membership is None:
+                return None
+            period_of_report = datetime.strptime(membership['period'], '%Y-%m-%d').date()
+            membership['neighbors'] = style_clustering.neighbors(db, cik, period_of_report, k=neighbors)['neighbors']
+            return membership
+
+        result = await run_in_threadpool(load)
+        if result is None:
+            raise HTTPException(status_code=404, detail=f"No style assignment for CIK {cik}")
+        return result
+
+    except HTTPException:
+        raise
+    except ValueError as e:
+        logger.error(f"Validation error: {e}", exc_info=True)
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Unexpected error in get_fund_style: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+
+@router.get("/leaderboards/{board}")
+async def get_leaderboard(
+    board: str,
+    period: Optional[str] = None,
+    by: str = 'value',
+    limit: int = 20,
+    db: Session = Depends(get_db),
+):
+    """
+    全市场（已入库基金）持仓变化排行榜
+
+    参数:
+    - board: bought（净买入）、sold（净卖出）、new（新建仓基金数）、closed（清仓基金数）、crowded（持有基金数）
+    - period: 报告期 (YYYY-MM-DD)，默认最新报告期
+    - by: 买卖榜按 value（估算金额）或 shares（股数）排序
+    - limit: 返回数量
+
+    返回:
+    - 每只证券的持有基金数、新建仓/清仓数、买卖股数与金额；数据在入库时增量维护
+    """
+    from app.services.leaderboards import leaderboard_store
+
+    try:
+        period_date = datetime.strptime(period, '%Y-%m-%d').date() if period else None
+        result = await run_in_threadpool(leaderboard_store.top, db, board, period_date, by, limit)
+        if result is None:
+            raise HTTPException(status_code=404, detail="No leaderboard data has been ingested")
+        return result
+
+    except HTTPException:
+        raise
+    except ValueError as e:
+        logger.error(f"Validation error: {e}", exc_info=True)
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Unexpected error in get_leaderboard: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+
+@router.get("/similar/{cik}")
+async def get_similar_funds(
+    cik: str,
+    period: Optional[str] = None,
+    k: int = 10,
+    by: str = 'holdings',
+    edgar_service=Depends(get_edgar_service),
+):
+    """
+    持仓最相似的基金（MinHash/LSH近似检索）
+
+    参数:
+    - cik: SEC CIK编号
+    - period: 报告期 (YYYY-MM-DD)，默认该基金最近一个已索引的报告期
+    - k: 返回数量
+    - by: holdings（持有证券的Jaccard相似度）或 weights（组合权重的余弦相似度）
+
+    返回:
+    - 相似基金及两种相似度的估计值；索引在入库时增量更新，也可通过 POST /similar/rebuild 重建
+    """
+    from app.services.fund_similarity import fund_similarity
+
+    try:
+        cik = edgar_service.validate_cik(cik)
+        period_date = datetime.strptime(period, '%Y-%m-%d').date() if period else None
+        result = await run_in_threadpool(fund_similarity.similar, cik, period_date, k, by)
+        if result is None:
+            raise HTTPException(status_code=404, detail=f"CIK {cik} is not in the similarity index")
+        return result
+
+    except HTTPException:
+        raise
+    except ValueError as e:
+        logger.error(f"Validation error: {e}", exc_info=True)
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Unexpected error in get_similar_funds: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+
+@router.post("/similar/rebuild")
+async def rebuild_similarity_index(
+    period: str,
+    db: Session = Depends(get_db),
+):
+    """
+    用入库数据重建一个报告期的相似基金索引（每个基金取该期最新提交的文件）
+
+    参数:
+    - period: 报告期 (YYYY-MM-DD)
+    """
+    from app.services.fund_similarity import fund_similarity
+
+    try:
+        period_date = datetime.strptime(period, '%Y-%m-%d').date()
+        return await run_in_threadpool(fund_similarity.rebuild, db, period_date)
+
+    except HTTPException:
+        raise
+    except ValueError as e:
+        logger.error(f"Validation error: {e}", exc_info=True)
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Unexpected error in rebuild_similarity_index: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail="Internal server error")
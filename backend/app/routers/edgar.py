@@ -1,65 +1,52 @@
-from fastapi import APIRouter, HTTPException, Request
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
 from typing import List, Optional, Dict
 from pydantic import BaseModel, Field, validator
 from datetime import datetime
-from app.services.edgar_service import EDGARService
-import pandas as pd
-import logging
-import sys
+from app.api.deps import get_edgar_service, get_job_owner
+from app.services.filing_watcher import filing_watcher
+import asyncio
+import json
 import os
+from app.core.config import settings
+from app.db.session import SessionLocal, get_db
+from app.routers.jobs import submit_job
+from app.services.job_queue import job_queue
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+from app.core.http_cache import (
+    apply_cache_headers, compute_etag, freshness_headers, is_not_modified, not_modified, to_http_datetime,
+)
+import logging
 
-# 配置日志记录
-log_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), 'logs')
-os.makedirs(log_dir, exist_ok=True)
-
-# 创建日志记录器
+# 日志处理器在应用启动时由 app.core.logging_config 统一配置
 logger = logging.getLogger(__name__)
-logger.setLevel(logging.DEBUG)
-
-# 创建文件处理器
-file_handler = logging.FileHandler(os.path.join(log_dir, 'edgar_router.log'), encoding='utf-8')
-file_handler.setLevel(logging.DEBUG)
-
-# 创建控制台处理器
-console_handler = logging.StreamHandler(sys.stdout)
-console_handler.setLevel(logging.DEBUG)
-
-# 创建格式化器
-formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-file_handler.setFormatter(formatter)
-console_handler.setFormatter(formatter)
-
-# 添加处理器到日志记录器
-logger.addHandler(file_handler)
-logger.addHandler(console_handler)
-
-# 防止日志重复
-logger.propagate = False
 
 router = APIRouter()
-edgar_service = EDGARService()
 
 class HoldingData(BaseModel):
     rank: int = Field(..., description="持仓排名")
     nameOfIssuer: str = Field(..., description="发行人名称")
     titleOfClass: str = Field(..., description="证券类别")
     cusip: str = Field(..., description="CUSIP编号")
-    value: int = Field(..., description="持仓市值（美元）")
+    value: float = Field(..., description="持仓市值（美元，2023年前以千美元申报的文件已换算）")
     shares: int = Field(..., description="持仓数量")
     shareType: str = Field(..., description="股份类型")
     putCall: Optional[str] = Field(None, description="期权类型（如适用）")
     investmentDiscretion: str = Field(..., description="投资决策权")
     otherManager: Optional[str] = Field(None, description="其他管理人")
     filingDate: str = Field(..., description="申报日期")
-    averagePrice: float = Field(..., description="平均价格")
+    averagePrice: Optional[float] = Field(None, description="平均价格（美元/股）")
     percentOfPortfolio: float = Field(..., description="投资组合占比（%）")
     isAmended: bool = Field(False, description="是否为修正文件")
-
-    @validator('cusip')
-    def validate_cusip(cls, v):
-        if not v or len(v) != 9:
-            raise ValueError('CUSIP must be 9 characters')
-        return v
+    periodOfReport: Optional[str] = Field(None, description="报告期末日期")
+    marketPrice: Optional[float] = Field(None, description="重估日收盘价")
+    marketValue: Optional[float] = Field(None, description="重估日市值（美元）")
+    reportPrice: Optional[float] = Field(None, description="报告期末收盘价")
+    valueChange: Optional[float] = Field(None, description="自报告期以来的市值变化（美元）")
+    valueChangePct: Optional[float] = Field(None, description="自报告期以来的市值变化（%）")
+    markDate: Optional[str] = Field(None, description="重估日期")
+    validationFlags: int = Field(0, description="解析时的校验标记（按位组合，0表示无异常），见holdings_validation.FLAG_NAMES")
 
 class FilingData(BaseModel):
     date: str = Field(..., description="申报日期")
@@ -77,16 +64,20 @@ class FilingData(BaseModel):
         return v
 
 @router.get("/holdings/{cik}/{year}", response_model=List[HoldingData])
-async def get_fund_holdings(request: Request, cik: str, year: int):
+async def get_fund_holdings(request: Request, response: Response, cik: str, year: int, as_of: Optional[str] = None,
+                            edgar_service=Depends(get_edgar_service)):
     """
     获取指定基金和年份的持仓数据
     
     参数:
     - cik: SEC CIK编号
     - year: 年份 (1993-当前)
+    - as_of: 按市价重估的日期 (YYYY-MM-DD)，需配置本地价格存储
     
     返回:
     - 持仓数据列表，按市值降序排序
+    - 支持If-None-Match / If-Modified-Since条件请求，未变化时返回304
+    - 文件列表来自stale-while-revalidate缓存，Age和X-Cache-Status（HIT/STALE/MISS）标明数据新鲜度
     """
     try:
         logger.info(f"Processing holdings request for CIK {cik}, year {year}")
@@ -98,7 +89,27 @@ async def get_fund_holdings(request: Request, cik: str, year: int):
         if not year or year < 1993 or year > datetime.now().year:
             raise HTTPException(status_code=400, detail=f"Year must be between 1993 and {datetime.now().year}")
         
-        holdings_df = edgar_service.get_fund_holdings(cik, year)
+        cached = await run_in_threadpool(edgar_service.get_13f_filings_cached, cik, year)
+        filings = cached.value
+        if not filings:
+            logger.warning(f"No filings found for CIK {cik} in year {year}")
+            raise HTTPException(status_code=404, detail="No holdings data found")
+
+        # 在解析和序列化之前根据文件编号判断是否可以返回304
+        mark_date = None
+        if edgar_service.price_store is not None:
+            mark_date = as_of or str(edgar_service.price_store.dates[-1])
+        etag = compute_etag('holdings', cik, str(year), mark_date, [f['accessionNumber'] for f in filings])
+        last_modified = to_http_datetime(max([f['date'] for f in filings] + ([mark_date] if mark_date else [])))
+        if is_not_modified(request, etag, last_modified):
+            logger.info(f"Holdings for CIK {cik}, year {year} not modified")
+            not_modified_response = not_modified(etag, last_modified)
+            not_modified_response.headers.update(freshness_headers(cached.age, cached.status))
+            return not_modified_response
+        apply_cache_headers(response, etag, last_modified)
+        response.headers.update(freshness_headers(cached.age, cached.status))
+
+        holdings_df = await run_in_threadpool(edgar_service.get_fund_holdings, cik, year, filings)
         
         if holdings_df is None or holdings_df.empty:
             logger.warning(f"No holdings data found for CIK {cik} in year {year}")
@@ -110,12 +121,19 @@ async def get_fund_holdings(request: Request, cik: str, year: int):
         except Exception as e:
             logger.error(f"Error enriching holdings data: {e}", exc_info=True)
             raise HTTPException(status_code=500, detail="Error processing holdings data")
+
+        # 按市价重估
+        if edgar_service.price_store is not None:
+            holdings_df = edgar_service.mark_to_market(holdings_df, as_of=as_of)
+        elif as_of:
+            raise HTTPException(status_code=503, detail="Price history is not available")
         
-        # 转换为JSON格式
+        # 转换为JSON格式：持仓在解析时已批量校验，按响应模型的字段整列序列化，不再逐行校验
         try:
-            holdings_list = holdings_df.to_dict('records')
-            logger.info(f"Successfully processed {len(holdings_list)} holdings")
-            return holdings_list
+            columns = [c for c in HoldingData.model_fields if c in holdings_df.columns]
+            content = holdings_df[columns].to_json(orient='records', date_format='iso')
+            logger.info(f"Successfully processed {len(holdings_df)} holdings")
+            return Response(content=content, media_type='application/json', headers=dict(response.headers))
         except Exception as e:
             logger.error(f"Error converting holdings to JSON: {e}", exc_info=True)
             raise HTTPException(status_code=500, detail="Error formatting response data")
@@ -130,7 +148,8 @@ async def get_fund_holdings(request: Request, cik: str, year: int):
         raise HTTPException(status_code=500, detail="Internal server error")
 
 @router.get("/filings/{cik}/{year}", response_model=List[FilingData])
-async def get_filings(request: Request, cik: str, year: int):
+async def get_filings(request: Request, response: Response, cik: str, year: int,
+                      edgar_service=Depends(get_edgar_service)):
     """
     获取指定基金和年份的13F文件列表
     
@@ -140,6 +159,8 @@ async def get_filings(request: Request, cik: str, year: int):
     
     返回:
     - 13F文件列表，按日期降序排序
+    - 支持If-None-Match / If-Modified-Since条件请求，未变化时返回304
+    - 文件列表来自stale-while-revalidate缓存，Age和X-Cache-Status（HIT/STALE/MISS）标明数据新鲜度
     """
     try:
         logger.info(f"Processing filings request for CIK {cik}, year {year}")
@@ -151,11 +172,22 @@ async def get_filings(request: Request, cik: str, year: int):
         if not year or year < 1993 or year > datetime.now().year:
             raise HTTPException(status_code=400, detail=f"Year must be between 1993 and {datetime.now().year}")
         
-        filings = edgar_service.get_13f_filings(cik, year)
-        
+        cached = await run_in_threadpool(edgar_service.get_13f_filings_cached, cik, year)
+        filings = cached.value
+
         if not filings:
             logger.warning(f"No filings found for CIK {cik} in year {year}")
             raise HTTPException(status_code=404, detail="No filings found")
+
+        etag = compute_etag('filings', cik, str(year), [f['accessionNumber'] for f in filings])
+        last_modified = to_http_datetime(max(f['date'] for f in filings))
+        if is_not_modified(request, etag, last_modified):
+            logger.info(f"Filings for CIK {cik}, year {year} not modified")
+            not_modified_response = not_modified(etag, last_modified)
+            not_modified_response.headers.update(freshness_headers(cached.age, cached.status))
+            return not_modified_response
+        apply_cache_headers(response, etag, last_modified)
+        response.headers.update(freshness_headers(cached.age, cached.status))
             
         logger.info(f"Successfully retrieved {len(filings)} filings")
         return filings
@@ -168,3 +200,305 @@ async def get_filings(request: Request, cik: str, year: int):
     except Exception as e:
         logger.error(f"Unexpected error in get_filings: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail="Internal server error")
+
+@router.post("/ingest/{cik}")
+async def ingest_fund(cik: str, year: Optional[int] = None, background: bool = False, priority: int = 0,
+                      db: Session = Depends(get_db), edgar_service=Depends(get_edgar_service),
+                      owner: str = Depends(get_job_owner)):
+    """
+    将基金的13F文件及持仓写入数据库
+
+    参数:
+    - cik: SEC CIK编号
+    - year: 提交年份，为空时入库全部13F文件
+    - background: 为True时作为后台任务执行，立即返回202及任务信息（见 /api/v1/jobs）
+    - priority: 后台任务优先级
+
+    返回:
+    - 入库的文件编号和持仓条数；入库时同步物化板块汇总等派生表
+    """
+    from app.services.ingest_service import ingest_service
+
+    try:
+        if year is not None and (year < 1993 or year > datetime.now().year):
+            raise HTTPException(status_code=400, detail=f"Year must be between 1993 and {datetime.now().year}")
+        if background:
+            return await submit_job('ingest', {'cik': cik, 'year': year}, owner, priority)
+        return await run_in_threadpool(ingest_service.ingest_fund, edgar_service, db, cik, year)
+
+    except HTTPException:
+        raise
+    except ValueError as e:
+        logger.error(f"Validation error: {e}", exc_info=True)
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Unexpected error in ingest_fund: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+@router.get("/as-of/holdings")
+async def get_holdings_as_of(
+    ciks: str = Query(..., description="逗号分隔的CIK列表"),
+    date: str = Query(..., description="时点 (YYYY-MM-DD)"),
+    period: Optional[str] = None,
+    db: Session = Depends(get_db),
+    edgar_service=Depends(get_edgar_service),
+):
+    """
+    基金在指定日期已公开的持仓（无前视偏差）
+
+    参数:
+    - ciks: 一个或多个CIK，逗号分隔
+    - date: 时点，只使用当日及之前提交的文件；修正文件自其提交日起生效
+    - period: 报告期 (YYYY-MM-DD)，为空时取当日已公开的最新报告期
+
+    返回:
+    - 每个基金当日有效的文件（含可见区间 filedAt ~ supersededAt）及其持仓；基金持仓需已入库
+    """
+    from app.crud.holdings import HOLDING_COLUMNS
+    from app.services.point_in_time import point_in_time
+
+    try:
+        as_of = datetime.strptime(date, '%Y-%m-%d').date()
+        period_date = datetime.strptime(period, '%Y-%m-%d').date() if period else None
+        cik_list = [edgar_service.validate_cik(c) for c in ciks.split(',') if c.strip()]
+        if not cik_list:
+            raise HTTPException(status_code=400, detail="At least one CIK is required")
+
+        resolved = await run_in_threadpool(point_in_time.holdings_as_of, db, cik_list, as_of, period_date)
+        columns = {dst: src for src, dst in HOLDING_COLUMNS.items()}
+        funds = []
+        for cik in cik_list:
+            entry = resolved[cik]
+            holdings = None
+            if entry['holdings'] is not None:
+                frame = entry['holdings'][list(columns)].rename(columns=columns)
+                holdings = json.loads(frame.to_json(orient='records'))
+            funds.append({'cik': cik, 'filing': entry['filing'], 'holdings': holdings})
+        return {'asOf': str(as_of), 'funds': funds}
+
+    except HTTPException:
+        raise
+    except ValueError as e:
+        logger.error(f"Validation error: {e}", exc_info=True)
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Unexpected error in get_holdings_as_of: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+@router.get("/as-of/intervals/{cik}")
+async def get_filing_intervals(cik: str, db: Session = Depends(get_db), edgar_service=Depends(get_edgar_service)):
+    """
+    基金已入库文件的可见区间
+
+    返回:
+    - 每个文件的报告期、提交日期及被重述文件取代的日期（supersededAt为空表示仍然有效；新增持仓修正文件不取代原文件）
+    """
+    from app.services.point_in_time import point_in_time
+
+    try:
+        cik = edgar_service.validate_cik(cik)
+        intervals = await run_in_threadpool(point_in_time.intervals, db, cik)
+        if not intervals:
+            raise HTTPException(status_code=404, detail=f"No ingested filings found for {cik}")
+        return {'cik': cik, 'filings': intervals}
+
+    except HTTPException:
+        raise
+    except ValueError as e:
+        logger.error(f"Validation error: {e}", exc_info=True)
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Unexpected error in get_filing_intervals: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+@router.get("/export/holdings")
+async def export_holdings(
+    period: Optional[str] = None,
+    year: Optional[int] = None,
+    ciks: Optional[List[str]] = Query(None),
+    source: str = 'db',
+    format: str = 'ndjson',
+    compression: str = 'none',
+    edgar_service=Depends(get_edgar_service),
+):
+    """
+    流式导出持仓数据
+
+    参数:
+    - source: db（数据库中已入库的持仓，按报告期导出）或 edgar（实时解析指定基金）
+    - period: 报告期末日期 (YYYY-MM-DD)，source=db时必填
+    - year / ciks: source=edgar时必填，可重复传入ciks
+    - format: ndjson 或 csv
+    - compression: none、gzip 或 zstd
+
+    返回:
+    - 逐个基金分块输出的NDJSON/CSV流，内存占用与导出规模无关
+    """
+    # 导出依赖pandas，首次请求时才加载
+    from app.services import export_service
+
+    try:
+        if source == 'db':
+            if not period:
+                raise HTTPException(status_code=400, detail="period is required for source=db")
+            report_period = datetime.strptime(period, '%Y-%m-%d').date()
+            cik_list = [edgar_service.validate_cik(c) for c in ciks] if ciks else None
+            frames = export_service.iter_stored_holdings(report_period, cik_list)
+            stem = f"holdings_{period}"
+        elif source == 'edgar':
+            if not ciks or not year:
+                raise HTTPException(status_code=400, detail="ciks and year are required for source=edgar")
+            frames = export_service.iter_parsed_holdings(
+                lambda cik: edgar_service.get_fund_holdings(cik, year), ciks
+            )
+            stem = f"holdings_{year}"
+        else:
+            raise HTTPException(status_code=400, detail="source must be 'db' or 'edgar'")
+
+        stream = export_service.export_stream(frames, fmt=format, compression=compression)
+        logger.info(f"Starting holdings export: source={source}, format={format}, compression={compression}")
+        return StreamingResponse(
+            stream,
+            media_type=export_service.export_media_type(format, compression),
+            headers={
+                'Content-Disposition': f'attachment; filename="{export_service.export_filename(stem, format, compression)}"'
+            },
+        )
+
+    except HTTPException:
+        raise
+    except ValueError as e:
+        logger.error(f"Validation error: {e}", exc_info=True)
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Unexpected error in export_holdings: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+@router.get("/stream/filings")
+async def stream_filings(request: Request, ciks: List[str] = Query(...), include_delta: bool = False,
+                         edgar_service=Depends(get_edgar_service)):
+    """
+    通过Server-Sent Events推送新的13F文件
+
+    参数:
+    - ciks: 关注的CIK，可重复传入
+    - include_delta: 是否附带相对上一报告期的增减仓摘要
+
+    返回:
+    - text/event-stream，每个新文件一条 `event: filing` 事件；定期发送注释行保持连接
+    """
+    try:
+        cik_list = sorted({edgar_service.validate_cik(c) for c in ciks})
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    subscription = filing_watcher.subscribe(cik_list, include_delta=include_delta)
+    logger.info(f"SSE client subscribed to {cik_list}")
+
+    async def event_stream():
+        try:
+            yield f"event: subscribed\ndata: {json.dumps({'ciks': cik_list})}\n\n"
+            while True:
+                try:
+                    event = await asyncio.wait_for(subscription.queue.get(), timeout=settings.SSE_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        break
+                    yield ": keep-alive\n\n"
+                    continue
+                event_id = event['filing']['accessionNumber']
+                yield f"id: {event_id}\nevent: {event['type']}\ndata: {json.dumps(event, default=str)}\n\n"
+        finally:
+            filing_watcher.unsubscribe(subscription)
+            logger.info(f"SSE client unsubscribed from {cik_list}")
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'},
+    )
+
+
+@router.get("/upstream/status")
+async def get_upstream_status():
+    """
+    SEC请求限流器状态
+
+    返回:
+    - 熔断状态（closed/open/half_open）、当前请求速率与并发上限、进行中的请求数、
+      建议重试等待秒数、平均延迟以及请求/成功/429/失败/拒绝/熔断次数累计
+    """
+    from app.core.rate_limiter import sec_limiter
+
+    return sec_limiter.metrics()
+
+
+def _validate_history_job(params: Dict) -> Dict:
+    edgar_service = get_edgar_service()
+    start_year = edgar_service.validate_year(params.get('start_year'))
+    end_year = edgar_service.validate_year(params.get('end_year') or datetime.now().year)
+    if start_year > end_year:
+        raise ValueError("start_year must not be after end_year")
+    return {'cik': edgar_service.validate_cik(params.get('cik', '')), 'start_year': start_year, 'end_year': end_year}
+
+
+def run_holdings_history_job(ctx) -> List[Dict]:
+    """
+    后台任务：多年持仓历史
+
+    每个报告期的持仓写入任务目录后才报告进度，进程重启后已完成的报告期直接从文件读取。
+    """
+    edgar_service = get_edgar_service()
+    cik, params = ctx.params['cik'], ctx.params
+    filings = edgar_service.latest_filings_by_period(cik, params['start_year'], params['end_year'])
+    for i, filing in enumerate(filings):
+        part = ctx.work_dir / f"{filing['accessionNumber']}.json"
+        if not part.exists():
+            holdings_df = edgar_service.load_filing_holdings(cik, filing)
+            tmp = part.with_suffix('.tmp')
+            holdings_df.to_json(tmp, orient='records')
+            os.replace(tmp, part)
+        ctx.progress((i + 1) / len(filings), f"Loaded {filing.get('reportDate') or filing['date']}",
+                     force=i + 1 == len(filings))
+
+    return [{
+        'periodOfReport': filing.get('reportDate'),
+        'filingDate': filing['date'],
+        'accessionNumber': filing['accessionNumber'],
+        'isAmended': filing.get('isAmended', False),
+        'holdings': json.loads((ctx.work_dir / f"{filing['accessionNumber']}.json").read_text()),
+    } for filing in filings]
+
+
+def _validate_ingest_job(params: Dict) -> Dict:
+    edgar_service = get_edgar_service()
+    year = params.get('year')
+    return {'cik': edgar_service.validate_cik(params.get('cik', '')),
+            'year': edgar_service.validate_year(year) if year is not None else None}
+
+
+def run_ingest_job(ctx) -> Dict:
+    """后台任务：基金入库；每个文件入库后保存断点，重启后跳过已入库的文件"""
+    from app.services.ingest_service import ingest_service
+
+    state = ctx.checkpoint or {'filings': [], 'holdings': 0}
+
+    def progress(done: int, total: int, accession_number: str, count: int) -> None:
+        if accession_number not in state['filings']:
+            state['filings'].append(accession_number)
+            state['holdings'] += count
+            ctx.save_checkpoint(state)
+        ctx.progress(done / total, f"Ingested {done} of {total} filings", force=done == total)
+
+    db = SessionLocal()
+    try:
+        result = ingest_service.ingest_fund(get_edgar_service(), db, ctx.params['cik'], ctx.params['year'],
+                                            progress=progress, skip=list(state['filings']))
+    finally:
+        db.close()
+    result['holdings'] = state['holdings']
+    return result
+
+
+job_queue.register('holdings_history', run_holdings_history_job, validate=_validate_history_job)
+job_queue.register('ingest', run_ingest_job, validate=_validate_ingest_job)
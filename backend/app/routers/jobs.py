@@ -0,0 +1,124 @@
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import FileResponse, JSONResponse
+from pydantic import BaseModel, Field
+from starlette.concurrency import run_in_threadpool
+from typing import Dict, Optional
+from app.api.deps import get_job_owner
+from app.core.config import settings
+from app.services.job_queue import FINISHED, QueueFullError, SUCCEEDED, job_queue
+import logging
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+
+class JobRequest(BaseModel):
+    kind: str = Field(..., description="任务类型，如 holdings_history、ingest、backtest")
+    params: Dict = Field(default_factory=dict, description="任务参数，与对应同步接口的参数相同")
+    priority: int = Field(0, description="优先级，数值越大越先执行")
+
+
+def job_url(job_id: str) -> str:
+    return f"{settings.API_V1_STR}/jobs/{job_id}"
+
+
+async def submit_job(kind: str, params: Dict, owner: str, priority: int = 0) -> JSONResponse:
+    """提交后台任务并返回202，Location指向任务状态"""
+    try:
+        job = await run_in_threadpool(job_queue.submit, kind, params, owner, priority)
+    except QueueFullError as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    job['statusUrl'] = job_url(job['id'])
+    job['resultUrl'] = job_url(job['id']) + '/result'
+    return JSONResponse(status_code=202, content=job, headers={'Location': job['statusUrl']})
+
+
+@router.post("", status_code=202)
+async def create_job(request: JobRequest, owner: str = Depends(get_job_owner)):
+    """
+    提交后台任务
+
+    返回202及任务信息，通过 Location（GET /jobs/{job_id}）轮询进度，完成后从 /jobs/{job_id}/result 获取结果。
+    同一用户同时执行的任务数和排队数有上限，超出排队上限时返回429。
+    """
+    try:
+        return await submit_job(request.kind, request.params, owner, request.priority)
+
+    except HTTPException:
+        raise
+    except ValueError as e:
+        logger.error(f"Validation error: {e}", exc_info=True)
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Unexpected error in create_job: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+
+@router.get("")
+async def list_jobs(status: Optional[str] = None, limit: int = 50, owner: str = Depends(get_job_owner)):
+    """当前用户最近提交的任务"""
+    try:
+        return {'jobs': await run_in_threadpool(job_queue.list, owner, status, min(max(limit, 1), 200))}
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Unexpected error in list_jobs: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+
+@router.get("/{job_id}")
+async def get_job(job_id: str, owner: str = Depends(get_job_owner)):
+    """任务状态和进度（progress为0-1）"""
+    try:
+        job = await run_in_threadpool(job_queue.get, job_id, owner)
+        if job is None:
+            raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+        if job['status'] == SUCCEEDED:
+            job['resultUrl'] = job_url(job_id) + '/result'
+        return job
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Unexpected error in get_job: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+
+@router.get("/{job_id}/result")
+async def get_job_result(job_id: str, owner: str = Depends(get_job_owner)):
+    """已完成任务的结果（JSON）；任务未完成时返回409，失败或取消时返回409及错误信息"""
+    try:
+        job = await run_in_threadpool(job_queue.get, job_id, owner)
+        if job is None:
+            raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+        if job['status'] != SUCCEEDED:
+            detail = job['error'] if job['status'] in FINISHED and job['error'] else f"Job is {job['status']}"
+            raise HTTPException(status_code=409, detail=detail)
+        path = await run_in_threadpool(job_queue.result_file, job_id, owner)
+        if path is None:
+            raise HTTPException(status_code=410, detail=f"Result of job {job_id} has expired")
+        return FileResponse(path, media_type='application/json')
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Unexpected error in get_job_result: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+
+@router.delete("/{job_id}")
+async def cancel_job(job_id: str, owner: str = Depends(get_job_owner)):
+    """取消任务：排队中的任务立即取消，执行中的任务在下次报告进度时停止"""
+    try:
+        job = await run_in_threadpool(job_queue.cancel, job_id, owner)
+        if job is None:
+            raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+        return job
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Unexpected error in cancel_job: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail="Internal server error")
@@ -0,0 +1,209 @@
+from fastapi import APIRouter, Depends, HTTPException
+from pydantic import BaseModel, Field
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+from typing import List, Optional
+from app.core.security import get_current_user
+from app.crud import watchlists as watchlist_crud
+from app.db.session import get_db
+from app.schemas.watchlists import (
+    Alert, AlertRule, AlertRuleCreate, Watchlist, WatchlistCreate, WatchlistItem, WatchlistItemCreate,
+)
+import logging
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+
+class MarkRead(BaseModel):
+    ids: Optional[List[int]] = Field(None, description="要标记为已读的提醒，为空时标记全部")
+
+
+@router.get("/watchlists", response_model=List[Watchlist])
+async def list_watchlists(user=Depends(get_current_user), db: Session = Depends(get_db)):
+    """当前用户的关注列表"""
+    try:
+        return await run_in_threadpool(watchlist_crud.list_watchlists, db, user.id)
+
+    except HTTPException:
+        raise
+    except ValueError as e:
+        logger.error(f"Validation error: {e}", exc_info=True)
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Unexpected error in list_watchlists: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+
+@router.post("/watchlists", response_model=Watchlist, status_code=201)
+async def create_watchlist(request: WatchlistCreate, user=Depends(get_current_user), db: Session = Depends(get_db)):
+    """新建关注列表，可同时加入基金（CIK）和证券（CUSIP）"""
+    try:
+        return await run_in_threadpool(
+            watchlist_crud.create_watchlist, db, user.id, request.name, request.funds, request.securities
+        )
+
+    except HTTPException:
+        raise
+    except ValueError as e:
+        logger.error(f"Validation error: {e}", exc_info=True)
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Unexpected error in create_watchlist: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+
+@router.delete("/watchlists/{watchlist_id}", status_code=204)
+async def delete_watchlist(watchlist_id: int, user=Depends(get_current_user), db: Session = Depends(get_db)):
+    """删除关注列表及限定于该列表的提醒规则"""
+    try:
+        if not await run_in_threadpool(watchlist_crud.delete_watchlist, db, user.id, watchlist_id):
+            raise HTTPException(status_code=404, detail=f"Watchlist {watchlist_id} not found")
+
+    except HTTPException:
+        raise
+    except ValueError as e:
+        logger.error(f"Validation error: {e}", exc_info=True)
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Unexpected error in delete_watchlist: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+
+@router.post("/watchlists/{watchlist_id}/items", response_model=WatchlistItem, status_code=201)
+async def add_watchlist_item(watchlist_id: int, request: WatchlistItemCreate, user=Depends(get_current_user),
+                             db: Session = Depends(get_db)):
+    """向关注列表添加基金或证券"""
+    try:
+        item = await run_in_threadpool(
+            watchlist_crud.add_item, db, user.id, watchlist_id, request.kind, request.value, request.label
+        )
+        if item is None:
+            raise HTTPException(status_code=404, detail=f"Watchlist {watchlist_id} not found")
+        return item
+
+    except HTTPException:
+        raise
+    except ValueError as e:
+        logger.error(f"Validation error: {e}", exc_info=True)
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Unexpected error in add_watchlist_item: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+
+@router.delete("/watchlists/{watchlist_id}/items/{item_id}", status_code=204)
+async def remove_watchlist_item(watchlist_id: int, item_id: int, user=Depends(get_current_user),
+                                db: Session = Depends(get_db)):
+    """从关注列表移除一个条目"""
+    try:
+        if not await run_in_threadpool(watchlist_crud.remove_item, db, user.id, watchlist_id, item_id):
+            raise HTTPException(status_code=404, detail=f"Item {item_id} not found")
+
+    except HTTPException:
+        raise
+    except ValueError as e:
+        logger.error(f"Validation error: {e}", exc_info=True)
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Unexpected error in remove_watchlist_item: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+
+@router.get("/alerts/rules", response_model=List[AlertRule])
+async def list_alert_rules(user=Depends(get_current_user), db: Session = Depends(get_db)):
+    """当前用户的提醒规则"""
+    try:
+        return await run_in_threadpool(watchlist_crud.list_rules, db, user.id)
+
+    except HTTPException:
+        raise
+    except ValueError as e:
+        logger.error(f"Validation error: {e}", exc_info=True)
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Unexpected error in list_alert_rules: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+
+@router.post("/alerts/rules", response_model=AlertRule, status_code=201)
+async def create_alert_rule(request: AlertRuleCreate, user=Depends(get_current_user), db: Session = Depends(get_db)):
+    """
+    新建提醒规则，在新文件入库时对全部用户的规则批量求值
+
+    示例:
+    - 基金X对证券Y的持仓变化超过20%：{"kind": "position_change", "cik": X, "cusip": Y, "threshold_pct": 20}
+    - 证券Y出现新的持有基金：{"kind": "new_holder", "cusip": Y}
+    - 关注列表中的基金或证券有清仓：{"kind": "closed_position", "watchlist_id": 1}
+    """
+    try:
+        return await run_in_threadpool(
+            watchlist_crud.create_rule, db, user.id, request.kind, request.cik, request.cusip,
+            request.watchlist_id, request.threshold_pct,
+        )
+
+    except HTTPException:
+        raise
+    except ValueError as e:
+        logger.error(f"Validation error: {e}", exc_info=True)
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Unexpected error in create_alert_rule: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+
+@router.delete("/alerts/rules/{rule_id}", status_code=204)
+async def delete_alert_rule(rule_id: int, user=Depends(get_current_user), db: Session = Depends(get_db)):
+    """删除提醒规则（已触发的提醒一并删除）"""
+    try:
+        if not await run_in_threadpool(watchlist_crud.delete_rule, db, user.id, rule_id):
+            raise HTTPException(status_code=404, detail=f"Rule {rule_id} not found")
+
+    except HTTPException:
+        raise
+    except ValueError as e:
+        logger.error(f"Validation error: {e}", exc_info=True)
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Unexpected error in delete_alert_rule: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+
+@router.get("/alerts", response_model=List[Alert])
+async def list_alerts(unread: bool = False, limit: int = 100, user=Depends(get_current_user),
+                      db: Session = Depends(get_db)):
+    """
+    触发的提醒，按时间降序
+
+    参数:
+    - unread: 只返回未读提醒
+    - limit: 返回数量（最多500）
+    """
+    try:
+        return await run_in_threadpool(watchlist_crud.list_alerts, db, user.id, unread, min(max(limit, 1), 500))
+
+    except HTTPException:
+        raise
+    except ValueError as e:
+        logger.error(f"Validation error: {e}", exc_info=True)
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Unexpected error in list_alerts: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+
+@router.post("/alerts/read")
+async def mark_alerts_read(request: MarkRead, user=Depends(get_current_user), db: Session = Depends(get_db)):
+    """把提醒标记为已读"""
+    try:
+        return {'updated': await run_in_threadpool(watchlist_crud.mark_alerts_read, db, user.id, request.ids)}
+
+    except HTTPException:
+        raise
+    except ValueError as e:
+        logger.error(f"Validation error: {e}", exc_info=True)
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Unexpected error in mark_alerts_read: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail="Internal server error")
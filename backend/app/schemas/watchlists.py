@@ -0,0 +1,67 @@
+from datetime import date, datetime
+from typing import List, Optional
+
+from pydantic import BaseModel, Field
+
+
+class WatchlistItemCreate(BaseModel):
+    kind: str = Field(..., description="fund（基金CIK）或 security（证券CUSIP）")
+    value: str = Field(..., description="CIK或CUSIP")
+    label: Optional[str] = Field(None, description="备注名称")
+
+
+class WatchlistItem(WatchlistItemCreate):
+    id: int
+    created_at: datetime
+
+    class Config:
+        from_attributes = True
+
+
+class WatchlistCreate(BaseModel):
+    name: str = Field(..., min_length=1, max_length=100)
+    funds: List[str] = Field(default_factory=list, description="基金CIK列表")
+    securities: List[str] = Field(default_factory=list, description="证券CUSIP列表")
+
+
+class Watchlist(BaseModel):
+    id: int
+    name: str
+    created_at: datetime
+    items: List[WatchlistItem] = []
+
+
+class AlertRuleCreate(BaseModel):
+    kind: str = Field(..., description="position_change（持仓变化超过阈值）、new_holder（新建仓）或 closed_position（清仓）")
+    cik: Optional[str] = Field(None, description="限定基金")
+    cusip: Optional[str] = Field(None, description="限定证券")
+    watchlist_id: Optional[int] = Field(None, description="限定为关注列表中的基金和证券")
+    threshold_pct: Optional[float] = Field(None, gt=0, description="position_change的股数变化幅度阈值（%）")
+
+
+class AlertRule(AlertRuleCreate):
+    id: int
+    is_active: bool
+    created_at: datetime
+
+    class Config:
+        from_attributes = True
+
+
+class Alert(BaseModel):
+    id: int
+    rule_id: int
+    kind: str
+    cik: str
+    cusip: str
+    name_of_issuer: Optional[str] = None
+    accession_number: str
+    period_of_report: date
+    shares_before: float
+    shares_after: float
+    change_pct: Optional[float] = None
+    created_at: datetime
+    read_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
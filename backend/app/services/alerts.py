@@ -0,0 +1,148 @@
+import logging
+from datetime import date, datetime
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import and_, func, or_, select
+from sqlalchemy.orm import Session
+
+from app.crud import holdings as holdings_crud
+from app.models.holdings import Filing
+from app.models.leaderboards import FundPositionChange
+from app.models.watchlists import Alert, AlertRule, WatchlistItem
+
+logger = logging.getLogger(__name__)
+
+CONDITION_COLUMNS = ['rule_id', 'user_id', 'kind', 'cusip', 'threshold_pct']
+
+
+def rule_conditions(db: Session, cik: str) -> pd.DataFrame:
+    """
+    可能被该基金的文件触发的全部有效规则，展开为 (规则, cusip) 条件，cusip为空表示任意证券
+
+    限定关注列表的规则：列表中的基金等同于限定cik，证券等同于限定cusip，两者任一命中即可。
+    """
+    direct = db.execute(
+        select(AlertRule.id, AlertRule.user_id, AlertRule.kind, AlertRule.cusip, AlertRule.threshold_pct)
+        .where(AlertRule.is_active.is_(True), AlertRule.watchlist_id.is_(None),
+               or_(AlertRule.cik.is_(None), AlertRule.cik == cik))
+    ).all()
+    scoped = pd.DataFrame(db.execute(
+        select(AlertRule.id, AlertRule.user_id, AlertRule.kind, AlertRule.cusip, AlertRule.threshold_pct,
+               WatchlistItem.kind, WatchlistItem.value)
+        .join(WatchlistItem, WatchlistItem.watchlist_id == AlertRule.watchlist_id)
+        .where(AlertRule.is_active.is_(True), or_(AlertRule.cik.is_(None), AlertRule.cik == cik),
+               or_(and_(WatchlistItem.kind == 'fund', WatchlistItem.value == cik), WatchlistItem.kind == 'security'))
+    ).all(), columns=CONDITION_COLUMNS + ['item_kind', 'item_value'])
+
+    securities = scoped['item_kind'] == 'security'
+    # 规则本身限定了证券时，列表中的其他证券不适用
+    scoped = scoped[~securities | scoped['cusip'].isna() | (scoped['cusip'] == scoped['item_value'])]
+    scoped = scoped.assign(cusip=np.where(scoped['item_kind'] == 'security', scoped['item_value'], scoped['cusip']))
+    rows = [tuple(row) for row in direct] + list(scoped[CONDITION_COLUMNS].itertuples(index=False, name=None))
+    conditions = pd.DataFrame(rows, columns=CONDITION_COLUMNS)
+    return conditions.drop_duplicates(['rule_id', 'cusip'])
+
+
+def filing_delta(db: Session, cik: str, period: date, accession_number: str) -> pd.DataFrame:
+    """文件相对上一报告期的逐证券变化（由排行榜钩子写入fund_position_changes）；没有可比较的上一期时为空"""
+    rows = db.execute(
+        select(FundPositionChange.cusip, FundPositionChange.name_of_issuer, FundPositionChange.shares,
+               FundPositionChange.shares_change, FundPositionChange.is_new, FundPositionChange.is_closed)
+        .where(FundPositionChange.period_of_report == period, FundPositionChange.cik == cik,
+               FundPositionChange.accession_number == accession_number,
+               FundPositionChange.has_baseline.is_(True))
+    ).all()
+    frame = pd.DataFrame(rows, columns=['cusip', 'name_of_issuer', 'shares', 'shares_change', 'is_new', 'is_closed'])
+    frame['shares_before'] = frame['shares'].astype(np.float64) - frame['shares_change'].astype(np.float64)
+    return frame
+
+
+def evaluate_rules(conditions: pd.DataFrame, delta: pd.DataFrame) -> pd.DataFrame:
+    """
+    一次性对全部条件和文件的持仓变化求值，返回触发的 (rule_id, user_id, kind, cusip, ...) 行
+
+    - position_change：股数变化幅度 >= 阈值，新建仓和清仓都算
+    - new_holder：新建仓
+    - closed_position：清仓
+    """
+    if conditions.empty or delta.empty:
+        return pd.DataFrame(columns=CONDITION_COLUMNS + list(delta.columns) + ['change_pct'])
+    any_security = conditions['cusip'].isna()
+    candidates = pd.concat([
+        conditions[any_security].drop(columns='cusip').merge(delta, how='cross'),
+        conditions[~any_security].merge(delta, on='cusip'),
+    ], ignore_index=True)
+
+    before = candidates['shares_before'].to_numpy(dtype=np.float64)
+    change = candidates['shares_change'].to_numpy(dtype=np.float64)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        change_pct = np.where(before > 0, change / before * 100, np.nan)
+    is_new = candidates['is_new'].astype(bool).to_numpy()
+    is_closed = candidates['is_closed'].astype(bool).to_numpy()
+    kind = candidates['kind'].to_numpy()
+    threshold = candidates['threshold_pct'].to_numpy(dtype=np.float64)
+    with np.errstate(invalid='ignore'):
+        moved = is_new | is_closed | (np.abs(change_pct) >= threshold)
+    hit = (
+        ((kind == 'position_change') & moved)
+        | ((kind == 'new_holder') & is_new)
+        | ((kind == 'closed_position') & is_closed)
+    )
+    triggered = candidates[hit].copy()
+    triggered['change_pct'] = change_pct[hit]
+    # 关注列表同时含有该基金和证券时，同一规则会从任意证券和指定证券两个条件各命中一次
+    return triggered.drop_duplicates(['rule_id', 'cusip'])
+
+
+def evaluate_alerts(db: Session, context) -> None:
+    """
+    入库钩子：用文件的持仓变化对所有用户的提醒规则批量求值并保存触发的提醒
+
+    依赖排行榜钩子在同一事务中写入的持仓变化，需注册在其后。只有基金最新报告期的文件触发提醒，
+    补录历史报告期不产生提醒；同一文件重复入库不会重复提醒。
+    """
+    period = context.period_of_report
+    if period is None:
+        return
+    latest_period = db.execute(select(func.max(Filing.period_of_report)).where(Filing.cik == context.cik)).scalar()
+    if latest_period is not None and latest_period > period:
+        return
+
+    conditions = rule_conditions(db, context.cik)
+    if conditions.empty:
+        return
+    triggered = evaluate_rules(conditions, filing_delta(db, context.cik, period, context.accession_number))
+    if triggered.empty:
+        return
+
+    existing = set(db.execute(
+        select(Alert.rule_id, Alert.cusip).where(Alert.accession_number == context.accession_number)
+    ).all())
+    if existing:
+        keys = list(zip(triggered['rule_id'], triggered['cusip']))
+        triggered = triggered[[key not in existing for key in keys]]
+        if triggered.empty:
+            return
+
+    now = datetime.utcnow()
+    records = pd.DataFrame({
+        'user_id': triggered['user_id'].astype(int).to_numpy(),
+        'rule_id': triggered['rule_id'].astype(int).to_numpy(),
+        'kind': triggered['kind'].to_numpy(),
+        'cik': context.cik,
+        'cusip': triggered['cusip'].to_numpy(),
+        'name_of_issuer': triggered['name_of_issuer'].to_numpy(),
+        'accession_number': context.accession_number,
+        'period_of_report': period,
+        'shares_before': triggered['shares_before'].astype(np.float64).to_numpy(),
+        'shares_after': triggered['shares'].astype(np.float64).to_numpy(),
+        'change_pct': triggered['change_pct'].to_numpy(),
+        'created_at': now,
+    }).replace({np.nan: None})
+    stmt = holdings_crud._dialect_insert(db, Alert.__table__).on_conflict_do_nothing(
+        index_elements=['rule_id', 'accession_number', 'cusip']
+    )
+    db.execute(stmt, records.to_dict('records'))
+    logger.info(f"Filing {context.accession_number} triggered {len(records)} alerts "
+                f"for {records['user_id'].nunique()} users")
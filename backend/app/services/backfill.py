@@ -0,0 +1,374 @@
+import argparse
+import json
+import logging
+import re
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import date
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from fastapi import HTTPException
+from sqlalchemy import select
+
+from app.core.config import settings
+from app.models.holdings import Filing
+from app.services.filer_directory import THIRTEEN_F_FORMS
+
+logger = logging.getLogger(__name__)
+
+DONE = 'done'
+SKIPPED = 'skipped'
+FAILED = 'failed'
+
+# 完整提交文件（.txt）的SGML头和文档块
+_PERIOD_OF_REPORT = re.compile(r'CONFORMED PERIOD OF REPORT:\s*(\d{8})')
+_DOCUMENT = re.compile(r'<DOCUMENT>(.*?)</DOCUMENT>', re.S | re.I)
+_DOCUMENT_TYPE = re.compile(r'<TYPE>([^\r\n<]+)', re.I)
+_XML_BLOCK = re.compile(r'<XML>\s*(.*?)\s*</XML>', re.S | re.I)
+# 修正文件主文档（封面页）中的修正类型
+_AMENDMENT_TYPE = re.compile(r'<(?:\w+:)?amendmentType>\s*([^<]+?)\s*<', re.I)
+
+# 熔断（503）时等待后重试的次数
+_UNAVAILABLE_RETRIES = 5
+
+
+def backfill_quarters(start_year: int, end_year: int, today: Optional[date] = None) -> List[Tuple[int, int]]:
+    """年份区间内已经开始的季度 (年, 季度)"""
+    today = today or date.today()
+    current = (today.year, (today.month - 1) // 3 + 1)
+    return [(year, quarter) for year in range(start_year, end_year + 1) for quarter in range(1, 5)
+            if (year, quarter) <= current]
+
+
+def parse_submission(text: str) -> Dict:
+    """
+    从EDGAR完整提交文件中取出报告期、修正类型和信息表XML
+
+    一个 .txt 同时包含SGML头、主文档和信息表，每个文件只需一次请求。
+    没有XML信息表（2013年第二季度之前的文本格式或未附信息表的文件）时infoTable为None，
+    不是修正文件时amendmentType为None。
+    """
+    match = _PERIOD_OF_REPORT.search(text[:20000])
+    period = None
+    if match:
+        raw = match.group(1)
+        period = f"{raw[:4]}-{raw[4:6]}-{raw[6:]}"
+
+    amendment = _AMENDMENT_TYPE.search(text)
+    info_table = None
+    for document in _DOCUMENT.finditer(text):
+        body = document.group(1)
+        doc_type = _DOCUMENT_TYPE.search(body)
+        xml = _XML_BLOCK.search(body)
+        if xml is None:
+            continue
+        if (doc_type and doc_type.group(1).strip().upper() == 'INFORMATION TABLE') \
+                or 'informationTable' in xml.group(1)[:2000]:
+            info_table = xml.group(1)
+            break
+    return {'periodOfReport': period, 'amendmentType': amendment.group(1) if amendment else None,
+            'infoTable': info_table}
+
+
+class BackfillCheckpoint:
+    """
+    逐个accession记录结果的追加式断点文件（JSON Lines）
+
+    每条记录写入后立即flush；进程崩溃时最多丢失最后一行（读取时忽略不完整的行），
+    同一accession以最后一条记录为准。
+    """
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+        self.records: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+        torn = False
+        if self.path.exists():
+            with open(self.path, encoding='utf-8') as f:
+                for line in f:
+                    torn = not line.endswith('\n')
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue
+                    self.records[record['accessionNumber']] = record
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = open(self.path, 'a', encoding='utf-8')
+        if torn:
+            # 上次中断在行中间时另起一行，新记录不会与残缺的行连在一起
+            self._file.write('\n')
+
+    def status(self, accession_number: str) -> Optional[str]:
+        record = self.records.get(accession_number)
+        return record['status'] if record else None
+
+    def attempts(self, accession_number: str) -> int:
+        record = self.records.get(accession_number)
+        return record.get('attempts', 0) if record else 0
+
+    def record(self, accession_number: str, status: str, **info) -> None:
+        record = {'accessionNumber': accession_number, 'status': status, **info}
+        with self._lock:
+            self.records[accession_number] = record
+            self._file.write(json.dumps(record) + '\n')
+            self._file.flush()
+
+    def close(self) -> None:
+        self._file.close()
+
+
+class BackfillProgress:
+    """已处理文件数、下载量及按最近窗口估算的吞吐量和剩余时间"""
+
+    def __init__(self, total: int, window: float = 120.0, timer: Callable[[], float] = time.monotonic):
+        self.total = total
+        self.counts = {DONE: 0, SKIPPED: 0, FAILED: 0}
+        self.holdings = 0
+        self.bytes = 0
+        self.window = window
+        self._timer = timer
+        self.started = timer()
+        self._samples: List[Tuple[float, int, int]] = [(self.started, 0, 0)]
+
+    @property
+    def processed(self) -> int:
+        return sum(self.counts.values())
+
+    def add(self, status: str, size: int = 0, holdings: int = 0) -> None:
+        self.counts[status] += 1
+        self.bytes += size
+        self.holdings += holdings
+        now = self._timer()
+        self._samples.append((now, self.processed, self.bytes))
+        # 只保留窗口内的样本（加上窗口前的最后一个作为起点）
+        while len(self._samples) > 2 and self._samples[1][0] < now - self.window:
+            self._samples.pop(0)
+
+    def snapshot(self) -> Dict:
+        now = self._timer()
+        start_time, start_count, start_bytes = self._samples[0]
+        elapsed = max(now - start_time, 1e-9)
+        rate = (self.processed - start_count) / elapsed
+        remaining = self.total - self.processed
+        return {
+            'total': self.total,
+            'processed': self.processed,
+            'ingested': self.counts[DONE],
+            'skipped': self.counts[SKIPPED],
+            'failed': self.counts[FAILED],
+            'holdings': self.holdings,
+            'elapsedSeconds': round(now - self.started, 1),
+            'filingsPerSecond': round(rate, 3),
+            'megabytesPerSecond': round((self.bytes - start_bytes) / elapsed / 1e6, 3),
+            'etaSeconds': round(remaining / rate, 1) if rate > 0 else None,
+        }
+
+    def describe(self) -> str:
+        s = self.snapshot()
+        percent = s['processed'] / s['total'] * 100 if s['total'] else 100.0
+        eta = s['etaSeconds']
+        eta_text = 'unknown' if eta is None else time.strftime('%H:%M:%S', time.gmtime(eta))
+        if eta is not None and eta >= 86400:
+            eta_text = f"{int(eta // 86400)}d {eta_text}"
+        return (f"{s['processed']}/{s['total']} filings ({percent:.1f}%), {s['ingested']} ingested, "
+                f"{s['skipped']} skipped, {s['failed']} failed; {s['filingsPerSecond']:.2f} filings/s, "
+                f"{s['megabytesPerSecond']:.2f} MB/s, ETA {eta_text}")
+
+
+class BackfillCrawler:
+    """
+    13F历史数据回填
+
+    1. 逐季度读取 full-index/form.idx 列出全部13F-HR/13F-HR/A（不受submissions接口只含近期文件的限制）
+    2. 线程池并行下载完整提交文件（所有请求经过EDGAR服务的共享限流器），解析信息表
+    3. 在调用线程中逐个入库（入库钩子照常执行），并把每个accession的结果写入断点文件
+
+    已入库或断点中已完成/跳过的文件不再下载；失败的文件在之后的运行中重试，
+    超过max_attempts次后不再尝试。
+    """
+
+    def __init__(self, edgar_service, session_factory: Optional[Callable] = None, ingest=None,
+                 checkpoint_path: str = './data/backfill_checkpoint.jsonl', workers: int = 4,
+                 max_attempts: int = 3, report_interval: float = 30.0, sleep: Callable[[float], None] = time.sleep):
+        self.edgar_service = edgar_service
+        self._session_factory = session_factory
+        self._ingest = ingest
+        self.checkpoint_path = checkpoint_path
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.report_interval = report_interval
+        self._sleep = sleep
+        self.progress: Optional[BackfillProgress] = None
+
+    @classmethod
+    def from_settings(cls, edgar_service, config=settings, **kwargs) -> 'BackfillCrawler':
+        options = dict(checkpoint_path=config.BACKFILL_CHECKPOINT_PATH, workers=config.BACKFILL_WORKERS,
+                       max_attempts=config.BACKFILL_MAX_ATTEMPTS, report_interval=config.BACKFILL_REPORT_SECONDS)
+        options.update(kwargs)
+        return cls(edgar_service, **options)
+
+    def _session(self):
+        if self._session_factory is None:
+            from app.db.session import SessionLocal
+
+            self._session_factory = SessionLocal
+        return self._session_factory()
+
+    @property
+    def ingest(self):
+        if self._ingest is None:
+            from app.services.ingest_service import ingest_service
+
+            self._ingest = ingest_service
+        return self._ingest
+
+    def enumerate(self, start_year: int, end_year: int, today: Optional[date] = None) -> List[Dict]:
+        """区间内全部13F文件的索引条目，按提交日期排序；尚未生成的季度索引跳过"""
+        entries = []
+        for year, quarter in backfill_quarters(start_year, end_year, today):
+            try:
+                entries.extend(self.edgar_service.get_form_index(year, quarter, THIRTEEN_F_FORMS))
+            except HTTPException as e:
+                if e.status_code != 404:
+                    raise
+                logger.warning(f"Form index {year} Q{quarter} is not available, skipping")
+        entries.sort(key=lambda e: (e['date'], e['accessionNumber']))
+        return entries
+
+    def _pending(self, entries: List[Dict], checkpoint: BackfillCheckpoint) -> List[Dict]:
+        db = self._session()
+        try:
+            loaded = set(db.execute(select(Filing.accession_number)).scalars())
+        finally:
+            db.close()
+        pending = []
+        for entry in entries:
+            accession_number = entry['accessionNumber']
+            status = checkpoint.status(accession_number)
+            if accession_number in loaded or status in (DONE, SKIPPED):
+                continue
+            if status == FAILED and checkpoint.attempts(accession_number) >= self.max_attempts:
+                continue
+            pending.append(entry)
+        return pending
+
+    def fetch(self, entry: Dict) -> Tuple[Dict, Optional[object], int]:
+        """下载并解析一个文件（在工作线程中执行），返回 (文件记录, 持仓或None, 下载字节数)"""
+        url = f"{self.edgar_service.base_url}/{entry['filename']}"
+        for attempt in range(_UNAVAILABLE_RETRIES + 1):
+            try:
+                response = self.edgar_service._make_request(url)
+                break
+            except HTTPException as e:
+                # 熔断期间等待限流器给出的时间后继续，不计入文件的失败次数
+                if e.status_code != 503 or attempt == _UNAVAILABLE_RETRIES:
+                    raise
+                retry_after = float((e.headers or {}).get('Retry-After', 1))
+                self._sleep(min(retry_after, 60.0))
+
+        text = response.text
+        submission = parse_submission(text)
+        filing = {
+            'accessionNumber': entry['accessionNumber'],
+            'date': entry['date'],
+            'reportDate': submission['periodOfReport'],
+            'isAmended': entry['form'] == '13F-HR/A',
+            'amendmentType': submission['amendmentType'],
+            'formUrl': url,
+        }
+        if submission['infoTable'] is None:
+            return filing, None, len(text)
+        holdings = self.edgar_service.parse_13f_xml_text(submission['infoTable'], filing_date=entry['date'])
+        return filing, holdings, len(text)
+
+    def run(self, start_year: int, end_year: int, today: Optional[date] = None,
+            limit: Optional[int] = None) -> Dict:
+        """执行回填，返回进度快照；limit限制本次处理的文件数"""
+        checkpoint = BackfillCheckpoint(self.checkpoint_path)
+        try:
+            entries = self.enumerate(start_year, end_year, today)
+            pending = self._pending(entries, checkpoint)
+            if limit is not None:
+                pending = pending[:limit]
+            logger.info(f"Backfill {start_year}-{end_year}: {len(entries)} 13F filings indexed, "
+                        f"{len(pending)} to fetch")
+            self.progress = BackfillProgress(len(pending))
+            self._crawl(pending, checkpoint)
+        finally:
+            checkpoint.close()
+        logger.info(f"Backfill finished: {self.progress.describe()}")
+        return self.progress.snapshot()
+
+    def _crawl(self, pending: List[Dict], checkpoint: BackfillCheckpoint) -> None:
+        queue: Iterator[Dict] = iter(pending)
+        db = self._session()
+        executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='backfill')
+        in_flight = {}
+        last_report = time.monotonic()
+        try:
+            while True:
+                # 下载窗口为worker数的两倍，入库与下载重叠进行
+                while len(in_flight) < self.workers * 2:
+                    entry = next(queue, None)
+                    if entry is None:
+                        break
+                    in_flight[executor.submit(self.fetch, entry)] = entry
+                if not in_flight:
+                    break
+
+                finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    self._complete(db, in_flight.pop(future), future, checkpoint)
+
+                if time.monotonic() - last_report >= self.report_interval:
+                    logger.info(f"Backfill progress: {self.progress.describe()}")
+                    last_report = time.monotonic()
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+            db.close()
+
+    def _complete(self, db, entry: Dict, future, checkpoint: BackfillCheckpoint) -> None:
+        accession_number = entry['accessionNumber']
+        try:
+            filing, holdings, size = future.result()
+            if holdings is None:
+                checkpoint.record(accession_number, SKIPPED, reason='no XML information table')
+                self.progress.add(SKIPPED, size)
+                return
+            count = self.ingest.ingest_filing(db, entry['cik'], filing, holdings, filer_name=entry['company'])
+            checkpoint.record(accession_number, DONE, holdings=count, periodOfReport=filing['reportDate'])
+            self.progress.add(DONE, size, count)
+        except Exception as e:
+            detail = getattr(e, 'detail', None) or str(e)
+            attempts = checkpoint.attempts(accession_number) + 1
+            logger.warning(f"Backfill of {accession_number} failed (attempt {attempts}): {detail}")
+            checkpoint.record(accession_number, FAILED, attempts=attempts, error=str(detail)[:500])
+            self.progress.add(FAILED)
+
+
+def main(argv: Optional[List[str]] = None) -> Dict:
+    from app.api.deps import get_edgar_service
+
+    parser = argparse.ArgumentParser(description="Backfill 13F filings from EDGAR quarterly form.idx files")
+    parser.add_argument('--start-year', type=int, default=settings.BACKFILL_START_YEAR)
+    parser.add_argument('--end-year', type=int, default=date.today().year)
+    parser.add_argument('--workers', type=int, default=settings.BACKFILL_WORKERS)
+    parser.add_argument('--checkpoint', default=settings.BACKFILL_CHECKPOINT_PATH)
+    parser.add_argument('--limit', type=int, default=None, help="process at most this many filings")
+    args = parser.parse_args(argv)
+
+    crawler = BackfillCrawler.from_settings(get_edgar_service(), workers=args.workers,
+                                            checkpoint_path=args.checkpoint)
+    return crawler.run(args.start_year, args.end_year, limit=args.limit)
+
+
+if __name__ == '__main__':
+    from app.core.logging_config import configure_logging
+
+    from app.services import backfill
+
+    configure_logging()
+    # 通过包路径调用，使日志记录器名称落在 app.* 下
+    backfill.main()
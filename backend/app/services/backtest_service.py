@@ -0,0 +1,294 @@
+import logging
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from app.services.price_store import PriceStore
+
+logger = logging.getLogger(__name__)
+
+TRADING_DAYS = 252
+
+
+@dataclass(frozen=True)
+class BacktestParams:
+    """
+    克隆组合回测参数
+
+    - rebalance: 'filing' 在文件提交日调仓；'period' 在报告期末加 lag_days 天调仓
+    - lag_days: 调仓日相对基准日期的额外延迟（天）
+    - weighting: 'value' 按申报市值加权；'equal' 等权
+    - start / end: 回测区间 (YYYY-MM-DD)，为空时使用全部价格历史
+    """
+    rebalance: str = 'filing'
+    lag_days: int = 0
+    weighting: str = 'value'
+    start: Optional[str] = None
+    end: Optional[str] = None
+
+    def __post_init__(self):
+        if self.rebalance not in ('filing', 'period'):
+            raise ValueError("rebalance must be 'filing' or 'period'")
+        if self.weighting not in ('value', 'equal'):
+            raise ValueError("weighting must be 'value' or 'equal'")
+        if self.lag_days < 0:
+            raise ValueError("lag_days must not be negative")
+
+
+@dataclass
+class BacktestResult:
+    """回测结果：日期、日收益率序列和汇总统计"""
+    cik: str
+    params: BacktestParams
+    dates: np.ndarray
+    returns: np.ndarray
+    rebalance_dates: List[str]
+    coverage: List[float]
+
+    @property
+    def equity_curve(self) -> np.ndarray:
+        return np.cumprod(1 + self.returns)
+
+    def summary(self) -> Dict:
+        """汇总统计：总收益、年化收益、年化波动、夏普比率、最大回撤"""
+        n = len(self.returns)
+        if n == 0:
+            return {'days': 0, 'totalReturn': 0.0, 'annualReturn': 0.0,
+                    'annualVolatility': 0.0, 'sharpe': None, 'maxDrawdown': 0.0}
+
+        equity = self.equity_curve
+        total_return = float(equity[-1] - 1)
+        annual_return = float(equity[-1] ** (TRADING_DAYS / n) - 1)
+        annual_vol = float(np.std(self.returns, ddof=1) * np.sqrt(TRADING_DAYS)) if n > 1 else 0.0
+        drawdown = equity / np.maximum.accumulate(equity) - 1
+
+        return {
+            'days': n,
+            'totalReturn': round(total_return, 6),
+            'annualReturn': round(annual_return, 6),
+            'annualVolatility': round(annual_vol, 6),
+            'sharpe': round(annual_return / annual_vol, 4) if annual_vol > 0 else None,
+            'maxDrawdown': round(float(drawdown.min()), 6),
+        }
+
+    def to_dict(self, include_series: bool = True) -> Dict:
+        result = {
+            'cik': self.cik,
+            'params': asdict(self.params),
+            'rebalanceDates': self.rebalance_dates,
+            'coverage': self.coverage,
+            'summary': self.summary(),
+        }
+        if include_series:
+            result['dates'] = [str(d) for d in self.dates]
+            result['returns'] = np.round(self.returns, 8).tolist()
+            result['equity'] = np.round(self.equity_curve, 8).tolist()
+        return result
+
+
+class BacktestEngine:
+    """
+    13F克隆组合回测引擎
+
+    按基金各报告期的持仓在调仓日建立目标权重，之后买入持有至下一次调仓，
+    使用本地价格矩阵以向量化方式计算每日组合收益。结果按 (基金, 文件, 参数) 缓存。
+    """
+
+    def __init__(self, price_store: PriceStore, cache_size: int = 512):
+        self.price_store = price_store
+        self.cache_size = cache_size
+        self._cache: 'OrderedDict[Tuple, BacktestResult]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def cache_key(cik: str, history: List[pd.DataFrame], params: BacktestParams) -> Tuple:
+        """缓存键：基金、各期文件编号（无编号时用提交日期）和参数"""
+        filings = tuple(
+            str(df['accessionNumber'].iloc[0]) if 'accessionNumber' in df.columns else str(df['filingDate'].iloc[0])
+            for df in history if not df.empty
+        )
+        return (cik, filings, params)
+
+    def _cache_get(self, key: Tuple) -> Optional[BacktestResult]:
+        with self._lock:
+            result = self._cache.get(key)
+            if result is not None:
+                self._cache.move_to_end(key)
+            return result
+
+    def _cache_put(self, key: Tuple, result: BacktestResult) -> None:
+        with self._lock:
+            self._cache[key] = result
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def clear_cache(self) -> None:
+        with self._lock:
+            self._cache.clear()
+
+    def run(self, cik: str, history: List[pd.DataFrame], params: Optional[BacktestParams] = None) -> BacktestResult:
+        """回测单个基金，history为各报告期持仓（get_holdings_history的返回值）"""
+        params = params or BacktestParams()
+        key = self.cache_key(cik, history, params)
+        cached = self._cache_get(key)
+        if cached is not None:
+            return cached
+
+        result = simulate(self.price_store, cik, history, params)
+        self._cache_put(key, result)
+        return result
+
+    def run_many(self, histories: Dict[str, List[pd.DataFrame]], params: Optional[BacktestParams] = None,
+                 max_workers: Optional[int] = None) -> Dict[str, BacktestResult]:
+        """
+        并行回测多个基金
+
+        已缓存的结果直接返回；其余基金分发到进程池。价格存储已保存到磁盘时，
+        各工作进程以内存映射方式打开同一份数据，不复制价格矩阵。
+        """
+        params = params or BacktestParams()
+        results: Dict[str, BacktestResult] = {}
+        pending = []
+        for cik, history in histories.items():
+            key = self.cache_key(cik, history, params)
+            cached = self._cache_get(key)
+            if cached is not None:
+                results[cik] = cached
+            else:
+                pending.append((cik, history, key))
+
+        if not pending:
+            return results
+
+        workers = max_workers or os.cpu_count() or 1
+        if workers <= 1 or len(pending) == 1 or self.price_store.path is None:
+            for cik, history, key in pending:
+                results[cik] = simulate(self.price_store, cik, history, params)
+                self._cache_put(key, results[cik])
+            return results
+
+        logger.info(f"Running {len(pending)} backtests on {workers} processes")
+        with ProcessPoolExecutor(max_workers=min(workers, len(pending)),
+                                 initializer=_init_worker,
+                                 initargs=(self.price_store.path,)) as executor:
+            futures = {cik: (executor.submit(_run_worker, cik, history, params), key)
+                       for cik, history, key in pending}
+            for cik, (future, key) in futures.items():
+                results[cik] = future.result()
+                self._cache_put(key, results[cik])
+        return results
+
+
+def _rebalance_dates(history: List[pd.DataFrame], params: BacktestParams) -> List[pd.Timestamp]:
+    dates = []
+    for df in history:
+        if params.rebalance == 'period' and 'periodOfReport' in df.columns and pd.notna(df['periodOfReport'].iloc[0]):
+            base = pd.Timestamp(df['periodOfReport'].iloc[0])
+        else:
+            base = pd.Timestamp(df['filingDate'].iloc[0])
+        dates.append(base + pd.Timedelta(days=params.lag_days))
+    return dates
+
+
+def simulate(store: PriceStore, cik: str, history: List[pd.DataFrame], params: BacktestParams) -> BacktestResult:
+    """
+    向量化模拟克隆组合
+
+    调仓日 k 按目标权重 w_k 和当日价格换算持有份额 u_k = w_k / p_k，
+    第 t 日收益为 (u·p_t) / (u·p_{t-1}) - 1，其中 u 为第 t-1 日收盘时持有的份额。
+    """
+    history = [df for df in history if not df.empty]
+    if not history:
+        raise ValueError(f"No holdings history for {cik}")
+
+    rebalance_ts = _rebalance_dates(history, params)
+    order = np.argsort(np.array(rebalance_ts, dtype='datetime64[ns]'), kind='stable')
+    history = [history[i] for i in order]
+    rebalance_ts = [rebalance_ts[i] for i in order]
+
+    # 回测区间对应的价格行
+    start = max(rebalance_ts[0], pd.Timestamp(params.start)) if params.start else rebalance_ts[0]
+    row_start = int(np.searchsorted(store.dates, np.datetime64(start, 'D'), side='left'))
+    row_end = len(store.dates)
+    if params.end:
+        row_end = int(np.searchsorted(store.dates, np.datetime64(pd.Timestamp(params.end), 'D'), side='right'))
+    if row_end - row_start < 2:
+        raise ValueError("Not enough price history in the backtest window")
+
+    # 全部报告期的证券并集
+    universe = pd.unique(pd.concat([df['cusip'] for df in history], ignore_index=True).astype(str))
+    cols = store.key_positions(universe)
+    known = cols >= 0
+    universe, cols = universe[known], cols[known]
+    prices = np.asarray(store.closes[row_start:row_end][:, cols], dtype=np.float64)
+    dates = store.dates[row_start:row_end]
+
+    # 目标权重矩阵 (K, N)
+    position = pd.Index(universe)
+    weights = np.zeros((len(history), len(universe)))
+    for k, df in enumerate(history):
+        idx = position.get_indexer(df['cusip'].astype(str))
+        mask = idx >= 0
+        raw = df['value'].to_numpy(dtype=np.float64)[mask] if params.weighting == 'value' else np.ones(mask.sum())
+        np.add.at(weights[k], idx[mask], raw)
+
+    # 调仓日所在价格行（非交易日顺延到下一个交易日）
+    rebal_rows = np.searchsorted(dates, np.array(rebalance_ts, dtype='datetime64[D]'), side='left')
+    in_window = rebal_rows < len(dates)
+    rebal_prices = prices[np.minimum(rebal_rows, len(dates) - 1)]
+
+    # 当日无价格的证券不可买入，剩余权重重新归一化
+    priced = ~np.isnan(rebal_prices) & (rebal_prices > 0)
+    gross = weights.sum(axis=1)
+    weights = np.where(priced, weights, 0.0)
+    invested = weights.sum(axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        coverage = np.where(gross > 0, invested / gross, 0.0)
+        weights = np.where(invested[:, None] > 0, weights / invested[:, None], 0.0)
+        units = np.where(priced, weights / rebal_prices, 0.0)
+
+    # 每个交易日收盘时生效的调仓序号
+    segment = np.searchsorted(rebal_rows[in_window], np.arange(len(dates)), side='right') - 1
+    active = segment >= 0
+    held = np.zeros((len(dates), len(universe)))
+    held[active] = units[in_window][segment[active]]
+
+    filled = np.nan_to_num(prices)
+    prev_units = held[:-1]
+    numerator = np.einsum('tn,tn->t', prev_units, filled[1:])
+    denominator = np.einsum('tn,tn->t', prev_units, filled[:-1])
+    with np.errstate(divide='ignore', invalid='ignore'):
+        daily = np.where(denominator > 0, numerator / denominator - 1, 0.0)
+
+    # 从首次调仓后的第一个交易日开始计收益
+    first = int(np.argmax(active)) if active.any() else len(dates) - 1
+    returns = daily[first:]
+    return_dates = dates[first + 1:]
+
+    return BacktestResult(
+        cik=cik,
+        params=params,
+        dates=return_dates,
+        returns=returns,
+        rebalance_dates=[str(ts.date()) for ts in rebalance_ts],
+        coverage=[round(float(c), 4) for c in coverage],
+    )
+
+
+_worker_store: Optional[PriceStore] = None
+
+
+def _init_worker(store_path: str) -> None:
+    global _worker_store
+    _worker_store = PriceStore.open(store_path)
+
+
+def _run_worker(cik: str, history: List[pd.DataFrame], params: BacktestParams) -> BacktestResult:
+    return simulate(_worker_store, cik, history, params)
@@ -11,63 +11,46 @@ from dotenv import load_dotenv
 import re
 from fastapi import HTTPException
 import sys
+import math
+import numpy as np
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.core.rate_limiter import CircuitOpenError, parse_retry_after, sec_limiter
+from app.core.swr_cache import CacheResult, StaleWhileRevalidateCache
+from app.services.holdings_validation import normalize_holdings
+from app.services.price_store import PriceStore
 
-# 配置日志记录
-try:
-    log_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), 'logs')
-    os.makedirs(log_dir, exist_ok=True)
-
-    # 创建日志记录器
-    logger = logging.getLogger(__name__)
-    logger.setLevel(logging.DEBUG)
-
-    # 创建文件处理器
-    log_file = os.path.join(log_dir, 'edgar_service.log')
-    try:
-        # 测试文件是否可写
-        with open(log_file, 'a', encoding='utf-8') as f:
-            f.write('')
-        file_handler = logging.FileHandler(log_file, encoding='utf-8')
-        file_handler.setLevel(logging.DEBUG)
-    except Exception as e:
-        print(f"Warning: Could not create file handler: {str(e)}")
-        file_handler = None
-
-    # 创建控制台处理器
-    console_handler = logging.StreamHandler(sys.stdout)
-    console_handler.setLevel(logging.DEBUG)
-
-    # 创建格式化器
-    formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-    
-    if file_handler:
-        file_handler.setFormatter(formatter)
-        logger.addHandler(file_handler)
-    
-    console_handler.setFormatter(formatter)
-    logger.addHandler(console_handler)
-
-    # 防止日志重复
-    logger.propagate = False
-
-except Exception as e:
-    print(f"Warning: Failed to configure logging: {str(e)}")
-    # 创建一个基本的控制台日志记录器
-    logger = logging.getLogger(__name__)
-    logger.setLevel(logging.DEBUG)
-    console_handler = logging.StreamHandler(sys.stdout)
-    console_handler.setLevel(logging.DEBUG)
-    formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-    console_handler.setFormatter(formatter)
-    logger.addHandler(console_handler)
-    logger.propagate = False
+logger = logging.getLogger(__name__)
+
+# 解析结果的格式版本，解析或单位规则变化时递增，使共享缓存中的旧条目失效
+HOLDINGS_CACHE_VERSION = 2
 
 load_dotenv()
 
+# 最近成功的响应正文（(url, params) -> (content, encoding)），熔断期间作为降级数据返回；
+# 只缓存调用方显式允许的小响应（submissions JSON等），进程内所有EDGARService实例共享
+sec_fallback_cache = TTLCache(maxsize=settings.SEC_FALLBACK_CACHE_SIZE, ttl=settings.SEC_FALLBACK_TTL_SECONDS)
+
+
+def _cached_response(url: str, content: bytes, encoding: Optional[str]) -> requests.Response:
+    """用缓存的正文重建响应对象"""
+    response = requests.Response()
+    response.status_code = 200
+    response.url = url
+    response.encoding = encoding
+    response._content = content
+    return response
+
+
 class EDGARService:
-    def __init__(self):
+    def __init__(self, price_store: Optional[PriceStore] = None, holdings_cache=None, limiter=None):
         """
         初始化EDGAR服务
+
+        参数:
+        - price_store: 本地收盘价存储，用于按市价重估持仓（可选）
+        - holdings_cache: 跨进程共享的持仓缓存（HoldingsCache，可选），按accession编号缓存解析结果
+        - limiter: SEC请求限流器（AdaptiveLimiter），默认使用进程内共享的sec_limiter
         """
         self.base_url = "https://www.sec.gov/Archives"
         self.headers = {
@@ -75,37 +58,51 @@ class EDGARService:
             'Accept-Encoding': 'gzip, deflate',
             'Host': 'www.sec.gov'
         }
-        self.request_delay = 0.1  # 100ms between requests to comply with SEC rate limit
+        self.limiter = limiter or sec_limiter
+        # 文件列表允许短时间过期：超过软TTL先返回旧值再后台刷新，超过硬TTL才同步请求SEC
+        self.filings_cache = StaleWhileRevalidateCache(
+            soft_ttl=settings.FILINGS_CACHE_SOFT_TTL_SECONDS,
+            hard_ttl=settings.FILINGS_CACHE_HARD_TTL_SECONDS,
+            maxsize=settings.FILINGS_CACHE_MAXSIZE,
+            max_workers=settings.FILINGS_CACHE_REFRESH_WORKERS,
+        )
         self.logger = logger
+        self.price_store = price_store
+        self.holdings_cache = holdings_cache
 
-    def _make_request(self, url: str, params: dict = None) -> requests.Response:
+    def _make_request(self, url: str, params: dict = None, fallback: bool = False) -> requests.Response:
         """
         发送请求到SEC，包含重试逻辑和速率限制
+
+        所有请求经过进程内共享的自适应限流器：429的Retry-After由限流器统一暂停，
+        熔断期间不再请求SEC，否则返回503。fallback为True时保存成功响应的正文
+        （不超过SEC_FALLBACK_MAX_BYTES），熔断期间返回最近成功的响应；
+        form.idx、XML、完整提交文件等大响应不应开启。
         """
         max_retries = 3
         retry_delay = 1  # 初始重试延迟（秒）
-        
+        cache_key = (url, tuple(sorted((params or {}).items())))
+
         headers = {
             'User-Agent': 'Hedge Fund Analytics research@example.com',
             'Accept-Encoding': 'gzip, deflate',
             'Host': 'www.sec.gov' if 'sec.gov' in url else None
         }
         headers = {k: v for k, v in headers.items() if v is not None}
-        
+
         for attempt in range(max_retries):
             try:
-                # 添加延迟以遵守SEC的速率限制
-                time.sleep(self.request_delay)
-                
-                response = requests.get(url, params=params, headers=headers, timeout=30)
-                
+                with self.limiter.request() as ticket:
+                    response = requests.get(url, params=params, headers=headers, timeout=30)
+                    ticket.record(response.status_code, parse_retry_after(response.headers.get('Retry-After')))
+
                 # 检查响应状态
                 if response.status_code == 200:
+                    if fallback and len(response.content) <= settings.SEC_FALLBACK_MAX_BYTES:
+                        sec_fallback_cache.set(cache_key, (response.content, response.encoding))
                     return response
-                elif response.status_code == 429:  # 速率限制
-                    wait_time = int(response.headers.get('Retry-After', 60))
-                    self.logger.warning(f"达到速率限制，等待 {wait_time} 秒")
-                    time.sleep(wait_time)
+                elif response.status_code == 429:  # 速率限制，由限流器统一等待
+                    self.logger.warning(f"达到速率限制 (尝试 {attempt + 1}/{max_retries}): {url}")
                     continue
                 elif response.status_code == 404:
                     self.logger.error(f"资源未找到: {url}")
@@ -113,75 +110,98 @@ class EDGARService:
                 else:
                     self.logger.error(f"请求失败 ({response.status_code}): {url}")
                     response.raise_for_status()
-                    
+
+            except CircuitOpenError as e:
+                cached = sec_fallback_cache.get(cache_key) if fallback else None
+                if cached is not None:
+                    self.logger.warning(f"SEC不可用，返回缓存的响应: {url}")
+                    return _cached_response(url, *cached)
+                self.logger.warning(f"SEC请求被限流器拒绝: {e}")
+                raise self._upstream_unavailable(e.retry_after)
             except requests.RequestException as e:
                 self.logger.error(f"请求出错 (尝试 {attempt + 1}/{max_retries}): {str(e)}")
                 if attempt == max_retries - 1:  # 最后一次尝试
                     raise HTTPException(status_code=500, detail=f"Failed to fetch data from SEC: {str(e)}")
-                    
+
                 # 指数退避
                 time.sleep(retry_delay * (2 ** attempt))
-                
-        raise HTTPException(status_code=500, detail="Maximum retries exceeded")
 
-    def parse_13f_xml(self, xml_url: str) -> pd.DataFrame:
-        """解析13F XML文件并返回持仓数据DataFrame"""
+        cached = sec_fallback_cache.get(cache_key) if fallback else None
+        if cached is not None:
+            self.logger.warning(f"SEC持续限流，返回缓存的响应: {url}")
+            return _cached_response(url, *cached)
+        raise self._upstream_unavailable(self.limiter.metrics()['retryAfterSeconds'])
+
+    @staticmethod
+    def _upstream_unavailable(retry_after: float) -> HTTPException:
+        return HTTPException(
+            status_code=503,
+            detail="SEC EDGAR is throttling requests, please retry later",
+            headers={'Retry-After': str(max(int(math.ceil(retry_after)), 1))},
+        )
+
+    def parse_13f_xml(self, xml_url: str, filing_date: Optional[str] = None) -> pd.DataFrame:
+        """
+        解析13F XML文件并返回持仓数据DataFrame
+
+        filing_date为提交日期，用于把2023-01-03之前以千美元申报的value换算为美元；为空时保持申报值。
+        """
         try:
             # 获取XML内容
             response = self._make_request(xml_url)
-            soup = BeautifulSoup(response.text, 'xml')
-            
-            # 查找所有命名空间
-            namespaces = self._get_namespaces(soup)
-            self.logger.info(f"找到的命名空间: {namespaces}")
-            
-            # 尝试不同的标签组合
-            holdings_data = []
-            rank = 1
-            
-            # 定义可能的标签名组合
-            info_table_tags = ['informationTable', 'ns1:informationTable']
-            info_table_entry_tags = ['infoTableEntry', 'ns1:infoTableEntry']
-            
-            # 查找信息表
-            info_table = None
-            for tag in info_table_tags:
-                info_table = soup.find(tag)
-                if info_table:
-                    break
-            
-            if not info_table:
-                raise ValueError("无法找到informationTable标签")
-            
-            # 遍历每个条目
-            for tag in info_table_entry_tags:
-                entries = info_table.find_all(tag)
-                if entries:
-                    for entry in entries:
-                        holding = self._parse_holding_entry(entry, namespaces, rank)
-                        holdings_data.append(holding)
-                        rank += 1
-                    break
-            
-            if not holdings_data:
-                raise ValueError("未找到任何持仓数据")
-            
-            # 创建DataFrame并计算额外的指标
-            df = pd.DataFrame(holdings_data)
-            
-            # 计算投资组合百分比
-            total_value = df['value'].sum()
-            df['percentOfPortfolio'] = (df['value'] / total_value * 100).round(2)
-            
-            # 计算平均价格
-            df['averagePrice'] = (df['value'] * 1000 / df['shares']).round(2)
-            
-            return df
-            
+            return self.parse_13f_xml_text(response.text, filing_date)
+
+        except HTTPException:
+            # 上游的404/503等状态原样返回
+            raise
         except Exception as e:
             self.logger.error(f"解析XML文件失败: {str(e)}")
             raise HTTPException(status_code=500, detail=f"Failed to parse XML file: {str(e)}")
 
+    def parse_13f_xml_text(self, text: str, filing_date: Optional[str] = None) -> pd.DataFrame:
+        """解析已下载的13F信息表XML文本（见parse_13f_xml）；找不到持仓时抛出ValueError"""
+        soup = BeautifulSoup(text, 'xml')
+        
+        # 查找所有命名空间
+        namespaces = self._get_namespaces(soup)
+        self.logger.info(f"找到的命名空间: {namespaces}")
+        
+        # 尝试不同的标签组合
+        holdings_data = []
+        rank = 1
+        
+        # 定义可能的标签名组合
+        info_table_tags = ['informationTable', 'ns1:informationTable']
+        # SEC信息表架构中的条目为infoTable
+        info_table_entry_tags = ['infoTableEntry', 'ns1:infoTableEntry', 'infoTable', 'ns1:infoTable']
+        
+        # 查找信息表
+        info_table = None
+        for tag in info_table_tags:
+            info_table = soup.find(tag)
+            if info_table:
+                break
+        
+        if not info_table:
+            raise ValueError("无法找到informationTable标签")
+        
+        # 遍历每个条目
+        for tag in info_table_entry_tags:
+            entries = info_table.find_all(tag)
+            if entries:
+                for entry in entries:
+                    holding = self._parse_holding_entry(entry, namespaces, rank)
+                    holdings_data.append(holding)
+                    rank += 1
+                break
+        
+        if not holdings_data:
+            raise ValueError("未找到任何持仓数据")
+        
+        # 创建DataFrame，批量校验并统一单位，计算组合占比和平均价格
+        df = pd.DataFrame(holdings_data)
+        return normalize_holdings(df, filing_date)
+
     def _get_namespaces(self, soup: BeautifulSoup) -> Dict[str, str]:
         """从XML文档中提取命名空间"""
         try:
@@ -278,23 +298,26 @@ class EDGARService:
         except Exception as e:
             raise ValueError(f"Invalid year: {str(e)}")
 
-    def get_13f_filings(self, cik: str, year: int) -> List[Dict]:
+    def get_13f_filings(self, cik: str, year: Optional[int] = None) -> List[Dict]:
         """
         获取指定CIK和年份的13F文件列表
+
+        year为空时返回submissions中全部13F文件
         """
         try:
             # 验证输入
             cik = self.validate_cik(cik)
-            self.validate_year(year)
+            if year is not None:
+                self.validate_year(year)
             
-            self.logger.info(f"获取 {cik} 在 {year} 年的13F文件")
+            self.logger.info(f"获取 {cik} 在 {year or '全部'} 年的13F文件")
             
             # 构建SEC公司提交历史的API URL
             submissions_url = f"https://data.sec.gov/submissions/CIK{cik}.json"
             self.logger.info(f"请求提交历史: {submissions_url}")
             
             # 获取提交历史
-            response = self._make_request(submissions_url)
+            response = self._make_request(submissions_url, fallback=True)
             data = response.json()
             
             # 从最近的文件开始处理
@@ -310,6 +333,7 @@ class EDGARService:
             filing_dates = recent_filings.get('filingDate', [])
             accession_numbers = recent_filings.get('accessionNumber', [])
             primary_docs = recent_filings.get('primaryDocument', [])
+            report_dates = recent_filings.get('reportDate', [])
             filing_urls = recent_filings.get('url', [])
             
             # 遍历所有文件
@@ -319,6 +343,7 @@ class EDGARService:
                     filing_date = filing_dates[i]
                     accession_number = accession_numbers[i]
                     primary_doc = primary_docs[i]
+                    report_date = report_dates[i] if i < len(report_dates) else None
                     filing_url = filing_urls[i] if filing_urls else None
                     
                     # 只处理13F-HR文件
@@ -327,7 +352,7 @@ class EDGARService:
                         
                     # 检查年份
                     file_year = int(filing_date.split('-')[0])
-                    if file_year != year:
+                    if year is not None and file_year != year:
                         continue
                     
                     # 构建XML URL
@@ -337,6 +362,7 @@ class EDGARService:
                     
                     filing = {
                         'date': filing_date,
+                        'reportDate': report_date or None,
                         'accessionNumber': accession_number,
                         'primaryDocument': primary_doc,
                         'xmlUrl': xml_url,
@@ -362,11 +388,102 @@ class EDGARService:
                 raise
             raise HTTPException(status_code=500, detail=str(e))
 
-    def get_fund_holdings(self, cik: str, year: int) -> pd.DataFrame:
-        """获取基金在指定年份的所有持仓数据"""
+    def get_13f_filings_cached(self, cik: str, year: Optional[int] = None) -> CacheResult:
+        """
+        带stale-while-revalidate缓存的get_13f_filings
+
+        返回CacheResult：value为文件列表，age为数据已缓存的秒数，status为HIT/STALE/MISS。
+        """
+        cik = self.validate_cik(cik)
+        if year is not None:
+            self.validate_year(year)
+        return self.filings_cache.get((cik, year), lambda: self.get_13f_filings(cik, year))
+
+    def invalidate_filings(self, cik: str) -> int:
+        """发现新文件后丢弃该基金缓存的文件列表"""
+        cik = self.validate_cik(cik)
+        return self.filings_cache.invalidate(lambda key: key[0] == cik)
+
+    # form.idx数据行：表单类型、公司名称、CIK、提交日期、文件路径（各列之间至少两个空格）
+    FORM_INDEX_LINE = re.compile(
+        r'^(?P<form>\S.*?)\s{2,}(?P<company>\S.*?)\s{2,}(?P<cik>\d+)\s+'
+        r'(?P<date>\d{4}-?\d{2}-?\d{2})\s+(?P<filename>\S+)\s*$'
+    )
+
+    # 修正文件主文档（封面页）中的修正类型：RESTATEMENT 或 NEW HOLDINGS
+    AMENDMENT_TYPE = re.compile(r'<(?:\w+:)?amendmentType>\s*([^<]+?)\s*<', re.I)
+
+    def parse_amendment_type(self, text: str) -> Optional[str]:
+        """从13F主文档中取出修正类型，没有时返回None"""
+        match = self.AMENDMENT_TYPE.search(text)
+        return match.group(1) if match else None
+
+    def get_amendment_type(self, filing: Dict) -> Optional[str]:
+        """
+        获取13F-HR/A文件的修正类型（请求文件的主文档）
+
+        不是修正文件时返回None；请求失败时记录警告并返回None，入库时按重述处理。
+        """
+        if not filing.get('isAmended'):
+            return None
+        try:
+            return self.parse_amendment_type(self._make_request(filing['xmlUrl']).text)
+        except Exception as e:
+            self.logger.warning(f"Failed to read amendment type of {filing.get('accessionNumber')}: {e}")
+            return None
+
+    def parse_form_index(self, text: str, form_types: Optional[List[str]] = None) -> List[Dict]:
+        """解析EDGAR季度full-index的form.idx文本"""
+        entries = []
+        in_body = False
+        for line in text.splitlines():
+            if not in_body:
+                # 表头之后是一行连字符
+                in_body = line.startswith('---')
+                continue
+            match = self.FORM_INDEX_LINE.match(line)
+            if not match:
+                continue
+            form = match.group('form').strip()
+            if form_types and form not in form_types:
+                continue
+            filed = match.group('date').replace('-', '')
+            filename = match.group('filename')
+            entries.append({
+                'form': form,
+                'company': match.group('company').strip(),
+                'cik': match.group('cik').zfill(10),
+                'date': f"{filed[:4]}-{filed[4:6]}-{filed[6:]}",
+                'filename': filename,
+                'accessionNumber': filename.rsplit('/', 1)[-1].replace('.txt', ''),
+            })
+        return entries
+
+    def get_form_index(self, year: int, quarter: int, form_types: Optional[List[str]] = None) -> List[Dict]:
+        """
+        获取并解析EDGAR季度form.idx
+
+        form_types为空时返回全部表单，例如传入 ['13F-HR', '13F-HR/A'] 只保留13F文件
+        """
+        if quarter not in (1, 2, 3, 4):
+            raise ValueError("quarter must be between 1 and 4")
+        url = f"{self.base_url}/edgar/full-index/{int(year)}/QTR{int(quarter)}/form.idx"
+        self.logger.info(f"请求季度索引: {url}")
+        response = self._make_request(url)
+        entries = self.parse_form_index(response.text, form_types)
+        self.logger.info(f"{year} 年第 {quarter} 季度索引中找到 {len(entries)} 条记录")
+        return entries
+
+    def get_fund_holdings(self, cik: str, year: int, filings: Optional[List[Dict]] = None) -> pd.DataFrame:
+        """
+        获取基金在指定年份的所有持仓数据
+
+        filings为已获取的文件列表（可选），提供时不再重复请求SEC
+        """
         try:
             # 获取13F文件列表
-            filings = self.get_13f_filings(cik, year)
+            if filings is None:
+                filings = self.get_13f_filings(cik, year)
             
             if not filings:
                 raise HTTPException(status_code=404, detail=f"No 13F filings found for {cik} in {year}")
@@ -375,31 +492,7 @@ class EDGARService:
             latest_filing = filings[0]  # 文件已按日期降序排序
             self.logger.info(f"处理最新的13F文件: {latest_filing['date']}")
             
-            try:
-                # 解析XML文件
-                holdings_df = self.parse_13f_xml(latest_filing['xmlUrl'])
-                
-                # 添加文件日期信息
-                holdings_df['filingDate'] = latest_filing['date']
-                holdings_df['isAmended'] = latest_filing['isAmended']
-                
-                # 添加基金信息
-                holdings_df['fundCik'] = cik
-                
-                # 重新排序列
-                columns = [
-                    'rank', 'nameOfIssuer', 'titleOfClass', 'cusip', 'value', 
-                    'shares', 'shareType', 'percentOfPortfolio', 'averagePrice',
-                    'investmentDiscretion', 'otherManager', 'sole_voting', 
-                    'shared_voting', 'no_voting', 'filingDate', 'isAmended', 'fundCik'
-                ]
-                holdings_df = holdings_df[columns]
-                
-                return holdings_df
-                
-            except Exception as e:
-                self.logger.error(f"处理文件时出错: {str(e)}")
-                raise HTTPException(status_code=500, detail=f"Failed to process filing: {str(e)}")
+            return self.load_filing_holdings(cik, latest_filing)
             
         except HTTPException:
             raise
@@ -407,19 +500,92 @@ class EDGARService:
             self.logger.error(f"获取基金持仓数据时出错: {str(e)}")
             raise HTTPException(status_code=500, detail=str(e))
 
+    def load_filing_holdings(self, cik: str, filing: Dict) -> pd.DataFrame:
+        """解析单个13F文件并附加文件和基金信息，配置了共享缓存时优先从缓存读取"""
+        accession_number = filing.get('accessionNumber')
+        if self.holdings_cache is not None and accession_number:
+            return self.holdings_cache.get_or_load(
+                f"{accession_number}@v{HOLDINGS_CACHE_VERSION}", lambda: self._parse_filing_holdings(cik, filing)
+            )
+        return self._parse_filing_holdings(cik, filing)
+
+    def _parse_filing_holdings(self, cik: str, filing: Dict) -> pd.DataFrame:
+        try:
+            # 解析XML文件
+            holdings_df = self.parse_13f_xml(filing['xmlUrl'], filing_date=filing['date'])
+            
+            # 添加文件日期信息
+            holdings_df['filingDate'] = filing['date']
+            holdings_df['periodOfReport'] = filing.get('reportDate')
+            holdings_df['accessionNumber'] = filing.get('accessionNumber')
+            holdings_df['isAmended'] = filing['isAmended']
+            
+            # 添加基金信息
+            holdings_df['fundCik'] = cik
+            
+            # 重新排序列
+            columns = [
+                'rank', 'nameOfIssuer', 'titleOfClass', 'cusip', 'value', 
+                'shares', 'shareType', 'percentOfPortfolio', 'averagePrice',
+                'investmentDiscretion', 'otherManager', 'sole_voting', 
+                'shared_voting', 'no_voting', 'filingDate', 'periodOfReport',
+                'accessionNumber', 'isAmended', 'fundCik'
+            ]
+            if 'validationFlags' in holdings_df.columns:
+                columns.append('validationFlags')
+            return holdings_df[columns]
+            
+        except HTTPException:
+            # 上游的404/503等状态原样返回
+            raise
+        except Exception as e:
+            self.logger.error(f"处理文件时出错: {str(e)}")
+            raise HTTPException(status_code=500, detail=f"Failed to process filing: {str(e)}")
+
+    def get_holdings_history(self, cik: str, start_year: int, end_year: int) -> List[pd.DataFrame]:
+        """
+        获取基金在年份区间内各报告期的持仓
+
+        每个报告期只保留最新提交的文件（修正文件覆盖原文件），结果按报告期升序排列。
+        """
+        filings = self.latest_filings_by_period(cik, start_year, end_year)
+        self.logger.info(f"获取 {cik} 的 {len(filings)} 个报告期持仓")
+        return [self.load_filing_holdings(cik, filing) for filing in filings]
+
+    def latest_filings_by_period(self, cik: str, start_year: int, end_year: int) -> List[Dict]:
+        """年份区间内每个报告期最新提交的文件（修正文件覆盖原文件），按报告期升序排列"""
+        if start_year > end_year:
+            raise ValueError("start_year must not be after end_year")
+
+        latest_by_period: Dict[str, Dict] = {}
+        for year in range(start_year, end_year + 1):
+            for filing in self.get_13f_filings(cik, year):
+                period = filing.get('reportDate') or filing['date']
+                current = latest_by_period.get(period)
+                if current is None or filing['date'] > current['date']:
+                    latest_by_period[period] = filing
+
+        if not latest_by_period:
+            raise HTTPException(status_code=404, detail=f"No 13F filings found for {cik} in {start_year}-{end_year}")
+
+        return [latest_by_period[period] for period in sorted(latest_by_period)]
+
     def enrich_holdings_data(self, holdings_df: pd.DataFrame) -> pd.DataFrame:
         """
         使用额外的市场数据丰富持仓数据
+
+        返回新的DataFrame，不修改输入（命中共享缓存的持仓是只读视图）
         """
         try:
             if holdings_df.empty:
                 return holdings_df
+            holdings_df = holdings_df.copy()
                 
             # 计算基本指标
             total_value = holdings_df['value'].sum()
             
             # 添加分析指标
-            holdings_df['averagePrice'] = (holdings_df['value'] / holdings_df['shares']).round(2)
+            holdings_df['averagePrice'] = (holdings_df['value'] / holdings_df['shares'].where(holdings_df['shares'] > 0)).round(2)
             holdings_df['percentOfPortfolio'] = (holdings_df['value'] / total_value * 100).round(2)
             
             # 按持仓市值排序并添加排名
@@ -442,3 +608,61 @@ class EDGARService:
         except Exception as e:
             self.logger.error(f"Error enriching holdings data: {str(e)}")
             return holdings_df
+
+    def mark_to_market(self, holdings_df: pd.DataFrame, as_of: Optional[Union[str, datetime]] = None,
+                       price_store: Optional[PriceStore] = None) -> pd.DataFrame:
+        """
+        使用本地价格历史按市价重估持仓
+
+        输入可以是多个基金拼接而成的持仓表，所有行在一次数组运算中完成价格查询：
+        - marketPrice / marketValue: as_of日期（默认最新交易日）的收盘价及市值
+        - reportPrice / reportValue: 报告期末（periodOfReport，缺失时用filingDate）的收盘价及市值
+        - valueChange / valueChangePct: 自报告期以来的市值变化
+        价格存储中找不到的证券对应字段为NaN。
+        """
+        store = price_store or self.price_store
+        if store is None:
+            raise ValueError("No price store configured")
+        if holdings_df.empty:
+            return holdings_df
+
+        df = holdings_df.copy()
+        keys = df['cusip'].to_numpy(dtype=object)
+        shares = df['shares'].to_numpy(dtype=np.float64)
+
+        # 报告期末价格：每行的日期可能不同，逐元素批量查询
+        if 'periodOfReport' in df.columns:
+            report_dates = df['periodOfReport'].fillna(df['filingDate'])
+        else:
+            report_dates = df['filingDate']
+        report_price = store.lookup(keys, report_dates.to_numpy())
+
+        as_of = store.dates[-1] if as_of is None else as_of
+        market_price = store.lookup(keys, as_of)
+
+        # 按ticker补充CUSIP未覆盖的证券
+        if 'ticker' in df.columns:
+            tickers = df['ticker'].to_numpy(dtype=object)
+            missing = np.isnan(market_price)
+            if missing.any():
+                market_price[missing] = store.lookup(tickers[missing], as_of)
+            missing = np.isnan(report_price)
+            if missing.any():
+                report_price[missing] = store.lookup(tickers[missing], report_dates.to_numpy()[missing])
+
+        market_value = shares * market_price
+        report_value = shares * report_price
+        with np.errstate(divide='ignore', invalid='ignore'):
+            change_pct = np.where(report_value > 0, (market_value / report_value - 1) * 100, np.nan)
+
+        df['marketPrice'] = market_price.round(4)
+        df['marketValue'] = market_value.round(2)
+        df['reportPrice'] = report_price.round(4)
+        df['reportValue'] = report_value.round(2)
+        df['valueChange'] = (market_value - report_value).round(2)
+        df['valueChangePct'] = np.round(change_pct, 2)
+        df['markDate'] = str(pd.Timestamp(as_of).date())
+
+        priced = int(np.count_nonzero(~np.isnan(market_price)))
+        self.logger.info(f"按市价重估 {len(df)} 条持仓，其中 {priced} 条有价格")
+        return df
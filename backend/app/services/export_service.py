@@ -0,0 +1,146 @@
+import io
+import logging
+import zlib
+from datetime import date
+from typing import Callable, Dict, Iterable, Iterator, List, Optional
+
+import pandas as pd
+from fastapi import HTTPException
+from sqlalchemy import select
+
+from app.crud import holdings as holdings_crud
+from app.db import session as db_session
+from app.models.holdings import Filing
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHUNK_ROWS = 5000
+
+FORMATS = {
+    'ndjson': ('application/x-ndjson', 'ndjson'),
+    'csv': ('text/csv', 'csv'),
+}
+
+COMPRESSIONS = {
+    'none': (None, ''),
+    'gzip': ('application/gzip', '.gz'),
+    'zstd': ('application/zstd', '.zst'),
+}
+
+
+def iter_stored_holdings(period: date, ciks: Optional[Iterable[str]] = None) -> Iterator[pd.DataFrame]:
+    """
+    逐个基金读取数据库中指定报告期的持仓
+
+    每个基金只取该报告期最新提交的文件（修正文件覆盖原文件），一次只在内存中保留一个基金的数据。
+    """
+    db = db_session.SessionLocal()
+    try:
+        stmt = (
+            select(Filing.cik, Filing.accession_number)
+            .where(Filing.period_of_report == period)
+            .order_by(Filing.cik, Filing.filed_at)
+        )
+        if ciks:
+            stmt = stmt.where(Filing.cik.in_(list(ciks)))
+
+        latest: Dict[str, str] = {}
+        for cik, accession_number in db.execute(stmt):
+            latest[cik] = accession_number
+
+        logger.info(f"Exporting stored holdings for {len(latest)} filers in period {period}")
+        for cik in sorted(latest):
+            yield holdings_crud.read_holdings(db, [latest[cik]])
+    finally:
+        db.close()
+
+
+def iter_parsed_holdings(load_holdings: Callable[[str], pd.DataFrame], ciks: Iterable[str]) -> Iterator[pd.DataFrame]:
+    """逐个基金从EDGAR解析持仓，没有文件的基金跳过"""
+    for cik in ciks:
+        try:
+            yield load_holdings(cik)
+        except HTTPException as e:
+            if e.status_code != 404:
+                raise
+            logger.warning(f"No holdings for {cik}, skipping")
+
+
+def _chunks(frames: Iterable[pd.DataFrame], chunk_rows: int) -> Iterator[pd.DataFrame]:
+    for frame in frames:
+        for start in range(0, len(frame), chunk_rows):
+            yield frame.iloc[start:start + chunk_rows]
+
+
+def encode_ndjson(frames: Iterable[pd.DataFrame], chunk_rows: int = DEFAULT_CHUNK_ROWS) -> Iterator[bytes]:
+    """按块输出NDJSON，每行一条持仓"""
+    for chunk in _chunks(frames, chunk_rows):
+        if chunk.empty:
+            continue
+        text = chunk.to_json(orient='records', lines=True, date_format='iso')
+        yield (text if text.endswith('\n') else text + '\n').encode('utf-8')
+
+
+def encode_csv(frames: Iterable[pd.DataFrame], chunk_rows: int = DEFAULT_CHUNK_ROWS) -> Iterator[bytes]:
+    """按块输出CSV，列以第一个非空块为准，只输出一次表头"""
+    columns: Optional[List[str]] = None
+    for chunk in _chunks(frames, chunk_rows):
+        if chunk.empty:
+            continue
+        header = columns is None
+        if header:
+            columns = list(chunk.columns)
+        buffer = io.StringIO()
+        chunk.reindex(columns=columns).to_csv(buffer, index=False, header=header)
+        yield buffer.getvalue().encode('utf-8')
+
+
+def compress_stream(chunks: Iterable[bytes], compression: str = 'none') -> Iterator[bytes]:
+    """对字节流进行流式压缩"""
+    if compression == 'none':
+        yield from chunks
+        return
+
+    if compression == 'gzip':
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    elif compression == 'zstd':
+        try:
+            import zstandard
+        except ImportError:
+            raise ValueError("zstd compression requires the 'zstandard' package")
+        compressor = zstandard.ZstdCompressor().compressobj()
+    else:
+        raise ValueError(f"Unsupported compression: {compression}")
+
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    tail = compressor.flush()
+    if tail:
+        yield tail
+
+
+def export_stream(frames: Iterable[pd.DataFrame], fmt: str = 'ndjson', compression: str = 'none',
+                  chunk_rows: int = DEFAULT_CHUNK_ROWS) -> Iterator[bytes]:
+    """组合编码和压缩，返回可直接交给StreamingResponse的字节迭代器"""
+    if fmt not in FORMATS:
+        raise ValueError(f"Unsupported format: {fmt}")
+    if compression not in COMPRESSIONS:
+        raise ValueError(f"Unsupported compression: {compression}")
+    if compression == 'zstd':
+        try:
+            import zstandard  # noqa: F401
+        except ImportError:
+            raise ValueError("zstd compression requires the 'zstandard' package")
+
+    encoder = encode_ndjson if fmt == 'ndjson' else encode_csv
+    return compress_stream(encoder(frames, chunk_rows), compression)
+
+
+def export_media_type(fmt: str, compression: str) -> str:
+    return COMPRESSIONS[compression][0] or FORMATS[fmt][0]
+
+
+def export_filename(stem: str, fmt: str, compression: str) -> str:
+    return f"{stem}.{FORMATS[fmt][1]}{COMPRESSIONS[compression][1]}"
@@ -0,0 +1,231 @@
+import asyncio
+import bisect
+import logging
+import re
+import threading
+import time
+from datetime import date, datetime
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from app.db import session as db_session
+from app.models.holdings import Filer, Filing
+
+logger = logging.getLogger(__name__)
+
+THIRTEEN_F_FORMS = ['13F-HR', '13F-HR/A']
+
+_NON_ALNUM = re.compile(r'[^A-Z0-9 ]+')
+
+
+def normalize_name(text: Optional[str]) -> str:
+    """名称归一化：大写、去掉标点、合并空白"""
+    if not text:
+        return ''
+    return ' '.join(_NON_ALNUM.sub(' ', text.upper().replace('&', ' AND ')).split())
+
+
+def trigrams(text: str) -> List[str]:
+    padded = f'  {text} '
+    return list({padded[i:i + 3] for i in range(len(padded) - 2)})
+
+
+class FilerIndex:
+    """
+    13F申报机构名称的搜索索引
+
+    前缀索引为排序后的 (词, 条目号) 列表，用二分查找定位；多个查询词要求全部命中。
+    前缀无结果时使用三元组倒排索引做模糊匹配。索引构建后只读，可被并发查询。
+    """
+
+    def __init__(self, entries: List[Dict]):
+        # 默认按AUM降序排列，条目号越小排名越靠前
+        self.entries = sorted(entries, key=lambda e: -(e.get('aum') or 0))
+        self._names = [normalize_name(e.get('name')) for e in self.entries]
+
+        tokens: List[Tuple[str, int]] = []
+        postings: Dict[str, List[int]] = {}
+        for i, entry in enumerate(self.entries):
+            text = ' '.join(filter(None, [self._names[i], normalize_name(entry.get('manager'))]))
+            for token in set(text.split()):
+                tokens.append((token, i))
+            for gram in trigrams(text):
+                postings.setdefault(gram, []).append(i)
+        tokens.sort()
+        self._token_keys = [t for t, _ in tokens]
+        self._token_ids = np.array([i for _, i in tokens], dtype=np.int32)
+        self._trigrams = {g: np.array(ids, dtype=np.int32) for g, ids in postings.items()}
+        self._ciks = [e['cik'] for e in self.entries]
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def _prefix_ids(self, prefix: str) -> np.ndarray:
+        lo = bisect.bisect_left(self._token_keys, prefix)
+        hi = bisect.bisect_left(self._token_keys, prefix + '\uffff')
+        return np.unique(self._token_ids[lo:hi])
+
+    def _fuzzy_ids(self, query: str, min_similarity: float) -> np.ndarray:
+        grams = trigrams(query)
+        lists = [self._trigrams[g] for g in grams if g in self._trigrams]
+        if not lists:
+            return np.array([], dtype=np.int32)
+        counts = np.bincount(np.concatenate(lists), minlength=len(self.entries))
+        score = counts / len(grams)
+        ids = np.nonzero(score >= min_similarity)[0]
+        return ids[np.argsort(-score[ids], kind='stable')]
+
+    def search(self, query: str = '', offset: int = 0, limit: int = 20,
+               min_similarity: float = 0.4) -> Tuple[int, List[Dict]]:
+        """
+        搜索申报机构，返回 (匹配总数, 当前页条目)
+
+        空查询按AUM降序返回全部；纯数字查询按CIK前缀匹配。
+        """
+        query = (query or '').strip()
+        if not query:
+            ids = np.arange(len(self.entries))
+        elif query.isdigit():
+            digits = query.lstrip('0')
+            ids = np.array([i for i, cik in enumerate(self._ciks) if cik.lstrip('0').startswith(digits)],
+                           dtype=np.int64)
+        else:
+            words = normalize_name(query).split()
+            ids = None
+            for word in words:
+                matched = self._prefix_ids(word)
+                ids = matched if ids is None else np.intersect1d(ids, matched, assume_unique=True)
+                if len(ids) == 0:
+                    break
+            if ids is None or len(ids) == 0:
+                ids = self._fuzzy_ids(normalize_name(query), min_similarity)
+            else:
+                # 名称以查询开头的排在前面，其余保持AUM顺序
+                head = normalize_name(query)
+                starts = np.array([self._names[i].startswith(head) for i in ids], dtype=bool)
+                ids = np.concatenate([ids[starts], ids[~starts]])
+
+        total = int(len(ids))
+        page = ids[offset:offset + limit]
+        return total, [self.entries[i] for i in page]
+
+
+class FilerDirectory:
+    """
+    13F申报机构目录
+
+    本地数据库中的filers表为数据源，后台定期从EDGAR季度索引刷新申报机构名单，
+    并用各机构最新入库文件的持仓总市值作为AUM。
+    """
+
+    def __init__(self):
+        self._index = FilerIndex([])
+        self._lock = threading.Lock()
+        self.refreshed_at: Optional[datetime] = None
+
+    @property
+    def index(self) -> FilerIndex:
+        return self._index
+
+    def search(self, query: str = '', page: int = 1, page_size: int = 20) -> Dict:
+        page = max(page, 1)
+        page_size = min(max(page_size, 1), 100)
+        total, entries = self._index.search(query, offset=(page - 1) * page_size, limit=page_size)
+        return {'total': total, 'page': page, 'page_size': page_size, 'funds': entries}
+
+    def load(self, db: Session) -> int:
+        """从数据库加载目录并重建搜索索引，返回条目数"""
+        # 每个机构最新报告期、最新提交文件的持仓总市值
+        ranked = (
+            select(
+                Filing.cik,
+                Filing.total_value,
+                func.row_number().over(
+                    partition_by=Filing.cik,
+                    order_by=(Filing.period_of_report.desc(), Filing.filed_at.desc()),
+                ).label('rn'),
+            ).subquery()
+        )
+        latest = select(ranked.c.cik, ranked.c.total_value).where(ranked.c.rn == 1).subquery()
+        rows = db.execute(
+            select(Filer.cik, Filer.name, Filer.manager, latest.c.total_value)
+            .outerjoin(latest, latest.c.cik == Filer.cik)
+        ).all()
+
+        entries = [
+            {'id': int(cik), 'cik': cik, 'name': name or '', 'manager': manager, 'aum': total_value}
+            for cik, name, manager, total_value in rows
+        ]
+        index = FilerIndex(entries)
+        with self._lock:
+            self._index = index
+        logger.info(f"Filer directory loaded with {len(entries)} filers")
+        return len(entries)
+
+    def refresh_from_edgar(self, edgar_service, db: Session, quarters: int = 2,
+                           today: Optional[date] = None) -> int:
+        """从最近几个季度的form.idx更新13F申报机构名单，返回新增或更新的机构数"""
+        from app.crud import holdings as holdings_crud
+
+        today = today or date.today()
+        year, quarter = today.year, (today.month - 1) // 3 + 1
+        filers: Dict[str, str] = {}
+        for _ in range(quarters):
+            try:
+                entries = edgar_service.get_form_index(year, quarter, THIRTEEN_F_FORMS)
+            except Exception as e:
+                # 当前季度索引可能尚未生成
+                logger.warning(f"Could not load form index {year} Q{quarter}: {e}")
+                entries = []
+            for entry in entries:
+                filers.setdefault(entry['cik'], entry['company'])
+            year, quarter = (year, quarter - 1) if quarter > 1 else (year - 1, 4)
+
+        holdings_crud.upsert_filers(db, filers)
+        db.commit()
+        self.refreshed_at = datetime.utcnow()
+        logger.info(f"Refreshed {len(filers)} 13F filers from EDGAR")
+        return len(filers)
+
+    def reload(self) -> int:
+        db = db_session.SessionLocal()
+        try:
+            return self.load(db)
+        finally:
+            db.close()
+
+    def refresh(self, edgar_service, quarters: int = 2) -> int:
+        db = db_session.SessionLocal()
+        try:
+            self.refresh_from_edgar(edgar_service, db, quarters=quarters)
+            return self.load(db)
+        finally:
+            db.close()
+
+    async def run_background_refresh(self, service_provider: Callable, interval_hours: float,
+                                     quarters: int = 2) -> None:
+        """
+        启动时先从本地加载，随后按间隔在线程池中从EDGAR刷新
+
+        service_provider 在线程池中调用以获取EDGAR服务，服务模块的导入不占用启动路径。
+        """
+        loop = asyncio.get_running_loop()
+        try:
+            await loop.run_in_executor(None, self.reload)
+        except Exception as e:
+            logger.error(f"Failed to load filer directory: {e}", exc_info=True)
+
+        while True:
+            started = time.monotonic()
+            try:
+                await loop.run_in_executor(None, lambda: self.refresh(service_provider(), quarters))
+            except Exception as e:
+                logger.error(f"Filer directory refresh failed: {e}", exc_info=True)
+            elapsed = time.monotonic() - started
+            await asyncio.sleep(max(interval_hours * 3600 - elapsed, 60))
+
+
+filer_directory = FilerDirectory()
@@ -0,0 +1,164 @@
+import asyncio
+import logging
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterable, List, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(eq=False)
+class Subscription:
+    """单个客户端的订阅：关注的CIK集合和待推送事件队列"""
+    ciks: Set[str]
+    include_delta: bool = False
+    queue: asyncio.Queue = field(default_factory=lambda: asyncio.Queue(maxsize=100))
+
+    def push(self, event: Dict) -> None:
+        # 客户端消费过慢时丢弃最旧的事件，避免阻塞其他订阅者
+        if self.queue.full():
+            try:
+                self.queue.get_nowait()
+            except asyncio.QueueEmpty:
+                pass
+        self.queue.put_nowait(event)
+
+
+class FilingWatcher:
+    """
+    新13F文件监听器
+
+    所有订阅共享一个轮询循环：每轮对被关注的每个CIK只请求一次submissions，
+    发现新的accession编号后生成一次事件（可附带增减仓摘要）并分发给全部订阅者。
+    N个客户端关注M个基金时每轮只产生M次上游请求。
+    """
+
+    def __init__(self, interval: float = 300.0, concurrency: int = 4):
+        self.interval = interval
+        self.concurrency = concurrency
+        self.edgar_service = None
+        self._service_provider: Optional[Callable] = None
+        self._subscriptions: Dict[str, Set[Subscription]] = {}
+        self._known: Dict[str, Set[str]] = {}
+        self._task: Optional[asyncio.Task] = None
+        self.checks = 0
+
+    @property
+    def watched_ciks(self) -> List[str]:
+        return sorted(cik for cik, subs in self._subscriptions.items() if subs)
+
+    def subscribe(self, ciks: Iterable[str], include_delta: bool = False) -> Subscription:
+        subscription = Subscription(ciks=set(ciks), include_delta=include_delta)
+        for cik in subscription.ciks:
+            self._subscriptions.setdefault(cik, set()).add(subscription)
+        logger.info(f"New filing subscription for {sorted(subscription.ciks)}")
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        for cik in subscription.ciks:
+            subs = self._subscriptions.get(cik)
+            if subs is None:
+                continue
+            subs.discard(subscription)
+            if not subs:
+                # 无人关注的CIK不再轮询，下次重新订阅时重新建立基线
+                del self._subscriptions[cik]
+                self._known.pop(cik, None)
+
+    def start(self, service_provider: Callable) -> None:
+        """启动轮询循环；EDGAR服务在首次需要检查时才通过 service_provider 获取"""
+        self._service_provider = service_provider
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.check_once()
+            except Exception as e:
+                logger.error(f"Filing watcher check failed: {e}", exc_info=True)
+            await asyncio.sleep(self.interval)
+
+    async def check_once(self) -> int:
+        """检查所有被关注的CIK一次，返回发出的事件数"""
+        ciks = self.watched_ciks
+        if not ciks:
+            return 0
+
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def check(cik: str) -> int:
+            async with semaphore:
+                return await self._check_cik(cik)
+
+        results = await asyncio.gather(*(check(cik) for cik in ciks), return_exceptions=True)
+        emitted = 0
+        for cik, result in zip(ciks, results):
+            if isinstance(result, Exception):
+                logger.warning(f"Failed to check filings for {cik}: {result}")
+            else:
+                emitted += result
+        return emitted
+
+    async def _check_cik(self, cik: str) -> int:
+        loop = asyncio.get_running_loop()
+        if self.edgar_service is None:
+            self.edgar_service = self._service_provider()
+        filings = await loop.run_in_executor(None, self.edgar_service.get_13f_filings, cik)
+        self.checks += 1
+
+        accessions = {f['accessionNumber'] for f in filings}
+        known = self._known.get(cik)
+        self._known[cik] = accessions
+        if known is None:
+            # 首次检查只建立基线
+            return 0
+
+        new_filings = sorted((f for f in filings if f['accessionNumber'] not in known), key=lambda f: f['date'])
+        if new_filings:
+            # 接口缓存的文件列表已过时，下次请求直接取最新数据
+            self.edgar_service.invalidate_filings(cik)
+        emitted = 0
+        for filing in new_filings:
+            subscribers = list(self._subscriptions.get(cik, ()))
+            if not subscribers:
+                break
+            event = {'type': 'filing', 'cik': cik, 'filing': filing}
+            delta_event = event
+            if any(s.include_delta for s in subscribers):
+                # 增减仓摘要每个新文件只计算一次
+                try:
+                    delta = await loop.run_in_executor(None, self._build_delta, cik, filing, filings)
+                    delta_event = dict(event, delta=delta)
+                except Exception as e:
+                    logger.warning(f"Could not compute holdings delta for {filing['accessionNumber']}: {e}")
+            for subscription in subscribers:
+                subscription.push(delta_event if subscription.include_delta else event)
+            emitted += 1
+            logger.info(f"New 13F filing {filing['accessionNumber']} for {cik} sent to {len(subscribers)} subscribers")
+        return emitted
+
+    def _build_delta(self, cik: str, filing: Dict, filings: List[Dict]) -> Dict:
+        """计算新文件相对上一报告期文件的增减仓摘要"""
+        from app.services.holdings_delta import compute_position_delta, summarize_delta
+
+        period = filing.get('reportDate') or filing['date']
+        earlier = [f for f in filings if (f.get('reportDate') or f['date']) < period]
+        previous = max(earlier, key=lambda f: ((f.get('reportDate') or f['date']), f['date']), default=None)
+
+        current_df = self.edgar_service.load_filing_holdings(cik, filing)
+        previous_df = self.edgar_service.load_filing_holdings(cik, previous) if previous else None
+        summary = summarize_delta(compute_position_delta(previous_df, current_df))
+        summary['previousAccessionNumber'] = previous['accessionNumber'] if previous else None
+        return summary
+
+
+filing_watcher = FilingWatcher()
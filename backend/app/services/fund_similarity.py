@@ -0,0 +1,373 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+from datetime import date, datetime
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.crud import holdings as holdings_crud
+from app.models.holdings import Holding
+
+logger = logging.getLogger(__name__)
+
+# 置换哈希 (a*x + b) mod p，x为32位CUSIP哈希；a、b < 2^31 保证乘加不溢出uint64
+_PRIME = np.uint64((1 << 61) - 1)
+_MASK = np.uint64(0xFFFFFFFF)
+_SEED = 20240214
+# 把一个band内的签名合成64位桶键的奇数乘子
+_MIX = np.uint64(0x9E3779B97F4A7C15)
+
+SORT_BY = ('holdings', 'weights')
+
+
+class MinHasher:
+    """
+    CUSIP集合的MinHash签名与持仓权重的量化草图
+
+    签名两两相同的比例估计Jaccard相似度（持有证券的重合度）；
+    草图是组合权重的带符号特征哈希，单位化后量化为int8，内积估计权重向量的余弦相似度。
+    """
+
+    def __init__(self, num_perm: int = 128, sketch_dim: int = 256, seed: int = _SEED):
+        self.num_perm = num_perm
+        self.sketch_dim = sketch_dim
+        rng = np.random.default_rng(seed)
+        self._a = rng.integers(1, 1 << 31, size=num_perm, dtype=np.uint64)
+        self._b = rng.integers(0, 1 << 31, size=num_perm, dtype=np.uint64)
+        self._cache: Dict[str, Tuple[int, int, float]] = {}
+
+    def _hash(self, cusips: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """CUSIP -> (32位哈希, 草图桶号, 符号)"""
+        tokens = np.empty(len(cusips), dtype=np.uint64)
+        buckets = np.empty(len(cusips), dtype=np.int64)
+        signs = np.empty(len(cusips))
+        for i, cusip in enumerate(cusips):
+            cached = self._cache.get(cusip)
+            if cached is None:
+                digest = hashlib.md5(cusip.encode('utf-8')).digest()
+                h = int.from_bytes(digest[4:12], 'little')
+                cached = (int.from_bytes(digest[:4], 'little'), h % self.sketch_dim, 1.0 if (h >> 40) & 1 else -1.0)
+                self._cache[cusip] = cached
+            tokens[i], buckets[i], signs[i] = cached
+        return tokens, buckets, signs
+
+    def sketch(self, positions: pd.DataFrame, chunk: int = 20000) -> Dict[str, np.ndarray]:
+        """
+        positions: 按cik排序的 (cik, cusip, value)，每个基金的CUSIP已去重
+        返回每个基金的 signature (n, num_perm)、sketch (n, sketch_dim) int8、scale、size
+        """
+        ciks, starts, sizes = np.unique(positions['cik'].to_numpy(dtype=object), return_index=True,
+                                        return_counts=True)
+        tokens, buckets, signs = self._hash(positions['cusip'].to_numpy(dtype=object))
+
+        signatures = np.empty((len(ciks), self.num_perm), dtype=np.uint32)
+        # 按基金分块：每块内一次算出全部置换哈希，再按基金取最小值
+        first = 0
+        while first < len(ciks):
+            last = first + 1
+            while last < len(ciks) and starts[last] + sizes[last] - starts[first] <= chunk:
+                last += 1
+            lo, hi = starts[first], starts[last - 1] + sizes[last - 1]
+            permuted = (tokens[lo:hi, None] * self._a[None, :] + self._b[None, :]) % _PRIME
+            signatures[first:last] = np.minimum.reduceat(permuted & _MASK, starts[first:last] - lo, axis=0)
+            first = last
+
+        rows = np.repeat(np.arange(len(ciks)), sizes)
+        values = np.clip(pd.to_numeric(positions['value'], errors='coerce').fillna(0.0).to_numpy(np.float64), 0, None)
+        dense = np.zeros((len(ciks), self.sketch_dim))
+        np.add.at(dense, (rows, buckets), signs * values)
+        norms = np.linalg.norm(dense, axis=1)
+        dense /= np.where(norms > 0, norms, 1.0)[:, None]
+        peak = np.abs(dense).max(axis=1)
+        scale = np.where(peak > 0, peak / 127.0, 1.0)
+        sketch = np.round(dense / scale[:, None]).astype(np.int8)
+        return {'cik': ciks, 'signature': signatures, 'sketch': sketch,
+                'scale': scale.astype(np.float32), 'size': sizes.astype(np.uint32)}
+
+
+def positions_frame(holdings: pd.DataFrame, cik: Optional[str] = None) -> pd.DataFrame:
+    """
+    解析结果（cusip、value、putCall）或holdings表（cik、cusip、value、put_call）-> 按cik排序的 (cik, cusip, value)
+
+    期权行不计入持仓，同一证券的多行合并。
+    """
+    frame = holdings
+    put_call = 'putCall' if 'putCall' in frame.columns else 'put_call'
+    if put_call in frame.columns:
+        frame = frame[frame[put_call].fillna('').astype(str).str.strip() == '']
+    frame = pd.DataFrame({
+        'cik': frame['cik'].astype(str).to_numpy() if cik is None else cik,
+        'cusip': frame['cusip'].astype(str).to_numpy(),
+        'value': pd.to_numeric(frame['value'], errors='coerce').fillna(0.0).to_numpy(np.float64),
+    })
+    return frame.groupby(['cik', 'cusip'], sort=True, as_index=False)['value'].sum()
+
+
+class _PeriodIndex:
+    """一个报告期的签名矩阵及每个band按桶键排序的行号"""
+
+    def __init__(self, records: np.ndarray, bands: int):
+        self.bands = bands
+        self._set(records)
+
+    def _set(self, records: np.ndarray) -> None:
+        # 同一基金的多条记录以最后写入的为准
+        ciks = records['cik']
+        _, last = np.unique(ciks[::-1], return_index=True)
+        records = records[np.sort(len(records) - 1 - last)]
+        self.records = records
+        self.ciks = records['cik'].astype(str)
+        self.rows = {cik: i for i, cik in enumerate(self.ciks)}
+        self.band_keys = band_keys(records['signature'], self.bands)
+        self._order = np.argsort(self.band_keys, axis=0, kind='stable')
+        self._sorted = np.take_along_axis(self.band_keys, self._order, axis=0)
+
+    def extend(self, records: np.ndarray) -> None:
+        self._set(np.concatenate([self.records, records]))
+
+    def candidates(self, row: int) -> np.ndarray:
+        """任一band桶键相同的行"""
+        query = self.band_keys[row]
+        found = []
+        for band in range(self.bands):
+            keys = self._sorted[:, band]
+            lo, hi = np.searchsorted(keys, query[band], side='left'), np.searchsorted(keys, query[band], side='right')
+            found.append(self._order[lo:hi, band])
+        found = np.unique(np.concatenate(found))
+        return found[found != row]
+
+
+def band_keys(signatures: np.ndarray, bands: int) -> np.ndarray:
+    """签名分成bands段，每段合成一个64位桶键"""
+    n, num_perm = signatures.shape
+    rows = num_perm // bands
+    blocks = signatures[:, :bands * rows].reshape(n, bands, rows).astype(np.uint64)
+    keys = np.zeros((n, bands), dtype=np.uint64)
+    for j in range(rows):
+        keys = (keys ^ blocks[:, :, j]) * _MIX
+    return keys
+
+
+class FundSimilarityIndex:
+    """
+    基于MinHash/LSH的相似基金索引
+
+    每个 (基金, 报告期) 保存CUSIP集合的MinHash签名和权重草图。签名分成若干band，
+    任一band完全相同的基金成为候选，只对候选计算相似度，查询在毫秒级完成。
+    每个报告期一个只追加的记录文件（data/similarity/{period}.bin）：入库钩子在事务提交后追加该基金的记录，
+    同一基金以最后一条为准；查询前检查文件大小，读入其他进程追加的记录，rebuild整体重写文件。
+    """
+
+    META_FILE = 'meta.json'
+
+    def __init__(self, directory: Optional[str] = None, num_perm: Optional[int] = None,
+                 bands: Optional[int] = None, sketch_dim: Optional[int] = None):
+        self.directory = directory or settings.SIMILARITY_INDEX_DIR
+        self.num_perm = num_perm or settings.SIMILARITY_NUM_PERM
+        self.bands = bands or settings.SIMILARITY_BANDS
+        self.sketch_dim = sketch_dim or settings.SIMILARITY_SKETCH_DIM
+        if self.num_perm % self.bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        self.hasher = MinHasher(self.num_perm, self.sketch_dim)
+        self.dtype = np.dtype([
+            ('cik', 'S10'), ('accession', 'S24'), ('signature', '<u4', (self.num_perm,)),
+            ('sketch', 'i1', (self.sketch_dim,)), ('scale', '<f4'), ('size', '<u4'),
+        ])
+        # 报告期 -> (文件inode, 已读入的字节数, 索引)
+        self._periods: Dict[date, Tuple[int, int, _PeriodIndex]] = {}
+        self._lock = threading.Lock()
+        self._checked_meta = False
+
+    def _path(self, period: date) -> str:
+        return os.path.join(self.directory, f"{period.isoformat()}.bin")
+
+    def _check_meta(self) -> None:
+        """签名参数写入meta.json；参数变化后旧文件无法解读，需要rebuild"""
+        if self._checked_meta:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        meta = {'num_perm': self.num_perm, 'sketch_dim': self.sketch_dim, 'seed': _SEED}
+        path = os.path.join(self.directory, self.META_FILE)
+        if os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                stored = json.load(f)
+            if stored != meta:
+                raise ValueError(f"Similarity index at {self.directory} was built with {stored}; rebuild it")
+        else:
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(meta, f)
+        self._checked_meta = True
+
+    def records(self, positions: pd.DataFrame, accessions: Dict[str, str]) -> np.ndarray:
+        sketches = self.hasher.sketch(positions)
+        records = np.zeros(len(sketches['cik']), dtype=self.dtype)
+        records['cik'] = sketches['cik'].astype('S10')
+        records['accession'] = [accessions[c].encode('ascii') for c in sketches['cik']]
+        for field in ('signature', 'sketch', 'scale', 'size'):
+            records[field] = sketches[field]
+        return records
+
+    def append(self, period: date, records: np.ndarray) -> None:
+        """追加记录；上次写入中断留下的半条记录先截掉"""
+        self._check_meta()
+        with open(self._path(period), 'ab') as f:
+            torn = f.tell() % self.dtype.itemsize
+            if torn:
+                logger.warning(f"Truncating {torn} bytes of a partial record in {self._path(period)}")
+                f.truncate(f.tell() - torn)
+                f.seek(0, os.SEEK_END)
+            f.write(records.tobytes())
+            f.flush()
+
+    def add_filing(self, cik: str, period: date, accession_number: str, holdings: pd.DataFrame) -> None:
+        positions = positions_frame(holdings, cik=cik)
+        if positions.empty:
+            logger.info(f"Filing {accession_number} has no stock positions, not indexed for similarity")
+            return
+        self.append(period, self.records(positions, {cik: accession_number}))
+
+    def rebuild(self, db: Session, period: date) -> Dict:
+        """用入库数据重建一个报告期（每个基金取构成本期完整持仓的文件，见latest_filings_in_period）"""
+        self._check_meta()
+        latest = holdings_crud.latest_filings_in_period(period)
+        rows = db.execute(
+            select(Holding.cik, Holding.cusip, Holding.value, Holding.put_call)
+            .join(latest, latest.c.accession_number == Holding.accession_number)
+        ).all()
+        frame = pd.DataFrame(rows, columns=['cik', 'cusip', 'value', 'put_call'])
+        accessions = dict(db.execute(
+            select(latest.c.cik, latest.c.accession_number).where(latest.c.is_latest.is_(True))
+        ).all())
+        positions = positions_frame(frame)
+        records = self.records(positions, accessions) if not positions.empty else np.zeros(0, dtype=self.dtype)
+
+        path = self._path(period)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(records.tobytes())
+        os.replace(tmp_path, path)
+        with self._lock:
+            self._periods.pop(period, None)
+        logger.info(f"Rebuilt similarity index for {period}: {len(records)} funds")
+        return {'period': str(period), 'funds': int(len(records))}
+
+    def _read(self, path: str, offset: int) -> Tuple[np.ndarray, int]:
+        with open(path, 'rb') as f:
+            f.seek(offset)
+            data = f.read()
+        usable = len(data) - len(data) % self.dtype.itemsize
+        return np.frombuffer(data[:usable], dtype=self.dtype), offset + usable
+
+    def _index(self, period: date) -> Optional[_PeriodIndex]:
+        """返回报告期的索引，先读入文件新增的记录；文件被重写（inode变化或变短）时整体重新加载"""
+        path = self._path(period)
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return None
+        with self._lock:
+            cached = self._periods.get(period)
+            if cached is not None and cached[0] == stat.st_ino and cached[1] <= stat.st_size:
+                inode, offset, index = cached
+                if stat.st_size - offset >= self.dtype.itemsize:
+                    records, offset = self._read(path, offset)
+                    index.extend(records)
+                    self._periods[period] = (inode, offset, index)
+                return index
+            self._check_meta()
+            records, offset = self._read(path, 0)
+            if not len(records):
+                return None
+            index = _PeriodIndex(records, self.bands)
+            self._periods[period] = (stat.st_ino, offset, index)
+            return index
+
+    def periods(self) -> List[date]:
+        if not os.path.isdir(self.directory):
+            return []
+        names = [name[:-4] for name in os.listdir(self.directory) if name.endswith('.bin')]
+        return sorted((datetime.strptime(name, '%Y-%m-%d').date() for name in names), reverse=True)
+
+    def similar(self, cik: str, period: Optional[date] = None, k: int = 10, by: str = 'holdings') -> Optional[Dict]:
+        """
+        与基金最相似的k个基金
+
+        by=holdings 按CUSIP集合的Jaccard估计排序，weights 按权重草图的余弦相似度排序；
+        候选来自LSH，共享证券很少的基金不会出现。基金在该期（默认其最近的报告期）未被索引时返回None。
+        """
+        if by not in SORT_BY:
+            raise ValueError(f"by must be one of {', '.join(SORT_BY)}")
+        if k <= 0:
+            raise ValueError("k must be positive")
+        for candidate_period in ([period] if period else self.periods()):
+            index = self._index(candidate_period)
+            if index is not None and cik in index.rows:
+                period = candidate_period
+                break
+        else:
+            return None
+
+        row = index.rows[cik]
+        records = index.records
+        found = index.candidates(row)
+        jaccard = (records['signature'][found] == records['signature'][row]).mean(axis=1)
+        cosine = (records['sketch'][found].astype(np.int32) @ records['sketch'][row].astype(np.int32)
+                  ) * records['scale'][found] * records['scale'][row]
+        primary, secondary = (jaccard, cosine) if by == 'holdings' else (cosine, jaccard)
+        order = np.lexsort((-secondary, -primary))[:k]
+        return {'cik': cik, 'period': str(period), 'by': by, 'candidates': int(len(found)), 'funds': [{
+            'cik': index.ciks[found[i]],
+            'accessionNumber': records['accession'][found[i]].decode('ascii'),
+            'jaccard': round(float(jaccard[i]), 4),
+            'weightSimilarity': round(float(cosine[i]), 4),
+            'positions': int(records['size'][found[i]]),
+        } for i in order]}
+
+
+fund_similarity = FundSimilarityIndex()
+
+
+def _flush_pending(session: Session) -> None:
+    pending = session.info.pop('similarity_pending', [])
+    for cik, period, accession_number, holdings in pending:
+        try:
+            fund_similarity.add_filing(cik, period, accession_number, holdings)
+        except Exception as e:
+            logger.error(f"Failed to index {accession_number} for similarity: {e}", exc_info=True)
+
+
+def _discard_pending(session: Session, previous_transaction=None) -> None:
+    session.info.pop('similarity_pending', None)
+
+
+def index_similarity(db: Session, context) -> None:
+    """
+    入库钩子：事务提交后把该文件追加到相似度索引
+
+    只有该基金本期最新提交的文件才会写入（迟到的旧版本不覆盖修正文件）；新增持仓修正文件
+    写入的是与所修正文件合并后的持仓。事务回滚时丢弃。
+    """
+    if context.period_of_report is None:
+        return
+    filings = holdings_crud.get_period_filings(db, context.cik, context.period_of_report)
+    if filings and filings[-1].accession_number != context.accession_number:
+        return
+    holdings = context.holdings
+    if len(filings) > 1:
+        holdings = pd.DataFrame(db.execute(
+            select(Holding.cusip, Holding.value, Holding.put_call)
+            .where(Holding.accession_number.in_([f.accession_number for f in filings]))
+        ).all(), columns=['cusip', 'value', 'put_call'])
+    if not event.contains(db, 'after_commit', _flush_pending):
+        event.listen(db, 'after_commit', _flush_pending)
+        event.listen(db, 'after_soft_rollback', _discard_pending)
+    db.info.setdefault('similarity_pending', []).append(
+        (context.cik, context.period_of_report, context.accession_number, holdings)
+    )
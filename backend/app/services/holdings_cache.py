@@ -0,0 +1,176 @@
+import json
+import logging
+import struct
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from app.core.config import Settings, settings
+from app.core.shared_cache import FileCacheBackend, RedisCacheBackend, SharedCacheBackend
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'HFACOL01'
+_HEADER_LEN = struct.Struct('<I')
+_ALIGN = 8
+
+
+def _pad(size: int) -> int:
+    return (-size) % _ALIGN
+
+
+def encode_frame(df: pd.DataFrame) -> bytes:
+    """
+    将DataFrame序列化为按列存储的二进制格式
+
+    数值、布尔和日期列按原始内存布局存储，读取时可直接映射为numpy数组；
+    字符串列按字典编码（唯一值 + int32编码，-1表示缺失）。索引不保存。
+    其他类型的列会抛出TypeError。
+    """
+    columns: List[Dict] = []
+    blocks: List[bytes] = []
+    offset = 0
+
+    def add_block(data: bytes) -> int:
+        nonlocal offset
+        start = offset
+        blocks.append(data)
+        padding = _pad(len(data))
+        if padding:
+            blocks.append(b'\0' * padding)
+        offset += len(data) + padding
+        return start
+
+    for name in df.columns:
+        series = df[name]
+        values = series.to_numpy()
+        if values.dtype.kind in 'biufMm':
+            values = np.ascontiguousarray(values)
+            columns.append({'name': str(name), 'kind': 'array', 'dtype': values.dtype.str,
+                            'offset': add_block(values.tobytes())})
+            continue
+
+        codes, uniques = pd.factorize(series, use_na_sentinel=True)
+        if not all(isinstance(u, str) for u in uniques):
+            raise TypeError(f"Column {name!r} of dtype {series.dtype} cannot be cached")
+        encoded = [u.encode('utf-8') for u in uniques]
+        lengths = np.fromiter((len(b) for b in encoded), dtype=np.int64, count=len(encoded))
+        offsets = np.concatenate([[0], np.cumsum(lengths)]).astype(np.int64)
+        columns.append({
+            'name': str(name),
+            'kind': 'dict',
+            'size': len(encoded),
+            'codes': add_block(codes.astype(np.int32).tobytes()),
+            'offsets': add_block(offsets.tobytes()),
+            'data': add_block(b''.join(encoded)),
+            'data_bytes': int(offsets[-1]),
+        })
+
+    header = json.dumps({'rows': len(df), 'columns': columns}).encode('utf-8')
+    prefix = MAGIC + _HEADER_LEN.pack(len(header)) + header
+    prefix += b'\0' * _pad(len(prefix))
+    return prefix + b''.join(blocks)
+
+
+def decode_frame(buffer) -> pd.DataFrame:
+    """
+    从encode_frame的输出重建DataFrame
+
+    buffer为内存映射时数值列是其上的只读视图，不复制数据；
+    字符串列按字典解码为object列，缺失值为None。
+    """
+    view = memoryview(buffer)
+    if bytes(view[:len(MAGIC)]) != MAGIC:
+        raise ValueError("Not a cached holdings frame")
+    (header_len,) = _HEADER_LEN.unpack_from(view, len(MAGIC))
+    header_start = len(MAGIC) + _HEADER_LEN.size
+    header = json.loads(bytes(view[header_start:header_start + header_len]))
+    base = header_start + header_len
+    base += _pad(base)
+    rows = header['rows']
+
+    data = {}
+    for column in header['columns']:
+        if column['kind'] == 'array':
+            data[column['name']] = np.frombuffer(view, dtype=np.dtype(column['dtype']), count=rows,
+                                                 offset=base + column['offset'])
+            continue
+        size = column['size']
+        codes = np.frombuffer(view, dtype=np.int32, count=rows, offset=base + column['codes'])
+        offsets = np.frombuffer(view, dtype=np.int64, count=size + 1, offset=base + column['offsets'])
+        raw = bytes(view[base + column['data']:base + column['data'] + column['data_bytes']])
+        uniques = np.empty(size + 1, dtype=object)
+        uniques[:size] = [raw[offsets[i]:offsets[i + 1]].decode('utf-8') for i in range(size)]
+        # 编码-1取到末尾的None
+        data[column['name']] = uniques[codes]
+    return pd.DataFrame(data, copy=False)
+
+
+class HoldingsCache:
+    """
+    按accession编号缓存解析后的持仓
+
+    accession编号一经发布内容不变（修正文件使用新编号），条目无需失效。
+    未命中时在跨进程锁内再检查一次，保证多个worker同时请求时只有一个解析并写入。
+    """
+
+    def __init__(self, backend: SharedCacheBackend, lock_timeout: float = 60.0):
+        self.backend = backend
+        self.lock_timeout = lock_timeout
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, accession_number: str) -> Optional[pd.DataFrame]:
+        try:
+            buffer = self.backend.get(accession_number)
+            if buffer is None:
+                return None
+            return decode_frame(buffer)
+        except Exception as e:
+            logger.warning(f"Failed to read cached holdings {accession_number}: {e}")
+            return None
+
+    def set(self, accession_number: str, df: pd.DataFrame) -> bool:
+        try:
+            self.backend.set(accession_number, encode_frame(df))
+            return True
+        except Exception as e:
+            logger.warning(f"Failed to cache holdings {accession_number}: {e}")
+            return False
+
+    def get_or_load(self, accession_number: str, loader: Callable[[], pd.DataFrame]) -> pd.DataFrame:
+        df = self.get(accession_number)
+        if df is not None:
+            self.hits += 1
+            return df
+
+        with self.backend.lock(accession_number, timeout=self.lock_timeout) as locked:
+            if locked:
+                # 等锁期间其他worker可能已经写入
+                df = self.get(accession_number)
+                if df is not None:
+                    self.hits += 1
+                    return df
+            else:
+                logger.warning(f"Timed out waiting for cache lock on {accession_number}, loading directly")
+            self.misses += 1
+            df = loader()
+            self.set(accession_number, df)
+            return df
+
+
+def build_holdings_cache(config: Settings = settings) -> Optional[HoldingsCache]:
+    """根据配置创建持仓缓存，HOLDINGS_CACHE_BACKEND为none时返回None"""
+    backend_name = (config.HOLDINGS_CACHE_BACKEND or 'none').lower()
+    if backend_name == 'none':
+        return None
+    if backend_name == 'file':
+        max_bytes = config.HOLDINGS_CACHE_MAX_MB * 1024 * 1024 if config.HOLDINGS_CACHE_MAX_MB else None
+        backend = FileCacheBackend(config.HOLDINGS_CACHE_DIR, max_bytes=max_bytes)
+    elif backend_name == 'redis':
+        backend = RedisCacheBackend(config.HOLDINGS_CACHE_REDIS_URL, ttl=config.HOLDINGS_CACHE_TTL_SECONDS or None)
+    else:
+        raise ValueError(f"Unknown holdings cache backend: {config.HOLDINGS_CACHE_BACKEND}")
+    logger.info(f"Using {backend_name} holdings cache")
+    return HoldingsCache(backend)
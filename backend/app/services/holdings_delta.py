@@ -0,0 +1,78 @@
+from typing import Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+DELTA_COLUMNS = [
+    'cusip', 'nameOfIssuer', 'prevShares', 'shares', 'sharesChange', 'sharesChangePct',
+    'prevValue', 'value', 'valueChange', 'status',
+]
+
+
+def _positions(df: Optional[pd.DataFrame]) -> pd.DataFrame:
+    """按CUSIP汇总持仓（同一证券可能因期权类型或其他管理人拆成多行）"""
+    if df is None or df.empty:
+        return pd.DataFrame(columns=['nameOfIssuer', 'shares', 'value'],
+                            index=pd.Index([], name='cusip')).astype({'shares': float, 'value': float})
+    frame = df[['cusip', 'shares', 'value']].copy()
+    frame['nameOfIssuer'] = df['nameOfIssuer'] if 'nameOfIssuer' in df.columns else ''
+    return frame.groupby('cusip', sort=False).agg(
+        nameOfIssuer=('nameOfIssuer', 'first'), shares=('shares', 'sum'), value=('value', 'sum')
+    )
+
+
+def compute_position_delta(previous: Optional[pd.DataFrame], current: Optional[pd.DataFrame]) -> pd.DataFrame:
+    """
+    计算两期持仓之间按CUSIP的仓位变化
+
+    status取值：new（新建仓）、closed（清仓）、increased、decreased、unchanged。
+    上一期没有持仓时sharesChangePct为NaN。
+    """
+    prev = _positions(previous)
+    cur = _positions(current)
+
+    merged = cur.join(prev, how='outer', lsuffix='', rsuffix='_prev')
+    merged['nameOfIssuer'] = merged['nameOfIssuer'].fillna(merged['nameOfIssuer_prev'])
+
+    shares = merged['shares'].fillna(0.0).to_numpy(dtype=np.float64)
+    prev_shares = merged['shares_prev'].fillna(0.0).to_numpy(dtype=np.float64)
+    value = merged['value'].fillna(0.0).to_numpy(dtype=np.float64)
+    prev_value = merged['value_prev'].fillna(0.0).to_numpy(dtype=np.float64)
+    change = shares - prev_shares
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        change_pct = np.where(prev_shares > 0, change / prev_shares * 100, np.nan)
+
+    status = np.select(
+        [prev_shares <= 0, shares <= 0, change > 0, change < 0],
+        ['new', 'closed', 'increased', 'decreased'],
+        default='unchanged',
+    )
+
+    delta = pd.DataFrame({
+        'cusip': merged.index.to_numpy(),
+        'nameOfIssuer': merged['nameOfIssuer'].to_numpy(),
+        'prevShares': prev_shares,
+        'shares': shares,
+        'sharesChange': change,
+        'sharesChangePct': np.round(change_pct, 2),
+        'prevValue': prev_value,
+        'value': value,
+        'valueChange': value - prev_value,
+        'status': status,
+    })
+    return delta[DELTA_COLUMNS].sort_values('valueChange', key=np.abs, ascending=False, ignore_index=True)
+
+
+def summarize_delta(delta: pd.DataFrame, top: int = 20) -> Dict:
+    """生成适合推送的增减仓摘要"""
+    counts = delta['status'].value_counts()
+    changed = delta[delta['status'] != 'unchanged'].head(top)
+    return {
+        'newPositions': int(counts.get('new', 0)),
+        'closedPositions': int(counts.get('closed', 0)),
+        'increased': int(counts.get('increased', 0)),
+        'decreased': int(counts.get('decreased', 0)),
+        'netValueChange': float(delta['valueChange'].sum()),
+        'topChanges': changed.replace({np.nan: None}).to_dict('records'),
+    }
@@ -0,0 +1,186 @@
+import logging
+from datetime import date
+from typing import Dict, Optional, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# 2023年1月3日起提交的13F按美元申报value，此前以千美元为单位
+VALUE_IN_DOLLARS_FROM = date(2023, 1, 3)
+
+# 校验标记（按位组合，写入validationFlags列）
+INVALID_CUSIP = 1
+MISSING_VALUE = 2
+NEGATIVE_VALUE = 4
+NEGATIVE_SHARES = 8
+FRACTIONAL_SHARES = 16
+ZERO_SHARES = 32
+PRICE_OUTLIER = 64
+
+FLAG_NAMES = {
+    INVALID_CUSIP: 'invalidCusip',
+    MISSING_VALUE: 'missingValue',
+    NEGATIVE_VALUE: 'negativeValue',
+    NEGATIVE_SHARES: 'negativeShares',
+    FRACTIONAL_SHARES: 'fractionalShares',
+    ZERO_SHARES: 'zeroShares',
+    PRICE_OUTLIER: 'priceOutlier',
+}
+
+# 每股隐含价格（美元）超出该范围多半是单位申报错误
+MIN_PRICE = 1e-3
+MAX_PRICE = 1e6
+
+NUMERIC_COLUMNS = ['value', 'shares', 'sole_voting', 'shared_voting', 'no_voting']
+
+# CUSIP字符取值：0-9为数字本身，A-Z为10-35，*、@、#为36-38；其他字符为-1
+_CHAR_VALUES = np.full(256, -1, dtype=np.int16)
+_CHAR_VALUES[ord('0'):ord('9') + 1] = np.arange(10)
+_CHAR_VALUES[ord('A'):ord('Z') + 1] = np.arange(10, 36)
+_CHAR_VALUES[[ord('*'), ord('@'), ord('#')]] = [36, 37, 38]
+
+
+def _cusip_codes(cusips) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    去空格、转大写后的CUSIP及其字符码点矩阵
+
+    在numpy定长unicode数组上按码点运算，避免pandas字符串方法逐个元素调用Python函数；
+    只有首尾带空白的少数行才逐个strip。返回 (文本数组, (n, 宽度) 的uint32码点矩阵)。
+    """
+    raw = pd.Series(cusips, dtype=object).fillna('').to_numpy(dtype=object)
+    text = raw.astype(str)
+    if text.dtype.itemsize == 0:
+        return text, np.zeros((len(text), 1), dtype=np.uint32)
+    codes = text.view(np.uint32).reshape(len(text), -1)
+    lengths = np.count_nonzero(codes, axis=1)
+    last = codes[np.arange(len(codes)), np.maximum(lengths - 1, 0)]
+    padded = (lengths > 0) & ((codes[:, 0] <= 32) | (last <= 32))
+    if padded.any():
+        text[padded] = np.char.strip(text[padded])
+    codes = text.view(np.uint32).reshape(len(text), -1).copy()
+    lower = (codes >= ord('a')) & (codes <= ord('z'))
+    codes[lower] -= 32
+    return codes.view(text.dtype).ravel(), codes
+
+
+def cusip_check_digits(cusips: Union[pd.Series, list]) -> np.ndarray:
+    """
+    批量计算CUSIP校验位（前8位的“双倍相加”算法）
+
+    返回与输入等长的int数组，长度不是9或含非法字符的CUSIP为-1。
+    """
+    _, codes = _cusip_codes(cusips)
+    return _check_digits(codes)
+
+
+def _check_digits(codes: np.ndarray) -> np.ndarray:
+    result = np.full(len(codes), -1, dtype=np.int16)
+    if codes.shape[1] < 9:
+        return result
+    is_nine = np.count_nonzero(codes, axis=1) == 9
+    values = _CHAR_VALUES[np.minimum(codes[is_nine, :8], 255)]
+    legal = (values >= 0).all(axis=1)
+    # 第2、4、6、8位乘2，各位数字之和
+    values = values * np.array([1, 2, 1, 2, 1, 2, 1, 2], dtype=np.int16)
+    total = (values // 10 + values % 10).sum(axis=1)
+    check = (10 - total % 10) % 10
+    result[is_nine] = np.where(legal, check, -1)
+    return result
+
+
+def _valid(codes: np.ndarray) -> np.ndarray:
+    expected = _check_digits(codes)
+    if codes.shape[1] < 9:
+        return np.zeros(len(codes), dtype=bool)
+    actual = codes[:, 8].astype(np.int64) - ord('0')
+    return (expected >= 0) & (expected == actual)
+
+
+def valid_cusips(cusips: Union[pd.Series, list]) -> np.ndarray:
+    """CUSIP格式和校验位是否正确（bool数组）"""
+    _, codes = _cusip_codes(cusips)
+    return _valid(codes)
+
+
+def value_multiplier(filing_dates: pd.Series) -> np.ndarray:
+    """按提交日期返回value换算为美元的倍数：2023-01-03之前为1000，之后为1；日期未知时为1"""
+    # 一个文件只有一个提交日期，先去重再解析
+    codes, uniques = pd.factorize(pd.Series(filing_dates), use_na_sentinel=True)
+    dates = pd.to_datetime(pd.Series(uniques, dtype=object), errors='coerce')
+    before = np.append((dates < pd.Timestamp(VALUE_IN_DOLLARS_FROM)).to_numpy(), False)
+    return np.where(before[codes], 1000.0, 1.0)
+
+
+def normalize_holdings(df: pd.DataFrame, filing_date: Optional[Union[str, date]] = None) -> pd.DataFrame:
+    """
+    持仓的批量校验与单位统一（列式运算，不逐行处理）
+
+    - CUSIP去空格转大写并检查校验位
+    - value、shares、投票权转换为数值；value按提交日期统一为美元
+      （filing_date为空时使用filingDate列，两者都没有时保持申报值）
+    - shares必须为非负整数：负数和缺失置0，小数四舍五入，均记录标记
+    - 计算averagePrice（美元/股）和percentOfPortfolio，隐含价格异常的行标记为PRICE_OUTLIER
+    结果附加validationFlags列（按位组合的校验标记，0表示无异常）。
+    """
+    if df is None or df.empty:
+        return df
+    df = df.copy()
+    flags = np.zeros(len(df), dtype=np.int64)
+
+    cusips, codes = _cusip_codes(df['cusip'])
+    df['cusip'] = cusips.astype(object)
+    flags |= np.where(_valid(codes), 0, INVALID_CUSIP)
+
+    for column in NUMERIC_COLUMNS:
+        if column in df.columns:
+            df[column] = pd.to_numeric(df[column], errors='coerce')
+
+    value = df['value'].to_numpy(dtype=np.float64)
+    flags |= np.where(np.isnan(value), MISSING_VALUE, 0)
+    flags |= np.where(value < 0, NEGATIVE_VALUE, 0)
+    if filing_date is not None:
+        multiplier = value_multiplier(pd.Series([filing_date]))[0]
+    elif 'filingDate' in df.columns:
+        multiplier = value_multiplier(df['filingDate'])
+    else:
+        multiplier = 1.0
+    value = np.nan_to_num(value, nan=0.0) * multiplier
+    df['value'] = value
+
+    shares = df['shares'].to_numpy(dtype=np.float64)
+    negative = shares < 0
+    missing = np.isnan(shares)
+    rounded = np.rint(np.nan_to_num(shares, nan=0.0))
+    flags |= np.where(negative, NEGATIVE_SHARES, 0)
+    flags |= np.where(~missing & (np.abs(shares - rounded) > 1e-6), FRACTIONAL_SHARES, 0)
+    shares = np.where(negative | missing, 0, rounded).astype(np.int64)
+    flags |= np.where(shares == 0, ZERO_SHARES, 0)
+    df['shares'] = shares
+
+    for column in ('sole_voting', 'shared_voting', 'no_voting'):
+        if column in df.columns:
+            df[column] = df[column].fillna(0).astype(np.int64)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        price = np.where(shares > 0, value / shares, np.nan)
+    outlier = (shares > 0) & (value > 0) & ((price < MIN_PRICE) | (price > MAX_PRICE))
+    flags |= np.where(outlier, PRICE_OUTLIER, 0)
+    df['averagePrice'] = np.round(price, 2)
+    total = value.sum()
+    df['percentOfPortfolio'] = np.round(value / total * 100, 2) if total > 0 else 0.0
+    df['validationFlags'] = flags
+
+    flagged = int(np.count_nonzero(flags))
+    if flagged:
+        logger.info(f"Holdings validation flagged {flagged} of {len(df)} rows: {summarize_flags(flags)}")
+    return df
+
+
+def summarize_flags(flags: Union[np.ndarray, pd.Series]) -> Dict[str, int]:
+    """各校验标记出现的行数（只包含出现过的标记）"""
+    flags = np.asarray(flags, dtype=np.int64)
+    counts = {name: int(np.count_nonzero(flags & bit)) for bit, name in FLAG_NAMES.items()}
+    return {name: count for name, count in counts.items() if count}
+
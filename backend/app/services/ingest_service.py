@@ -0,0 +1,105 @@
+import logging
+from dataclasses import dataclass
+from datetime import date
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import pandas as pd
+from sqlalchemy.orm import Session
+
+from app.crud import holdings as holdings_crud
+from app.services.alerts import evaluate_alerts
+from app.services.fund_similarity import index_similarity
+from app.services.leaderboards import update_leaderboards
+from app.services.point_in_time import forget_filing
+from app.services.sector_rollup import materialize_sector_weights
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class IngestContext:
+    """传给入库钩子的文件信息及其解析后的持仓"""
+    cik: str
+    filing: Dict
+    holdings: pd.DataFrame
+    accession_number: str
+    period_of_report: Optional[date]
+
+
+IngestHook = Callable[[Session, IngestContext], None]
+
+
+class IngestService:
+    """
+    13F文件入库
+
+    持仓写入后依次执行注册的钩子（物化汇总表等），钩子与持仓写入在同一事务中，
+    任一步骤失败时整个文件回滚，汇总表不会与持仓不一致。
+    """
+
+    def __init__(self):
+        self._hooks: List[Tuple[str, IngestHook]] = []
+
+    @property
+    def hooks(self) -> List[str]:
+        return [name for name, _ in self._hooks]
+
+    def register_hook(self, hook: IngestHook, name: Optional[str] = None) -> None:
+        self._hooks.append((name or hook.__name__, hook))
+
+    def ingest_filing(self, db: Session, cik: str, filing: Dict, holdings_df: pd.DataFrame,
+                      filer_name: Optional[str] = None) -> int:
+        """写入一个文件的持仓并执行入库钩子，返回写入的持仓条数"""
+        try:
+            count = holdings_crud.load_filing(db, filing, holdings_df, cik, filer_name=filer_name, commit=False)
+            context = IngestContext(
+                cik=cik,
+                filing=filing,
+                holdings=holdings_df,
+                accession_number=filing['accessionNumber'],
+                period_of_report=holdings_crud.to_date(filing.get('reportDate')),
+            )
+            for name, hook in self._hooks:
+                hook(db, context)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        return count
+
+    def ingest_fund(self, edgar_service, db: Session, cik: str, year: Optional[int] = None,
+                    progress: Optional[Callable[[int, int, str, int], None]] = None,
+                    skip: Iterable[str] = ()) -> Dict:
+        """
+        获取基金（指定年份或全部）的13F文件并按提交顺序入库
+
+        每个文件单独提交事务；progress(已完成文件数, 文件总数, accession编号, 该文件持仓条数) 在每个文件入库后调用，
+        skip中的文件视为已入库（后台任务从断点继续时使用）。修正文件入库前读取其修正类型。
+        """
+        cik = edgar_service.validate_cik(cik)
+        filings = sorted(edgar_service.get_13f_filings(cik, year), key=lambda f: (f['date'], f['accessionNumber']))
+        skip = set(skip)
+        accessions = []
+        total = 0
+        for filing in filings:
+            count = 0
+            if filing['accessionNumber'] not in skip:
+                if filing.get('isAmended') and 'amendmentType' not in filing:
+                    filing = {**filing, 'amendmentType': edgar_service.get_amendment_type(filing)}
+                holdings_df = edgar_service.load_filing_holdings(cik, filing)
+                count = self.ingest_filing(db, cik, filing, holdings_df)
+                total += count
+            accessions.append(filing['accessionNumber'])
+            if progress is not None:
+                progress(len(accessions), len(filings), filing['accessionNumber'], count)
+        logger.info(f"Ingested {len(accessions)} filings ({total} holdings) for {cik}")
+        return {'cik': cik, 'filings': accessions, 'holdings': total}
+
+
+ingest_service = IngestService()
+ingest_service.register_hook(materialize_sector_weights, name='sector_rollup')
+ingest_service.register_hook(update_leaderboards, name='leaderboards')
+# 提醒使用排行榜钩子写入的持仓变化
+ingest_service.register_hook(evaluate_alerts, name='alerts')
+ingest_service.register_hook(forget_filing, name='point_in_time')
+ingest_service.register_hook(index_similarity, name='similarity')
@@ -0,0 +1,468 @@
+import json
+import logging
+import os
+import shutil
+import socket
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+from sqlalchemy import func, select, update
+
+from app.models.jobs import Job
+
+logger = logging.getLogger(__name__)
+
+QUEUED = 'queued'
+RUNNING = 'running'
+SUCCEEDED = 'succeeded'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+FINISHED = (SUCCEEDED, FAILED, CANCELLED)
+
+
+class JobCancelled(Exception):
+    """任务在执行中被取消（由 JobContext.progress 抛出）"""
+
+
+class QueueFullError(Exception):
+    """用户排队中的任务数已达上限"""
+
+
+@dataclass
+class JobHandler:
+    run: Callable[['JobContext'], Any]
+    # 提交时校验并规范化参数，参数非法时抛出ValueError
+    validate: Optional[Callable[[Dict], Dict]] = None
+
+
+@dataclass
+class JobContext:
+    """
+    传给任务处理函数的执行上下文
+
+    - params: 任务参数
+    - checkpoint: 上次执行保存的断点（首次执行为None），处理函数据此跳过已完成的部分
+    - work_dir: 任务的临时目录，保存中间结果；任务结束后删除，进程重启后保留
+    """
+    job_id: str
+    params: Dict
+    checkpoint: Optional[Dict]
+    work_dir: Path
+    _queue: 'JobQueue' = field(repr=False)
+    _last_report: float = field(default=0.0, repr=False)
+
+    def progress(self, fraction: float, message: Optional[str] = None, force: bool = False) -> None:
+        """报告进度（0-1）；写库按时间节流。任务已被取消时抛出JobCancelled"""
+        now = time.monotonic()
+        if not force and now - self._last_report < self._queue.progress_interval:
+            return
+        self._last_report = now
+        if self._queue._report(self.job_id, min(max(fraction, 0.0), 1.0), message):
+            raise JobCancelled(self.job_id)
+
+    def save_checkpoint(self, state: Dict) -> None:
+        """保存断点状态（可JSON序列化），立即写库"""
+        self.checkpoint = state
+        self._queue._save_checkpoint(self.job_id, state)
+
+
+class JobQueue:
+    """
+    持久化的后台任务队列
+
+    任务记录保存在数据库中，结果以JSON文件写入结果目录。调度线程按优先级（高者先）
+    和提交时间从数据库领取任务，交给有界线程池执行，并限制每个用户同时运行的任务数；
+    领取通过条件UPDATE完成，多个进程共享同一数据库时同一任务只会被一个进程执行。
+    执行中的任务定期写心跳，进程退出或崩溃后心跳过期的任务重新排队，
+    处理函数通过断点从中断处继续；超过最大尝试次数的任务标记为失败。
+    """
+
+    def __init__(self, session_factory: Optional[Callable] = None, results_dir: str = './data/jobs',
+                 max_workers: int = 2, max_running_per_user: int = 1, max_queued_per_user: int = 20,
+                 max_attempts: int = 3, heartbeat_seconds: float = 10.0, stale_seconds: float = 60.0,
+                 poll_seconds: float = 2.0, progress_interval: float = 0.5, retention_hours: float = 7 * 24):
+        self._session_factory = session_factory
+        self.results_dir = Path(results_dir)
+        self.max_workers = max_workers
+        self.max_running_per_user = max_running_per_user
+        self.max_queued_per_user = max_queued_per_user
+        self.max_attempts = max_attempts
+        self.heartbeat_seconds = heartbeat_seconds
+        self.stale_seconds = stale_seconds
+        self.poll_seconds = poll_seconds
+        self.progress_interval = progress_interval
+        self.retention_hours = retention_hours
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._handlers: Dict[str, JobHandler] = {}
+        self._running: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    def configure(self, config) -> None:
+        """按配置调整队列参数（在start之前调用）"""
+        self.results_dir = Path(config.JOB_RESULTS_DIR)
+        self.max_workers = config.JOB_WORKERS
+        self.max_running_per_user = config.JOB_MAX_RUNNING_PER_USER
+        self.max_queued_per_user = config.JOB_MAX_QUEUED_PER_USER
+        self.max_attempts = config.JOB_MAX_ATTEMPTS
+        self.heartbeat_seconds = config.JOB_HEARTBEAT_SECONDS
+        self.stale_seconds = config.JOB_STALE_SECONDS
+        self.retention_hours = config.JOB_RETENTION_HOURS
+
+    def _session(self):
+        if self._session_factory is None:
+            from app.db.session import SessionLocal
+
+            self._session_factory = SessionLocal
+        return self._session_factory()
+
+    # ---- 任务类型 ----
+
+    def register(self, kind: str, run: Callable[[JobContext], Any],
+                 validate: Optional[Callable[[Dict], Dict]] = None) -> None:
+        self._handlers[kind] = JobHandler(run=run, validate=validate)
+
+    @property
+    def kinds(self) -> List[str]:
+        return sorted(self._handlers)
+
+    # ---- 提交与查询 ----
+
+    def submit(self, kind: str, params: Optional[Dict], owner: str, priority: int = 0) -> Dict:
+        """提交任务并返回任务信息；任务类型未知或参数非法时抛出ValueError，排队已满时抛出QueueFullError"""
+        handler = self._handlers.get(kind)
+        if handler is None:
+            raise ValueError(f"Unknown job kind '{kind}', expected one of {', '.join(self.kinds)}")
+        params = dict(params or {})
+        if handler.validate is not None:
+            params = handler.validate(params)
+
+        db = self._session()
+        try:
+            queued = db.execute(
+                select(func.count()).select_from(Job).where(Job.owner == owner, Job.status == QUEUED)
+            ).scalar()
+            if queued >= self.max_queued_per_user:
+                raise QueueFullError(f"{owner} already has {queued} queued jobs")
+            job = Job(id=uuid.uuid4().hex, kind=kind, params=json.dumps(params), owner=owner,
+                      priority=int(priority), status=QUEUED, progress=0.0, attempts=0,
+                      cancel_requested=False, created_at=datetime.utcnow())
+            db.add(job)
+            db.commit()
+            info = self._to_dict(job)
+        finally:
+            db.close()
+        logger.info(f"Queued {kind} job {info['id']} for {owner} (priority {priority})")
+        self._wakeup.set()
+        return info
+
+    def get(self, job_id: str, owner: Optional[str] = None) -> Optional[Dict]:
+        """任务信息；指定owner时只返回该用户的任务"""
+        db = self._session()
+        try:
+            job = db.get(Job, job_id)
+            if job is None or (owner is not None and job.owner != owner):
+                return None
+            return self._to_dict(job)
+        finally:
+            db.close()
+
+    def list(self, owner: str, status: Optional[str] = None, limit: int = 50) -> List[Dict]:
+        db = self._session()
+        try:
+            stmt = select(Job).where(Job.owner == owner)
+            if status is not None:
+                stmt = stmt.where(Job.status == status)
+            jobs = db.execute(stmt.order_by(Job.created_at.desc()).limit(limit)).scalars().all()
+            return [self._to_dict(job) for job in jobs]
+        finally:
+            db.close()
+
+    def result_file(self, job_id: str, owner: Optional[str] = None) -> Optional[Path]:
+        """已完成任务的结果文件路径；任务不存在、未完成或结果已清理时返回None"""
+        info = self.get(job_id, owner)
+        if info is None or info['status'] != SUCCEEDED:
+            return None
+        path = self.results_dir / f"{job_id}.json"
+        return path if path.exists() else None
+
+    def cancel(self, job_id: str, owner: Optional[str] = None) -> Optional[Dict]:
+        """取消任务：排队中的任务立即取消，执行中的任务在下次报告进度时停止"""
+        db = self._session()
+        try:
+            job = db.get(Job, job_id)
+            if job is None or (owner is not None and job.owner != owner):
+                return None
+            now = datetime.utcnow()
+            db.execute(update(Job).where(Job.id == job_id, Job.status == QUEUED)
+                       .values(status=CANCELLED, finished_at=now))
+            db.execute(update(Job).where(Job.id == job_id, Job.status == RUNNING)
+                       .values(cancel_requested=True))
+            db.commit()
+            db.refresh(job)
+            return self._to_dict(job)
+        finally:
+            db.close()
+
+    @staticmethod
+    def _to_dict(job: Job) -> Dict:
+        return {
+            'id': job.id,
+            'kind': job.kind,
+            'params': json.loads(job.params or '{}'),
+            'owner': job.owner,
+            'priority': job.priority,
+            'status': job.status,
+            'progress': round(job.progress or 0.0, 4),
+            'message': job.message,
+            'error': job.error,
+            'attempts': job.attempts,
+            'cancelRequested': bool(job.cancel_requested),
+            'createdAt': job.created_at.isoformat() if job.created_at else None,
+            'startedAt': job.started_at.isoformat() if job.started_at else None,
+            'finishedAt': job.finished_at.isoformat() if job.finished_at else None,
+        }
+
+    # ---- 调度 ----
+
+    def start(self) -> None:
+        """恢复中断的任务并启动调度线程"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self.results_dir.mkdir(parents=True, exist_ok=True)
+        self._stopping.clear()
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='job-worker')
+        self._thread = threading.Thread(target=self._run, name='job-dispatcher', daemon=True)
+        self._thread.start()
+        logger.info(f"Job queue started with {self.max_workers} workers ({self.worker_id})")
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        """
+        停止调度；timeout内未完成的任务重新排队，下次启动时从断点继续
+
+        线程无法被强制结束，超时后仍在执行的处理函数会继续运行到进程退出，
+        其结果因任务已不属于本进程而被丢弃。
+        """
+        self._stopping.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            deadline = time.monotonic() + (timeout or 0)
+            while self._running and time.monotonic() < deadline:
+                time.sleep(0.05)
+            self._executor = None
+        with self._lock:
+            unfinished = list(self._running)
+        if unfinished:
+            db = self._session()
+            try:
+                db.execute(update(Job).where(Job.id.in_(unfinished), Job.worker_id == self.worker_id)
+                           .values(status=QUEUED, worker_id=None, heartbeat_at=None))
+                db.commit()
+            finally:
+                db.close()
+            logger.info(f"Requeued {len(unfinished)} unfinished jobs on shutdown")
+
+    def _run(self) -> None:
+        last_maintenance = 0.0
+        while not self._stopping.is_set():
+            try:
+                now = time.monotonic()
+                if now - last_maintenance >= self.heartbeat_seconds:
+                    self._heartbeat()
+                    self.recover()
+                    self.purge()
+                    last_maintenance = now
+                self.dispatch()
+            except Exception as e:
+                logger.error(f"Job dispatcher error: {e}", exc_info=True)
+            self._wakeup.wait(self.poll_seconds)
+            self._wakeup.clear()
+
+    def dispatch(self) -> int:
+        """按优先级领取可执行的任务并提交到线程池，返回本轮启动的任务数"""
+        with self._lock:
+            free = self.max_workers - len(self._running)
+        if free <= 0 or self._executor is None:
+            return 0
+
+        db = self._session()
+        started = 0
+        try:
+            running = dict(db.execute(
+                select(Job.owner, func.count()).where(Job.status == RUNNING).group_by(Job.owner)
+            ).all())
+            candidates = db.execute(
+                select(Job.id, Job.owner).where(Job.status == QUEUED)
+                .order_by(Job.priority.desc(), Job.created_at, Job.id).limit(free * 10 + 50)
+            ).all()
+            for job_id, owner in candidates:
+                if started >= free:
+                    break
+                if running.get(owner, 0) >= self.max_running_per_user:
+                    continue
+                now = datetime.utcnow()
+                claimed = db.execute(
+                    update(Job).where(Job.id == job_id, Job.status == QUEUED)
+                    .values(status=RUNNING, worker_id=self.worker_id, heartbeat_at=now,
+                            started_at=now, attempts=Job.attempts + 1, cancel_requested=False)
+                ).rowcount
+                db.commit()
+                if not claimed:
+                    continue
+                running[owner] = running.get(owner, 0) + 1
+                job = db.get(Job, job_id)
+                db.refresh(job)
+                context = JobContext(
+                    job_id=job_id,
+                    params=json.loads(job.params or '{}'),
+                    checkpoint=json.loads(job.checkpoint) if job.checkpoint else None,
+                    work_dir=self.results_dir / f"{job_id}.work",
+                    _queue=self,
+                )
+                with self._lock:
+                    self._running[job_id] = context
+                self._executor.submit(self._execute, job.kind, context)
+                started += 1
+        finally:
+            db.close()
+        return started
+
+    def _execute(self, kind: str, context: JobContext) -> None:
+        job_id = context.job_id
+        try:
+            handler = self._handlers.get(kind)
+            if handler is None:
+                raise ValueError(f"Unknown job kind '{kind}'")
+            context.work_dir.mkdir(parents=True, exist_ok=True)
+            logger.info(f"Running {kind} job {job_id}" + (" from checkpoint" if context.checkpoint else ""))
+            result = handler.run(context)
+            self._write_result(job_id, result)
+            self._finish(job_id, SUCCEEDED, progress=1.0, result_path=str(self.results_dir / f"{job_id}.json"))
+            logger.info(f"Job {job_id} succeeded")
+        except JobCancelled:
+            self._finish(job_id, CANCELLED)
+            logger.info(f"Job {job_id} cancelled")
+        except Exception as e:
+            detail = getattr(e, 'detail', None) or str(e) or type(e).__name__
+            logger.error(f"Job {job_id} failed: {detail}", exc_info=True)
+            self._finish(job_id, FAILED, error=str(detail)[:2000])
+        finally:
+            with self._lock:
+                self._running.pop(job_id, None)
+            self._wakeup.set()
+
+    def _write_result(self, job_id: str, result: Any) -> None:
+        # 先写临时文件再替换，读取方不会看到写了一半的结果
+        path = self.results_dir / f"{job_id}.json"
+        tmp = path.with_suffix('.json.tmp')
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(result, f, default=str)
+        os.replace(tmp, path)
+
+    def _finish(self, job_id: str, status: str, **values) -> None:
+        db = self._session()
+        try:
+            updated = db.execute(
+                update(Job).where(Job.id == job_id, Job.worker_id == self.worker_id, Job.status == RUNNING)
+                .values(status=status, finished_at=datetime.utcnow(), heartbeat_at=None, **values)
+            ).rowcount
+            db.commit()
+        finally:
+            db.close()
+        if updated:
+            shutil.rmtree(self.results_dir / f"{job_id}.work", ignore_errors=True)
+        else:
+            logger.warning(f"Job {job_id} is no longer owned by this worker, discarding its result")
+
+    def _report(self, job_id: str, fraction: float, message: Optional[str]) -> bool:
+        """写入进度和心跳，返回任务是否已被请求取消"""
+        db = self._session()
+        try:
+            values = {'progress': fraction, 'heartbeat_at': datetime.utcnow()}
+            if message is not None:
+                values['message'] = message
+            db.execute(update(Job).where(Job.id == job_id, Job.worker_id == self.worker_id).values(**values))
+            db.commit()
+            return bool(db.execute(select(Job.cancel_requested).where(Job.id == job_id)).scalar())
+        finally:
+            db.close()
+
+    def _save_checkpoint(self, job_id: str, state: Dict) -> None:
+        db = self._session()
+        try:
+            db.execute(update(Job).where(Job.id == job_id, Job.worker_id == self.worker_id)
+                       .values(checkpoint=json.dumps(state), heartbeat_at=datetime.utcnow()))
+            db.commit()
+        finally:
+            db.close()
+
+    def _heartbeat(self) -> None:
+        with self._lock:
+            running = list(self._running)
+        if not running:
+            return
+        db = self._session()
+        try:
+            db.execute(update(Job).where(Job.id.in_(running), Job.worker_id == self.worker_id)
+                       .values(heartbeat_at=datetime.utcnow()))
+            db.commit()
+        finally:
+            db.close()
+
+    def recover(self) -> int:
+        """重新排队心跳过期的running任务（执行进程已退出）；超过最大尝试次数的标记为失败"""
+        cutoff = datetime.utcnow() - timedelta(seconds=self.stale_seconds)
+        stale = (Job.status == RUNNING) & ((Job.heartbeat_at.is_(None)) | (Job.heartbeat_at < cutoff))
+        db = self._session()
+        try:
+            failed = db.execute(
+                update(Job).where(stale, Job.attempts >= self.max_attempts)
+                .values(status=FAILED, error='Interrupted too many times', finished_at=datetime.utcnow(),
+                        worker_id=None)
+            ).rowcount
+            requeued = db.execute(
+                update(Job).where(stale, Job.attempts < self.max_attempts)
+                .values(status=QUEUED, worker_id=None, heartbeat_at=None)
+            ).rowcount
+            db.commit()
+        finally:
+            db.close()
+        if requeued or failed:
+            logger.info(f"Recovered interrupted jobs: {requeued} requeued, {failed} failed")
+        return requeued
+
+    def purge(self) -> int:
+        """删除超过保留期的已结束任务及其结果文件"""
+        if not self.retention_hours:
+            return 0
+        cutoff = datetime.utcnow() - timedelta(hours=self.retention_hours)
+        db = self._session()
+        try:
+            ids = db.execute(
+                select(Job.id).where(Job.status.in_(FINISHED), Job.finished_at < cutoff)
+            ).scalars().all()
+            for job_id in ids:
+                (self.results_dir / f"{job_id}.json").unlink(missing_ok=True)
+                shutil.rmtree(self.results_dir / f"{job_id}.work", ignore_errors=True)
+            if ids:
+                db.query(Job).filter(Job.id.in_(ids)).delete(synchronize_session=False)
+                db.commit()
+        finally:
+            db.close()
+        return len(ids)
+
+
+job_queue = JobQueue()
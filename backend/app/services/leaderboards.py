@@ -0,0 +1,320 @@
+import logging
+import threading
+from datetime import date, datetime
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import delete, func, insert, or_, select
+from sqlalchemy.orm import Session
+
+from app.crud import holdings as holdings_crud
+from app.models.holdings import Filing, Holding
+from app.models.leaderboards import FundPositionChange, SecurityPeriodActivity
+
+logger = logging.getLogger(__name__)
+
+# 排行榜：名称 -> (排序列, 是否升序)；bought/sold按by参数选择金额或股数
+BOARDS = {
+    'bought': ('net_{by}', False),
+    'sold': ('net_{by}', True),
+    'new': ('new_positions', False),
+    'closed': ('closed_positions', False),
+    'crowded': ('holders', False),
+}
+BY = ('value', 'shares')
+
+ACTIVITY_COLUMNS = [
+    'holders', 'new_positions', 'closed_positions', 'shares_bought', 'shares_sold',
+    'value_bought', 'value_sold', 'total_shares', 'total_value',
+]
+
+_CHUNK = 500
+
+
+def position_changes(current: pd.DataFrame, previous: Optional[pd.DataFrame]) -> pd.DataFrame:
+    """
+    单个基金相对上一报告期的逐证券变化
+
+    current / previous：按cusip汇总的持仓（cusip、name_of_issuer、shares、value）；previous为None表示没有可比较的上一期。
+    买卖金额按股数变化乘以持仓价格估算（本期价格，清仓时用上期价格），不计入价格涨跌。
+    """
+    columns = ['cusip', 'name_of_issuer', 'shares', 'value', 'shares_change', 'value_change',
+               'is_new', 'is_closed', 'has_baseline']
+    current = current.set_index('cusip')
+    if previous is None:
+        frame = current.assign(shares_change=0.0, value_change=0.0, is_new=False, is_closed=False,
+                               has_baseline=False)
+        return frame.reset_index()[columns]
+
+    previous = previous.set_index('cusip')
+    index = current.index.union(previous.index)
+    shares = current['shares'].reindex(index, fill_value=0.0)
+    value = current['value'].reindex(index, fill_value=0.0)
+    prev_shares = previous['shares'].reindex(index, fill_value=0.0)
+    prev_value = previous['value'].reindex(index, fill_value=0.0)
+    names = current['name_of_issuer'].reindex(index).fillna(previous['name_of_issuer'].reindex(index))
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        price = np.where(shares > 0, value / shares, np.where(prev_shares > 0, prev_value / prev_shares, 0.0))
+    shares_change = shares - prev_shares
+    frame = pd.DataFrame({
+        'cusip': index,
+        'name_of_issuer': names.to_numpy(),
+        'shares': shares.to_numpy(),
+        'value': value.to_numpy(),
+        'shares_change': shares_change.to_numpy(),
+        'value_change': shares_change.to_numpy() * price,
+        'is_new': ((shares > 0) & (prev_shares <= 0)).to_numpy(),
+        'is_closed': ((shares <= 0) & (prev_shares > 0)).to_numpy(),
+        'has_baseline': True,
+    })
+    return frame[columns]
+
+
+def aggregate_changes(changes: pd.DataFrame) -> pd.DataFrame:
+    """把一个或多个基金的变化汇总为按cusip索引的排行榜指标"""
+    if changes.empty:
+        return pd.DataFrame(columns=ACTIVITY_COLUMNS, index=pd.Index([], name='cusip'), dtype=float)
+    baseline = changes['has_baseline'].astype(bool).to_numpy()
+    shares_change = np.where(baseline, changes['shares_change'].to_numpy(dtype=np.float64), 0.0)
+    value_change = np.where(baseline, changes['value_change'].to_numpy(dtype=np.float64), 0.0)
+    frame = pd.DataFrame({
+        'cusip': changes['cusip'].to_numpy(),
+        'holders': (changes['shares'].to_numpy(dtype=np.float64) > 0).astype(np.int64),
+        'new_positions': (changes['is_new'].astype(bool).to_numpy() & baseline).astype(np.int64),
+        'closed_positions': (changes['is_closed'].astype(bool).to_numpy() & baseline).astype(np.int64),
+        'shares_bought': np.clip(shares_change, 0, None),
+        'shares_sold': np.clip(-shares_change, 0, None),
+        'value_bought': np.clip(value_change, 0, None),
+        'value_sold': np.clip(-value_change, 0, None),
+        'total_shares': changes['shares'].to_numpy(dtype=np.float64),
+        'total_value': changes['value'].to_numpy(dtype=np.float64),
+    })
+    return frame.groupby('cusip', sort=False)[ACTIVITY_COLUMNS].sum()
+
+
+def _fund_period_holdings(db: Session, cik: str, period: date) -> Tuple[Optional[str], Optional[pd.DataFrame]]:
+    """
+    基金在报告期的股票持仓（按cusip汇总，不含期权），返回 (最新提交文件的accession编号, 持仓)
+
+    持仓由最新的原始或重述文件加上其后的新增持仓修正文件组成（见get_period_filings）。
+    """
+    filings = holdings_crud.get_period_filings(db, cik, period)
+    if not filings:
+        return None, None
+    rows = db.execute(
+        select(Holding.cusip, Holding.name_of_issuer, Holding.shares, Holding.value)
+        .where(Holding.accession_number.in_([f.accession_number for f in filings]),
+               or_(Holding.put_call.is_(None), Holding.put_call == ''))
+    ).all()
+    frame = pd.DataFrame(rows, columns=['cusip', 'name_of_issuer', 'shares', 'value'])
+    frame[['shares', 'value']] = frame[['shares', 'value']].astype(np.float64).fillna(0.0)
+    frame = frame.groupby('cusip', as_index=False, sort=False).agg(
+        name_of_issuer=('name_of_issuer', 'first'), shares=('shares', 'sum'), value=('value', 'sum')
+    )
+    return filings[-1].accession_number, frame
+
+
+def _adjacent_period(db: Session, cik: str, period: date, later: bool) -> Optional[date]:
+    column = Filing.period_of_report
+    stmt = select(func.min(column) if later else func.max(column)).where(
+        Filing.cik == cik, column > period if later else column < period
+    )
+    return db.execute(stmt).scalar()
+
+
+def _apply_activity_delta(db: Session, period: date, delta: pd.DataFrame, names: pd.Series) -> None:
+    """把指标增量合并进security_period_activity；不再有任何持有和变化的证券行被删除"""
+    if delta.empty:
+        return
+    cusips = list(delta.index)
+    existing = []
+    for start in range(0, len(cusips), _CHUNK):
+        chunk = cusips[start:start + _CHUNK]
+        existing.extend(db.execute(
+            select(SecurityPeriodActivity.__table__)
+            .where(SecurityPeriodActivity.period_of_report == period, SecurityPeriodActivity.cusip.in_(chunk))
+        ).mappings().all())
+        db.execute(delete(SecurityPeriodActivity.__table__).where(
+            SecurityPeriodActivity.period_of_report == period, SecurityPeriodActivity.cusip.in_(chunk)
+        ))
+
+    current = pd.DataFrame(existing, columns=['cusip', 'name_of_issuer'] + ACTIVITY_COLUMNS).set_index('cusip')
+    merged = current[ACTIVITY_COLUMNS].astype(np.float64).add(delta.astype(np.float64), fill_value=0.0)
+    # 浮点相减的残差按0处理
+    merged = merged.where(merged.abs() > 1e-6, 0.0)
+    merged = merged[(merged[['holders', 'new_positions', 'closed_positions']] > 0).any(axis=1)
+                    | (merged[['shares_bought', 'shares_sold']] > 0).any(axis=1)]
+    if merged.empty:
+        return
+
+    merged['name_of_issuer'] = names.reindex(merged.index).fillna(current['name_of_issuer'].reindex(merged.index))
+    for column in ('holders', 'new_positions', 'closed_positions'):
+        merged[column] = merged[column].round().astype(np.int64)
+    merged['period_of_report'] = period
+    merged['updated_at'] = datetime.utcnow()
+    records = merged.reset_index().replace({np.nan: None}).to_dict('records')
+    db.execute(insert(SecurityPeriodActivity.__table__), records)
+
+
+def refresh_fund_period(db: Session, cik: str, period: date) -> int:
+    """
+    重新计算基金在一个报告期的变化，并把与旧结果的差额合并进全市场汇总
+
+    只涉及该基金的持仓，复杂度与全市场基金数量无关。返回变化行数。
+    """
+    old = pd.DataFrame(db.execute(
+        select(FundPositionChange.__table__)
+        .where(FundPositionChange.period_of_report == period, FundPositionChange.cik == cik)
+    ).mappings().all())
+    db.execute(delete(FundPositionChange.__table__).where(
+        FundPositionChange.period_of_report == period, FundPositionChange.cik == cik
+    ))
+
+    accession_number, current = _fund_period_holdings(db, cik, period)
+    new = pd.DataFrame()
+    if current is not None:
+        previous_period = _adjacent_period(db, cik, period, later=False)
+        previous = _fund_period_holdings(db, cik, previous_period)[1] if previous_period else None
+        new = position_changes(current, previous)
+        new = new[(new['shares'] > 0) | new['is_closed']]
+
+    delta = aggregate_changes(new).astype(np.float64).sub(aggregate_changes(old).astype(np.float64), fill_value=0.0)
+    names = new.set_index('cusip')['name_of_issuer'] if not new.empty else pd.Series(dtype=object)
+    _apply_activity_delta(db, period, delta, names)
+
+    if not new.empty:
+        rows = new.assign(period_of_report=period, cik=cik, accession_number=accession_number)
+        db.execute(insert(FundPositionChange.__table__), rows.replace({np.nan: None}).to_dict('records'))
+    return len(new)
+
+
+def update_leaderboards(db: Session, context) -> None:
+    """
+    入库钩子：增量更新排行榜
+
+    新文件（或修正文件）改变基金在本报告期的持仓，也改变其下一报告期的比较基准，
+    因此两个报告期都按“减去旧贡献、加上新贡献”更新。
+    """
+    if context.period_of_report is None:
+        logger.warning(f"Filing {context.accession_number} has no report period, skipping leaderboards")
+        return
+    periods = [context.period_of_report]
+    next_period = _adjacent_period(db, context.cik, context.period_of_report, later=True)
+    if next_period is not None:
+        periods.append(next_period)
+    for period in periods:
+        count = refresh_fund_period(db, context.cik, period)
+        logger.info(f"Leaderboards updated with {count} position changes of {context.cik} for {period}")
+
+
+class LeaderboardStore:
+    """
+    排行榜的内存视图
+
+    每个报告期的汇总表整体读入内存并缓存各榜单的排序，请求只做一次版本查询
+    （该期最后更新时间和行数）；其他进程入库后版本变化，下次请求时重新加载。
+    """
+
+    def __init__(self):
+        self._frames: Dict[date, Tuple[tuple, pd.DataFrame]] = {}
+        self._rankings: Dict[tuple, np.ndarray] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _version(db: Session, period: date) -> tuple:
+        return tuple(db.execute(
+            select(func.max(SecurityPeriodActivity.updated_at), func.count())
+            .where(SecurityPeriodActivity.period_of_report == period)
+        ).one())
+
+    @staticmethod
+    def latest_period(db: Session) -> Optional[date]:
+        return db.execute(select(func.max(SecurityPeriodActivity.period_of_report))).scalar()
+
+    @staticmethod
+    def periods(db: Session) -> List[str]:
+        rows = db.execute(
+            select(SecurityPeriodActivity.period_of_report).distinct()
+            .order_by(SecurityPeriodActivity.period_of_report.desc())
+        ).scalars().all()
+        return [str(p) for p in rows]
+
+    def _frame(self, db: Session, period: date) -> pd.DataFrame:
+        version = self._version(db, period)
+        with self._lock:
+            cached = self._frames.get(period)
+            if cached is not None and cached[0] == version:
+                return cached[1]
+        frame = pd.DataFrame(db.execute(
+            select(SecurityPeriodActivity.__table__).where(SecurityPeriodActivity.period_of_report == period)
+        ).mappings().all())
+        if frame.empty:
+            frame = pd.DataFrame(columns=['cusip', 'name_of_issuer'] + ACTIVITY_COLUMNS)
+        frame = frame.reset_index(drop=True)
+        frame['net_value'] = frame['value_bought'] - frame['value_sold']
+        frame['net_shares'] = frame['shares_bought'] - frame['shares_sold']
+        with self._lock:
+            self._frames[period] = (version, frame)
+            for key in [k for k in self._rankings if k[0] == period]:
+                del self._rankings[key]
+        return frame
+
+    def invalidate(self, period: Optional[date] = None) -> None:
+        with self._lock:
+            if period is None:
+                self._frames.clear()
+                self._rankings.clear()
+            else:
+                self._frames.pop(period, None)
+                for key in [k for k in self._rankings if k[0] == period]:
+                    del self._rankings[key]
+
+    def top(self, db: Session, board: str, period: Optional[date] = None, by: str = 'value',
+            limit: int = 20) -> Optional[Dict]:
+        """返回一个榜单的前limit名；没有任何数据时返回None"""
+        if board not in BOARDS:
+            raise ValueError(f"board must be one of {', '.join(BOARDS)}")
+        if by not in BY:
+            raise ValueError(f"by must be one of {', '.join(BY)}")
+        if limit <= 0:
+            raise ValueError("limit must be positive")
+        period = period or self.latest_period(db)
+        if period is None:
+            return None
+
+        frame = self._frame(db, period)
+        column, ascending = BOARDS[board]
+        column = column.format(by=by)
+        key = (period, board, column)
+        with self._lock:
+            order = self._rankings.get(key)
+        if order is None:
+            values = frame[column].to_numpy(dtype=np.float64)
+            order = np.argsort(values if ascending else -values, kind='stable')
+            # 卖出榜只保留净卖出，其他榜单只保留正值
+            order = order[values[order] < 0] if board == 'sold' else order[values[order] > 0]
+            with self._lock:
+                self._rankings[key] = order
+
+        top = frame.iloc[order[:limit]]
+        items = [{
+            'cusip': row.cusip,
+            'nameOfIssuer': row.name_of_issuer,
+            'holders': int(row.holders),
+            'newPositions': int(row.new_positions),
+            'closedPositions': int(row.closed_positions),
+            'sharesBought': float(row.shares_bought),
+            'sharesSold': float(row.shares_sold),
+            'netShares': float(row.net_shares),
+            'valueBought': float(row.value_bought),
+            'valueSold': float(row.value_sold),
+            'netValue': float(row.net_value),
+            'totalShares': float(row.total_shares),
+            'totalValue': float(row.total_value),
+        } for row in top.itertuples(index=False)]
+        return {'period': str(period), 'board': board, 'by': by, 'items': items}
+
+
+leaderboard_store = LeaderboardStore()
@@ -0,0 +1,316 @@
+import logging
+import threading
+from collections import OrderedDict
+from datetime import date
+from typing import Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from app.crud import holdings as holdings_crud
+from app.models.holdings import Filing
+
+logger = logging.getLogger(__name__)
+
+# 日期按距1970-01-01的天数编码；17位可表示到2328年
+_DAY_BITS = 17
+_MAX_DAY = (1 << _DAY_BITS) - 1
+# 尚未被取代的文件的 superseded_at
+OPEN_END = np.int64(_MAX_DAY)
+
+
+def _to_days(values) -> np.ndarray:
+    """日期序列 -> 天数（int64）"""
+    days = pd.to_datetime(pd.Series(values), errors='raise').to_numpy(dtype='datetime64[D]').astype(np.int64)
+    if days.size and (days.min() < 0 or days.max() >= _MAX_DAY):
+        raise ValueError("dates must be between 1970-01-01 and 2328-12-31")
+    return days
+
+
+def _from_days(days: np.ndarray) -> np.ndarray:
+    return days.astype('datetime64[D]')
+
+
+class FilingIntervalIndex:
+    """
+    13F文件的时点（as-of）区间索引
+
+    每个文件在 [filed_at, superseded_at) 内是该基金该报告期公开版本的一部分，
+    superseded_at 为同一基金同一报告期下一个原始或重述文件的提交日期。新增持仓（NEW HOLDINGS）
+    修正文件只列出遗漏的持仓，不取代之前的文件：其生效后的版本是所修正文件与之后各新增持仓文件的合并。
+    某日D已知的持仓是 filed_at <= D 的文件中报告期最新的那一期在D时的有效版本：
+    报告期的持仓在提交日之前不可见，修正文件在其自身提交日之前也不可见，
+    迟交的旧报告期文件不会取代已公开的新报告期。
+
+    构建时把每个基金的“当前可见文件”展开为按提交日期排序的阶梯函数，
+    键为 (基金编号, 日期) 编码的int64，查询多个基金、多个日期只需一次 np.searchsorted。
+    """
+
+    def __init__(self, filings: pd.DataFrame):
+        """filings需包含 accession_number、cik、period_of_report、filed_at 列，amendment_type列可选"""
+        frame = filings.dropna(subset=['cik', 'period_of_report', 'filed_at'])
+        dropped = len(filings) - len(frame)
+        if dropped:
+            logger.warning(f"Skipped {dropped} filings without period or filing date")
+
+        ciks, fund = np.unique(frame['cik'].astype(str).to_numpy(), return_inverse=True)
+        self.ciks = ciks
+        self._fund_codes = {cik: i for i, cik in enumerate(ciks)}
+        period = _to_days(frame['period_of_report'])
+        filed = _to_days(frame['filed_at'])
+        accession = frame['accession_number'].astype(str).to_numpy()
+        if 'amendment_type' in frame.columns:
+            adds = frame['amendment_type'].map(holdings_crud.normalize_amendment_type).to_numpy() \
+                == holdings_crud.NEW_HOLDINGS
+        else:
+            adds = np.zeros(len(frame), dtype=bool)
+
+        # 区间表：按 (基金, 报告期, 提交日期, accession) 排序，同日提交以accession编号先后为准
+        order = np.lexsort((accession, filed, period, fund))
+        self.fund = fund[order].astype(np.int64)
+        self.period = period[order]
+        self.filed = filed[order]
+        self.accession = accession[order]
+        adds = adds[order]
+        rows = np.arange(len(order))
+        group_start = np.ones(len(order), dtype=bool)
+        group_start[1:] = (self.fund[1:] != self.fund[:-1]) | (self.period[1:] != self.period[:-1])
+        group = np.cumsum(group_start) - 1
+        # 只有原始或重述文件取代同一报告期之前的文件
+        replaces = np.flatnonzero(~adds)
+        following = np.searchsorted(replaces, rows, side='right')
+        nxt = replaces[np.minimum(following, max(len(replaces) - 1, 0))] if len(replaces) else rows
+        closes = (following < len(replaces)) & (group[nxt] == group)
+        self.superseded = np.where(closes, self.filed[nxt], OPEN_END).astype(np.int64)
+        # 每个文件生效后的版本由 base[i]..i 这些文件合并而成；报告期的第一个文件总是起点
+        starts = np.flatnonzero(~adds | group_start)
+        self.base = starts[np.searchsorted(starts, rows, side='right') - 1] if len(order) else rows
+        self._period_keys = (self.fund << (2 * _DAY_BITS)) | (self.period << _DAY_BITS) | self.filed
+
+        # 阶梯函数：按 (基金, 提交日期) 依次加入文件，可见的最新报告期取累计最大值，
+        # 该报告期截至当日的最新文件即为当前版本
+        if len(order):
+            events = np.lexsort((self.accession, self.filed, self.fund))
+            ev_fund = self.fund[events]
+            ev_filed = self.filed[events]
+            latest = pd.Series(self.period[events]).groupby(ev_fund).cummax().to_numpy(dtype=np.int64)
+            current = np.searchsorted(
+                self._period_keys, (ev_fund << (2 * _DAY_BITS)) | (latest << _DAY_BITS) | ev_filed, side='right'
+            ) - 1
+            # 同一基金同一天的多个事件只保留最后一个
+            last = np.ones(len(events), dtype=bool)
+            last[:-1] = (ev_fund[1:] != ev_fund[:-1]) | (ev_filed[1:] != ev_filed[:-1])
+            self._step_keys = (ev_fund[last] << _DAY_BITS) | ev_filed[last]
+            self._step_rows = current[last]
+        else:
+            self._step_keys = np.empty(0, dtype=np.int64)
+            self._step_rows = np.empty(0, dtype=np.int64)
+
+    def __len__(self) -> int:
+        return len(self.accession)
+
+    def _codes(self, ciks: Sequence[str]) -> np.ndarray:
+        """cik -> 基金编号；未入库的基金为-1"""
+        return np.fromiter((self._fund_codes.get(str(c), -1) for c in ciks), dtype=np.int64, count=len(ciks))
+
+    def lookup(self, ciks: Sequence[str], dates: Sequence, period=None) -> np.ndarray:
+        """
+        逐对查询 (ciks[i], dates[i]) 当日已知的文件，返回区间表行号数组，无可见文件时为-1
+
+        指定period时返回该报告期在当日的有效版本（修正文件按其提交日期生效）。
+        """
+        ciks = list(ciks)
+        day = _to_days(dates)
+        if len(ciks) != len(day):
+            raise ValueError("ciks and dates must have the same length")
+        return self._lookup(self._codes(ciks), day, period)
+
+    def _lookup(self, code: np.ndarray, day: np.ndarray, period=None) -> np.ndarray:
+        rows = np.full(len(code), -1, dtype=np.int64)
+        if not len(self):
+            return rows
+        known = code >= 0
+        safe = np.where(known, code, 0)
+
+        if period is None:
+            pos = np.searchsorted(self._step_keys, (safe << _DAY_BITS) | day, side='right') - 1
+            found = self._step_rows[np.maximum(pos, 0)]
+            valid = known & (pos >= 0) & (self.fund[found] == code)
+        else:
+            period_day = _to_days([period])[0]
+            keys = (safe << (2 * _DAY_BITS)) | (period_day << _DAY_BITS) | day
+            found = np.searchsorted(self._period_keys, keys, side='right') - 1
+            hit = np.maximum(found, 0)
+            valid = known & (found >= 0) & (self.fund[hit] == code) & (self.period[hit] == period_day)
+        rows[valid] = found[valid]
+        return rows
+
+    def resolve(self, ciks: Sequence[str], dates: Sequence, period=None) -> pd.DataFrame:
+        """
+        查询一组基金在一组日期（笛卡尔积）已知的文件
+
+        返回列：cik、as_of、accession_number、accession_numbers、period_of_report、filed_at、superseded_at；
+        accession_numbers为当日版本包含的全部文件（有新增持仓修正文件时不止一个）。
+        无可见文件时accession_number和accession_numbers为None、日期列为NaT。指定period时查询该报告期的有效版本。
+        一次调用即可覆盖日度回测的全部日期。
+        """
+        ciks = [str(c) for c in ciks]
+        day = _to_days(dates)
+        code = np.repeat(self._codes(ciks), len(day))
+        grid_days = np.tile(day, len(ciks))
+        rows = self._lookup(code, grid_days, period)
+        return self._frame(np.repeat(np.asarray(ciks, dtype=object), len(day)), grid_days, rows)
+
+    def _frame(self, ciks: np.ndarray, days: np.ndarray, rows: np.ndarray) -> pd.DataFrame:
+        found = rows >= 0
+        hit = np.where(found, rows, 0)
+        empty = np.full(len(rows), OPEN_END, dtype=np.int64)
+
+        def dates(values: np.ndarray, mask: np.ndarray) -> np.ndarray:
+            result = _from_days(values[hit] if len(self) else empty).astype('datetime64[ns]')
+            result[~mask] = np.datetime64('NaT')
+            return result
+
+        accession = np.full(len(rows), None, dtype=object)
+        components = np.full(len(rows), None, dtype=object)
+        if len(self):
+            accession[found] = self.accession[rows[found]]
+            for i in np.flatnonzero(found):
+                components[i] = tuple(self.accession[self.base[rows[i]]:rows[i] + 1])
+        superseded = self.superseded[hit] if len(self) else empty
+        return pd.DataFrame({
+            'cik': ciks,
+            'as_of': _from_days(days).astype('datetime64[ns]'),
+            'accession_number': accession,
+            'accession_numbers': components,
+            'period_of_report': dates(self.period, found),
+            'filed_at': dates(self.filed, found),
+            'superseded_at': dates(self.superseded, found & (superseded != OPEN_END)),
+        })
+
+    def intervals(self, cik: str) -> pd.DataFrame:
+        """基金全部文件的可见区间，按报告期和提交日期排序"""
+        code = self._fund_codes.get(str(cik), -1)
+        rows = np.flatnonzero(self.fund == code)
+        return self._frame(np.full(len(rows), str(cik), dtype=object), self.filed[rows], rows).drop(columns='as_of')
+
+
+class PointInTimeHoldings:
+    """
+    时点持仓查询
+
+    区间索引由filings表整体构建并缓存在内存中，每次查询只做一次版本查询
+    （文件数和最后提交日期）；其他进程入库后版本变化，下次查询时重建。
+    持仓按accession缓存：日度回测中相邻日期大多解析到同一批文件。
+    """
+
+    def __init__(self, max_cached_filings: int = 2048):
+        self._index: Optional[FilingIntervalIndex] = None
+        self._version: Optional[tuple] = None
+        self._holdings: 'OrderedDict[str, pd.DataFrame]' = OrderedDict()
+        self.max_cached_filings = max_cached_filings
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _current_version(db: Session) -> tuple:
+        return tuple(db.execute(
+            select(func.count(), func.max(Filing.filed_at), func.max(Filing.period_of_report))
+        ).one())
+
+    def index(self, db: Session) -> FilingIntervalIndex:
+        version = self._current_version(db)
+        with self._lock:
+            if self._index is not None and self._version == version:
+                return self._index
+        frame = pd.DataFrame(db.execute(
+            select(Filing.accession_number, Filing.cik, Filing.period_of_report, Filing.filed_at,
+                   Filing.amendment_type)
+        ).mappings().all(), columns=['accession_number', 'cik', 'period_of_report', 'filed_at', 'amendment_type'])
+        index = FilingIntervalIndex(frame)
+        logger.info(f"Built point-in-time index over {len(index)} filings of {len(index.ciks)} funds")
+        with self._lock:
+            if self._version != version:
+                # 文件可能被重新加载，持仓缓存一并失效
+                self._holdings.clear()
+            self._index, self._version = index, version
+        return index
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._index = None
+            self._version = None
+            self._holdings.clear()
+
+    def forget(self, accession_number: str) -> None:
+        with self._lock:
+            self._holdings.pop(accession_number, None)
+
+    def resolve(self, db: Session, ciks: Sequence[str], dates: Sequence) -> pd.DataFrame:
+        """见 FilingIntervalIndex.resolve"""
+        return self.index(db).resolve(ciks, dates)
+
+    def _read_holdings(self, db: Session, accession_numbers: Iterable[str]) -> Dict[str, pd.DataFrame]:
+        wanted = list(dict.fromkeys(accession_numbers))
+        with self._lock:
+            result = {a: self._holdings[a] for a in wanted if a in self._holdings}
+            for a in result:
+                self._holdings.move_to_end(a)
+        missing = [a for a in wanted if a not in result]
+        if missing:
+            frame = holdings_crud.read_holdings(db, missing)
+            groups = dict(tuple(frame.groupby('accession_number', sort=False)))
+            with self._lock:
+                for a in missing:
+                    holdings = groups.get(a, frame.iloc[0:0]).reset_index(drop=True)
+                    result[a] = holdings
+                    self._holdings[a] = holdings
+                while len(self._holdings) > self.max_cached_filings:
+                    self._holdings.popitem(last=False)
+        return result
+
+    def holdings_as_of(self, db: Session, ciks: Sequence[str], as_of: date,
+                       period: Optional[date] = None) -> Dict[str, Dict]:
+        """
+        多个基金在as_of日已知的持仓
+
+        返回 cik -> {filing: 文件及其可见区间, holdings: DataFrame}；当日尚无公开文件的基金filing为None。
+        有新增持仓修正文件时holdings为其与所修正文件的合并。
+        """
+        resolved = self.index(db).resolve(ciks, [as_of], period=period)
+        holdings = self._read_holdings(
+            db, [a for components in resolved['accession_numbers'].dropna() for a in components]
+        )
+
+        result = {}
+        for row in resolved.itertuples(index=False):
+            if row.accession_number is None:
+                result[row.cik] = {'filing': None, 'holdings': None}
+            else:
+                frames = [holdings[a] for a in row.accession_numbers]
+                combined = frames[0] if len(frames) == 1 else pd.concat(frames, ignore_index=True)
+                result[row.cik] = {'filing': _filing_record(row), 'holdings': combined}
+        return result
+
+    def intervals(self, db: Session, cik: str) -> List[Dict]:
+        """基金全部文件的可见区间"""
+        return [_filing_record(row) for row in self.index(db).intervals(cik).itertuples(index=False)]
+
+
+def _filing_record(row) -> Dict:
+    return {
+        'accessionNumber': row.accession_number,
+        'accessionNumbers': list(row.accession_numbers),
+        'periodOfReport': str(row.period_of_report.date()),
+        'filedAt': str(row.filed_at.date()),
+        'supersededAt': None if pd.isna(row.superseded_at) else str(row.superseded_at.date()),
+    }
+
+
+point_in_time = PointInTimeHoldings()
+
+
+def forget_filing(db: Session, context) -> None:
+    """入库钩子：重新加载的文件持仓可能变化，丢弃其缓存；区间索引由版本查询自动重建"""
+    point_in_time.forget(context.accession_number)
@@ -0,0 +1,151 @@
+import json
+import logging
+import os
+from typing import Iterable, Optional, Sequence, Union
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+
+class PriceStore:
+    """
+    本地每日收盘价存储
+
+    数据以列式数组保存：日期向量 (n_dates,)、证券标识列表 (n_keys,) 和收盘价矩阵
+    (n_dates, n_keys)。保存到磁盘后以内存映射方式打开，多个进程可共享同一份数据。
+    收盘价在构建时按日期前向填充，因此任意日期的查询都返回该日及之前最近的收盘价。
+    """
+
+    DATES_FILE = 'dates.npy'
+    CLOSES_FILE = 'closes.npy'
+    KEYS_FILE = 'keys.json'
+
+    def __init__(self, dates: np.ndarray, keys: Sequence[str], closes: np.ndarray):
+        dates = np.asarray(dates, dtype='datetime64[D]')
+        if closes.shape != (len(dates), len(keys)):
+            raise ValueError(
+                f"closes shape {closes.shape} does not match ({len(dates)}, {len(keys)})"
+            )
+        if len(dates) > 1 and not np.all(dates[1:] > dates[:-1]):
+            raise ValueError("dates must be strictly increasing")
+
+        self.dates = dates
+        self.keys = list(keys)
+        self.closes = closes
+        self.path: Optional[str] = None
+        self._key_index = pd.Index(self.keys)
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame, date_col: str = 'date', key_col: str = 'id',
+                   price_col: str = 'close') -> 'PriceStore':
+        """从长格式DataFrame（日期、标识、收盘价）构建价格存储"""
+        if df.empty:
+            raise ValueError("price data is empty")
+
+        frame = df[[date_col, key_col, price_col]].copy()
+        frame[date_col] = pd.to_datetime(frame[date_col]).dt.normalize()
+        frame[key_col] = frame[key_col].astype(str).str.strip().str.upper()
+        frame[price_col] = pd.to_numeric(frame[price_col], errors='coerce')
+
+        wide = frame.pivot_table(index=date_col, columns=key_col, values=price_col, aggfunc='last')
+        wide = wide.sort_index().ffill()
+
+        dates = wide.index.values.astype('datetime64[D]')
+        closes = np.ascontiguousarray(wide.to_numpy(dtype=np.float64))
+        return cls(dates, wide.columns.tolist(), closes)
+
+    @classmethod
+    def from_csv(cls, path: Union[str, Iterable[str]], **kwargs) -> 'PriceStore':
+        """从一个或多个CSV文件加载"""
+        paths = [path] if isinstance(path, str) else list(path)
+        df = pd.concat([pd.read_csv(p) for p in paths], ignore_index=True)
+        return cls.from_frame(df, **kwargs)
+
+    @classmethod
+    def from_parquet(cls, path: Union[str, Iterable[str]], **kwargs) -> 'PriceStore':
+        """从一个或多个Parquet文件加载（需要pyarrow或fastparquet）"""
+        paths = [path] if isinstance(path, str) else list(path)
+        df = pd.concat([pd.read_parquet(p) for p in paths], ignore_index=True)
+        return cls.from_frame(df, **kwargs)
+
+    def save(self, directory: str) -> None:
+        """将列式数组写入目录，供后续以内存映射方式打开"""
+        os.makedirs(directory, exist_ok=True)
+        np.save(os.path.join(directory, self.DATES_FILE), self.dates.astype('datetime64[D]'))
+        np.save(os.path.join(directory, self.CLOSES_FILE), np.ascontiguousarray(self.closes))
+        with open(os.path.join(directory, self.KEYS_FILE), 'w', encoding='utf-8') as f:
+            json.dump(self.keys, f)
+
+    @classmethod
+    def open(cls, directory: str, mmap: bool = True) -> 'PriceStore':
+        """打开已保存的价格存储，收盘价矩阵默认以只读内存映射方式加载"""
+        mmap_mode = 'r' if mmap else None
+        dates = np.load(os.path.join(directory, cls.DATES_FILE))
+        closes = np.load(os.path.join(directory, cls.CLOSES_FILE), mmap_mode=mmap_mode)
+        with open(os.path.join(directory, cls.KEYS_FILE), encoding='utf-8') as f:
+            keys = json.load(f)
+        logger.info(f"Opened price store at {directory}: {len(dates)} dates x {len(keys)} securities")
+        store = cls(dates, keys, closes)
+        store.path = directory
+        return store
+
+    def key_positions(self, keys: Sequence[str]) -> np.ndarray:
+        """返回标识对应的列号，未知标识为-1"""
+        normalized = pd.Index(pd.Series(keys, dtype=object).fillna('').astype(str).str.strip().str.upper())
+        return self._key_index.get_indexer(normalized)
+
+    def date_positions(self, dates: Union[Sequence, np.ndarray]) -> np.ndarray:
+        """返回每个日期对应的行号（该日及之前最近的交易日），早于首个交易日为-1"""
+        dates = pd.to_datetime(pd.Series(dates)).values.astype('datetime64[D]')
+        rows = np.searchsorted(self.dates, dates, side='right') - 1
+        rows[np.isnat(dates)] = -1
+        return rows
+
+    def lookup(self, keys: Sequence[str], dates: Union[Sequence, np.ndarray, str, pd.Timestamp]) -> np.ndarray:
+        """
+        批量查询收盘价
+
+        keys和dates逐元素对应；dates也可以是单个日期，此时对所有标识使用同一日期。
+        找不到的标识或早于价格历史的日期返回NaN。
+        """
+        cols = self.key_positions(keys)
+        if np.ndim(dates) == 0:
+            rows = np.full(len(cols), self.date_positions([dates])[0])
+        else:
+            rows = self.date_positions(dates)
+
+        prices = np.full(len(cols), np.nan)
+        valid = (cols >= 0) & (rows >= 0)
+        prices[valid] = self.closes[rows[valid], cols[valid]]
+        return prices
+
+    def window(self, keys: Sequence[str], start=None, end=None) -> pd.DataFrame:
+        """返回指定标识在日期区间内的收盘价宽表"""
+        row_start = 0 if start is None else int(np.searchsorted(self.dates, np.datetime64(pd.Timestamp(start), 'D'), side='left'))
+        row_end = len(self.dates) if end is None else int(np.searchsorted(self.dates, np.datetime64(pd.Timestamp(end), 'D'), side='right'))
+        cols = self.key_positions(keys)
+
+        block = np.full((row_end - row_start, len(cols)), np.nan)
+        known = cols >= 0
+        block[:, known] = self.closes[row_start:row_end][:, cols[known]]
+        return pd.DataFrame(block, index=pd.DatetimeIndex(self.dates[row_start:row_end]), columns=list(keys))
+
+
+def load_price_store(path: Optional[str]) -> Optional[PriceStore]:
+    """
+    根据路径加载价格存储
+
+    目录按已保存的内存映射存储打开；.csv/.parquet文件则直接构建。路径为空或不存在时返回None。
+    """
+    if not path or not os.path.exists(path):
+        return None
+    if os.path.isdir(path):
+        return PriceStore.open(path)
+    if path.endswith('.parquet'):
+        return PriceStore.from_parquet(path)
+    return PriceStore.from_csv(path)
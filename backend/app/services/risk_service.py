@@ -0,0 +1,258 @@
+import logging
+import threading
+from typing import Dict, List, Optional, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+from app.services.price_store import PriceStore
+
+logger = logging.getLogger(__name__)
+
+TRADING_DAYS = 252
+
+
+def daily_returns(closes: np.ndarray) -> np.ndarray:
+    """由收盘价矩阵计算日收益率；上市前或缺失价格对应的收益记为0"""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        returns = closes[1:] / closes[:-1] - 1.0
+    returns[~np.isfinite(returns)] = 0.0
+    return returns
+
+
+class CovarianceEstimator:
+    """
+    可增量更新的协方差估计
+
+    保存样本数、均值和离差乘积矩阵，新的收益率按批合并（Chan等的并行合并公式），
+    结果与一次性计算全部历史相同，但每次只需处理新增的交易日。
+    shrinkage为0~1之间的固定强度，或'auto'按Ledoit-Wolf公式向缩放单位阵收缩；
+    估计强度所需的四阶矩也随更新累加，不需要保留历史收益。
+    """
+
+    def __init__(self, n_assets: int, shrinkage: Union[None, float, str] = None):
+        if isinstance(shrinkage, str) and shrinkage != 'auto':
+            raise ValueError("shrinkage must be a number between 0 and 1 or 'auto'")
+        if isinstance(shrinkage, (int, float)) and not 0 <= shrinkage <= 1:
+            raise ValueError("shrinkage must be between 0 and 1")
+        self.n_assets = n_assets
+        self.shrinkage = shrinkage
+        self.count = 0
+        self.mean = np.zeros(n_assets)
+        self._m2 = np.zeros((n_assets, n_assets))
+        # Ledoit-Wolf强度需要的 sum_t ||x_t||^4（未去均值的日收益）
+        self._fourth = 0.0
+
+    def update(self, returns: np.ndarray) -> None:
+        """合并一批新的日收益 (n_days, n_assets)"""
+        returns = np.asarray(returns, dtype=np.float64)
+        if returns.ndim != 2 or returns.shape[1] != self.n_assets:
+            raise ValueError(f"returns must have shape (n, {self.n_assets})")
+        n_b = len(returns)
+        if n_b == 0:
+            return
+
+        mean_b = returns.mean(axis=0)
+        centered = returns - mean_b
+        m2_b = centered.T @ centered
+
+        n_a = self.count
+        n = n_a + n_b
+        delta = mean_b - self.mean
+        self.mean = self.mean + delta * (n_b / n)
+        self._m2 += m2_b + np.outer(delta, delta) * (n_a * n_b / n)
+        self._fourth += float(np.sum(np.einsum('ij,ij->i', returns, returns) ** 2))
+        self.count = n
+
+    def sample_covariance(self) -> np.ndarray:
+        if self.count < 2:
+            raise ValueError("At least two return observations are required")
+        return self._m2 / (self.count - 1)
+
+    def shrinkage_intensity(self) -> float:
+        """当前使用的收缩强度"""
+        if not self.shrinkage:
+            return 0.0
+        if self.shrinkage != 'auto':
+            return float(self.shrinkage)
+
+        n = self.count
+        # 以未去均值的二阶矩估计（日收益均值相对波动可忽略）
+        second = (self._m2 + n * np.outer(self.mean, self.mean)) / n
+        mu = np.trace(second) / self.n_assets
+        d2 = np.sum((second - mu * np.eye(self.n_assets)) ** 2)
+        if d2 <= 0:
+            return 0.0
+        b2_bar = max(self._fourth / n - np.sum(second ** 2), 0.0) / n
+        return float(min(b2_bar, d2) / d2)
+
+    def covariance(self) -> np.ndarray:
+        """日收益协方差矩阵（按配置收缩）"""
+        cov = self.sample_covariance()
+        delta = self.shrinkage_intensity()
+        if delta > 0:
+            target = np.eye(self.n_assets) * (np.trace(cov) / self.n_assets)
+            cov = delta * target + (1 - delta) * cov
+        return cov
+
+
+class RiskEngine:
+    """
+    13F组合风险分析
+
+    所有基金共享一个基于本地价格存储的协方差估计；价格存储追加新的交易日后，
+    refresh只合并新增日期的收益。风险指标按组合权重矩阵 W (n_portfolios, n_assets)
+    一次矩阵运算批量计算：组合方差为 diag(W Σ W^T)，边际风险贡献为 (W Σ) / σ。
+    """
+
+    def __init__(self, price_store: PriceStore, shrinkage: Union[None, float, str] = 'auto',
+                 benchmark: Optional[str] = None):
+        self.shrinkage = shrinkage
+        self.benchmark = benchmark.upper() if benchmark else None
+        self._lock = threading.Lock()
+        self._cov: Optional[np.ndarray] = None
+        self._build(price_store)
+
+    def _build(self, store: PriceStore) -> None:
+        self.price_store = store
+        self.keys = list(store.keys)
+        self._key_index = pd.Index(self.keys)
+        self.estimator = CovarianceEstimator(len(self.keys), shrinkage=self.shrinkage)
+        self.estimator.update(daily_returns(np.asarray(store.closes)))
+        self.last_date = store.dates[-1] if len(store.dates) else None
+        self._cov = None
+        logger.info(f"Risk model built on {self.estimator.count} days x {len(self.keys)} securities")
+
+    def refresh(self, store: PriceStore) -> int:
+        """
+        切换到新的价格存储，返回新合并的交易日数
+
+        证券列表不变且日期只是向后追加时增量更新；否则重新估计。
+        """
+        with self._lock:
+            if store is self.price_store:
+                return 0
+            if list(store.keys) != self.keys or self.last_date is None:
+                self._build(store)
+                return self.estimator.count
+            start = int(np.searchsorted(store.dates, self.last_date, side='right'))
+            if start == 0 or store.dates[start - 1] != self.last_date:
+                self._build(store)
+                return self.estimator.count
+            # 包含最后一个已处理日期，才能得到第一天新增收益
+            new_returns = daily_returns(np.asarray(store.closes[start - 1:]))
+            self.estimator.update(new_returns)
+            self.price_store = store
+            self.last_date = store.dates[-1]
+            self._cov = None
+            logger.info(f"Risk model updated with {len(new_returns)} new days")
+            return len(new_returns)
+
+    @property
+    def covariance(self) -> np.ndarray:
+        if self._cov is None:
+            self._cov = self.estimator.covariance()
+        return self._cov
+
+    def portfolio_weights(self, portfolios: Dict[str, pd.DataFrame]) -> Tuple[List[str], np.ndarray, np.ndarray]:
+        """
+        将各基金持仓转换为权重矩阵
+
+        按持仓市值加权并归一化到价格存储中有数据的证券，返回 (基金列表, W, 覆盖率)；
+        覆盖率为可定价证券市值占申报总市值的比例。
+        """
+        names = list(portfolios)
+        weights = np.zeros((len(names), len(self.keys)))
+        coverage = np.zeros(len(names))
+        for row, name in enumerate(names):
+            df = portfolios[name]
+            if df is None or df.empty:
+                continue
+            cols = self._key_index.get_indexer(df['cusip'].astype(str).str.upper())
+            values = pd.to_numeric(df['value'], errors='coerce').fillna(0.0).to_numpy(dtype=np.float64)
+            known = cols >= 0
+            total = values.sum()
+            np.add.at(weights[row], cols[known], values[known])
+            covered = weights[row].sum()
+            if covered > 0:
+                weights[row] /= covered
+            coverage[row] = covered / total if total > 0 else 0.0
+        return names, weights, coverage
+
+    def evaluate(self, weights: np.ndarray, benchmark: Optional[str] = None) -> Dict[str, np.ndarray]:
+        """
+        批量计算组合风险（年化）
+
+        返回 volatility、beta、trackingError (n_portfolios,) 以及
+        marginal（边际风险贡献）、contribution（风险贡献，按行求和等于volatility）(n_portfolios, n_assets)。
+        基准不在价格存储中时beta和trackingError为NaN。
+        """
+        weights = np.atleast_2d(np.asarray(weights, dtype=np.float64))
+        cov = self.covariance * TRADING_DAYS
+        weighted = weights @ cov
+        variance = np.einsum('ij,ij->i', weighted, weights)
+        volatility = np.sqrt(np.maximum(variance, 0.0))
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            marginal = np.where(volatility[:, None] > 0, weighted / volatility[:, None], 0.0)
+        contribution = weights * marginal
+
+        beta = np.full(len(weights), np.nan)
+        tracking_error = np.full(len(weights), np.nan)
+        benchmark = (benchmark or self.benchmark or '').upper()
+        b = self._key_index.get_indexer([benchmark])[0] if benchmark else -1
+        if b >= 0 and cov[b, b] > 0:
+            covariance_b = weighted[:, b]
+            beta = covariance_b / cov[b, b]
+            tracking_error = np.sqrt(np.maximum(variance - 2 * covariance_b + cov[b, b], 0.0))
+
+        return {
+            'volatility': volatility,
+            'beta': beta,
+            'trackingError': tracking_error,
+            'marginal': marginal,
+            'contribution': contribution,
+        }
+
+    def fund_risk(self, holdings_df: pd.DataFrame, benchmark: Optional[str] = None, top: int = 20) -> Dict:
+        """单个基金的风险报告，包含风险贡献最大的证券"""
+        _, weights, coverage = self.portfolio_weights({'fund': holdings_df})
+        metrics = self.evaluate(weights, benchmark=benchmark)
+        volatility = float(metrics['volatility'][0])
+
+        held = np.nonzero(weights[0])[0]
+        order = held[np.argsort(-metrics['contribution'][0, held])][:top]
+        contributors = [{
+            'cusip': self.keys[i],
+            'weight': float(weights[0, i]),
+            'marginalRisk': float(metrics['marginal'][0, i]),
+            'riskContribution': float(metrics['contribution'][0, i]),
+            'riskContributionPct': float(metrics['contribution'][0, i] / volatility * 100) if volatility > 0 else None,
+        } for i in order]
+
+        def optional(value: float) -> Optional[float]:
+            return None if np.isnan(value) else float(value)
+
+        return {
+            'volatility': volatility,
+            'beta': optional(metrics['beta'][0]),
+            'trackingError': optional(metrics['trackingError'][0]),
+            'benchmark': (benchmark or self.benchmark),
+            'coverage': float(coverage[0]),
+            'observations': self.estimator.count,
+            'shrinkage': self.estimator.shrinkage_intensity(),
+            'asOf': str(self.last_date) if self.last_date is not None else None,
+            'topContributors': contributors,
+        }
+
+    def risk_table(self, portfolios: Dict[str, pd.DataFrame], benchmark: Optional[str] = None) -> pd.DataFrame:
+        """多个基金的风险汇总表（一次批量运算）"""
+        names, weights, coverage = self.portfolio_weights(portfolios)
+        metrics = self.evaluate(weights, benchmark=benchmark)
+        return pd.DataFrame({
+            'fund': names,
+            'volatility': metrics['volatility'],
+            'beta': metrics['beta'],
+            'trackingError': metrics['trackingError'],
+            'coverage': coverage,
+        })
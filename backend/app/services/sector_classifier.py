@@ -0,0 +1,105 @@
+import logging
+import os
+from functools import lru_cache
+from typing import Iterable, Optional
+
+import numpy as np
+import pandas as pd
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+UNCLASSIFIED = 'Unclassified'
+
+# SIC分部（按两位主要行业组划分）
+SIC_DIVISIONS = [
+    (1, 9, 'Agriculture, Forestry & Fishing'),
+    (10, 14, 'Mining'),
+    (15, 17, 'Construction'),
+    (20, 39, 'Manufacturing'),
+    (40, 49, 'Transportation & Utilities'),
+    (50, 51, 'Wholesale Trade'),
+    (52, 59, 'Retail Trade'),
+    (60, 67, 'Finance, Insurance & Real Estate'),
+    (70, 89, 'Services'),
+    (91, 99, 'Public Administration'),
+]
+
+
+def sic_to_sector(sic_codes) -> np.ndarray:
+    """将四位SIC代码映射到SIC分部名称，无法识别的返回Unclassified"""
+    codes = pd.to_numeric(pd.Series(sic_codes), errors='coerce').to_numpy(dtype=np.float64)
+    major = np.floor(codes / 100)
+    sectors = np.full(len(codes), UNCLASSIFIED, dtype=object)
+    for low, high, name in SIC_DIVISIONS:
+        sectors[(major >= low) & (major <= high)] = name
+    return sectors
+
+
+class SectorClassifier:
+    """
+    CUSIP到板块/行业的分类器
+
+    映射表列：cusip（9位证券代码或6位发行人代码）、sector、industry，可选sic。
+    sector为空而有sic时按SIC分部推断板块。分类时先按完整CUSIP匹配，
+    再按前6位发行人代码匹配（同一发行人的不同证券类别归入同一行业）。
+    """
+
+    def __init__(self, mapping: Optional[pd.DataFrame] = None):
+        mapping = pd.DataFrame(columns=['cusip', 'sector', 'industry']) if mapping is None else mapping.copy()
+        if 'cusip' not in mapping.columns:
+            raise ValueError("Sector mapping requires a 'cusip' column")
+        if 'sector' not in mapping.columns:
+            mapping['sector'] = None
+        if 'industry' not in mapping.columns:
+            mapping['industry'] = None
+        if 'sic' in mapping.columns:
+            missing = mapping['sector'].isna() | (mapping['sector'].astype(str).str.strip() == '')
+            mapping.loc[missing, 'sector'] = sic_to_sector(mapping.loc[missing, 'sic'])
+
+        mapping['cusip'] = mapping['cusip'].astype(str).str.strip().str.upper()
+        mapping['sector'] = mapping['sector'].fillna(UNCLASSIFIED)
+        mapping['industry'] = mapping['industry'].fillna(mapping['sector'])
+        mapping = mapping.drop_duplicates('cusip', keep='last')
+
+        full = mapping[mapping['cusip'].str.len() == 9]
+        issuer = mapping[mapping['cusip'].str.len() == 6]
+        self._full_index = pd.Index(full['cusip'])
+        self._issuer_index = pd.Index(issuer['cusip'])
+        self._full_labels = full[['sector', 'industry']].to_numpy(dtype=object)
+        self._issuer_labels = issuer[['sector', 'industry']].to_numpy(dtype=object)
+
+    def __len__(self) -> int:
+        return len(self._full_index) + len(self._issuer_index)
+
+    @classmethod
+    def from_csv(cls, path: str) -> 'SectorClassifier':
+        mapping = pd.read_csv(path, dtype={'cusip': str, 'sic': str})
+        logger.info(f"Loaded {len(mapping)} sector mappings from {path}")
+        return cls(mapping)
+
+    def classify(self, cusips: Iterable[str]) -> pd.DataFrame:
+        """返回与输入等长的 sector、industry 两列，未找到的证券为Unclassified"""
+        keys = pd.Index(pd.Series(list(cusips), dtype=object).fillna('').astype(str).str.upper())
+        labels = np.full((len(keys), 2), UNCLASSIFIED, dtype=object)
+
+        pos = self._issuer_index.get_indexer(keys.str[:6]) if len(self._issuer_index) else np.full(len(keys), -1)
+        hit = pos >= 0
+        labels[hit] = self._issuer_labels[pos[hit]]
+
+        # 完整CUSIP的映射优先于发行人代码
+        pos = self._full_index.get_indexer(keys) if len(self._full_index) else np.full(len(keys), -1)
+        hit = pos >= 0
+        labels[hit] = self._full_labels[pos[hit]]
+        return pd.DataFrame(labels, columns=['sector', 'industry'])
+
+
+@lru_cache(maxsize=None)
+def get_sector_classifier(path: Optional[str] = None) -> SectorClassifier:
+    """加载配置的映射文件；文件不存在时所有证券归为Unclassified"""
+    path = path or settings.SECTOR_MAPPING_PATH
+    if path and os.path.exists(path):
+        return SectorClassifier.from_csv(path)
+    logger.warning(f"Sector mapping file {path} not found, all holdings will be unclassified")
+    return SectorClassifier()
@@ -0,0 +1,209 @@
+import logging
+from datetime import date, datetime
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import delete, distinct, func, insert, select
+from sqlalchemy.orm import Session
+
+from app.crud import holdings as holdings_crud
+from app.models.holdings import Filing
+from app.models.sectors import FundSectorWeight, SectorPeriodTotal
+from app.services.sector_classifier import SectorClassifier, get_sector_classifier
+
+logger = logging.getLogger(__name__)
+
+LEVELS = ('sector', 'industry')
+
+
+def _check_level(level: str) -> str:
+    if level not in LEVELS:
+        raise ValueError(f"level must be one of {', '.join(LEVELS)}")
+    return level
+
+
+def sector_weights(holdings_df: pd.DataFrame, classifier: SectorClassifier) -> pd.DataFrame:
+    """
+    按板块和行业汇总单个文件的持仓
+
+    返回列：level、name、sector（行业所属板块，板块行为空）、value、weight（%）、positions（证券数）。
+    """
+    columns = ['level', 'name', 'sector', 'value', 'weight', 'positions']
+    if holdings_df is None or holdings_df.empty:
+        return pd.DataFrame(columns=columns)
+
+    labels = classifier.classify(holdings_df['cusip'])
+    frame = pd.DataFrame({
+        'cusip': holdings_df['cusip'].to_numpy(),
+        'sector': labels['sector'].to_numpy(),
+        'industry': labels['industry'].to_numpy(),
+        'value': pd.to_numeric(holdings_df['value'], errors='coerce').fillna(0.0).to_numpy(dtype=np.float64),
+    })
+    total = frame['value'].sum()
+
+    sectors = frame.groupby('sector', sort=True).agg(
+        value=('value', 'sum'), positions=('cusip', 'nunique')
+    ).reset_index().rename(columns={'sector': 'name'})
+    sectors['level'] = 'sector'
+    sectors['sector'] = None
+
+    industries = frame.groupby('industry', sort=True).agg(
+        sector=('sector', 'first'), value=('value', 'sum'), positions=('cusip', 'nunique')
+    ).reset_index().rename(columns={'industry': 'name'})
+    industries['level'] = 'industry'
+
+    result = pd.concat([sectors, industries], ignore_index=True)
+    result['weight'] = result['value'] / total * 100 if total > 0 else 0.0
+    return result[columns]
+
+
+def with_period_changes(frame: pd.DataFrame, value_columns=('weight', 'value')) -> pd.DataFrame:
+    """
+    计算每个名称相对上一报告期的变化（weightChange、valueChange）
+
+    frame为长表（period、name及数值列）。某一期未出现的名称按0计算：
+    上一期存在、本期退出的名称补一行数值为0的记录；第一期的变化为NaN。
+    """
+    change_columns = [f'{c}Change' for c in value_columns]
+    if frame.empty:
+        return frame.assign(**{c: pd.Series(dtype=float) for c in change_columns})
+
+    wide = {c: frame.pivot_table(index='period', columns='name', values=c, aggfunc='sum').sort_index()
+            for c in value_columns}
+    present = wide[value_columns[0]].notna()
+    keep = (present | present.shift(1, fill_value=False)).stack()
+    index = keep[keep].index
+
+    result = pd.DataFrame(index=index)
+    for column, change_column in zip(value_columns, change_columns):
+        filled = wide[column].fillna(0.0)
+        change = filled.diff()
+        change.iloc[0] = np.nan
+        result[column] = filled.stack().reindex(index)
+        result[change_column] = change.stack(dropna=False).reindex(index)
+    result = result.reset_index()
+
+    others = [c for c in frame.columns if c not in value_columns and c not in ('period', 'name')]
+    if others:
+        result = result.merge(frame[['period', 'name'] + others], on=['period', 'name'], how='left')
+        for column in others:
+            if pd.api.types.is_numeric_dtype(frame[column]):
+                result[column] = result[column].fillna(0)
+            else:
+                # 退出的名称沿用此前的分类信息
+                result[column] = result.groupby('name')[column].ffill()
+    return result
+
+
+def refresh_period_totals(db: Session, period: date) -> int:
+    """重新计算一个报告期的全市场板块汇总，每个基金只取该期最新提交的文件"""
+    latest = select(holdings_crud.latest_filings_in_period(period).c.accession_number)
+    rows = db.execute(
+        select(
+            FundSectorWeight.level,
+            FundSectorWeight.name,
+            func.max(FundSectorWeight.sector),
+            func.sum(FundSectorWeight.value),
+            func.count(distinct(FundSectorWeight.cik)),
+            func.sum(FundSectorWeight.positions),
+        )
+        .where(FundSectorWeight.accession_number.in_(latest))
+        .group_by(FundSectorWeight.level, FundSectorWeight.name)
+    ).all()
+
+    db.execute(delete(SectorPeriodTotal.__table__).where(SectorPeriodTotal.period_of_report == period))
+    if not rows:
+        return 0
+
+    totals = pd.DataFrame(rows, columns=['level', 'name', 'sector', 'value', 'funds', 'positions'])
+    level_total = totals.groupby('level')['value'].transform('sum')
+    totals['weight'] = np.where(level_total > 0, totals['value'] / level_total * 100, 0.0)
+    totals['period_of_report'] = period
+    totals['updated_at'] = datetime.utcnow()
+    db.execute(insert(SectorPeriodTotal.__table__), totals.replace({np.nan: None}).to_dict('records'))
+    return len(totals)
+
+
+def materialize_sector_weights(db: Session, context, classifier: Optional[SectorClassifier] = None) -> None:
+    """
+    入库钩子：物化文件的板块/行业权重并刷新所在报告期的全市场汇总
+
+    与持仓写入在同一事务中执行，查询接口只读取物化后的表。
+    """
+    if context.period_of_report is None:
+        logger.warning(f"Filing {context.accession_number} has no report period, skipping sector rollup")
+        return
+
+    weights = sector_weights(context.holdings, classifier or get_sector_classifier())
+    db.execute(delete(FundSectorWeight.__table__)
+               .where(FundSectorWeight.accession_number == context.accession_number))
+    if not weights.empty:
+        weights['accession_number'] = context.accession_number
+        weights['cik'] = context.cik
+        weights['period_of_report'] = context.period_of_report
+        db.execute(insert(FundSectorWeight.__table__), weights.replace({np.nan: None}).to_dict('records'))
+
+    refresh_period_totals(db, context.period_of_report)
+    logger.info(f"Materialized {len(weights)} sector rows for filing {context.accession_number}")
+
+
+def _group_by_period(frame: pd.DataFrame, fields: List[str]) -> List[Dict]:
+    periods = []
+    for period, group in frame.groupby('period', sort=True):
+        group = group.sort_values('weight', ascending=False)
+        periods.append({
+            'period': str(period),
+            'items': group[fields].replace({np.nan: None}).to_dict('records'),
+        })
+    return periods
+
+
+def market_sector_trends(db: Session, level: str = 'sector', start: Optional[date] = None,
+                         end: Optional[date] = None) -> Dict:
+    """全市场板块权重及季度变化，读取物化的sector_period_totals"""
+    _check_level(level)
+    stmt = select(
+        SectorPeriodTotal.period_of_report.label('period'), SectorPeriodTotal.name, SectorPeriodTotal.sector,
+        SectorPeriodTotal.value, SectorPeriodTotal.weight, SectorPeriodTotal.funds, SectorPeriodTotal.positions,
+    ).where(SectorPeriodTotal.level == level)
+    if start is not None:
+        stmt = stmt.where(SectorPeriodTotal.period_of_report >= start)
+    if end is not None:
+        stmt = stmt.where(SectorPeriodTotal.period_of_report <= end)
+
+    frame = pd.DataFrame(db.execute(stmt).all(),
+                         columns=['period', 'name', 'sector', 'value', 'weight', 'funds', 'positions'])
+    frame = with_period_changes(frame)
+    fields = ['name', 'sector', 'value', 'weight', 'weightChange', 'valueChange', 'funds', 'positions']
+    return {'level': level, 'periods': _group_by_period(frame, fields)}
+
+
+def fund_sector_trends(db: Session, cik: str, level: str = 'sector') -> Dict:
+    """单个基金各报告期（取最新提交的文件）的板块权重及季度变化"""
+    _check_level(level)
+    ranked = (
+        select(
+            Filing.accession_number,
+            func.row_number().over(
+                partition_by=Filing.period_of_report,
+                order_by=(Filing.filed_at.desc(), Filing.accession_number.desc()),
+            ).label('rn'),
+        )
+        .where(Filing.cik == cik)
+        .subquery()
+    )
+    latest = select(ranked.c.accession_number).where(ranked.c.rn == 1)
+    rows = db.execute(
+        select(
+            FundSectorWeight.period_of_report.label('period'), FundSectorWeight.name, FundSectorWeight.sector,
+            FundSectorWeight.value, FundSectorWeight.weight, FundSectorWeight.positions,
+        )
+        .where(FundSectorWeight.accession_number.in_(latest), FundSectorWeight.level == level)
+    ).all()
+
+    frame = with_period_changes(
+        pd.DataFrame(rows, columns=['period', 'name', 'sector', 'value', 'weight', 'positions'])
+    )
+    fields = ['name', 'sector', 'value', 'weight', 'weightChange', 'valueChange', 'positions']
+    return {'cik': cik, 'level': level, 'periods': _group_by_period(frame, fields)}
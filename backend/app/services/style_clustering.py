@@ -0,0 +1,421 @@
+import contextlib
+import hashlib
+import json
+import logging
+import os
+import threading
+from datetime import date
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import delete, func, insert, select
+from sqlalchemy.orm import Session
+
+try:
+    import fcntl
+except ImportError:  # Windows：退化为进程内锁
+    fcntl = None
+
+from app.core.config import settings
+from app.crud import holdings as holdings_crud
+from app.models.holdings import Filing, Holding
+from app.models.sectors import FundSectorWeight
+from app.models.styles import FundStyle
+from app.services.sector_classifier import UNCLASSIFIED
+
+logger = logging.getLogger(__name__)
+
+
+class MiniBatchKMeans:
+    """
+    小批量K均值（Sculley, 2010）
+
+    每个中心记录累计分配到的样本数，新的小批量按 1/累计数 的学习率移动中心，
+    因此每个季度只需对新一期的特征调用partial_fit，无需用全部历史重新拟合。
+    """
+
+    def __init__(self, n_clusters: int = 8, batch_size: int = 256, random_state: int = 0):
+        self.n_clusters = n_clusters
+        self.batch_size = batch_size
+        self._rng = np.random.default_rng(random_state)
+        self.cluster_centers_: Optional[np.ndarray] = None
+        self.counts_: Optional[np.ndarray] = None
+
+    def _init_centers(self, X: np.ndarray) -> None:
+        """k-means++ 初始化"""
+        n = len(X)
+        centers = np.empty((self.n_clusters, X.shape[1]))
+        centers[0] = X[self._rng.integers(n)]
+        closest = np.sum((X - centers[0]) ** 2, axis=1)
+        for i in range(1, self.n_clusters):
+            total = closest.sum()
+            index = self._rng.choice(n, p=closest / total) if total > 0 else self._rng.integers(n)
+            centers[i] = X[index]
+            closest = np.minimum(closest, np.sum((X - centers[i]) ** 2, axis=1))
+        self.cluster_centers_ = centers
+        self.counts_ = np.zeros(self.n_clusters)
+
+    def _distances(self, X: np.ndarray) -> np.ndarray:
+        centers = self.cluster_centers_
+        d2 = (np.sum(X ** 2, axis=1)[:, None] - 2 * X @ centers.T + np.sum(centers ** 2, axis=1)[None, :])
+        return np.maximum(d2, 0.0)
+
+    def predict(self, X: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """返回每个样本的聚类编号及到中心的距离"""
+        d2 = self._distances(np.asarray(X, dtype=np.float64))
+        labels = np.argmin(d2, axis=1)
+        return labels, np.sqrt(d2[np.arange(len(labels)), labels])
+
+    def partial_fit(self, X: np.ndarray, passes: int = 1) -> 'MiniBatchKMeans':
+        X = np.asarray(X, dtype=np.float64)
+        if len(X) == 0:
+            return self
+        if self.cluster_centers_ is None:
+            if len(X) < self.n_clusters:
+                raise ValueError(f"At least {self.n_clusters} samples are required for the initial fit")
+            self._init_centers(X)
+
+        for _ in range(passes):
+            order = self._rng.permutation(len(X))
+            for start in range(0, len(X), self.batch_size):
+                batch = X[order[start:start + self.batch_size]]
+                labels, _ = self.predict(batch)
+                sums = np.zeros_like(self.cluster_centers_)
+                np.add.at(sums, labels, batch)
+                n = np.bincount(labels, minlength=self.n_clusters).astype(np.float64)
+                self.counts_ += n
+                hit = n > 0
+                # 等价于对批内每个样本依次以 1/count 的学习率更新
+                self.cluster_centers_[hit] += (
+                    sums[hit] - n[hit, None] * self.cluster_centers_[hit]
+                ) / self.counts_[hit, None]
+        return self
+
+
+def _stable_hash(cusip: str) -> int:
+    return int.from_bytes(hashlib.md5(cusip.encode('utf-8')).digest()[:8], 'little')
+
+
+class StyleFeatures:
+    """
+    基金风格特征
+
+    - 板块权重：固定的板块词表，未知板块计入Unclassified
+    - 集中度：HHI、前十大持仓占比、log(持仓数)/log(5000)
+    - 换手率：相对基金自己上一报告期的权重变化 0.5 * sum|w_t - w_{t-1}|
+    - CUSIP权重的哈希投影：带符号的特征哈希，把任意多证券压缩到固定维度，跨季度保持一致
+    """
+
+    CONCENTRATION = ['hhi', 'top10', 'breadth', 'turnover']
+
+    def __init__(self, sectors: Sequence[str], hash_dim: int = 64):
+        self.sectors = list(sectors)
+        if UNCLASSIFIED not in self.sectors:
+            self.sectors.append(UNCLASSIFIED)
+        self.hash_dim = hash_dim
+        self._sector_index = pd.Index(self.sectors)
+        self._hash_cache: Dict[str, Tuple[int, float]] = {}
+
+    @property
+    def dim(self) -> int:
+        return len(self.sectors) + len(self.CONCENTRATION) + self.hash_dim
+
+    def _hash(self, cusips: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        buckets = np.empty(len(cusips), dtype=np.int64)
+        signs = np.empty(len(cusips))
+        for i, cusip in enumerate(cusips):
+            cached = self._hash_cache.get(cusip)
+            if cached is None:
+                h = _stable_hash(cusip)
+                cached = (h % self.hash_dim, 1.0 if (h >> 32) & 1 else -1.0)
+                self._hash_cache[cusip] = cached
+            buckets[i], signs[i] = cached
+        return buckets, signs
+
+    @staticmethod
+    def _weights(holdings: pd.DataFrame) -> pd.DataFrame:
+        """按 (cik, cusip) 合并持仓并计算组合内权重"""
+        frame = holdings.groupby(['cik', 'cusip'], sort=False, as_index=False)['value'].sum()
+        total = frame.groupby('cik')['value'].transform('sum')
+        frame['weight'] = np.where(total > 0, frame['value'] / total, 0.0)
+        return frame
+
+    def transform(self, holdings: pd.DataFrame, previous: Optional[pd.DataFrame] = None,
+                  sector_weights: Optional[pd.DataFrame] = None) -> Tuple[List[str], np.ndarray]:
+        """
+        holdings / previous: 本期和上一期的持仓（cik、cusip、value）
+        sector_weights: 本期板块权重（cik、name、weight，weight为百分比）
+        返回 (CIK列表, 特征矩阵)
+        """
+        current = self._weights(holdings)
+        ciks = sorted(current['cik'].unique())
+        cik_index = pd.Index(ciks)
+        X = np.zeros((len(ciks), self.dim))
+        rows = cik_index.get_indexer(current['cik'])
+        weights = current['weight'].to_numpy(dtype=np.float64)
+
+        offset = 0
+        if sector_weights is not None and not sector_weights.empty:
+            s_rows = cik_index.get_indexer(sector_weights['cik'])
+            s_cols = self._sector_index.get_indexer(sector_weights['name'])
+            s_cols[s_cols < 0] = self._sector_index.get_loc(UNCLASSIFIED)
+            keep = s_rows >= 0
+            np.add.at(X, (s_rows[keep], offset + s_cols[keep]),
+                      sector_weights['weight'].to_numpy(dtype=np.float64)[keep] / 100)
+        offset += len(self.sectors)
+
+        X[:, offset] = np.bincount(rows, weights=weights ** 2, minlength=len(ciks))
+        ranked = current.assign(row=rows).sort_values(['row', 'weight'], ascending=[True, False])
+        top10 = ranked.groupby('row').head(10)
+        X[:, offset + 1] = np.bincount(top10['row'], weights=top10['weight'], minlength=len(ciks))
+        X[:, offset + 2] = np.log1p(np.bincount(rows, minlength=len(ciks))) / np.log(5000)
+        if previous is not None and not previous.empty:
+            prior = self._weights(previous)
+            merged = current[['cik', 'cusip', 'weight']].merge(
+                prior[['cik', 'cusip', 'weight']], on=['cik', 'cusip'], how='outer', suffixes=('', '_prev')
+            ).fillna({'weight': 0.0, 'weight_prev': 0.0})
+            # 上一期不存在的基金没有换手率，保持为0
+            merged = merged[merged['cik'].isin(set(prior['cik']))]
+            m_rows = cik_index.get_indexer(merged['cik'])
+            keep = m_rows >= 0
+            diff = np.abs(merged['weight'].to_numpy() - merged['weight_prev'].to_numpy())[keep]
+            X[:, offset + 3] = 0.5 * np.bincount(m_rows[keep], weights=diff, minlength=len(ciks))
+        offset += len(self.CONCENTRATION)
+
+        buckets, signs = self._hash(current['cusip'].to_numpy(dtype=object))
+        np.add.at(X, (rows, offset + buckets), signs * weights)
+        return ciks, X
+
+
+class StyleClusteringService:
+    """
+    基金风格聚类
+
+    每个季度对新报告期调用refresh：构建该期全部已入库基金的特征，partial_fit更新聚类中心，
+    再把各基金的聚类编号和特征写入fund_styles，成员和相似基金查询直接读表。
+    模型（中心、累计样本数、板块词表）保存到磁盘，多个worker共享同一模型：refresh在跨进程文件锁内
+    完成加载、拟合和保存，模型文件被其他进程更新（修改时间变化）后重新加载。
+    """
+
+    def __init__(self, model_path: Optional[str] = None, n_clusters: Optional[int] = None,
+                 hash_dim: Optional[int] = None):
+        self.model_path = model_path or settings.STYLE_MODEL_PATH
+        self.n_clusters = n_clusters or settings.STYLE_CLUSTERS
+        self.hash_dim = hash_dim or settings.STYLE_HASH_DIM
+        self.model: Optional[MiniBatchKMeans] = None
+        self.features: Optional[StyleFeatures] = None
+        self.fitted_periods: List[str] = []
+        self._mtime: Optional[Tuple[int, int]] = None
+        self._lock = threading.Lock()
+
+    def _model_mtime(self) -> Optional[Tuple[int, int]]:
+        """模型文件的 (inode, 修改时间)；save通过os.replace写入新文件，inode随之变化"""
+        try:
+            stat = os.stat(self.model_path)
+            return stat.st_ino, stat.st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    @contextlib.contextmanager
+    def _model_lock(self) -> Iterator[None]:
+        """跨进程排他锁（flock）；flock按文件描述符生效，同进程内的线程另用线程锁串行"""
+        with self._lock:
+            if fcntl is None:
+                yield
+                return
+            directory = os.path.dirname(self.model_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(self.model_path + '.lock', 'a+b') as f:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+    def save(self) -> None:
+        directory = os.path.dirname(self.model_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        meta = {'sectors': self.features.sectors, 'hash_dim': self.features.hash_dim,
+                'periods': self.fitted_periods}
+        tmp_path = self.model_path + '.tmp.npz'
+        np.savez(tmp_path, centers=self.model.cluster_centers_, counts=self.model.counts_,
+                 meta=np.frombuffer(json.dumps(meta).encode('utf-8'), dtype=np.uint8))
+        os.replace(tmp_path, self.model_path)
+        self._mtime = self._model_mtime()
+
+    def load(self) -> bool:
+        """从磁盘加载模型，不存在时返回False"""
+        mtime = self._model_mtime()
+        if mtime is None:
+            return False
+        with np.load(self.model_path) as data:
+            meta = json.loads(data['meta'].tobytes().decode('utf-8'))
+            model = MiniBatchKMeans(n_clusters=len(data['centers']))
+            model.cluster_centers_ = data['centers'].copy()
+            model.counts_ = data['counts'].copy()
+        self.model = model
+        self.features = StyleFeatures(meta['sectors'], hash_dim=meta['hash_dim'])
+        self.fitted_periods = meta['periods']
+        self._mtime = mtime
+        return True
+
+    def _ensure_loaded(self) -> None:
+        """加载模型；磁盘上的模型已被其他进程更新时重新加载"""
+        mtime = self._model_mtime()
+        if mtime is not None and mtime != self._mtime:
+            self.load()
+        if self.model is None:
+            raise ValueError("Style model has not been fitted yet")
+
+    @staticmethod
+    def _period_holdings(db: Session, period: date, ciks=None) -> pd.DataFrame:
+        """报告期内各基金的持仓，ciks（可为子查询）限定基金"""
+        latest = holdings_crud.latest_filings_in_period(period)
+        stmt = (
+            select(Holding.cik, Holding.cusip, Holding.value)
+            .join(latest, latest.c.accession_number == Holding.accession_number)
+        )
+        if ciks is not None:
+            stmt = stmt.where(latest.c.cik.in_(ciks))
+        return pd.DataFrame(db.execute(stmt).all(), columns=['cik', 'cusip', 'value'])
+
+    def _previous_holdings(self, db: Session, period: date) -> Optional[pd.DataFrame]:
+        """
+        本期各基金在各自上一报告期的持仓
+
+        与leaderboards._adjacent_period一致，每个基金和自己最近的更早报告期比较，
+        缺报一个季度的基金不会被当作没有上一期。
+        """
+        previous = (
+            select(Filing.cik, func.max(Filing.period_of_report).label('period_of_report'))
+            .where(Filing.period_of_report < period,
+                   Filing.cik.in_(select(Filing.cik).where(Filing.period_of_report == period)))
+            .group_by(Filing.cik)
+            .subquery()
+        )
+        periods = db.execute(select(previous.c.period_of_report).distinct()).scalars().all()
+        frames = [
+            self._period_holdings(db, p, select(previous.c.cik).where(previous.c.period_of_report == p))
+            for p in periods
+        ]
+        return pd.concat(frames, ignore_index=True) if frames else None
+
+    def build_features(self, db: Session, period: date) -> Tuple[List[str], np.ndarray]:
+        latest = holdings_crud.latest_filings_in_period(period)
+        sectors = pd.DataFrame(db.execute(
+            select(FundSectorWeight.cik, FundSectorWeight.name, FundSectorWeight.value)
+            .join(latest, latest.c.accession_number == FundSectorWeight.accession_number)
+            .where(FundSectorWeight.level == 'sector')
+        ).all(), columns=['cik', 'name', 'value'])
+        # 有新增持仓修正文件时一个基金对应多个文件，按市值合并后重新计算权重
+        sectors = sectors.groupby(['cik', 'name'], as_index=False)['value'].sum()
+        totals = sectors.groupby('cik')['value'].transform('sum')
+        sectors['weight'] = (sectors['value'] / totals.where(totals > 0) * 100).fillna(0.0)
+        if self.features is None:
+            self.features = StyleFeatures(sorted(sectors['name'].unique()), hash_dim=self.hash_dim)
+
+        holdings = self._period_holdings(db, period)
+        if holdings.empty:
+            raise ValueError(f"No ingested holdings for period {period}")
+        return self.features.transform(holdings, self._previous_holdings(db, period), sectors)
+
+    def refresh(self, db: Session, period: date) -> Dict:
+        """
+        用一个报告期的数据增量更新模型并写入该期各基金的聚类结果
+
+        每个报告期只参与一次拟合；对已拟合的报告期再次调用时（例如补录或修正文件入库后）
+        只按当前模型重新分配聚类，不再移动中心。首次拟合需要至少n_clusters只基金。
+        """
+        with self._model_lock():
+            if self._model_mtime() != self._mtime:
+                self.load()
+            ciks, X = self.build_features(db, period)
+            fit = str(period) not in self.fitted_periods
+            if self.model is None:
+                if len(ciks) < self.n_clusters:
+                    raise ValueError(f"At least {self.n_clusters} funds are required for the initial style fit, "
+                                     f"period {period} has {len(ciks)}")
+                model = MiniBatchKMeans(n_clusters=self.n_clusters)
+                # 首次拟合多轮遍历，之后每期单轮增量更新
+                self.model = model.partial_fit(X, passes=10)
+            elif fit:
+                self.model.partial_fit(X)
+            labels, distances = self.model.predict(X)
+
+            latest = holdings_crud.latest_filings_in_period(period)
+            accessions = dict(db.execute(
+                select(latest.c.cik, latest.c.accession_number).where(latest.c.is_latest.is_(True))
+            ).all())
+            db.execute(delete(FundStyle.__table__).where(FundStyle.period_of_report == period))
+            db.execute(insert(FundStyle.__table__), [{
+                'cik': cik,
+                'period_of_report': period,
+                'accession_number': accessions[cik],
+                'cluster': int(label),
+                'distance': float(distance),
+                'features': X[i].astype(np.float32).tobytes(),
+            } for i, (cik, label, distance) in enumerate(zip(ciks, labels, distances))])
+            db.commit()
+
+            if fit:
+                self.fitted_periods.append(str(period))
+                self.save()
+        sizes = np.bincount(labels, minlength=self.model.n_clusters)
+        logger.info(f"Style clusters refreshed for {period}: {len(ciks)} funds, sizes {sizes.tolist()}"
+                    f"{'' if fit else ' (already fitted, labels only)'}")
+        return {'period': str(period), 'funds': len(ciks), 'fitted': fit, 'clusterSizes': sizes.tolist()}
+
+    @staticmethod
+    def _latest_period(db: Session, cik: Optional[str] = None) -> Optional[date]:
+        stmt = select(func.max(FundStyle.period_of_report))
+        if cik is not None:
+            stmt = stmt.where(FundStyle.cik == cik)
+        return db.execute(stmt).scalar()
+
+    def _period_rows(self, db: Session, period: date, cluster: Optional[int] = None) -> List[FundStyle]:
+        query = db.query(FundStyle).filter(FundStyle.period_of_report == period)
+        if cluster is not None:
+            query = query.filter(FundStyle.cluster == cluster)
+        return query.all()
+
+    def membership(self, db: Session, cik: str, period: Optional[date] = None) -> Optional[Dict]:
+        period = period or self._latest_period(db, cik)
+        if period is None:
+            return None
+        row = db.get(FundStyle, (cik, period))
+        if row is None:
+            return None
+        members = db.query(func.count()).select_from(FundStyle).filter(
+            FundStyle.period_of_report == period, FundStyle.cluster == row.cluster
+        ).scalar()
+        return {'cik': cik, 'period': str(period), 'cluster': row.cluster,
+                'distance': row.distance, 'clusterSize': members}
+
+    def cluster_members(self, db: Session, cluster: int, period: Optional[date] = None) -> Dict:
+        period = period or self._latest_period(db)
+        rows = sorted(self._period_rows(db, period, cluster) if period else [], key=lambda r: r.distance)
+        return {'cluster': cluster, 'period': str(period) if period else None,
+                'funds': [{'cik': r.cik, 'distance': r.distance} for r in rows]}
+
+    def neighbors(self, db: Session, cik: str, period: Optional[date] = None, k: int = 10) -> Optional[Dict]:
+        """按特征向量的欧氏距离返回同一报告期内最相似的基金"""
+        period = period or self._latest_period(db, cik)
+        if period is None:
+            return None
+        rows = self._period_rows(db, period)
+        ciks = [r.cik for r in rows]
+        if cik not in ciks:
+            return None
+        X = np.stack([np.frombuffer(r.features, dtype=np.float32) for r in rows]).astype(np.float64)
+        target = X[ciks.index(cik)]
+        distances = np.sqrt(np.sum((X - target) ** 2, axis=1))
+        order = [i for i in np.argsort(distances, kind='stable') if ciks[i] != cik][:k]
+        return {'cik': cik, 'period': str(period), 'neighbors': [
+            {'cik': ciks[i], 'distance': float(distances[i]), 'cluster': rows[i].cluster} for i in order
+        ]}
+
+
+style_clustering = StyleClusteringService()
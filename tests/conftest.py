@@ -8,3 +8,35 @@ project_root = Path(__file__).parent.parent.absolute()
 # 添加backend目录到Python路径
 backend_dir = project_root / 'backend'
 sys.path.insert(0, str(backend_dir))
+
+import pandas as pd
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+
+def memory_engine():
+    """建好全部表的内存SQLite引擎；StaticPool使所有连接（包括其他线程）共享同一个数据库"""
+    from app.db.migrate import run_migrations
+
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    run_migrations(bind=engine)
+    return engine
+
+
+def memory_session():
+    """内存SQLite数据库上的会话"""
+    return sessionmaker(bind=memory_engine())()
+
+
+def filing(accession, filed, period, amended=False, amendment_type=None):
+    """ingest_filing使用的文件记录；amendment_type为修正类型（RESTATEMENT / NEW HOLDINGS）"""
+    record = {'accessionNumber': accession, 'date': filed, 'reportDate': period, 'isAmended': amended}
+    if amendment_type is not None:
+        record['amendmentType'] = amendment_type
+    return record
+
+
+def holdings(rows):
+    """(cusip, nameOfIssuer, value, shares) 行构成的持仓表"""
+    return pd.DataFrame(rows, columns=['cusip', 'nameOfIssuer', 'value', 'shares'])
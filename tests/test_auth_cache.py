@@ -0,0 +1,134 @@
+import asyncio
+import os
+import sys
+import time
+import unittest
+from datetime import timedelta
+from pathlib import Path
+from unittest.mock import patch
+
+from fastapi import HTTPException
+from sqlalchemy.orm import sessionmaker
+
+# 添加backend目录到Python路径
+project_root = Path(__file__).parent.parent.absolute()
+backend_dir = project_root / 'backend'
+sys.path.insert(0, str(backend_dir))
+
+from app.core import security
+from app.core.cache import TTLCache
+from app.crud import user as user_crud
+from app.models.user import User
+from conftest import memory_engine
+
+
+class FakeTimer:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestTTLCache(unittest.TestCase):
+    def test_expiry_and_eviction(self):
+        """测试过期和容量淘汰"""
+        timer = FakeTimer()
+        cache = TTLCache(maxsize=2, ttl=10, timer=timer)
+        cache.set('a', 1)
+        cache.set('b', 2, ttl=1)
+        self.assertEqual(cache.get('a'), 1)
+
+        timer.now = 5
+        self.assertIsNone(cache.get('b'))
+
+        cache.set('c', 3)
+        cache.set('d', 4)
+        self.assertNotIn('a', cache)
+        self.assertEqual(len(cache), 2)
+
+
+class TestCurrentUserCache(unittest.TestCase):
+    def setUp(self):
+        self.Session = sessionmaker(bind=memory_engine(), autocommit=False, autoflush=False)
+        self.patcher = patch('app.db.session.SessionLocal', self.Session)
+        self.patcher.start()
+
+        db = self.Session()
+        db.add(User(email='a@example.com', username='alice', hashed_password='x', is_active=True))
+        db.commit()
+        db.close()
+
+        security.token_cache.clear()
+        security.user_cache.clear()
+        self.token = security.create_access_token({"sub": "alice"}, expires_delta=timedelta(minutes=5))
+
+    def tearDown(self):
+        self.patcher.stop()
+        security.token_cache.clear()
+        security.user_cache.clear()
+
+    def test_token_and_user_are_cached(self):
+        """测试令牌声明和用户对象缓存"""
+        user = asyncio.run(security.get_current_user(self.token))
+        self.assertEqual(user.username, 'alice')
+        self.assertIn(self.token, security.token_cache)
+
+        with patch('jose.jwt.decode') as decode, patch.object(security, 'resolve_user') as resolve:
+            again = asyncio.run(security.get_current_user(self.token))
+            decode.assert_not_called()
+            resolve.assert_not_called()
+        self.assertIs(again, user)
+
+    def test_deactivation_invalidates_user(self):
+        """测试停用用户后缓存失效"""
+        asyncio.run(security.get_current_user(self.token))
+
+        db = self.Session()
+        user_crud.deactivate_user(db, user_crud.get_user_by_username(db, 'alice'))
+        db.close()
+
+        with self.assertRaises(HTTPException) as ctx:
+            asyncio.run(security.get_current_user(self.token))
+        self.assertEqual(ctx.exception.status_code, 400)
+
+    @staticmethod
+    def restore_tz(tz):
+        if tz is None:
+            os.environ.pop('TZ', None)
+        else:
+            os.environ['TZ'] = tz
+        time.tzset()
+
+    def test_token_ttl_ignores_local_timezone(self):
+        """测试令牌缓存时间按UTC计算，与服务器时区无关"""
+        self.addCleanup(self.restore_tz, os.environ.get('TZ'))
+
+        for tz, expires, cached_after in (('Asia/Shanghai', timedelta(seconds=4), 5),
+                                          ('America/New_York', timedelta(hours=2), 60)):
+            os.environ['TZ'] = tz
+            time.tzset()
+            timer = FakeTimer()
+            with patch.object(security, 'token_cache', TTLCache(maxsize=16, ttl=300, timer=timer)):
+                token = security.create_access_token({"sub": "alice"}, expires_delta=expires)
+                security.decode_access_token(token)
+                self.assertIn(token, security.token_cache)
+                timer.now = cached_after
+                # 4秒后过期的令牌不能缓存5分钟；2小时的令牌应当被缓存
+                self.assertEqual(token in security.token_cache, tz == 'America/New_York')
+
+    def test_expired_cached_token_is_rejected(self):
+        token = security.create_access_token({"sub": "alice"}, expires_delta=timedelta(seconds=-1))
+        security.token_cache.set(token, {"sub": "alice", "exp": time.time() - 1})
+        with self.assertRaises(HTTPException) as ctx:
+            asyncio.run(security.get_current_user(token))
+        self.assertEqual(ctx.exception.status_code, 401)
+
+    def test_invalid_token(self):
+        with self.assertRaises(HTTPException) as ctx:
+            asyncio.run(security.get_current_user('not-a-token'))
+        self.assertEqual(ctx.exception.status_code, 401)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,255 @@
+import json
+import shutil
+import sys
+import tempfile
+import threading
+import unittest
+from datetime import date
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+# 添加backend目录到Python路径
+project_root = Path(__file__).parent.parent.absolute()
+backend_dir = project_root / 'backend'
+sys.path.insert(0, str(backend_dir))
+
+from app.core.rate_limiter import AdaptiveLimiter
+from app.models.user import Base
+from app.models.holdings import Filing, Holding
+from app.services.backfill import (
+    DONE, FAILED, SKIPPED, BackfillCheckpoint, BackfillCrawler, BackfillProgress, backfill_quarters,
+    parse_submission,
+)
+from app.services.edgar_service import EDGARService
+from app.services.ingest_service import IngestService
+
+HEADER = (
+    "Description:           Master Index of EDGAR Dissemination Feed by Form Type\n"
+    "Last Data Received:    March 31, 2023\n\n"
+    "Form Type   Company Name                                                  CIK         Date Filed  File Name\n"
+    + "-" * 140 + "\n"
+)
+
+
+def index_line(form, company, cik, filed, filename):
+    return f"{form.ljust(17)}{company.ljust(62)}{str(cik).ljust(12)}{filed}  {filename}\n"
+
+
+def submission(accession, period, rows=None):
+    """完整提交文件：SGML头、主文档和（可选的）信息表"""
+    parts = [
+        f"<SEC-DOCUMENT>{accession}.txt : 20230210\n<SEC-HEADER>{accession}.hdr.sgml\n"
+        f"ACCESSION NUMBER:\t\t{accession}\nCONFORMED SUBMISSION TYPE:\t13F-HR\n"
+        f"CONFORMED PERIOD OF REPORT:\t{period.replace('-', '')}\n</SEC-HEADER>\n",
+        "<DOCUMENT>\n<TYPE>13F-HR\n<SEQUENCE>1\n<FILENAME>primary_doc.xml\n<TEXT>\n<XML>\n"
+        "<?xml version=\"1.0\"?><edgarSubmission><headerData/></edgarSubmission>\n</XML>\n</TEXT>\n</DOCUMENT>\n",
+    ]
+    if rows is not None:
+        entries = ''.join(
+            f"<infoTable><nameOfIssuer>{name}</nameOfIssuer><titleOfClass>COM</titleOfClass>"
+            f"<cusip>{cusip}</cusip><value>{value}</value><shrsOrPrnAmt><sshPrnamt>{shares}</sshPrnamt>"
+            f"<sshPrnamtType>SH</sshPrnamtType></shrsOrPrnAmt><investmentDiscretion>SOLE</investmentDiscretion>"
+            f"<votingAuthority><Sole>{shares}</Sole><Shared>0</Shared><None>0</None></votingAuthority></infoTable>"
+            for name, cusip, value, shares in rows
+        )
+        parts.append(
+            "<DOCUMENT>\n<TYPE>INFORMATION TABLE\n<SEQUENCE>2\n<FILENAME>infotable.xml\n<TEXT>\n<XML>\n"
+            "<?xml version=\"1.0\" encoding=\"UTF-8\"?>\n"
+            "<informationTable xmlns=\"http://www.sec.gov/edgar/document/thirteenf/informationtable\">"
+            f"{entries}</informationTable>\n</XML>\n</TEXT>\n</DOCUMENT>\n"
+        )
+    parts.append("</SEC-DOCUMENT>\n")
+    return ''.join(parts)
+
+
+FILES = {
+    '/edgar/full-index/2023/QTR1/form.idx': HEADER + ''.join([
+        index_line('10-K', 'ACME CORP', 1234, '2023-02-01', 'edgar/data/1234/0000001234-23-000001.txt'),
+        index_line('13F-HR', 'ALPHA CAPITAL LLC', 1001, '2023-02-10', 'edgar/data/1001/0001001000-23-000001.txt'),
+        index_line('13F-HR', 'BETA PARTNERS LP', 1002, '2023-02-14', 'edgar/data/1002/0001002000-23-000001.txt'),
+        index_line('13F-HR', 'GAMMA NOTICE FUND', 1003, '2023-02-14', 'edgar/data/1003/0001003000-23-000001.txt'),
+    ]),
+    '/edgar/full-index/2023/QTR2/form.idx': HEADER + ''.join([
+        index_line('13F-HR/A', 'ALPHA CAPITAL LLC', 1001, '2023-05-01', 'edgar/data/1001/0001001000-23-000002.txt'),
+        index_line('13F-HR', 'ALPHA CAPITAL LLC', 1001, '2023-05-12', 'edgar/data/1001/0001001000-23-000003.txt'),
+    ]),
+    '/edgar/data/1001/0001001000-23-000001.txt': submission(
+        '0001001000-23-000001', '2022-12-31', [('APPLE INC', '037833100', 1000, 10), ('MICROSOFT', '594918104', 500, 5)]),
+    '/edgar/data/1002/0001002000-23-000001.txt': submission(
+        '0001002000-23-000001', '2022-12-31', [('APPLE INC', '037833100', 2000, 20)]),
+    # 未附信息表的文件
+    '/edgar/data/1003/0001003000-23-000001.txt': submission('0001003000-23-000001', '2022-12-31'),
+    '/edgar/data/1001/0001001000-23-000002.txt': submission(
+        '0001001000-23-000002', '2022-12-31', [('APPLE INC', '037833100', 1100, 11)]),
+    '/edgar/data/1001/0001001000-23-000003.txt': submission(
+        '0001001000-23-000003', '2023-03-31', [('APPLE INC', '037833100', 1500, 12)]),
+}
+
+
+class StandInArchive(BaseHTTPRequestHandler):
+    """本地模拟的EDGAR Archives：提供季度索引和完整提交文件，其余路径返回404"""
+
+    lock = threading.Lock()
+    hits = []
+    missing = set()
+
+    def do_GET(self):
+        cls = type(self)
+        with cls.lock:
+            cls.hits.append(self.path)
+        body = FILES.get(self.path)
+        if body is None or self.path in cls.missing:
+            self.send_response(404)
+            body = 'not found'
+        else:
+            self.send_response(200)
+        data = body.encode()
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class TestSubmissionParsing(unittest.TestCase):
+    def test_parse_submission(self):
+        parsed = parse_submission(FILES['/edgar/data/1002/0001002000-23-000001.txt'])
+        self.assertEqual(parsed['periodOfReport'], '2022-12-31')
+        self.assertIn('<informationTable', parsed['infoTable'])
+        self.assertIsNone(parse_submission(FILES['/edgar/data/1003/0001003000-23-000001.txt'])['infoTable'])
+        self.assertIsNone(parsed['amendmentType'])
+        amended = FILES['/edgar/data/1001/0001001000-23-000002.txt'].replace(
+            '<headerData/>', '<formData><coverPage><amendmentInfo><amendmentType>NEW HOLDINGS</amendmentType>'
+                             '</amendmentInfo></coverPage></formData>')
+        self.assertEqual(parse_submission(amended)['amendmentType'], 'NEW HOLDINGS')
+
+    def test_quarters_stop_at_today(self):
+        self.assertEqual(backfill_quarters(2023, 2024, today=date(2024, 5, 1)),
+                         [(2023, 1), (2023, 2), (2023, 3), (2023, 4), (2024, 1), (2024, 2)])
+
+    def test_progress_eta(self):
+        clock = [0.0]
+        progress = BackfillProgress(10, timer=lambda: clock[0])
+        for _ in range(4):
+            clock[0] += 0.5
+            progress.add(DONE, size=1000, holdings=3)
+        snapshot = progress.snapshot()
+        self.assertEqual(snapshot['filingsPerSecond'], 2.0)
+        self.assertEqual(snapshot['etaSeconds'], 3.0)
+        self.assertEqual(snapshot['holdings'], 12)
+        self.assertIn('ETA 00:00:03', progress.describe())
+
+    def test_checkpoint_ignores_torn_line(self):
+        tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp, ignore_errors=True)
+        path = Path(tmp) / 'checkpoint.jsonl'
+        checkpoint = BackfillCheckpoint(str(path))
+        checkpoint.record('A', FAILED, attempts=1)
+        checkpoint.record('A', DONE, holdings=3)
+        checkpoint.close()
+        with open(path, 'a') as f:
+            f.write('{"accessionNumber": "B", "sta')
+        reloaded = BackfillCheckpoint(str(path))
+        self.assertEqual(reloaded.status('A'), DONE)
+        self.assertIsNone(reloaded.status('B'))
+        reloaded.record('B', SKIPPED)
+        reloaded.close()
+        again = BackfillCheckpoint(str(path))
+        self.addCleanup(again.close)
+        self.assertEqual(again.status('B'), SKIPPED)
+
+
+class TestBackfillCrawler(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), StandInArchive)
+        cls.thread = threading.Thread(target=cls.server.serve_forever, daemon=True)
+        cls.thread.start()
+        cls.base_url = f"http://127.0.0.1:{cls.server.server_address[1]}"
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        StandInArchive.hits = []
+        StandInArchive.missing = set()
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp, ignore_errors=True)
+        engine = create_engine(f"sqlite:///{self.tmp}/backfill.db", connect_args={"check_same_thread": False})
+        Base.metadata.create_all(bind=engine)
+        self.addCleanup(engine.dispose)
+        self.Session = sessionmaker(bind=engine)
+        self.service = EDGARService(limiter=AdaptiveLimiter(max_rate=500, min_rate=5, max_concurrency=4,
+                                                            failure_threshold=10, cooldown=30, max_wait=2))
+        self.service.base_url = self.base_url
+        self.checkpoint = f"{self.tmp}/checkpoint.jsonl"
+
+    def crawler(self):
+        return BackfillCrawler(self.service, session_factory=self.Session, ingest=IngestService(),
+                               checkpoint_path=self.checkpoint, workers=3)
+
+    def fetched(self):
+        return [path for path in StandInArchive.hits if path.endswith('.txt')]
+
+    def test_backfill_ingests_all_13f_filings(self):
+        result = self.crawler().run(2023, 2023, today=date(2023, 6, 30))
+        self.assertEqual((result['total'], result['ingested'], result['skipped'], result['failed']), (5, 4, 1, 0))
+        self.assertEqual(result['holdings'], 5)
+        self.assertNotIn('/edgar/data/1234/0000001234-23-000001.txt', self.fetched())
+
+        db = self.Session()
+        self.addCleanup(db.close)
+        filing = db.get(Filing, '0001001000-23-000002')
+        self.assertTrue(filing.is_amended)
+        self.assertEqual(str(filing.period_of_report), '2022-12-31')
+        # 2023年之后提交的value已是美元
+        apple = db.query(Holding).filter_by(accession_number='0001001000-23-000003').one()
+        self.assertEqual((apple.cusip, apple.shares, apple.value), ('037833100', 12, 1500.0))
+
+    def test_resumes_after_interruption(self):
+        first = self.crawler().run(2023, 2023, today=date(2023, 6, 30), limit=2)
+        self.assertEqual(first['processed'], 2)
+        fetched_first = set(self.fetched())
+        StandInArchive.hits = []
+
+        second = self.crawler().run(2023, 2023, today=date(2023, 6, 30))
+        self.assertEqual(second['total'], 3)
+        self.assertFalse(fetched_first & set(self.fetched()))
+
+        # 全部完成后再次运行不再下载
+        StandInArchive.hits = []
+        self.assertEqual(self.crawler().run(2023, 2023, today=date(2023, 6, 30))['total'], 0)
+        self.assertEqual(self.fetched(), [])
+
+    def test_failures_are_retried_then_abandoned(self):
+        broken = '/edgar/data/1002/0001002000-23-000001.txt'
+        StandInArchive.missing = {broken}
+        crawler = self.crawler()
+        crawler.max_attempts = 2
+        self.assertEqual(crawler.run(2023, 2023, today=date(2023, 6, 30))['failed'], 1)
+        with open(self.checkpoint) as f:
+            records = [json.loads(line) for line in f]
+        self.assertEqual([r['status'] for r in records if r['accessionNumber'] == '0001002000-23-000001'], [FAILED])
+
+        self.assertEqual(crawler.run(2023, 2023, today=date(2023, 6, 30))['failed'], 1)
+        # 达到最大尝试次数后不再请求
+        StandInArchive.hits = []
+        self.assertEqual(crawler.run(2023, 2023, today=date(2023, 6, 30))['total'], 0)
+
+    def test_missing_quarter_index_is_skipped(self):
+        result = self.crawler().run(2023, 2023, today=date(2023, 12, 31))
+        self.assertEqual(result['ingested'], 4)
+        self.assertIn('/edgar/full-index/2023/QTR4/form.idx', StandInArchive.hits)
+        checkpoint = BackfillCheckpoint(self.checkpoint)
+        self.addCleanup(checkpoint.close)
+        self.assertEqual(checkpoint.status('0001003000-23-000001'), SKIPPED)
+
+
+if __name__ == '__main__':
+    unittest.main()
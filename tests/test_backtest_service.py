@@ -0,0 +1,79 @@
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+# 添加backend目录到Python路径
+project_root = Path(__file__).parent.parent.absolute()
+backend_dir = project_root / 'backend'
+sys.path.insert(0, str(backend_dir))
+
+from app.services.backtest_service import BacktestEngine, BacktestParams, simulate
+from app.services.price_store import PriceStore
+
+
+def make_store():
+    dates = pd.bdate_range('2023-01-02', periods=6)
+    closes = np.array([
+        [100.0, 50.0],
+        [110.0, 50.0],
+        [121.0, 55.0],
+        [121.0, 60.5],
+        [110.0, 60.5],
+        [110.0, 66.55],
+    ])
+    return PriceStore(dates.values, ['AAA000001', 'BBB000002'], closes)
+
+
+def make_history():
+    return [
+        pd.DataFrame({'cusip': ['AAA000001'], 'value': [1000.0], 'filingDate': ['2023-01-02'],
+                      'periodOfReport': ['2022-12-30'], 'accessionNumber': ['A-1']}),
+        pd.DataFrame({'cusip': ['AAA000001', 'BBB000002'], 'value': [500.0, 500.0], 'filingDate': ['2023-01-05'] * 2,
+                      'periodOfReport': ['2022-12-31'] * 2, 'accessionNumber': ['A-2'] * 2}),
+    ]
+
+
+class TestBacktestEngine(unittest.TestCase):
+    def test_simulate_rebalances_at_filing_date(self):
+        """测试按提交日调仓的组合收益"""
+        result = simulate(make_store(), '0000000001', make_history(), BacktestParams())
+
+        # 第一期全仓AAA：+10%, +10%, 0%；第二期50/50建仓后买入持有，权重随价格漂移
+        drifted_a = 0.5 * 110 / 121
+        expected = [0.10, 0.10, 0.0, (110 / 121 - 1) / 2, 0.5 * 0.10 / (drifted_a + 0.5)]
+        np.testing.assert_allclose(result.returns, expected, atol=1e-9)
+        self.assertEqual(result.rebalance_dates, ['2023-01-02', '2023-01-05'])
+        self.assertEqual(result.summary()['days'], 5)
+
+    def test_period_lag_and_equal_weight(self):
+        """测试报告期加延迟调仓与等权"""
+        params = BacktestParams(rebalance='period', lag_days=3, weighting='equal')
+        result = simulate(make_store(), '0000000001', make_history(), params)
+        self.assertEqual(result.rebalance_dates, ['2023-01-02', '2023-01-03'])
+        self.assertAlmostEqual(result.returns[0], 0.10)
+
+    def test_invalid_params(self):
+        with self.assertRaises(ValueError):
+            BacktestParams(rebalance='daily')
+
+    def test_run_many_uses_cache_and_processes(self):
+        """测试多进程回测与结果缓存"""
+        with tempfile.TemporaryDirectory() as tmp:
+            make_store().save(tmp)
+            engine = BacktestEngine(PriceStore.open(tmp))
+            histories = {'0000000001': make_history(), '0000000002': make_history()[:1]}
+
+            results = engine.run_many(histories, max_workers=2)
+            self.assertEqual(set(results), set(histories))
+            np.testing.assert_allclose(results['0000000002'].returns, [0.10, 0.10, 0.0, -1 / 11, 0.0])
+
+            again = engine.run_many(histories, max_workers=2)
+            self.assertIs(again['0000000001'], results['0000000001'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,105 @@
+import sys
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+import pandas as pd
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+# 添加backend目录到Python路径
+project_root = Path(__file__).parent.parent.absolute()
+backend_dir = project_root / 'backend'
+sys.path.insert(0, str(backend_dir))
+
+from app.api.deps import get_edgar_service
+from app.routers import edgar
+from app.services.edgar_service import EDGARService
+
+FILINGS = [{
+    'date': '2024-02-14',
+    'reportDate': '2023-12-31',
+    'accessionNumber': '0001234567-24-000001',
+    'primaryDocument': 'infotable.xml',
+    'xmlUrl': 'http://test.url/xml',
+    'isAmended': False,
+}]
+
+HOLDINGS = pd.DataFrame([{
+    'rank': 1, 'nameOfIssuer': 'APPLE INC', 'titleOfClass': 'COM', 'cusip': '037833100',
+    'value': 1000000, 'shares': 5000, 'shareType': 'SH', 'percentOfPortfolio': 100.0,
+    'averagePrice': 200.0, 'investmentDiscretion': 'SOLE', 'otherManager': '',
+    'sole_voting': 5000, 'shared_voting': 0, 'no_voting': 0, 'filingDate': '2024-02-14',
+    'periodOfReport': '2023-12-31', 'accessionNumber': '0001234567-24-000001',
+    'isAmended': False, 'fundCik': '0001234567',
+}])
+
+
+class TestConditionalGet(unittest.TestCase):
+    def setUp(self):
+        app = FastAPI()
+        app.include_router(edgar.router, prefix="/api/v1/edgar")
+        service = self.service = EDGARService()
+        app.dependency_overrides[get_edgar_service] = lambda: service
+        self.client = TestClient(app)
+        patches = [
+            patch.object(service, 'get_13f_filings', return_value=FILINGS),
+            patch.object(service, 'get_fund_holdings', return_value=HOLDINGS.copy()),
+        ]
+        self.mocks = [p.start() for p in patches]
+        for p in patches:
+            self.addCleanup(p.stop)
+
+    def test_holdings_etag_round_trip(self):
+        """测试持仓接口的ETag与304"""
+        first = self.client.get('/api/v1/edgar/holdings/1234567/2024')
+        self.assertEqual(first.status_code, 200)
+        etag = first.headers['etag']
+        self.assertIn('max-age', first.headers['cache-control'])
+        self.assertEqual(first.headers['last-modified'], 'Wed, 14 Feb 2024 00:00:00 GMT')
+        # 只返回响应模型中的字段
+        holding = first.json()[0]
+        self.assertEqual(holding['cusip'], '037833100')
+        self.assertNotIn('fundCik', holding)
+
+        get_holdings = self.mocks[1]
+        get_holdings.reset_mock()
+        second = self.client.get('/api/v1/edgar/holdings/1234567/2024', headers={'If-None-Match': etag})
+        self.assertEqual(second.status_code, 304)
+        self.assertEqual(second.content, b'')
+        self.assertEqual(second.headers['etag'], etag)
+        get_holdings.assert_not_called()
+
+    def test_filings_if_modified_since(self):
+        """测试文件列表接口的If-Modified-Since"""
+        response = self.client.get('/api/v1/edgar/filings/1234567/2024',
+                                   headers={'If-Modified-Since': 'Thu, 15 Feb 2024 00:00:00 GMT'})
+        self.assertEqual(response.status_code, 304)
+
+        response = self.client.get('/api/v1/edgar/filings/1234567/2024',
+                                   headers={'If-Modified-Since': 'Tue, 13 Feb 2024 00:00:00 GMT'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()), 1)
+
+    def test_etag_changes_with_new_filing(self):
+        etag = self.client.get('/api/v1/edgar/filings/1234567/2024').headers['etag']
+        self.mocks[0].return_value = FILINGS + [dict(FILINGS[0], accessionNumber='0001234567-24-000002')]
+        # 文件监控发现新文件时会使缓存的文件列表失效
+        self.service.invalidate_filings('1234567')
+        response = self.client.get('/api/v1/edgar/filings/1234567/2024', headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.headers['etag'], etag)
+
+    def test_filing_list_served_from_cache(self):
+        first = self.client.get('/api/v1/edgar/filings/1234567/2024')
+        self.assertEqual(first.headers['x-cache-status'], 'MISS')
+        self.assertEqual(first.headers['age'], '0')
+
+        second = self.client.get('/api/v1/edgar/holdings/1234567/2024')
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual(second.headers['x-cache-status'], 'HIT')
+        self.mocks[0].assert_called_once()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,91 @@
+import gzip
+import io
+import json
+import sys
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+import pandas as pd
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy.orm import sessionmaker
+
+# 添加backend目录到Python路径
+project_root = Path(__file__).parent.parent.absolute()
+backend_dir = project_root / 'backend'
+sys.path.insert(0, str(backend_dir))
+
+from app.crud import holdings as holdings_crud
+from app.routers import edgar
+from app.services import export_service
+from conftest import filing, memory_engine
+
+
+def make_holdings(prefix, n):
+    return pd.DataFrame({
+        'nameOfIssuer': [f'{prefix} {i}' for i in range(n)],
+        'cusip': [f'{i:09d}' for i in range(n)],
+        'value': [1000.0 * (i + 1) for i in range(n)],
+        'shares': [10.0] * n,
+    })
+
+
+class TestExportEncoding(unittest.TestCase):
+    def test_csv_header_written_once(self):
+        frames = [make_holdings('A', 3), make_holdings('B', 2)]
+        text = b''.join(export_service.encode_csv(frames, chunk_rows=2)).decode()
+        lines = text.strip().splitlines()
+        self.assertEqual(lines[0], 'nameOfIssuer,cusip,value,shares')
+        self.assertEqual(len(lines), 6)
+
+    def test_gzip_ndjson_round_trip(self):
+        frames = [make_holdings('A', 7)]
+        data = b''.join(export_service.export_stream(frames, 'ndjson', 'gzip', chunk_rows=3))
+        rows = [json.loads(line) for line in gzip.decompress(data).splitlines()]
+        self.assertEqual(len(rows), 7)
+        self.assertEqual(rows[6]['nameOfIssuer'], 'A 6')
+
+    def test_unknown_format(self):
+        with self.assertRaises(ValueError):
+            export_service.export_stream([], 'xml')
+
+
+class TestExportEndpoint(unittest.TestCase):
+    def setUp(self):
+        Session = sessionmaker(bind=memory_engine())
+        db = Session()
+        for cik, n in (('0000000001', 3), ('0000000002', 4)):
+            holdings_crud.load_filing(db, filing(f'{cik}-24-000001', '2024-02-14', '2023-12-31'),
+                                      make_holdings(cik, n), cik=cik)
+        # 同一报告期的修正文件覆盖原文件
+        amendment = filing('0000000002-24-000002', '2024-03-01', '2023-12-31', amended=True)
+        holdings_crud.load_filing(db, amendment, make_holdings('0000000002', 2), cik='0000000002')
+        db.close()
+
+        patcher = patch('app.db.session.SessionLocal', Session)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        app = FastAPI()
+        app.include_router(edgar.router, prefix="/api/v1/edgar")
+        self.client = TestClient(app)
+
+    def test_stream_stored_period_csv_gzip(self):
+        """测试按报告期流式导出已入库持仓"""
+        response = self.client.get('/api/v1/edgar/export/holdings',
+                                   params={'period': '2023-12-31', 'format': 'csv', 'compression': 'gzip'})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('holdings_2023-12-31.csv.gz', response.headers['content-disposition'])
+        frame = pd.read_csv(io.BytesIO(gzip.decompress(response.content)), dtype={'cik': str})
+        self.assertEqual(len(frame), 5)
+        self.assertEqual(sorted(frame['accession_number'].unique()),
+                         ['0000000001-24-000001', '0000000002-24-000002'])
+
+    def test_period_required(self):
+        response = self.client.get('/api/v1/edgar/export/holdings')
+        self.assertEqual(response.status_code, 400)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,111 @@
+import sys
+import time
+import unittest
+from datetime import date
+from pathlib import Path
+from unittest.mock import Mock
+
+import pandas as pd
+
+# 添加backend目录到Python路径
+project_root = Path(__file__).parent.parent.absolute()
+backend_dir = project_root / 'backend'
+sys.path.insert(0, str(backend_dir))
+
+from app.crud import holdings as holdings_crud
+from app.services.edgar_service import EDGARService
+from app.services.filer_directory import FilerDirectory, FilerIndex
+from conftest import memory_session
+
+FORM_IDX = """Description:           Master Index of EDGAR Dissemination Feed by Form Type
+Last Data Received:    December 31, 2023
+
+Form Type   Company Name                                                  CIK         Date Filed  File Name
+---------------------------------------------------------------------------------------------------------------------------------------------
+10-K        APPLE INC                                                     320193      2023-11-03  edgar/data/320193/0000320193-23-000106.txt
+13F-HR      BERKSHIRE HATHAWAY INC                                        1067983     2023-11-14  edgar/data/1067983/0000950123-23-011011.txt
+13F-HR/A    Renaissance Technologies LLC                                  1037389     2023-11-20  edgar/data/1037389/0001037389-23-000040.txt
+"""
+
+
+class TestFormIndex(unittest.TestCase):
+    def test_parse_form_index(self):
+        entries = EDGARService().parse_form_index(FORM_IDX, ['13F-HR', '13F-HR/A'])
+        self.assertEqual(len(entries), 2)
+        self.assertEqual(entries[0]['company'], 'BERKSHIRE HATHAWAY INC')
+        self.assertEqual(entries[0]['cik'], '0001067983')
+        self.assertEqual(entries[1]['form'], '13F-HR/A')
+        self.assertEqual(entries[1]['accessionNumber'], '0001037389-23-000040')
+
+
+class TestFilerIndex(unittest.TestCase):
+    def setUp(self):
+        self.index = FilerIndex([
+            {'cik': '0001423053', 'name': 'Citadel Advisors LLC', 'manager': 'Kenneth Griffin', 'aum': 2e11},
+            {'cik': '0001037389', 'name': 'Renaissance Technologies LLC', 'manager': 'James Simons', 'aum': 1.3e11},
+            {'cik': '0001350694', 'name': 'Bridgewater Associates, LP', 'manager': 'Ray Dalio', 'aum': 1.4e11},
+            {'cik': '0001167483', 'name': 'Tiger Global Management LLC', 'manager': None, 'aum': 1e10},
+        ])
+
+    def test_prefix_and_multi_word(self):
+        total, funds = self.index.search('rena')
+        self.assertEqual(total, 1)
+        self.assertEqual(funds[0]['cik'], '0001037389')
+
+        total, funds = self.index.search('ray dal')
+        self.assertEqual(funds[0]['name'], 'Bridgewater Associates, LP')
+
+    def test_fuzzy_fallback_and_cik(self):
+        total, funds = self.index.search('brigewater')
+        self.assertGreaterEqual(total, 1)
+        self.assertEqual(funds[0]['cik'], '0001350694')
+
+        total, funds = self.index.search('1423')
+        self.assertEqual(funds[0]['name'], 'Citadel Advisors LLC')
+
+    def test_empty_query_sorted_by_aum_and_paginated(self):
+        total, funds = self.index.search('', offset=1, limit=2)
+        self.assertEqual(total, 4)
+        self.assertEqual([f['cik'] for f in funds], ['0001350694', '0001037389'])
+
+    def test_typeahead_latency(self):
+        """测试约1万家机构时的前缀搜索延迟"""
+        words = ['CAPITAL', 'PARTNERS', 'ADVISORS', 'MANAGEMENT', 'ASSET', 'GLOBAL', 'INVESTMENT']
+        entries = [{'cik': f'{i:010d}', 'name': f'{words[i % 7]} FUND{i} {words[(i * 3) % 7]} LLC', 'aum': i}
+                   for i in range(10_000)]
+        index = FilerIndex(entries)
+        queries = ['cap', 'fund12', 'global inv', 'partners fund9', 'managment']
+        start = time.perf_counter()
+        for _ in range(20):
+            for q in queries:
+                index.search(q)
+        elapsed_ms = (time.perf_counter() - start) * 1000 / (20 * len(queries))
+        self.assertLess(elapsed_ms, 5.0)
+
+
+class TestFilerDirectory(unittest.TestCase):
+    def test_refresh_and_load_with_aum(self):
+        db = memory_session()
+
+        edgar_service = Mock()
+        edgar_service.get_form_index.side_effect = lambda year, quarter, forms: (
+            EDGARService().parse_form_index(FORM_IDX, forms) if (year, quarter) == (2023, 4) else []
+        )
+        directory = FilerDirectory()
+        refreshed = directory.refresh_from_edgar(edgar_service, db, quarters=2, today=date(2024, 1, 15))
+        self.assertEqual(refreshed, 2)
+
+        filing = {'accessionNumber': '0000950123-23-011011', 'date': '2023-11-14',
+                  'reportDate': '2023-09-30', 'isAmended': False}
+        holdings_crud.load_filing(db, filing, pd.DataFrame({'cusip': ['037833100'], 'value': [5e9]}),
+                                  cik='0001067983')
+
+        self.assertEqual(directory.load(db), 2)
+        result = directory.search('berk')
+        self.assertEqual(result['total'], 1)
+        self.assertEqual(result['funds'][0]['aum'], 5e9)
+        db.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
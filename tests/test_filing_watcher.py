@@ -0,0 +1,78 @@
+import asyncio
+import sys
+import unittest
+from pathlib import Path
+from unittest.mock import Mock
+
+import pandas as pd
+
+# 添加backend目录到Python路径
+project_root = Path(__file__).parent.parent.absolute()
+backend_dir = project_root / 'backend'
+sys.path.insert(0, str(backend_dir))
+
+from app.services.filing_watcher import FilingWatcher
+from app.services.holdings_delta import compute_position_delta
+
+Q3 = {'date': '2023-11-14', 'reportDate': '2023-09-30', 'accessionNumber': 'A-Q3', 'isAmended': False}
+Q4 = {'date': '2024-02-14', 'reportDate': '2023-12-31', 'accessionNumber': 'A-Q4', 'isAmended': False}
+
+HOLDINGS = {
+    'A-Q3': pd.DataFrame({'cusip': ['AAA', 'BBB'], 'nameOfIssuer': ['A', 'B'],
+                          'shares': [100.0, 50.0], 'value': [1000.0, 500.0]}),
+    'A-Q4': pd.DataFrame({'cusip': ['AAA', 'CCC'], 'nameOfIssuer': ['A', 'C'],
+                          'shares': [150.0, 10.0], 'value': [1600.0, 200.0]}),
+}
+
+
+class TestPositionDelta(unittest.TestCase):
+    def test_compute_position_delta(self):
+        delta = compute_position_delta(HOLDINGS['A-Q3'], HOLDINGS['A-Q4']).set_index('cusip')
+        self.assertEqual(delta.loc['AAA', 'status'], 'increased')
+        self.assertAlmostEqual(delta.loc['AAA', 'sharesChangePct'], 50.0)
+        self.assertEqual(delta.loc['BBB', 'status'], 'closed')
+        self.assertEqual(delta.loc['CCC', 'status'], 'new')
+        self.assertTrue(pd.isna(delta.loc['CCC', 'sharesChangePct']))
+
+
+class TestFilingWatcher(unittest.TestCase):
+    def test_single_upstream_check_fans_out(self):
+        """测试多个订阅者关注同一基金时每轮只请求一次"""
+        service = Mock()
+        filings = {'0000000001': [Q3], '0000000002': []}
+        service.get_13f_filings.side_effect = lambda cik: filings[cik]
+        service.load_filing_holdings.side_effect = lambda cik, filing: HOLDINGS[filing['accessionNumber']]
+
+        async def scenario():
+            watcher = FilingWatcher(interval=3600)
+            watcher.edgar_service = service
+            plain = [watcher.subscribe(['0000000001']) for _ in range(3)]
+            with_delta = watcher.subscribe(['0000000001', '0000000002'], include_delta=True)
+
+            self.assertEqual(await watcher.check_once(), 0)
+            self.assertEqual(service.get_13f_filings.call_count, 2)
+
+            filings['0000000001'] = [Q4, Q3]
+            self.assertEqual(await watcher.check_once(), 1)
+            self.assertEqual(service.get_13f_filings.call_count, 4)
+            service.invalidate_filings.assert_called_once_with('0000000001')
+            # 增减仓只计算一次（新旧两份持仓各解析一次）
+            self.assertEqual(service.load_filing_holdings.call_count, 2)
+
+            for sub in plain:
+                event = sub.queue.get_nowait()
+                self.assertEqual(event['filing']['accessionNumber'], 'A-Q4')
+                self.assertNotIn('delta', event)
+            event = with_delta.queue.get_nowait()
+            self.assertEqual(event['delta']['newPositions'], 1)
+            self.assertEqual(event['delta']['previousAccessionNumber'], 'A-Q3')
+
+            for sub in plain + [with_delta]:
+                watcher.unsubscribe(sub)
+            self.assertEqual(watcher.watched_ciks, [])
+
+        asyncio.run(scenario())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,167 @@
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from datetime import date
+from pathlib import Path
+from unittest.mock import patch
+
+import numpy as np
+import pandas as pd
+
+# 添加backend目录到Python路径
+project_root = Path(__file__).parent.parent.absolute()
+backend_dir = project_root / 'backend'
+sys.path.insert(0, str(backend_dir))
+
+from app.services import fund_similarity as similarity_module
+from app.services.fund_similarity import FundSimilarityIndex, MinHasher, positions_frame
+from app.services.ingest_service import IngestService
+from conftest import filing, memory_session
+
+PERIOD = date(2023, 12, 31)
+
+
+def holdings(cusips, values=None):
+    values = values if values is not None else [100.0] * len(cusips)
+    return pd.DataFrame({'cusip': cusips, 'value': values, 'putCall': [None] * len(cusips)})
+
+
+def universe(seed=3, funds=200):
+    """基金0-9共享一个核心组合，其余基金随机持仓"""
+    rng = np.random.default_rng(seed)
+    names = np.array([f'{i:08d}X' for i in range(3000)])
+    core = names[:80]
+    portfolios = {}
+    for fund in range(funds):
+        if fund < 10:
+            picks = np.concatenate([core, rng.choice(names[80:], 10, replace=False)])
+        else:
+            picks = rng.choice(names, 90, replace=False)
+        portfolios[f'{fund:010d}'] = list(picks)
+    return portfolios
+
+
+class TestMinHasher(unittest.TestCase):
+    def test_jaccard_estimate(self):
+        hasher = MinHasher(num_perm=256)
+        a = [f'A{i}' for i in range(100)]
+        b = [f'A{i}' for i in range(50, 150)]
+        frame = pd.concat([
+            pd.DataFrame({'cik': '1', 'cusip': a, 'value': 1.0}),
+            pd.DataFrame({'cik': '2', 'cusip': b, 'value': 1.0}),
+        ])
+        sketches = hasher.sketch(frame.sort_values(['cik', 'cusip']))
+        estimate = (sketches['signature'][0] == sketches['signature'][1]).mean()
+        self.assertAlmostEqual(estimate, 50 / 150, delta=0.08)
+        # 组合内的CUSIP分块计算不影响结果
+        chunked = hasher.sketch(frame.sort_values(['cik', 'cusip']), chunk=30)
+        np.testing.assert_array_equal(chunked['signature'], sketches['signature'])
+
+    def test_positions_exclude_options(self):
+        frame = pd.DataFrame({'cusip': ['A', 'A', 'B'], 'value': [1.0, 2.0, 5.0], 'putCall': [None, None, 'Put']})
+        positions = positions_frame(frame, cik='1')
+        self.assertEqual(positions.to_dict('records'), [{'cik': '1', 'cusip': 'A', 'value': 3.0}])
+
+
+class TestFundSimilarityIndex(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp, ignore_errors=True)
+
+    def make_index(self, **kwargs):
+        return FundSimilarityIndex(directory=self.tmp, num_perm=128, bands=64, sketch_dim=128, **kwargs)
+
+    def test_top_k_through_lsh(self):
+        index = self.make_index()
+        for cik, cusips in universe().items():
+            index.add_filing(cik, PERIOD, f'acc-{cik}', holdings(cusips))
+
+        result = index.similar('0000000000', k=5)
+        self.assertEqual(result['period'], str(PERIOD))
+        neighbours = [f['cik'] for f in result['funds']]
+        self.assertEqual(len(neighbours), 5)
+        self.assertLessEqual(set(neighbours), {f'{i:010d}' for i in range(1, 10)})
+        self.assertGreater(result['funds'][0]['jaccard'], 0.5)
+        self.assertGreater(result['funds'][0]['weightSimilarity'], 0.5)
+        # LSH只对少数候选计算相似度
+        self.assertLess(result['candidates'], 150)
+        self.assertIsNone(index.similar('9999999999'))
+        with self.assertRaises(ValueError):
+            index.similar('0000000000', by='sectors')
+
+    def test_persistence_and_incremental_updates(self):
+        writer = self.make_index()
+        portfolios = universe(funds=30)
+        for cik, cusips in portfolios.items():
+            writer.add_filing(cik, PERIOD, f'acc-{cik}', holdings(cusips))
+
+        reader = self.make_index()
+        before = reader.similar('0000000000', k=3)
+        self.assertEqual(before, writer.similar('0000000000', k=3))
+
+        # 其他进程追加的修正文件在下次查询时读入，同一基金以最后一条记录为准
+        writer.add_filing('0000000029', PERIOD, 'acc-amended', holdings(portfolios['0000000000']))
+        after = reader.similar('0000000000', k=1)
+        self.assertEqual(after['funds'][0]['cik'], '0000000029')
+        self.assertEqual(after['funds'][0]['accessionNumber'], 'acc-amended')
+        self.assertEqual(after['funds'][0]['jaccard'], 1.0)
+
+    def test_torn_record_and_parameter_change(self):
+        index = self.make_index()
+        index.add_filing('0000000001', PERIOD, 'acc-1', holdings(['A', 'B']))
+        path = os.path.join(self.tmp, f'{PERIOD.isoformat()}.bin')
+        with open(path, 'ab') as f:
+            f.write(b'\x00' * 17)
+        index.add_filing('0000000002', PERIOD, 'acc-2', holdings(['A', 'B']))
+        self.assertEqual(os.path.getsize(path), 2 * index.dtype.itemsize)
+        self.assertEqual(self.make_index().similar('0000000001')['funds'][0]['cik'], '0000000002')
+
+        with self.assertRaises(ValueError):
+            FundSimilarityIndex(directory=self.tmp, num_perm=64, bands=32, sketch_dim=128).similar('0000000001')
+
+
+class TestSimilarityIngest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp, ignore_errors=True)
+        self.db = memory_session()
+        self.addCleanup(self.db.close)
+        self.index = FundSimilarityIndex(directory=self.tmp, num_perm=64, bands=32, sketch_dim=64)
+        patcher = patch.object(similarity_module, 'fund_similarity', self.index)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.service = IngestService()
+        self.service.register_hook(similarity_module.index_similarity, name='similarity')
+
+    def ingest(self, cik, accession, filed, cusips):
+        frame = holdings(cusips).assign(nameOfIssuer='x', shares=1)
+        self.service.ingest_filing(self.db, cik, filing(accession, filed, str(PERIOD)), frame)
+
+    def test_indexed_after_commit(self):
+        self.ingest('0000000001', 'a1', '2024-02-14', ['A', 'B', 'C'])
+        self.ingest('0000000002', 'a2', '2024-02-14', ['A', 'B', 'C'])
+        self.assertEqual(self.index.similar('0000000001')['funds'][0]['cik'], '0000000002')
+
+        # 回滚的事务不写入索引
+        def fail(db, context):
+            raise RuntimeError('boom')
+
+        self.service.register_hook(fail, name='fail')
+        with self.assertRaises(RuntimeError):
+            self.ingest('0000000003', 'a3', '2024-02-14', ['A', 'B', 'C'])
+        self.assertIsNone(self.index.similar('0000000003'))
+
+    def test_rebuild_from_database(self):
+        self.ingest('0000000001', 'a1', '2024-02-14', ['A', 'B', 'C'])
+        self.ingest('0000000002', 'a2', '2024-02-14', ['A', 'B', 'D'])
+        rebuilt = FundSimilarityIndex(directory=os.path.join(self.tmp, 'rebuilt'), num_perm=64, bands=32,
+                                      sketch_dim=64)
+        self.assertEqual(rebuilt.rebuild(self.db, PERIOD), {'period': str(PERIOD), 'funds': 2})
+        result = rebuilt.similar('0000000001')
+        self.assertAlmostEqual(result['funds'][0]['jaccard'], 0.5, delta=0.2)
+
+
+if __name__ == '__main__':
+    unittest.main()
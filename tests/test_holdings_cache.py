@@ -0,0 +1,135 @@
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+import numpy as np
+import pandas as pd
+
+# 添加backend目录到Python路径
+project_root = Path(__file__).parent.parent.absolute()
+backend_dir = project_root / 'backend'
+sys.path.insert(0, str(backend_dir))
+
+from app.core.shared_cache import FileCacheBackend, fcntl
+from app.services.edgar_service import EDGARService
+from app.services.holdings_cache import HoldingsCache, decode_frame, encode_frame
+
+HOLDINGS = pd.DataFrame({
+    'nameOfIssuer': ['APPLE INC', 'MICROSOFT CORP', 'APPLE INC'],
+    'cusip': ['037833100', '594918104', '037833100'],
+    'value': [1_000_000, 500_000, 250_000],
+    'shares': [5000.0, 1250.5, 1000.0],
+    'putCall': [None, 'CALL', None],
+    'isAmended': [False, False, True],
+    'filingDate': pd.to_datetime(['2024-02-14'] * 3),
+})
+
+
+def _populate(directory: str, counter_path: str, queue) -> None:
+    """子进程：模拟worker并发请求同一份文件"""
+    cache = HoldingsCache(FileCacheBackend(directory))
+
+    def loader():
+        with open(counter_path, 'a') as f:
+            f.write('parsed\n')
+        time.sleep(0.3)
+        return HOLDINGS
+
+    df = cache.get_or_load('0001234567-24-000001', loader)
+    queue.put(int(df['value'].sum()))
+
+
+class TestColumnarFormat(unittest.TestCase):
+    def test_round_trip(self):
+        decoded = decode_frame(encode_frame(HOLDINGS))
+        pd.testing.assert_frame_equal(decoded, HOLDINGS)
+
+        empty = decode_frame(encode_frame(HOLDINGS.iloc[:0]))
+        self.assertEqual(list(empty.columns), list(HOLDINGS.columns))
+        self.assertEqual(len(empty), 0)
+
+    def test_unsupported_column(self):
+        with self.assertRaises(TypeError):
+            encode_frame(pd.DataFrame({'mixed': ['a', 1]}))
+
+
+class TestFileCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.backend = FileCacheBackend(self.tmp.name)
+
+    def test_numeric_columns_map_without_copy(self):
+        cache = HoldingsCache(self.backend)
+        self.assertTrue(cache.set('A-1', HOLDINGS))
+        df = cache.get('A-1')
+        values = df['value'].to_numpy()
+        # 数值列直接映射自缓存文件（只读视图）
+        self.assertFalse(values.flags.writeable)
+        self.assertTrue(np.array_equal(values, HOLDINGS['value'].to_numpy()))
+        self.assertEqual(df.loc[1, 'putCall'], 'CALL')
+        self.assertIsNone(df.loc[0, 'putCall'])
+
+    def test_enrich_does_not_modify_cached_frame(self):
+        """测试丰富数据时复制命中缓存的持仓，不修改只读视图"""
+        cache = HoldingsCache(self.backend)
+        cache.set('A-1', HOLDINGS)
+        df = cache.get('A-1')
+        enriched = EDGARService().enrich_holdings_data(df)
+        self.assertEqual(list(enriched['rank']), [1, 2, 3])
+        self.assertNotIn('rank', df.columns)
+        pd.testing.assert_frame_equal(cache.get('A-1'), HOLDINGS)
+
+    def test_prune_evicts_oldest(self):
+        self.backend.set('old', b'x' * 100)
+        os.utime(self.backend._path('old'), (1, 1))
+        self.backend.set('new', b'y' * 100)
+        self.assertEqual(self.backend.prune(150), 1)
+        self.assertIsNone(self.backend.get('old'))
+        self.assertIsNotNone(self.backend.get('new'))
+
+    @unittest.skipIf(fcntl is None, "requires fcntl")
+    def test_single_population_across_processes(self):
+        """测试多个进程同时未命中时只有一个进程解析"""
+        counter_path = os.path.join(self.tmp.name, 'counter.txt')
+        ctx = multiprocessing.get_context('fork')
+        queue = ctx.Queue()
+        workers = [ctx.Process(target=_populate, args=(self.tmp.name, counter_path, queue)) for _ in range(4)]
+        for w in workers:
+            w.start()
+        for w in workers:
+            w.join(timeout=30)
+            self.assertEqual(w.exitcode, 0)
+
+        results = [queue.get(timeout=5) for _ in workers]
+        self.assertEqual(results, [1_750_000] * 4)
+        with open(counter_path) as f:
+            self.assertEqual(f.read().count('parsed'), 1)
+
+    def test_edgar_service_shares_parsed_filing(self):
+        filing = {'date': '2024-02-14', 'reportDate': '2023-12-31', 'accessionNumber': '0001234567-24-000001',
+                  'xmlUrl': 'http://test.url/xml', 'isAmended': False}
+        parsed = pd.DataFrame([{
+            'rank': 1, 'nameOfIssuer': 'APPLE INC', 'titleOfClass': 'COM', 'cusip': '037833100',
+            'value': 1000000, 'shares': 5000, 'shareType': 'SH', 'percentOfPortfolio': 100.0,
+            'averagePrice': 200.0, 'investmentDiscretion': 'SOLE', 'otherManager': '',
+            'sole_voting': 5000, 'shared_voting': 0, 'no_voting': 0,
+        }])
+        # 两个服务实例代表同一主机上的两个worker
+        first = EDGARService(holdings_cache=HoldingsCache(FileCacheBackend(self.tmp.name)))
+        second = EDGARService(holdings_cache=HoldingsCache(FileCacheBackend(self.tmp.name)))
+        with patch.object(EDGARService, 'parse_13f_xml', return_value=parsed) as parse:
+            a = first.load_filing_holdings('0001234567', filing)
+            b = second.load_filing_holdings('0001234567', filing)
+        self.assertEqual(parse.call_count, 1)
+        pd.testing.assert_frame_equal(a.reset_index(drop=True), b)
+        self.assertEqual(b.loc[0, 'accessionNumber'], '0001234567-24-000001')
+
+
+if __name__ == '__main__':
+    unittest.main()
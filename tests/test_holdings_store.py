@@ -0,0 +1,97 @@
+import sys
+import time
+import unittest
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import func, inspect, select
+from sqlalchemy.orm import sessionmaker
+
+# 添加backend目录到Python路径
+project_root = Path(__file__).parent.parent.absolute()
+backend_dir = project_root / 'backend'
+sys.path.insert(0, str(backend_dir))
+
+from app.crud import holdings as holdings_crud
+from app.models.holdings import Filing, Holding
+from conftest import memory_engine
+
+
+def make_holdings(n):
+    rng = np.random.default_rng(0)
+    return pd.DataFrame({
+        'nameOfIssuer': [f'ISSUER {i}' for i in range(n)],
+        'titleOfClass': 'COM',
+        'cusip': [f'{i:09d}' for i in range(n)],
+        'value': rng.integers(1, 10_000_000, n).astype(float),
+        'shares': rng.integers(1, 100_000, n).astype(float),
+        'shareType': 'SH',
+        'investmentDiscretion': 'SOLE',
+        'otherManager': '',
+        'sole_voting': 0,
+        'shared_voting': 0,
+        'no_voting': 0,
+    })
+
+
+def make_filing(accession='0001234567-24-000001', date='2024-02-14', amended=False):
+    return {'accessionNumber': accession, 'date': date, 'reportDate': '2023-12-31', 'isAmended': amended}
+
+
+class TestHoldingsStore(unittest.TestCase):
+    def setUp(self):
+        self.engine = memory_engine()
+        self.db = sessionmaker(bind=self.engine)()
+
+    def tearDown(self):
+        self.db.close()
+
+    def test_indexes_exist(self):
+        """测试按(cik, period)、(cusip, period)和accession建立索引"""
+        names = {ix['name'] for ix in inspect(self.engine).get_indexes('holdings')}
+        self.assertTrue({'ix_holdings_cik_period', 'ix_holdings_cusip_period', 'ix_holdings_accession'} <= names)
+
+    def test_bulk_load_and_upsert(self):
+        """测试批量加载以及按accession重复加载时替换持仓"""
+        df = make_holdings(50_000)
+        start = time.perf_counter()
+        count = holdings_crud.load_filing(self.db, make_filing(), df, cik='0001234567', filer_name='TEST FUND')
+        elapsed = time.perf_counter() - start
+        self.assertEqual(count, 50_000)
+        self.assertLess(elapsed, 5.0)
+
+        holdings_crud.load_filing(self.db, make_filing(), df.head(10), cik='0001234567')
+        total = self.db.execute(select(func.count()).select_from(Holding)).scalar()
+        self.assertEqual(total, 10)
+
+        filing = self.db.get(Filing, '0001234567-24-000001')
+        self.assertEqual(filing.holdings_count, 10)
+        self.assertEqual(str(filing.period_of_report), '2023-12-31')
+
+        frame = holdings_crud.read_holdings(self.db, ['0001234567-24-000001'])
+        self.assertEqual(len(frame), 10)
+        self.assertEqual(frame.iloc[0]['cik'], '0001234567')
+
+    def test_latest_filing_prefers_amendment(self):
+        holdings_crud.load_filing(self.db, make_filing(), make_holdings(3), cik='0001234567')
+        holdings_crud.load_filing(self.db, make_filing('0001234567-24-000002', '2024-03-01', True),
+                                  make_holdings(2), cik='0001234567')
+        latest = holdings_crud.get_latest_filing(self.db, '0001234567')
+        self.assertEqual(latest.accession_number, '0001234567-24-000002')
+
+        # 新增持仓修正文件与其修正的文件共同构成本期持仓
+        holdings_crud.load_filing(self.db, dict(make_filing('0001234567-24-000003', '2024-03-05', True),
+                                                amendmentType='new holdings'),
+                                  make_holdings(1), cik='0001234567')
+        filings = holdings_crud.get_period_filings(self.db, '0001234567')
+        self.assertEqual([f.accession_number for f in filings], ['0001234567-24-000002', '0001234567-24-000003'])
+        self.assertEqual(filings[-1].amendment_type, holdings_crud.NEW_HOLDINGS)
+        latest = holdings_crud.latest_filings_in_period(filings[0].period_of_report)
+        rows = self.db.execute(select(latest.c.accession_number, latest.c.is_latest)).all()
+        self.assertEqual(sorted((a, bool(l)) for a, l in rows),
+                         [('0001234567-24-000002', False), ('0001234567-24-000003', True)])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,117 @@
+import sys
+import time
+import unittest
+from pathlib import Path
+from unittest.mock import Mock, patch
+
+import numpy as np
+import pandas as pd
+
+# 添加backend目录到Python路径
+project_root = Path(__file__).parent.parent.absolute()
+backend_dir = project_root / 'backend'
+sys.path.insert(0, str(backend_dir))
+
+from app.services.edgar_service import EDGARService
+from app.services.holdings_validation import (
+    FRACTIONAL_SHARES, INVALID_CUSIP, NEGATIVE_SHARES, PRICE_OUTLIER, ZERO_SHARES,
+    cusip_check_digits, normalize_holdings, summarize_flags, valid_cusips,
+)
+
+XML = """<?xml version="1.0" encoding="UTF-8"?>
+<informationTable>
+    <infoTableEntry>
+        <nameOfIssuer>APPLE INC</nameOfIssuer>
+        <titleOfClass>COM</titleOfClass>
+        <cusip>037833100</cusip>
+        <value>1000</value>
+        <shares>5</shares>
+        <sshPrnamt>5</sshPrnamt>
+        <sshPrnamtType>SH</sshPrnamtType>
+        <investmentDiscretion>SOLE</investmentDiscretion>
+    </infoTableEntry>
+</informationTable>
+"""
+
+
+class TestCusipCheckDigits(unittest.TestCase):
+    def test_known_cusips(self):
+        cusips = ['037833100', '594918104', '46625H100', '30231G102', 'g5960l103']
+        np.testing.assert_array_equal(cusip_check_digits(cusips), [0, 4, 0, 2, 3])
+        self.assertTrue(valid_cusips(cusips).all())
+
+    def test_invalid_cusips(self):
+        cusips = ['037833101', '03783310', '0378331000', '03783$100', None, '', '03783310X']
+        self.assertFalse(valid_cusips(cusips).any())
+        self.assertEqual(cusip_check_digits(cusips)[0], 0)
+        self.assertEqual(list(cusip_check_digits(cusips)[1:4]), [-1, -1, -1])
+
+
+class TestNormalizeHoldings(unittest.TestCase):
+    def test_value_units_follow_filing_date(self):
+        df = pd.DataFrame({
+            'cusip': ['037833100', '037833100'],
+            'value': ['1000', '1000000'],
+            'shares': ['5000', '5000'],
+            'filingDate': ['2022-11-14', '2023-02-14'],
+        })
+        result = normalize_holdings(df)
+        # 2023-01-03前以千美元申报
+        self.assertEqual(list(result['value']), [1_000_000.0, 1_000_000.0])
+        self.assertEqual(list(result['averagePrice']), [200.0, 200.0])
+        self.assertEqual(list(result['validationFlags']), [0, 0])
+
+        single = normalize_holdings(df.drop(columns='filingDate'), filing_date='2022-08-15')
+        self.assertEqual(list(single['value']), [1_000_000.0, 1_000_000_000.0])
+
+    def test_shares_and_anomalies(self):
+        df = pd.DataFrame({
+            'cusip': [' 037833100', '037833101', '594918104', '594918104', '46625H100'],
+            'value': [100.0, 100.0, 100.0, 100.0, 5e9],
+            'shares': [10, 10, -3, 2.5, 1],
+        })
+        result = normalize_holdings(df)
+        flags = result['validationFlags'].to_numpy()
+        self.assertEqual(result.loc[0, 'cusip'], '037833100')
+        self.assertEqual(flags[0], 0)
+        self.assertEqual(flags[1], INVALID_CUSIP)
+        self.assertEqual(flags[2], NEGATIVE_SHARES | ZERO_SHARES)
+        self.assertEqual(flags[3], FRACTIONAL_SHARES)
+        self.assertEqual(flags[4], PRICE_OUTLIER)
+        self.assertEqual(list(result['shares']), [10, 10, 0, 2, 1])
+        self.assertTrue(np.isnan(result.loc[2, 'averagePrice']))
+        self.assertEqual(summarize_flags(flags), {
+            'invalidCusip': 1, 'negativeShares': 1, 'fractionalShares': 1, 'zeroShares': 1, 'priceOutlier': 1,
+        })
+
+    def test_large_frame_is_fast(self):
+        n = 50_000
+        rng = np.random.default_rng(0)
+        df = pd.DataFrame({
+            'cusip': np.resize(['037833100', '594918104', '46625H100', 'BADCUSIP0'], n),
+            'value': rng.integers(1, 10**7, n).astype(str),
+            'shares': rng.integers(1, 10**5, n).astype(str),
+            'filingDate': np.resize(['2022-11-14', '2024-02-14'], n),
+        })
+        started = time.perf_counter()
+        result = normalize_holdings(df)
+        elapsed = time.perf_counter() - started
+        self.assertEqual(int((result['validationFlags'] & INVALID_CUSIP).astype(bool).sum()), n // 4)
+        self.assertLess(elapsed, 1.0)
+
+
+class TestParseNormalization(unittest.TestCase):
+    def test_parse_converts_legacy_thousands(self):
+        service = EDGARService()
+        with patch.object(service, '_make_request', return_value=Mock(text=XML)):
+            legacy = service.parse_13f_xml('http://test.url', filing_date='2022-11-14')
+            current = service.parse_13f_xml('http://test.url', filing_date='2024-02-14')
+        self.assertEqual(legacy.loc[0, 'value'], 1_000_000)
+        self.assertEqual(legacy.loc[0, 'averagePrice'], 200000.0)
+        self.assertEqual(current.loc[0, 'value'], 1000)
+        self.assertEqual(current.loc[0, 'averagePrice'], 200.0)
+        self.assertEqual(current.loc[0, 'shares'], 5)
+
+
+if __name__ == '__main__':
+    unittest.main()
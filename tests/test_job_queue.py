@@ -0,0 +1,264 @@
+import json
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from datetime import datetime, timedelta
+from pathlib import Path
+from unittest.mock import patch
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+# 添加backend目录到Python路径
+project_root = Path(__file__).parent.parent.absolute()
+backend_dir = project_root / 'backend'
+sys.path.insert(0, str(backend_dir))
+
+from app.models.user import Base
+from app.models.jobs import Job
+from app.routers import jobs as jobs_router
+from app.services.job_queue import (
+    CANCELLED, FAILED, QUEUED, RUNNING, SUCCEEDED, JobQueue, QueueFullError,
+)
+
+
+def wait_for(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.02)
+    return False
+
+
+class JobQueueTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp, ignore_errors=True)
+        # 文件数据库：调度线程和工作线程各自使用独立连接
+        engine = create_engine(f"sqlite:///{self.tmp}/jobs.db", connect_args={"check_same_thread": False})
+        Base.metadata.create_all(bind=engine)
+        self.addCleanup(engine.dispose)
+        self.Session = sessionmaker(bind=engine)
+
+    def make_queue(self, **kwargs):
+        options = dict(session_factory=self.Session, results_dir=f"{self.tmp}/results", max_workers=1,
+                       poll_seconds=0.02, progress_interval=0.0, heartbeat_seconds=0.05)
+        options.update(kwargs)
+        queue = JobQueue(**options)
+        self.addCleanup(queue.stop)
+        return queue
+
+    def status(self, queue, job_id):
+        return queue.get(job_id)['status']
+
+
+class TestJobQueue(JobQueueTestCase):
+    def test_job_runs_and_persists_result(self):
+        queue = self.make_queue()
+
+        def square(ctx):
+            ctx.progress(0.5, 'halfway')
+            return {'value': ctx.params['x'] ** 2}
+
+        queue.register('square', square, validate=lambda p: {'x': int(p['x'])})
+        job = queue.submit('square', {'x': '7'}, owner='alice')
+        self.assertEqual(job['status'], QUEUED)
+        self.assertEqual(job['params'], {'x': 7})
+
+        queue.start()
+        self.assertTrue(wait_for(lambda: self.status(queue, job['id']) == SUCCEEDED))
+        info = queue.get(job['id'])
+        self.assertEqual(info['progress'], 1.0)
+        self.assertEqual(info['attempts'], 1)
+        self.assertEqual(json.loads(queue.result_file(job['id']).read_text()), {'value': 49})
+        # 其他用户看不到该任务
+        self.assertIsNone(queue.get(job['id'], owner='bob'))
+
+    def test_failure_is_recorded(self):
+        queue = self.make_queue()
+
+        def fail(ctx):
+            raise RuntimeError('upstream exploded')
+
+        queue.register('fail', fail)
+        job = queue.submit('fail', {}, owner='alice')
+        queue.start()
+        self.assertTrue(wait_for(lambda: self.status(queue, job['id']) == FAILED))
+        self.assertIn('upstream exploded', queue.get(job['id'])['error'])
+        self.assertIsNone(queue.result_file(job['id']))
+
+    def test_priority_order(self):
+        queue = self.make_queue()
+        order = []
+        queue.register('record', lambda ctx: order.append(ctx.params['name']))
+        for name, priority in [('low', 0), ('high', 10), ('normal', 5), ('normal-later', 5)]:
+            queue.submit('record', {'name': name}, owner=name, priority=priority)
+
+        queue.start()
+        self.assertTrue(wait_for(lambda: len(order) == 4))
+        self.assertEqual(order, ['high', 'normal', 'normal-later', 'low'])
+
+    def test_per_user_concurrency_limit(self):
+        queue = self.make_queue(max_workers=3, max_running_per_user=1)
+        release = threading.Event()
+        queue.register('block', lambda ctx: release.wait(5))
+        a1 = queue.submit('block', {}, owner='alice')
+        a2 = queue.submit('block', {}, owner='alice')
+        b1 = queue.submit('block', {}, owner='bob')
+
+        queue.start()
+        self.assertTrue(wait_for(lambda: self.status(queue, b1['id']) == RUNNING))
+        self.assertEqual(self.status(queue, a1['id']), RUNNING)
+        time.sleep(0.1)
+        # 空闲worker不能执行alice的第二个任务
+        self.assertEqual(self.status(queue, a2['id']), QUEUED)
+
+        release.set()
+        self.assertTrue(wait_for(lambda: self.status(queue, a2['id']) == SUCCEEDED))
+
+    def test_queue_limits_and_validation(self):
+        queue = self.make_queue(max_queued_per_user=2)
+        queue.register('noop', lambda ctx: None)
+        queue.submit('noop', {}, owner='alice')
+        queue.submit('noop', {}, owner='alice')
+        with self.assertRaises(QueueFullError):
+            queue.submit('noop', {}, owner='alice')
+        queue.submit('noop', {}, owner='bob')
+        with self.assertRaises(ValueError):
+            queue.submit('unknown', {}, owner='bob')
+
+    def test_cancel(self):
+        queue = self.make_queue()
+        started = threading.Event()
+
+        def loop(ctx):
+            started.set()
+            while True:
+                ctx.progress(0.1)
+                time.sleep(0.01)
+
+        queue.register('loop', loop)
+        running = queue.submit('loop', {}, owner='alice')
+        queued = queue.submit('loop', {}, owner='bob')
+        self.assertEqual(queue.cancel(queued['id'])['status'], CANCELLED)
+
+        queue.start()
+        self.assertTrue(started.wait(5))
+        self.assertTrue(queue.cancel(running['id'])['cancelRequested'])
+        self.assertTrue(wait_for(lambda: self.status(queue, running['id']) == CANCELLED))
+        self.assertEqual(self.status(queue, queued['id']), CANCELLED)
+
+
+class TestJobRecovery(JobQueueTestCase):
+    def insert_orphan(self, attempts=1, checkpoint=None):
+        """模拟执行中崩溃的进程留下的任务"""
+        db = self.Session()
+        stale = datetime.utcnow() - timedelta(minutes=10)
+        db.add(Job(id='orphan', kind='count', params=json.dumps({'n': 5}), owner='alice', priority=0,
+                   status=RUNNING, progress=0.4, attempts=attempts, cancel_requested=False,
+                   worker_id='dead-host:1:abc', heartbeat_at=stale, created_at=stale, started_at=stale,
+                   checkpoint=json.dumps(checkpoint) if checkpoint else None))
+        db.commit()
+        db.close()
+
+    def test_resume_from_checkpoint_after_restart(self):
+        self.insert_orphan(checkpoint={'done': 3})
+        queue = self.make_queue(stale_seconds=60)
+        processed = []
+
+        def count(ctx):
+            start = (ctx.checkpoint or {}).get('done', 0)
+            for i in range(start, ctx.params['n']):
+                processed.append(i)
+                ctx.save_checkpoint({'done': i + 1})
+            return {'done': ctx.params['n']}
+
+        queue.register('count', count)
+        queue.start()
+        self.assertTrue(wait_for(lambda: self.status(queue, 'orphan') == SUCCEEDED))
+        self.assertEqual(processed, [3, 4])
+        self.assertEqual(queue.get('orphan')['attempts'], 2)
+
+    def test_live_jobs_are_not_recovered(self):
+        self.insert_orphan()
+        db = self.Session()
+        db.query(Job).update({'heartbeat_at': datetime.utcnow()})
+        db.commit()
+        db.close()
+        queue = self.make_queue(stale_seconds=60)
+        self.assertEqual(queue.recover(), 0)
+        self.assertEqual(self.status(queue, 'orphan'), RUNNING)
+
+    def test_gives_up_after_max_attempts(self):
+        self.insert_orphan(attempts=3)
+        queue = self.make_queue(max_attempts=3)
+        queue.recover()
+        info = queue.get('orphan')
+        self.assertEqual(info['status'], FAILED)
+        self.assertIn('Interrupted', info['error'])
+
+    def test_stop_requeues_unfinished_jobs(self):
+        queue = self.make_queue()
+        release = threading.Event()
+        started = threading.Event()
+
+        def block(ctx):
+            started.set()
+            release.wait(5)
+            return 'late'
+
+        queue.register('block', block)
+        job = queue.submit('block', {}, owner='alice')
+        queue.start()
+        self.assertTrue(started.wait(5))
+        queue.stop(timeout=0.1)
+        self.assertEqual(self.status(queue, job['id']), QUEUED)
+        # 已不属于本进程的任务完成后不覆盖状态
+        release.set()
+        time.sleep(0.1)
+        self.assertEqual(self.status(queue, job['id']), QUEUED)
+
+
+class TestJobsRouter(JobQueueTestCase):
+    def setUp(self):
+        super().setUp()
+        self.queue = self.make_queue()
+        self.queue.register('echo', lambda ctx: {'echo': ctx.params})
+        patcher = patch.object(jobs_router, 'job_queue', self.queue)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        app = FastAPI()
+        app.include_router(jobs_router.router, prefix="/api/v1/jobs")
+        self.client = TestClient(app)
+
+    def test_submit_poll_and_fetch_result(self):
+        response = self.client.post('/api/v1/jobs', json={'kind': 'echo', 'params': {'a': 1}})
+        self.assertEqual(response.status_code, 202)
+        job_id = response.json()['id']
+        self.assertEqual(response.headers['location'], f'/api/v1/jobs/{job_id}')
+
+        self.assertEqual(self.client.get(f'/api/v1/jobs/{job_id}/result').status_code, 409)
+        self.queue.start()
+        self.assertTrue(wait_for(
+            lambda: self.client.get(f'/api/v1/jobs/{job_id}').json()['status'] == SUCCEEDED
+        ))
+        result = self.client.get(f'/api/v1/jobs/{job_id}/result')
+        self.assertEqual(result.status_code, 200)
+        self.assertEqual(result.json(), {'echo': {'a': 1}})
+        self.assertEqual([j['id'] for j in self.client.get('/api/v1/jobs').json()['jobs']], [job_id])
+
+    def test_errors(self):
+        self.assertEqual(self.client.post('/api/v1/jobs', json={'kind': 'nope'}).status_code, 400)
+        self.assertEqual(self.client.get('/api/v1/jobs/missing').status_code, 404)
+        self.queue.max_queued_per_user = 0
+        self.assertEqual(self.client.post('/api/v1/jobs', json={'kind': 'echo'}).status_code, 429)
+
+
+if __name__ == '__main__':
+    unittest.main()
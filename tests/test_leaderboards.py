@@ -0,0 +1,170 @@
+import sys
+import unittest
+from pathlib import Path
+
+import pandas as pd
+
+# 添加backend目录到Python路径
+project_root = Path(__file__).parent.parent.absolute()
+backend_dir = project_root / 'backend'
+sys.path.insert(0, str(backend_dir))
+
+from app.models.leaderboards import SecurityPeriodActivity
+from app.services.ingest_service import IngestService
+from app.services import leaderboards
+from conftest import filing, holdings, memory_session
+
+
+def activity(db, period):
+    rows = db.query(SecurityPeriodActivity).filter_by(period_of_report=pd.Timestamp(period).date()).all()
+    return {r.cusip: (r.holders, r.new_positions, r.closed_positions, round(r.shares_bought, 6),
+                      round(r.shares_sold, 6), round(r.value_bought, 6), round(r.value_sold, 6))
+            for r in rows}
+
+
+class TestPositionChanges(unittest.TestCase):
+    def test_changes_against_previous_period(self):
+        current = pd.DataFrame({'cusip': ['A', 'B'], 'name_of_issuer': ['a', 'b'],
+                                'shares': [150.0, 10.0], 'value': [3000.0, 100.0]})
+        previous = pd.DataFrame({'cusip': ['A', 'C'], 'name_of_issuer': ['a', 'c'],
+                                 'shares': [100.0, 40.0], 'value': [1000.0, 200.0]})
+        changes = leaderboards.position_changes(current, previous).set_index('cusip')
+        # 按本期价格20估算买入金额，不计价格上涨
+        self.assertAlmostEqual(changes.loc['A', 'value_change'], 1000.0)
+        self.assertTrue(changes.loc['B', 'is_new'])
+        self.assertTrue(changes.loc['C', 'is_closed'])
+        # 清仓按上期价格估算卖出金额
+        self.assertAlmostEqual(changes.loc['C', 'value_change'], -200.0)
+
+        totals = leaderboards.aggregate_changes(changes.reset_index())
+        self.assertEqual(totals.loc['C', 'holders'], 0)
+        self.assertEqual(totals.loc['C', 'closed_positions'], 1)
+
+    def test_first_period_counts_holders_only(self):
+        current = pd.DataFrame({'cusip': ['A'], 'name_of_issuer': ['a'], 'shares': [5.0], 'value': [50.0]})
+        totals = leaderboards.aggregate_changes(leaderboards.position_changes(current, None))
+        self.assertEqual(totals.loc['A', 'holders'], 1)
+        self.assertEqual(totals.loc['A', 'new_positions'], 0)
+        self.assertEqual(totals.loc['A', 'shares_bought'], 0)
+
+
+class TestIncrementalLeaderboards(unittest.TestCase):
+    FILINGS = [
+        ('0000000001', filing('A-Q3', '2023-11-14', '2023-09-30'),
+         holdings([['037833100', 'APPLE', 1000.0, 100], ['594918104', 'MSFT', 500.0, 50]])),
+        ('0000000002', filing('B-Q3', '2023-11-10', '2023-09-30'),
+         holdings([['037833100', 'APPLE', 2000.0, 200]])),
+        ('0000000001', filing('A-Q4', '2024-02-14', '2023-12-31'),
+         holdings([['037833100', 'APPLE', 3000.0, 250], ['46625H100', 'JPM', 400.0, 20]])),
+        ('0000000002', filing('B-Q4', '2024-02-10', '2023-12-31'),
+         holdings([['037833100', 'APPLE', 1200.0, 100], ['594918104', 'MSFT', 800.0, 40]])),
+    ]
+
+    def ingest(self, db, filings):
+        service = IngestService()
+        service.register_hook(leaderboards.update_leaderboards, name='leaderboards')
+        for cik, f, frame in filings:
+            service.ingest_filing(db, cik, f, frame)
+
+    def setUp(self):
+        self.db = memory_session()
+        self.addCleanup(self.db.close)
+        self.ingest(self.db, self.FILINGS)
+        self.store = leaderboards.LeaderboardStore()
+
+    def test_boards(self):
+        bought = self.store.top(self.db, 'bought')
+        self.assertEqual(bought['period'], '2023-12-31')
+        self.assertEqual([i['cusip'] for i in bought['items']], ['037833100', '46625H100', '594918104'])
+        apple = bought['items'][0]
+        self.assertEqual(apple['holders'], 2)
+        self.assertAlmostEqual(apple['sharesBought'], 150.0)
+        self.assertAlmostEqual(apple['sharesSold'], 100.0)
+        # A按价格12买入150股，B按价格12卖出100股
+        self.assertAlmostEqual(apple['netValue'], 600.0)
+
+        # 微软：B新建仓40股（价格20），A清仓50股（按上期价格10）；按金额净买入，按股数净卖出
+        msft = bought['items'][2]
+        self.assertAlmostEqual(msft['netValue'], 300.0)
+        self.assertEqual((msft['newPositions'], msft['closedPositions']), (1, 1))
+        self.assertEqual(self.store.top(self.db, 'sold')['items'], [])
+        sold = self.store.top(self.db, 'sold', by='shares')
+        self.assertEqual([i['cusip'] for i in sold['items']], ['594918104'])
+        self.assertAlmostEqual(sold['items'][0]['netShares'], -10.0)
+
+        crowded = self.store.top(self.db, 'crowded', limit=1)
+        self.assertEqual(crowded['items'][0]['cusip'], '037833100')
+        q3 = self.store.top(self.db, 'closed', period=pd.Timestamp('2023-09-30').date())
+        self.assertEqual(q3['items'], [])
+
+        with self.assertRaises(ValueError):
+            self.store.top(self.db, 'unknown')
+
+    def test_amendment_matches_full_recompute(self):
+        amendment = ('0000000002', filing('B-Q3A', '2023-12-01', '2023-09-30', amended=True),
+                     holdings([['037833100', 'APPLE', 500.0, 50], ['46625H100', 'JPM', 200.0, 10]]))
+        self.ingest(self.db, [amendment])
+
+        fresh = memory_session()
+        self.addCleanup(fresh.close)
+        self.ingest(fresh, [self.FILINGS[0], amendment, self.FILINGS[2], self.FILINGS[3]])
+        for period in ('2023-09-30', '2023-12-31'):
+            self.assertEqual(activity(self.db, period), activity(fresh, period))
+        # 修正后B在第四季度相对新的基准加仓苹果、清仓JPM
+        self.assertEqual(activity(self.db, '2023-12-31')['46625H100'][2], 1)
+
+    def test_new_holdings_amendment_adds_to_filing(self):
+        # 新增持仓修正文件只列出原文件遗漏的持仓，原文件的持仓不算清仓
+        addition = ('0000000001', filing('A-Q4A', '2024-03-01', '2023-12-31', amended=True,
+                                         amendment_type='NEW HOLDINGS'),
+                    holdings([['02079K305', 'GOOG', 600.0, 6]]))
+        q1 = ('0000000001', filing('A-Q1', '2024-05-14', '2024-03-31'),
+              holdings([['037833100', 'APPLE', 3000.0, 250], ['46625H100', 'JPM', 400.0, 20],
+                        ['02079K305', 'GOOG', 600.0, 6]]))
+        self.ingest(self.db, [addition, q1])
+
+        q4 = activity(self.db, '2023-12-31')
+        self.assertEqual(q4['037833100'][:3], (2, 0, 0))
+        self.assertEqual(q4['46625H100'][:3], (1, 1, 0))
+        self.assertEqual(q4['02079K305'][:3], (1, 1, 0))
+        # 下一报告期以合并后的持仓为基准：没有任何变化
+        self.assertEqual({cusip: row[1:] for cusip, row in activity(self.db, '2024-03-31').items()},
+                         {cusip: (0, 0, 0, 0, 0, 0) for cusip in ('037833100', '46625H100', '02079K305')})
+
+        fresh = memory_session()
+        self.addCleanup(fresh.close)
+        self.ingest(fresh, [q1, addition] + list(reversed(self.FILINGS)))
+        for period in ('2023-09-30', '2023-12-31', '2024-03-31'):
+            self.assertEqual(activity(self.db, period), activity(fresh, period))
+
+        # 之后的重述文件替换整个报告期的持仓
+        restatement = ('0000000001', filing('A-Q4B', '2024-03-15', '2023-12-31', amended=True,
+                                            amendment_type='RESTATEMENT'),
+                       holdings([['037833100', 'APPLE', 3000.0, 250]]))
+        self.ingest(self.db, [restatement])
+        q4 = activity(self.db, '2023-12-31')
+        self.assertNotIn('46625H100', q4)
+        self.assertNotIn('02079K305', q4)
+        self.assertEqual(activity(self.db, '2024-03-31')['02079K305'][:3], (1, 1, 0))
+
+    def test_out_of_order_ingest(self):
+        fresh = memory_session()
+        self.addCleanup(fresh.close)
+        self.ingest(fresh, list(reversed(self.FILINGS)))
+        for period in ('2023-09-30', '2023-12-31'):
+            self.assertEqual(activity(self.db, period), activity(fresh, period))
+
+    def test_store_reloads_after_ingest(self):
+        before = self.store.top(self.db, 'new')
+        self.ingest(self.db, [('0000000003', filing('C-Q3', '2023-11-01', '2023-09-30'),
+                               holdings([['88160R101', 'TESLA', 10.0, 1]])),
+                              ('0000000003', filing('C-Q4', '2024-02-01', '2023-12-31'),
+                               holdings([['88160R101', 'TESLA', 30.0, 3], ['46625H100', 'JPM', 40.0, 2]]))])
+        after = self.store.top(self.db, 'new')
+        self.assertEqual(before['items'][0]['newPositions'], 1)
+        jpm = next(i for i in after['items'] if i['cusip'] == '46625H100')
+        self.assertEqual(jpm['newPositions'], 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,180 @@
+import sys
+import unittest
+from datetime import date, timedelta
+from pathlib import Path
+from unittest.mock import patch
+
+import numpy as np
+import pandas as pd
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+# 添加backend目录到Python路径
+project_root = Path(__file__).parent.parent.absolute()
+backend_dir = project_root / 'backend'
+sys.path.insert(0, str(backend_dir))
+
+from app.api.deps import get_edgar_service
+from app.crud import holdings as holdings_crud
+from app.db.session import get_db
+from app.routers import edgar
+from app.services import point_in_time as point_in_time_module
+from app.services.edgar_service import EDGARService
+from app.services.point_in_time import FilingIntervalIndex, PointInTimeHoldings
+from conftest import filing, holdings, memory_session
+
+FILINGS = pd.DataFrame([
+    # 基金A：Q4原始文件、Q4修正文件、Q1文件，以及迟交的Q3文件
+    ('A-q4', 'A', date(2023, 12, 31), date(2024, 2, 14)),
+    ('A-q4a', 'A', date(2023, 12, 31), date(2024, 3, 1)),
+    ('A-q1', 'A', date(2024, 3, 31), date(2024, 5, 15)),
+    ('A-q3', 'A', date(2023, 9, 30), date(2024, 6, 1)),
+    ('B-q1', 'B', date(2024, 3, 31), date(2024, 5, 10)),
+], columns=['accession_number', 'cik', 'period_of_report', 'filed_at'])
+
+
+def brute_force(filings, cik, as_of):
+    """逐条扫描：当日已提交的文件中最新报告期的最后一个版本"""
+    visible = filings[(filings['cik'] == cik) & (filings['filed_at'] <= as_of)]
+    if visible.empty:
+        return None
+    latest = visible[visible['period_of_report'] == visible['period_of_report'].max()]
+    return latest.sort_values(['filed_at', 'accession_number']).iloc[-1]['accession_number']
+
+
+class TestFilingIntervalIndex(unittest.TestCase):
+    def setUp(self):
+        self.index = FilingIntervalIndex(FILINGS)
+
+    def known(self, cik, day, period=None):
+        rows = self.index.lookup([cik], [day], period=period)
+        return self.index.accession[rows[0]] if rows[0] >= 0 else None
+
+    def test_no_look_ahead(self):
+        self.assertIsNone(self.known('A', date(2024, 2, 13)))
+        self.assertEqual(self.known('A', date(2024, 2, 14)), 'A-q4')
+        # 修正文件自其提交日起才可见
+        self.assertEqual(self.known('A', date(2024, 2, 29)), 'A-q4')
+        self.assertEqual(self.known('A', date(2024, 3, 1)), 'A-q4a')
+        self.assertEqual(self.known('A', date(2024, 5, 15)), 'A-q1')
+        # 迟交的旧报告期不取代已公开的新报告期
+        self.assertEqual(self.known('A', date(2024, 7, 1)), 'A-q1')
+        self.assertIsNone(self.known('unknown', date(2024, 7, 1)))
+
+    def test_specific_period(self):
+        q4 = date(2023, 12, 31)
+        self.assertIsNone(self.known('A', date(2024, 1, 1), period=q4))
+        self.assertEqual(self.known('A', date(2024, 2, 20), period=q4), 'A-q4')
+        self.assertEqual(self.known('A', date(2024, 7, 1), period=q4), 'A-q4a')
+        self.assertEqual(self.known('A', date(2024, 7, 1), period=date(2023, 9, 30)), 'A-q3')
+        self.assertIsNone(self.known('B', date(2024, 7, 1), period=q4))
+
+    def test_intervals(self):
+        intervals = self.index.intervals('A').set_index('accession_number')
+        self.assertEqual(intervals.loc['A-q4', 'superseded_at'], pd.Timestamp('2024-03-01'))
+        self.assertTrue(pd.isna(intervals.loc['A-q4a', 'superseded_at']))
+        self.assertEqual(list(intervals.index), ['A-q3', 'A-q4', 'A-q4a', 'A-q1'])
+
+    def test_new_holdings_amendment_adds_to_filing(self):
+        filings = FILINGS.assign(amendment_type=None)
+        filings.loc[filings['accession_number'] == 'A-q4a', 'amendment_type'] = 'NEW HOLDINGS'
+        filings.loc[len(filings)] = ('A-q4r', 'A', date(2023, 12, 31), date(2024, 4, 1), 'RESTATEMENT')
+        index = FilingIntervalIndex(filings)
+        q4 = date(2023, 12, 31)
+        grid = index.resolve(['A'], [date(2024, 2, 20), date(2024, 3, 1), date(2024, 4, 1)], period=q4)
+        self.assertEqual(list(grid['accession_numbers']), [('A-q4',), ('A-q4', 'A-q4a'), ('A-q4r',)])
+
+        # 新增持仓文件不取代原文件，重述文件取代两者
+        intervals = index.intervals('A').set_index('accession_number')
+        self.assertEqual(intervals.loc['A-q4', 'superseded_at'], pd.Timestamp('2024-04-01'))
+        self.assertEqual(intervals.loc['A-q4a', 'superseded_at'], pd.Timestamp('2024-04-01'))
+        self.assertTrue(pd.isna(intervals.loc['A-q4r', 'superseded_at']))
+
+    def test_grid_matches_brute_force(self):
+        rng = np.random.default_rng(7)
+        periods = pd.date_range('2018-03-31', periods=16, freq='Q').date
+        rows = []
+        for fund in range(30):
+            for i, period in enumerate(periods):
+                if rng.random() < 0.2:
+                    continue
+                filed = period + timedelta(days=int(rng.integers(10, 140)))
+                rows.append((f'{fund}-{i}', str(fund), period, filed))
+                if rng.random() < 0.3:
+                    lag = int(rng.integers(0, 60))
+                    rows.append((f'{fund}-{i}a', str(fund), period, filed + timedelta(days=lag)))
+        filings = pd.DataFrame(rows, columns=FILINGS.columns)
+        index = FilingIntervalIndex(filings)
+
+        dates = pd.date_range('2018-01-01', '2022-12-31', freq='7D').date
+        ciks = [str(f) for f in range(32)]
+        grid = index.resolve(ciks, dates)
+        self.assertEqual(len(grid), len(ciks) * len(dates))
+        for row in grid.sample(400, random_state=1).itertuples(index=False):
+            expected = brute_force(filings, row.cik, pd.Timestamp(row.as_of).date())
+            self.assertEqual(row.accession_number, expected, (row.cik, row.as_of))
+
+    def test_empty_index(self):
+        index = FilingIntervalIndex(FILINGS.iloc[0:0])
+        grid = index.resolve(['A'], [date(2024, 1, 1)])
+        self.assertIsNone(grid.iloc[0]['accession_number'])
+        self.assertTrue(pd.isna(grid.iloc[0]['filed_at']))
+
+
+class TestPointInTimeHoldings(unittest.TestCase):
+    def setUp(self):
+        self.db = memory_session()
+        self.addCleanup(self.db.close)
+        self.store = PointInTimeHoldings()
+
+    def load(self, accession, cik, filed, period, rows, amended=False, amendment_type=None):
+        holdings_crud.load_filing(self.db, filing(accession, filed, period, amended, amendment_type),
+                                  holdings(rows), cik)
+
+    def test_holdings_as_of(self):
+        self.load('0001', '0000000001', '2024-02-14', '2023-12-31', [('A', 'a', 100.0, 10)])
+        result = self.store.holdings_as_of(self.db, ['0000000001', '0000000002'], date(2024, 2, 20))
+        self.assertEqual(result['0000000001']['filing']['accessionNumber'], '0001')
+        self.assertEqual(list(result['0000000001']['holdings']['cusip']), ['A'])
+        self.assertIsNone(result['0000000002']['filing'])
+
+        # 入库修正文件后版本变化，索引自动重建；修正前的日期仍返回原文件
+        self.load('0002', '0000000001', '2024-03-01', '2023-12-31', [('B', 'b', 50.0, 5)], amended=True)
+        before = self.store.holdings_as_of(self.db, ['0000000001'], date(2024, 2, 20))['0000000001']
+        after = self.store.holdings_as_of(self.db, ['0000000001'], date(2024, 3, 1))['0000000001']
+        self.assertEqual(before['filing']['supersededAt'], '2024-03-01')
+        self.assertEqual(list(after['holdings']['cusip']), ['B'])
+        self.assertEqual(self.store.intervals(self.db, '0000000001')[1]['accessionNumber'], '0002')
+
+    def test_new_holdings_amendment_holdings(self):
+        self.load('0001', '0000000001', '2024-02-14', '2023-12-31', [('A', 'a', 100.0, 10)])
+        self.load('0002', '0000000001', '2024-03-01', '2023-12-31', [('B', 'b', 50.0, 5)], amended=True,
+                  amendment_type='NEW HOLDINGS')
+        entry = self.store.holdings_as_of(self.db, ['0000000001'], date(2024, 3, 1))['0000000001']
+        self.assertEqual(entry['filing']['accessionNumbers'], ['0001', '0002'])
+        self.assertEqual(sorted(entry['holdings']['cusip']), ['A', 'B'])
+        self.assertIsNone(self.store.intervals(self.db, '0000000001')[0]['supersededAt'])
+
+    def test_as_of_endpoint(self):
+        self.load('0001', '0000000001', '2024-02-14', '2023-12-31', [('A', 'a', 100.0, 10)])
+        app = FastAPI()
+        app.include_router(edgar.router, prefix="/api/v1/edgar")
+        service = EDGARService()
+        app.dependency_overrides[get_edgar_service] = lambda: service
+        app.dependency_overrides[get_db] = lambda: self.db
+        client = TestClient(app)
+
+        with patch.object(point_in_time_module, 'point_in_time', self.store):
+            response = client.get('/api/v1/edgar/as-of/holdings', params={'ciks': '1,2', 'date': '2024-03-01'})
+            self.assertEqual(response.status_code, 200)
+            funds = response.json()['funds']
+            self.assertEqual(funds[0]['holdings'][0]['nameOfIssuer'], 'a')
+            self.assertIsNone(funds[1]['filing'])
+            self.assertEqual(client.get('/api/v1/edgar/as-of/holdings',
+                                        params={'ciks': '1', 'date': 'bad'}).status_code, 400)
+            self.assertEqual(client.get('/api/v1/edgar/as-of/intervals/1').status_code, 200)
+            self.assertEqual(client.get('/api/v1/edgar/as-of/intervals/2').status_code, 404)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,76 @@
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+# 添加backend目录到Python路径
+project_root = Path(__file__).parent.parent.absolute()
+backend_dir = project_root / 'backend'
+sys.path.insert(0, str(backend_dir))
+
+from app.services.edgar_service import EDGARService
+from app.services.price_store import PriceStore
+
+
+def make_prices():
+    return pd.DataFrame({
+        'date': ['2023-03-30', '2023-03-31', '2023-04-03', '2023-03-31', '2023-04-03'],
+        'id': ['037833100', '037833100', '037833100', '594918104', '594918104'],
+        'close': [160.0, 164.9, 166.2, 288.3, 287.2],
+    })
+
+
+class TestPriceStore(unittest.TestCase):
+    def setUp(self):
+        self.store = PriceStore.from_frame(make_prices())
+
+    def test_lookup_as_of(self):
+        """测试按日期取最近收盘价"""
+        prices = self.store.lookup(['037833100', '594918104', 'UNKNOWN'], '2023-04-01')
+        self.assertAlmostEqual(prices[0], 164.9)
+        self.assertAlmostEqual(prices[1], 288.3)
+        self.assertTrue(np.isnan(prices[2]))
+
+        # 早于价格历史的日期
+        self.assertTrue(np.isnan(self.store.lookup(['037833100'], '2023-01-01')[0]))
+
+        # 逐元素日期
+        prices = self.store.lookup(['037833100', '594918104'], ['2023-03-30', '2023-03-30'])
+        self.assertAlmostEqual(prices[0], 160.0)
+        self.assertTrue(np.isnan(prices[1]))
+
+    def test_save_and_open_mmap(self):
+        """测试保存后以内存映射方式打开"""
+        with tempfile.TemporaryDirectory() as tmp:
+            self.store.save(tmp)
+            opened = PriceStore.open(tmp)
+            self.assertIsInstance(opened.closes, np.memmap)
+            np.testing.assert_allclose(
+                opened.lookup(['594918104'], '2023-04-03'),
+                self.store.lookup(['594918104'], '2023-04-03'),
+            )
+
+    def test_mark_to_market(self):
+        """测试多基金持仓批量按市价重估"""
+        holdings = pd.DataFrame({
+            'fundCik': ['0000000001', '0000000001', '0000000002'],
+            'cusip': ['037833100', '594918104', '037833100'],
+            'shares': [100.0, 10.0, 50.0],
+            'value': [16490.0, 2883.0, 8245.0],
+            'filingDate': ['2023-05-15'] * 3,
+            'periodOfReport': ['2023-03-31', '2023-03-31', '2023-03-30'],
+        })
+        service = EDGARService(price_store=self.store)
+        df = service.mark_to_market(holdings, as_of='2023-04-03')
+
+        self.assertAlmostEqual(df.iloc[0]['marketValue'], 16620.0)
+        self.assertAlmostEqual(df.iloc[0]['valueChange'], 130.0)
+        self.assertAlmostEqual(df.iloc[2]['reportPrice'], 160.0)
+        self.assertEqual(df.iloc[1]['markDate'], '2023-04-03')
+
+
+if __name__ == '__main__':
+    unittest.main()
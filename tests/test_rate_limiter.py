@@ -0,0 +1,231 @@
+import sys
+import threading
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from unittest.mock import patch
+
+from fastapi import HTTPException
+
+# 添加backend目录到Python路径
+project_root = Path(__file__).parent.parent.absolute()
+backend_dir = project_root / 'backend'
+sys.path.insert(0, str(backend_dir))
+
+from app.core.config import settings
+from app.core.rate_limiter import CLOSED, HALF_OPEN, OPEN, AdaptiveLimiter, CircuitOpenError
+from app.services.edgar_service import EDGARService, sec_fallback_cache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+def run(limiter, status, retry_after=None):
+    with limiter.request() as ticket:
+        ticket.record(status, retry_after)
+
+
+class TestAdaptiveLimiter(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.limiter = AdaptiveLimiter(max_rate=10, min_rate=1, max_concurrency=8, failure_threshold=3,
+                                       cooldown=30, max_wait=5, timer=self.clock, sleep=self.clock.sleep)
+
+    def test_requests_are_paced_at_current_rate(self):
+        for _ in range(5):
+            run(self.limiter, 200)
+        # 5个请求间隔 1/10 秒
+        self.assertAlmostEqual(self.clock.now, 100.4)
+
+    def test_multiplicative_decrease_once_per_signal(self):
+        tickets = [self.limiter.acquire() for _ in range(4)]
+        for ticket in tickets:
+            ticket.record(429, 0)
+            self.limiter.release(ticket)
+        metrics = self.limiter.metrics()
+        # 同一批请求的4个429只触发一次减半
+        self.assertEqual(metrics['requestsPerSecond'], 5.0)
+        self.assertEqual(metrics['concurrencyLimit'], 4)
+        self.assertEqual(metrics['throttled'], 4)
+        self.assertEqual(metrics['state'], OPEN)
+
+    def test_additive_increase_is_bounded(self):
+        run(self.limiter, 503)
+        self.assertEqual(self.limiter.rate, 5.0)
+        for _ in range(5):
+            run(self.limiter, 200)
+        self.assertGreater(self.limiter.rate, 5.0)
+        self.assertLess(self.limiter.rate, 7.0)
+        for _ in range(200):
+            run(self.limiter, 200)
+        self.assertEqual(self.limiter.rate, 10.0)
+
+    def test_retry_after_pauses_all_callers(self):
+        run(self.limiter, 429, 2)
+        before = self.clock.now
+        run(self.limiter, 200)
+        self.assertGreaterEqual(self.clock.now - before, 2)
+
+        # 需要等待超过max_wait时快速失败
+        run(self.limiter, 429, 60)
+        with self.assertRaises(CircuitOpenError) as ctx:
+            self.limiter.acquire()
+        self.assertGreater(ctx.exception.retry_after, 50)
+
+    def test_circuit_breaker_half_open_probe(self):
+        for _ in range(3):
+            run(self.limiter, 500)
+        self.assertEqual(self.limiter.state, OPEN)
+        with self.assertRaises(CircuitOpenError):
+            self.limiter.acquire()
+
+        self.clock.now += 31
+        probe = self.limiter.acquire()
+        self.assertEqual(self.limiter.state, HALF_OPEN)
+        # 探测请求进行中，其他请求直接拒绝
+        with self.assertRaises(CircuitOpenError):
+            self.limiter.acquire()
+        probe.record(500)
+        self.limiter.release(probe)
+        self.assertEqual(self.limiter.state, OPEN)
+
+        self.clock.now += 31
+        run(self.limiter, 200)
+        self.assertEqual(self.limiter.state, CLOSED)
+        self.assertEqual(self.limiter.metrics()['circuitOpens'], 2)
+
+    def test_exception_counts_as_failure(self):
+        with self.assertRaises(OSError):
+            with self.limiter.request():
+                raise OSError('connection reset')
+        metrics = self.limiter.metrics()
+        self.assertEqual(metrics['failures'], 1)
+        self.assertEqual(metrics['inFlight'], 0)
+
+
+class StandInSEC(BaseHTTPRequestHandler):
+    """本地模拟的SEC服务：throttle为正数时返回429，并记录最大并发"""
+
+    lock = threading.Lock()
+    throttle = 0
+    retry_after = '0'
+    delay = 0.0
+    hits = 0
+    in_flight = 0
+    max_in_flight = 0
+
+    def do_GET(self):
+        cls = type(self)
+        with cls.lock:
+            cls.hits += 1
+            cls.in_flight += 1
+            cls.max_in_flight = max(cls.max_in_flight, cls.in_flight)
+            throttled = cls.throttle != 0
+            if cls.throttle > 0:
+                cls.throttle -= 1
+        try:
+            time.sleep(cls.delay)
+            if throttled:
+                self.send_response(429)
+                self.send_header('Retry-After', cls.retry_after)
+                body = b'slow down'
+            else:
+                self.send_response(200)
+                body = b'{"ok": true}'
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        finally:
+            with cls.lock:
+                cls.in_flight -= 1
+
+    def log_message(self, format, *args):
+        pass
+
+
+class TestEDGARServiceThrottling(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), StandInSEC)
+        cls.thread = threading.Thread(target=cls.server.serve_forever, daemon=True)
+        cls.thread.start()
+        cls.url = f"http://127.0.0.1:{cls.server.server_address[1]}/submissions.json"
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        StandInSEC.throttle, StandInSEC.retry_after, StandInSEC.delay = 0, '0', 0.0
+        StandInSEC.hits = StandInSEC.max_in_flight = 0
+        self.limiter = AdaptiveLimiter(max_rate=200, min_rate=5, max_concurrency=4, failure_threshold=3,
+                                       cooldown=30, max_wait=2)
+        self.service = EDGARService(limiter=self.limiter)
+        sec_fallback_cache.clear()
+
+    def test_recovers_from_throttling(self):
+        StandInSEC.throttle = 2
+        response = self.service._make_request(self.url)
+        self.assertEqual(response.json(), {'ok': True})
+        metrics = self.limiter.metrics()
+        self.assertEqual(metrics['throttled'], 2)
+        self.assertEqual(metrics['state'], CLOSED)
+        self.assertLess(metrics['requestsPerSecond'], 200)
+
+    def test_concurrency_is_limited(self):
+        StandInSEC.delay = 0.05
+        with ThreadPoolExecutor(max_workers=12) as pool:
+            list(pool.map(lambda _: self.service._make_request(self.url), range(24)))
+        self.assertLessEqual(StandInSEC.max_in_flight, 4)
+        self.assertEqual(self.limiter.metrics()['successes'], 24)
+
+    def test_open_circuit_fails_fast_or_serves_cached(self):
+        cached_url = self.url + '?cached'
+        uncached_url = self.url + '?uncached'
+        self.service._make_request(cached_url, fallback=True)
+        self.service._make_request(uncached_url)
+
+        StandInSEC.throttle = -1  # 持续限流
+        with self.assertRaises(HTTPException) as ctx:
+            self.service._make_request(self.url)
+        self.assertEqual(ctx.exception.status_code, 503)
+        self.assertEqual(self.limiter.state, OPEN)
+        self.assertIn('Retry-After', ctx.exception.headers)
+
+        hits = StandInSEC.hits
+        started = time.monotonic()
+        with self.assertRaises(HTTPException):
+            self.service._make_request(self.url)
+        # 熔断期间不再访问上游，允许降级的请求返回最近成功的响应
+        self.assertEqual(self.service._make_request(cached_url, fallback=True).json(), {'ok': True})
+        with self.assertRaises(HTTPException):
+            self.service._make_request(uncached_url, fallback=True)
+        self.assertLess(time.monotonic() - started, 0.5)
+        self.assertEqual(StandInSEC.hits, hits)
+
+        # 同一进程的其他服务实例共享熔断状态和降级缓存
+        other = EDGARService(limiter=self.limiter)
+        with self.assertRaises(HTTPException):
+            other._make_request(self.url)
+        self.assertEqual(other._make_request(cached_url, fallback=True).json(), {'ok': True})
+        self.assertEqual(StandInSEC.hits, hits)
+
+    def test_fallback_skips_large_responses(self):
+        with patch.object(settings, 'SEC_FALLBACK_MAX_BYTES', 4):
+            self.service._make_request(self.url + '?large', fallback=True)
+        self.assertNotIn((self.url + '?large', ()), sec_fallback_cache)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,114 @@
+import sys
+import unittest
+from pathlib import Path
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import numpy as np
+import pandas as pd
+
+# 添加backend目录到Python路径
+project_root = Path(__file__).parent.parent.absolute()
+backend_dir = project_root / 'backend'
+sys.path.insert(0, str(backend_dir))
+
+from app.services.price_store import PriceStore
+from app.services.risk_service import TRADING_DAYS, CovarianceEstimator, RiskEngine, daily_returns
+
+KEYS = ['SPY', 'AAA', 'BBB', 'CCC', 'DDD']
+
+
+def make_store(days: int, seed: int = 7) -> PriceStore:
+    rng = np.random.default_rng(seed)
+    market = rng.normal(0.0004, 0.01, days)
+    betas = np.array([1.0, 1.3, 0.7, 1.0, 0.2])
+    noise = rng.normal(0, 0.008, (days, len(KEYS)))
+    noise[:, 0] = 0
+    returns = market[:, None] * betas + noise
+    closes = 100 * np.cumprod(1 + returns, axis=0)
+    dates = np.datetime64('2023-01-02') + np.arange(days)
+    return PriceStore(dates, KEYS, closes)
+
+
+class TestCovarianceEstimator(unittest.TestCase):
+    def test_incremental_matches_full_sample(self):
+        returns = daily_returns(make_store(300).closes)
+        estimator = CovarianceEstimator(len(KEYS))
+        for chunk in np.array_split(returns, [1, 120, 121]):
+            estimator.update(chunk)
+        np.testing.assert_allclose(estimator.sample_covariance(), np.cov(returns, rowvar=False), rtol=1e-10)
+
+    def test_shrinkage(self):
+        returns = daily_returns(make_store(60).closes)
+        auto = CovarianceEstimator(len(KEYS), shrinkage='auto')
+        auto.update(returns)
+        intensity = auto.shrinkage_intensity()
+        self.assertGreater(intensity, 0.0)
+        self.assertLessEqual(intensity, 1.0)
+
+        fixed = CovarianceEstimator(len(KEYS), shrinkage=1.0)
+        fixed.update(returns)
+        cov = fixed.covariance()
+        np.testing.assert_allclose(cov, np.eye(len(KEYS)) * np.trace(cov) / len(KEYS))
+
+        with self.assertRaises(ValueError):
+            CovarianceEstimator(len(KEYS), shrinkage='bogus')
+
+
+class TestRiskEngine(unittest.TestCase):
+    def setUp(self):
+        self.full = make_store(400)
+        self.engine = RiskEngine(self.full, shrinkage=None, benchmark='SPY')
+
+    def test_refresh_merges_only_new_days(self):
+        partial = PriceStore(self.full.dates[:250], KEYS, self.full.closes[:250])
+        engine = RiskEngine(partial, shrinkage=None)
+        self.assertEqual(engine.refresh(self.full), 150)
+        np.testing.assert_allclose(engine.covariance, self.engine.covariance, rtol=1e-10)
+
+    def test_price_store_reload_refreshes_shared_engine(self):
+        """测试重新加载价格存储时共享风险引擎只合并新增交易日"""
+        from app.routers import analytics
+
+        self.addCleanup(setattr, analytics, '_risk_engine', None)
+        analytics._risk_engine = None
+        service = SimpleNamespace(price_store=PriceStore(self.full.dates[:250], KEYS, self.full.closes[:250]))
+        engine = analytics.get_risk_engine(service)
+
+        with patch('app.services.price_store.load_price_store', return_value=self.full):
+            result = analytics.reload_price_store(service)
+        self.assertEqual(result['riskModelNewDays'], 150)
+        self.assertIs(service.price_store, self.full)
+        self.assertIs(analytics.get_risk_engine(service), engine)
+        self.assertEqual(engine.last_date, self.full.dates[-1])
+
+    def test_batched_evaluation(self):
+        rng = np.random.default_rng(1)
+        weights = rng.dirichlet(np.ones(len(KEYS)), size=1000)
+        metrics = self.engine.evaluate(weights)
+
+        cov = self.engine.covariance * TRADING_DAYS
+        for i in (0, 500, 999):
+            w = weights[i]
+            self.assertAlmostEqual(metrics['volatility'][i], np.sqrt(w @ cov @ w))
+        # 风险贡献之和等于组合波动率
+        np.testing.assert_allclose(metrics['contribution'].sum(axis=1), metrics['volatility'])
+
+        benchmark_only = self.engine.evaluate(np.eye(len(KEYS))[:1])
+        self.assertAlmostEqual(benchmark_only['beta'][0], 1.0)
+        self.assertAlmostEqual(benchmark_only['trackingError'][0], 0.0)
+
+    def test_fund_risk(self):
+        holdings = pd.DataFrame({'cusip': ['aaa', 'DDD', 'UNKNOWN'], 'value': [600.0, 300.0, 100.0]})
+        report = self.engine.fund_risk(holdings)
+        self.assertAlmostEqual(report['coverage'], 0.9)
+        self.assertGreater(report['beta'], 0.9)
+        self.assertEqual(report['topContributors'][0]['cusip'], 'AAA')
+        self.assertAlmostEqual(sum(c['riskContributionPct'] for c in report['topContributors']), 100.0)
+
+        table = self.engine.risk_table({'a': holdings, 'b': holdings.iloc[1:2]})
+        self.assertLess(table.loc[1, 'beta'], table.loc[0, 'beta'])
+
+
+if __name__ == '__main__':
+    unittest.main()
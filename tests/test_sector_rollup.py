@@ -0,0 +1,105 @@
+import sys
+import unittest
+from datetime import date
+from pathlib import Path
+
+import pandas as pd
+
+# 添加backend目录到Python路径
+project_root = Path(__file__).parent.parent.absolute()
+backend_dir = project_root / 'backend'
+sys.path.insert(0, str(backend_dir))
+
+from app.models.sectors import FundSectorWeight, SectorPeriodTotal
+from app.services.ingest_service import IngestService
+from app.services.sector_classifier import UNCLASSIFIED, SectorClassifier
+from app.services import sector_rollup
+from conftest import filing, holdings, memory_session
+
+MAPPING = pd.DataFrame({
+    'cusip': ['037833', '594918104', '46625H', '30231G'],
+    'sector': ['Information Technology', 'Information Technology', 'Financials', None],
+    'industry': ['Hardware', 'Software', 'Banks', None],
+    'sic': [None, None, None, '2911'],
+})
+
+
+class TestSectorClassifier(unittest.TestCase):
+    def test_classify(self):
+        classifier = SectorClassifier(MAPPING)
+        labels = classifier.classify(['037833100', '594918104', '30231G102', '999999999', None])
+        self.assertEqual(list(labels['sector']), [
+            'Information Technology', 'Information Technology', 'Manufacturing', UNCLASSIFIED, UNCLASSIFIED,
+        ])
+        self.assertEqual(labels.loc[1, 'industry'], 'Software')
+        # 行业缺失时使用板块名称
+        self.assertEqual(labels.loc[2, 'industry'], 'Manufacturing')
+
+
+class TestSectorRollup(unittest.TestCase):
+    def setUp(self):
+        self.db = memory_session()
+        self.addCleanup(self.db.close)
+
+        classifier = SectorClassifier(MAPPING)
+        self.service = IngestService()
+        self.service.register_hook(
+            lambda db, ctx: sector_rollup.materialize_sector_weights(db, ctx, classifier=classifier)
+        )
+
+        self.service.ingest_filing(self.db, '0000000001', filing('A-Q3', '2023-11-14', '2023-09-30'),
+                                   holdings([['037833100', 'APPLE', 600.0, 1], ['46625H100', 'JPM', 400.0, 1]]))
+        self.service.ingest_filing(self.db, '0000000002', filing('B-Q3', '2023-11-10', '2023-09-30'),
+                                   holdings([['594918104', 'MSFT', 1000.0, 1]]))
+        self.service.ingest_filing(self.db, '0000000001', filing('A-Q4', '2024-02-14', '2023-12-31'),
+                                   holdings([['037833100', 'APPLE', 900.0, 1], ['999999999', 'OTHER', 100.0, 1]]))
+
+    def test_fund_weights_materialized(self):
+        rows = self.db.query(FundSectorWeight).filter_by(accession_number='A-Q3', level='sector').all()
+        weights = {r.name: r.weight for r in rows}
+        self.assertAlmostEqual(weights['Information Technology'], 60.0)
+        self.assertAlmostEqual(weights['Financials'], 40.0)
+
+    def test_market_totals_and_changes(self):
+        result = sector_rollup.market_sector_trends(self.db, 'sector')
+        self.assertEqual([p['period'] for p in result['periods']], ['2023-09-30', '2023-12-31'])
+
+        q3 = {item['name']: item for item in result['periods'][0]['items']}
+        self.assertAlmostEqual(q3['Information Technology']['weight'], 80.0)
+        self.assertEqual(q3['Information Technology']['funds'], 2)
+        self.assertIsNone(q3['Financials']['weightChange'])
+
+        q4 = {item['name']: item for item in result['periods'][1]['items']}
+        self.assertAlmostEqual(q4['Information Technology']['weightChange'], 10.0)
+        # 上一期存在、本期退出的板块变化为负
+        self.assertAlmostEqual(q4['Financials']['weightChange'], -20.0)
+        self.assertAlmostEqual(q4[UNCLASSIFIED]['weightChange'], 10.0)
+
+    def test_amendment_replaces_fund_in_period_totals(self):
+        self.service.ingest_filing(self.db, '0000000002', filing('B-Q3A', '2023-12-01', '2023-09-30', True),
+                                   holdings([['46625H100', 'JPM', 1000.0, 1]]))
+        totals = {r.name: r for r in self.db.query(SectorPeriodTotal)
+                  .filter_by(period_of_report=date(2023, 9, 30), level='sector')}
+        self.assertAlmostEqual(totals['Financials'].value, 1400.0)
+        self.assertAlmostEqual(totals['Information Technology'].value, 600.0)
+
+    def test_fund_trends_by_industry(self):
+        result = sector_rollup.fund_sector_trends(self.db, '0000000001', 'industry')
+        q4 = {item['name']: item for item in result['periods'][1]['items']}
+        self.assertAlmostEqual(q4['Hardware']['weight'], 90.0)
+        self.assertAlmostEqual(q4['Hardware']['weightChange'], 30.0)
+        self.assertEqual(q4['Hardware']['sector'], 'Information Technology')
+
+    def test_failed_hook_rolls_back(self):
+        def broken(db, ctx):
+            raise RuntimeError('boom')
+
+        self.service.register_hook(broken)
+        with self.assertRaises(RuntimeError):
+            self.service.ingest_filing(self.db, '0000000003', filing('C-Q3', '2023-11-15', '2023-09-30'),
+                                       holdings([['037833100', 'APPLE', 10.0, 1]]))
+        self.assertEqual(self.db.query(FundSectorWeight).filter_by(accession_number='C-Q3').count(), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,67 @@
+import os
+import subprocess
+import sys
+import unittest
+from pathlib import Path
+
+# 添加backend目录到Python路径
+project_root = Path(__file__).parent.parent.absolute()
+backend_dir = project_root / 'backend'
+sys.path.insert(0, str(backend_dir))
+
+# 导入app.main时不应加载的重量级依赖
+HEAVY_MODULES = ['pandas', 'bs4', 'lxml', 'jose', 'passlib', 'requests', 'app.services.edgar_service']
+
+# 应用自身（不含FastAPI框架）的导入耗时预算，可通过环境变量调整
+IMPORT_BUDGET_MS = float(os.getenv('IMPORT_TIME_BUDGET_MS', '800'))
+
+
+def _run(code: str, *args: str) -> subprocess.CompletedProcess:
+    return subprocess.run([sys.executable, *args, '-c', code], cwd=backend_dir,
+                          capture_output=True, text=True, timeout=120)
+
+
+def _cumulative_us(importtime_output: str) -> dict:
+    """解析 python -X importtime 输出，返回 {模块: 累计耗时(微秒)}"""
+    times = {}
+    for line in importtime_output.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        parts = line.split('|')
+        try:
+            times[parts[2].strip()] = int(parts[1])
+        except (IndexError, ValueError):
+            continue
+    return times
+
+
+class TestColdStart(unittest.TestCase):
+    def test_heavy_modules_are_lazy(self):
+        """测试导入app.main不会加载pandas、BeautifulSoup、jose、passlib等"""
+        result = _run(
+            'import sys, app.main; '
+            f'print(",".join(m for m in {HEAVY_MODULES!r} if m in sys.modules))'
+        )
+        self.assertEqual(result.returncode, 0, result.stderr)
+        self.assertEqual(result.stdout.strip(), '')
+
+    def test_import_has_no_side_effects(self):
+        """测试导入时不创建数据库表、不启动后台任务"""
+        result = _run(
+            'import logging, app.main; '
+            'print(len(logging.getLogger("app").handlers))'
+        )
+        self.assertEqual(result.returncode, 0, result.stderr)
+        self.assertEqual(result.stdout.strip(), '0')
+
+    def test_import_time_budget(self):
+        """测试 python -X importtime 下应用自身的导入耗时"""
+        result = _run('import app.main', '-X', 'importtime')
+        self.assertEqual(result.returncode, 0, result.stderr)
+        times = _cumulative_us(result.stderr)
+        own_ms = (times['app.main'] - times.get('fastapi', 0)) / 1000
+        self.assertLess(own_ms, IMPORT_BUDGET_MS)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,190 @@
+import os
+import sys
+import tempfile
+import unittest
+from datetime import date
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+# 添加backend目录到Python路径
+project_root = Path(__file__).parent.parent.absolute()
+backend_dir = project_root / 'backend'
+sys.path.insert(0, str(backend_dir))
+
+from app.models.styles import FundStyle
+from app.services.ingest_service import IngestService
+from app.services.sector_classifier import SectorClassifier
+from app.services import sector_rollup
+from app.services.style_clustering import MiniBatchKMeans, StyleClusteringService, StyleFeatures
+from conftest import filing, memory_session
+
+MAPPING = pd.DataFrame({
+    'cusip': ['TECH00', 'BANK00'],
+    'sector': ['Information Technology', 'Financials'],
+    'industry': ['Software', 'Banks'],
+    'sic': [None, None],
+})
+
+
+def portfolio(prefix, count, seed):
+    """prefix开头的count只证券组成的持仓"""
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        'cusip': [f'{prefix}{i:03d}' for i in range(count)],
+        'nameOfIssuer': [f'{prefix} {i}' for i in range(count)],
+        'value': rng.uniform(50, 150, count),
+        'shares': 1,
+    })
+
+
+class TestMiniBatchKMeans(unittest.TestCase):
+    def test_partial_fit_tracks_clusters(self):
+        rng = np.random.default_rng(0)
+        centers = np.array([[0.0, 0.0], [10.0, 10.0], [-10.0, 10.0]])
+        X = np.concatenate([c + rng.normal(0, 0.5, (100, 2)) for c in centers])
+
+        model = MiniBatchKMeans(n_clusters=3, batch_size=32).partial_fit(X, passes=5)
+        labels, distances = model.predict(centers)
+        self.assertEqual(len(set(labels)), 3)
+        self.assertTrue(np.all(distances < 0.5))
+
+        # 增量更新只移动对应中心，累计样本数持续增加
+        before = model.cluster_centers_.copy()
+        model.partial_fit(centers[:1] + 1.0)
+        moved = np.any(model.cluster_centers_ != before, axis=1)
+        self.assertEqual(moved.sum(), 1)
+        self.assertEqual(model.counts_.sum(), 300 * 5 + 1)
+
+    def test_initial_fit_requires_enough_samples(self):
+        with self.assertRaises(ValueError):
+            MiniBatchKMeans(n_clusters=4).partial_fit(np.zeros((2, 3)))
+
+
+class TestStyleFeatures(unittest.TestCase):
+    def test_concentration_and_turnover(self):
+        features = StyleFeatures(['Financials'], hash_dim=8)
+        current = pd.DataFrame({'cik': ['A', 'A', 'B'], 'cusip': ['X', 'Y', 'X'], 'value': [75.0, 25.0, 10.0]})
+        previous = pd.DataFrame({'cik': ['A'], 'cusip': ['X'], 'value': [10.0]})
+        ciks, X = features.transform(current, previous)
+
+        self.assertEqual(ciks, ['A', 'B'])
+        self.assertEqual(X.shape, (2, features.dim))
+        hhi, top10, _, turnover = X[:, 2:6].T
+        np.testing.assert_allclose(hhi, [0.625, 1.0])
+        np.testing.assert_allclose(top10, [1.0, 1.0])
+        # B上一期不存在，换手率为0
+        np.testing.assert_allclose(turnover, [0.25, 0.0])
+
+
+class TestStyleClusteringService(unittest.TestCase):
+    def setUp(self):
+        self.db = memory_session()
+        self.addCleanup(self.db.close)
+
+        classifier = SectorClassifier(MAPPING)
+        self.ingest = IngestService()
+        self.ingest.register_hook(
+            lambda db, ctx: sector_rollup.materialize_sector_weights(db, ctx, classifier=classifier)
+        )
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        self.model_path = os.path.join(tmpdir.name, 'style_model.npz')
+        self.service = StyleClusteringService(model_path=self.model_path, n_clusters=2, hash_dim=16)
+
+        # 科技股集中型基金与银行股分散型基金
+        self.tech = [f'{i:010d}' for i in range(1, 5)]
+        self.bank = [f'{i:010d}' for i in range(5, 9)]
+        for quarter, (filed, period) in enumerate([('2023-11-14', '2023-09-30'), ('2024-02-14', '2023-12-31')]):
+            for n, cik in enumerate(self.tech):
+                self.ingest_fund(cik, quarter, filed, period, portfolio('TECH00', 5, n + quarter))
+            for n, cik in enumerate(self.bank):
+                self.ingest_fund(cik, quarter, filed, period, portfolio('BANK00', 60, n + quarter))
+
+    def ingest_fund(self, cik, quarter, filed, period, holdings):
+        self.ingest.ingest_filing(self.db, cik, filing(f'{cik}-{quarter}', filed, period), holdings)
+
+    def test_refresh_and_queries(self):
+        result = self.service.refresh(self.db, date(2023, 9, 30))
+        self.assertEqual(result['funds'], 8)
+        self.assertEqual(sorted(result['clusterSizes']), [4, 4])
+
+        tech = self.service.membership(self.db, self.tech[0])
+        bank = self.service.membership(self.db, self.bank[0])
+        self.assertNotEqual(tech['cluster'], bank['cluster'])
+        self.assertEqual(tech['clusterSize'], 4)
+
+        neighbors = self.service.neighbors(self.db, self.tech[0], k=3)['neighbors']
+        self.assertEqual({n['cik'] for n in neighbors}, set(self.tech[1:]))
+
+        members = self.service.cluster_members(self.db, bank['cluster'])
+        self.assertEqual({f['cik'] for f in members['funds']}, set(self.bank))
+
+    def test_incremental_refresh_uses_persisted_model(self):
+        self.service.refresh(self.db, date(2023, 9, 30))
+        counts = self.service.model.counts_.sum()
+
+        # 新进程从磁盘加载模型后，只用新一期数据增量更新
+        reloaded = StyleClusteringService(model_path=self.model_path)
+        reloaded.refresh(self.db, date(2023, 12, 31))
+        self.assertEqual(reloaded.model.counts_.sum(), counts + 8)
+        self.assertEqual(reloaded.fitted_periods, ['2023-09-30', '2023-12-31'])
+
+        q4 = self.db.query(FundStyle).filter_by(period_of_report=date(2023, 12, 31)).all()
+        self.assertEqual(len(q4), 8)
+        self.assertEqual(len({r.cluster for r in q4 if r.cik in self.tech}), 1)
+        self.assertEqual(self.service.membership(self.db, self.tech[0])['period'], '2023-12-31')
+
+    def test_refresh_reloads_model_saved_by_other_worker(self):
+        """测试另一个worker保存模型后重新加载，同一报告期不会被重复拟合"""
+        other = StyleClusteringService(model_path=self.model_path, n_clusters=2, hash_dim=16)
+        self.service.refresh(self.db, date(2023, 9, 30))
+        other.refresh(self.db, date(2023, 9, 30))
+
+        self.service.refresh(self.db, date(2023, 12, 31))
+        result = other.refresh(self.db, date(2023, 12, 31))
+        self.assertFalse(result['fitted'])
+        np.testing.assert_array_equal(other.model.counts_, self.service.model.counts_)
+        self.assertEqual(other.fitted_periods, ['2023-09-30', '2023-12-31'])
+
+    def test_refresh_is_idempotent_per_period(self):
+        """测试同一报告期重复refresh不会再次拟合"""
+        self.service.refresh(self.db, date(2023, 9, 30))
+        centers = self.service.model.cluster_centers_.copy()
+        counts = self.service.model.counts_.copy()
+
+        result = self.service.refresh(self.db, date(2023, 9, 30))
+        self.assertFalse(result['fitted'])
+        np.testing.assert_array_equal(self.service.model.cluster_centers_, centers)
+        np.testing.assert_array_equal(self.service.model.counts_, counts)
+        self.assertEqual(self.service.fitted_periods, ['2023-09-30'])
+
+    def test_turnover_against_each_funds_previous_period(self):
+        """测试缺报一个季度的基金和自己最近的报告期比较换手率"""
+        gap = '0000000009'
+        self.ingest_fund(gap, 0, '2023-11-14', '2023-09-30', portfolio('TECH00', 5, 0))
+        self.ingest_fund(gap, 2, '2024-05-15', '2024-03-31', portfolio('BANK00', 5, 0))
+        self.ingest_fund(self.tech[0], 2, '2024-05-15', '2024-03-31', portfolio('TECH00', 5, 1))
+
+        ciks, X = self.service.build_features(self.db, date(2024, 3, 31))
+        turnover = X[:, len(self.service.features.sectors) + 3]
+        self.assertEqual(ciks, [self.tech[0], gap])
+        np.testing.assert_allclose(turnover, [0.0, 1.0], atol=1e-12)
+
+    def test_initial_fit_does_not_cap_clusters(self):
+        service = StyleClusteringService(model_path=self.model_path, n_clusters=12, hash_dim=16)
+        with self.assertRaises(ValueError):
+            service.refresh(self.db, date(2023, 9, 30))
+        self.assertIsNone(service.model)
+        self.assertFalse(os.path.exists(self.model_path))
+
+    def test_queries_before_refresh(self):
+        self.assertIsNone(self.service.membership(self.db, self.tech[0]))
+        self.assertIsNone(self.service.neighbors(self.db, self.tech[0]))
+        with self.assertRaises(ValueError):
+            self.service.refresh(self.db, date(2022, 3, 31))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,100 @@
+import sys
+import threading
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+# 添加backend目录到Python路径
+project_root = Path(__file__).parent.parent.absolute()
+backend_dir = project_root / 'backend'
+sys.path.insert(0, str(backend_dir))
+
+from app.core.swr_cache import HIT, MISS, STALE, StaleWhileRevalidateCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class CountingLoader:
+    def __init__(self, delay=0.0):
+        self.calls = 0
+        self.delay = delay
+        self.fail = False
+        self.lock = threading.Lock()
+
+    def __call__(self):
+        time.sleep(self.delay)
+        with self.lock:
+            self.calls += 1
+            if self.fail:
+                raise RuntimeError('upstream down')
+            return self.calls
+
+
+class TestStaleWhileRevalidateCache(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.cache = StaleWhileRevalidateCache(soft_ttl=10, hard_ttl=100, timer=self.clock)
+
+    def wait_for_refresh(self, key):
+        for _ in range(200):
+            with self.cache._lock:
+                if key not in self.cache._inflight:
+                    return
+            time.sleep(0.005)
+        self.fail('background refresh did not finish')
+
+    def test_soft_ttl_serves_stale_and_refreshes_once(self):
+        loader = CountingLoader(delay=0.05)
+        self.assertEqual(self.cache.get('k', loader), (1, 0.0, MISS))
+
+        self.clock.now = 5
+        self.assertEqual(self.cache.get('k', loader).status, HIT)
+
+        self.clock.now = 20
+        results = [self.cache.get('k', loader) for _ in range(5)]
+        # 过了软TTL仍然立即返回旧值，只触发一次后台刷新
+        self.assertTrue(all(r.value == 1 and r.status == STALE and r.age == 20 for r in results))
+        self.wait_for_refresh('k')
+        self.assertEqual(loader.calls, 2)
+        self.assertEqual(self.cache.get('k', loader), (2, 0.0, HIT))
+
+    def test_failed_refresh_keeps_stale_value_until_hard_ttl(self):
+        loader = CountingLoader()
+        self.cache.get('k', loader)
+        loader.fail = True
+
+        self.clock.now = 50
+        self.assertEqual(self.cache.get('k', loader).value, 1)
+        self.wait_for_refresh('k')
+        self.assertEqual(self.cache.get('k', loader).status, STALE)
+        self.wait_for_refresh('k')
+
+        self.clock.now = 101
+        with self.assertRaises(RuntimeError):
+            self.cache.get('k', loader)
+
+    def test_concurrent_misses_share_one_load(self):
+        loader = CountingLoader(delay=0.1)
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            results = list(pool.map(lambda _: self.cache.get('k', loader), range(8)))
+        self.assertEqual(loader.calls, 1)
+        self.assertEqual({r.value for r in results}, {1})
+
+    def test_invalidate(self):
+        loader = CountingLoader()
+        self.cache.get(('0000000001', 2024), loader)
+        self.cache.get(('0000000002', 2024), loader)
+        self.assertEqual(self.cache.invalidate(lambda key: key[0] == '0000000001'), 1)
+        self.assertEqual(self.cache.get(('0000000001', 2024), loader).status, MISS)
+        self.assertEqual(self.cache.get(('0000000002', 2024), loader).status, HIT)
+
+
+if __name__ == '__main__':
+    unittest.main()
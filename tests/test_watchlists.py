@@ -0,0 +1,161 @@
+import sys
+import unittest
+from pathlib import Path
+from types import SimpleNamespace
+
+import pandas as pd
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+# 添加backend目录到Python路径
+project_root = Path(__file__).parent.parent.absolute()
+backend_dir = project_root / 'backend'
+sys.path.insert(0, str(backend_dir))
+
+from app.core.security import get_current_user
+from app.crud import watchlists as watchlist_crud
+from app.db.session import get_db
+from app.models.user import User
+from app.models.watchlists import Alert
+from app.routers import watchlists as watchlists_router
+from app.services.alerts import evaluate_alerts, evaluate_rules
+from app.services.ingest_service import IngestService
+from app.services.leaderboards import update_leaderboards
+from conftest import filing, holdings, memory_session
+
+FUND = '0000000001'
+OTHER_FUND = '0000000002'
+AAPL, MSFT, GOOG = '037833100', '594918104', '02079K305'
+
+
+class TestEvaluateRules(unittest.TestCase):
+    def test_rule_kinds(self):
+        conditions = pd.DataFrame([
+            (1, 10, 'position_change', AAPL, 20.0),
+            (2, 10, 'position_change', None, 60.0),
+            (3, 11, 'new_holder', MSFT, None),
+            (4, 11, 'closed_position', None, None),
+        ], columns=['rule_id', 'user_id', 'kind', 'cusip', 'threshold_pct'])
+        delta = pd.DataFrame([
+            (AAPL, 'apple', 150.0, 50.0, False, False),
+            (MSFT, 'microsoft', 10.0, 10.0, True, False),
+            (GOOG, 'alphabet', 0.0, -30.0, False, True),
+        ], columns=['cusip', 'name_of_issuer', 'shares', 'shares_change', 'is_new', 'is_closed'])
+        delta['shares_before'] = delta['shares'] - delta['shares_change']
+
+        triggered = evaluate_rules(conditions, delta)
+        hits = sorted(zip(triggered['rule_id'], triggered['cusip']))
+        # 规则2阈值60%：AAPL增持50%不触发，新建仓和清仓触发
+        self.assertEqual(hits, [(1, AAPL), (2, GOOG), (2, MSFT), (3, MSFT), (4, GOOG)])
+        aapl = triggered[triggered['rule_id'] == 1].iloc[0]
+        self.assertAlmostEqual(aapl['change_pct'], 50.0)
+
+
+class TestAlertsOnIngest(unittest.TestCase):
+    def setUp(self):
+        self.db = memory_session()
+        self.addCleanup(self.db.close)
+        self.alice = self.add_user('alice')
+        self.bob = self.add_user('bob')
+        self.service = IngestService()
+        self.service.register_hook(update_leaderboards, name='leaderboards')
+        self.service.register_hook(evaluate_alerts, name='alerts')
+
+        self.service.ingest_filing(self.db, FUND, filing('q3', '2023-11-14', '2023-09-30'), holdings([
+            (AAPL, 'apple', 1000.0, 100), (GOOG, 'alphabet', 300.0, 30),
+        ]))
+
+    def add_user(self, name):
+        user = User(email=f'{name}@example.com', username=name, hashed_password='x', is_active=True)
+        self.db.add(user)
+        self.db.commit()
+        return user
+
+    def alerts(self, user):
+        return sorted((a.rule_id, a.cusip, a.kind) for a in watchlist_crud.list_alerts(self.db, user.id))
+
+    def test_rules_of_all_users_evaluated_per_filing(self):
+        change = watchlist_crud.create_rule(self.db, self.alice.id, 'position_change', cik=FUND, cusip=AAPL,
+                                            threshold_pct=20)
+        small = watchlist_crud.create_rule(self.db, self.alice.id, 'position_change', cik=FUND, cusip=AAPL,
+                                           threshold_pct=80)
+        watchlist = watchlist_crud.create_watchlist(self.db, self.bob.id, 'tech', securities=[MSFT])
+        new_holder = watchlist_crud.create_rule(self.db, self.bob.id, 'new_holder', watchlist_id=watchlist['id'])
+        closed = watchlist_crud.create_rule(self.db, self.bob.id, 'closed_position', cik=FUND)
+        unrelated = watchlist_crud.create_rule(self.db, self.bob.id, 'new_holder', cik=OTHER_FUND)
+
+        q4 = holdings([(AAPL, 'apple', 1500.0, 150), (MSFT, 'microsoft', 500.0, 50)])
+        self.service.ingest_filing(self.db, FUND, filing('q4', '2024-02-14', '2023-12-31'), q4)
+
+        self.assertEqual(self.alerts(self.alice), [(change.id, AAPL, 'position_change')])
+        self.assertEqual(self.alerts(self.bob), [(new_holder.id, MSFT, 'new_holder'),
+                                                 (closed.id, GOOG, 'closed_position')])
+        alert = watchlist_crud.list_alerts(self.db, self.alice.id)[0]
+        self.assertEqual((alert.shares_before, alert.shares_after, alert.change_pct), (100.0, 150.0, 50.0))
+        self.assertNotIn(small.id, [a.rule_id for a in self.db.query(Alert).all()])
+        self.assertNotIn(unrelated.id, [a.rule_id for a in self.db.query(Alert).all()])
+
+        # 重复入库同一文件不重复提醒
+        self.service.ingest_filing(self.db, FUND, filing('q4', '2024-02-14', '2023-12-31'), q4)
+        self.assertEqual(self.db.query(Alert).count(), 3)
+
+        self.assertEqual(watchlist_crud.mark_alerts_read(self.db, self.bob.id), 2)
+        self.assertEqual(watchlist_crud.list_alerts(self.db, self.bob.id, unread_only=True), [])
+
+    def test_watchlist_with_fund_and_security_alerts_once(self):
+        watchlist = watchlist_crud.create_watchlist(self.db, self.bob.id, 'mixed', funds=[FUND], securities=[MSFT])
+        rule = watchlist_crud.create_rule(self.db, self.bob.id, 'new_holder', watchlist_id=watchlist['id'])
+
+        self.service.ingest_filing(self.db, FUND, filing('q4', '2024-02-14', '2023-12-31'), holdings([
+            (AAPL, 'apple', 1000.0, 100), (MSFT, 'microsoft', 500.0, 50),
+        ]))
+        self.assertEqual(self.alerts(self.bob), [(rule.id, MSFT, 'new_holder')])
+
+    def test_historical_filings_do_not_alert(self):
+        watchlist_crud.create_rule(self.db, self.alice.id, 'new_holder', cusip=MSFT)
+        self.service.ingest_filing(self.db, FUND, filing('q2', '2023-08-14', '2023-06-30'), holdings([
+            (MSFT, 'microsoft', 500.0, 50),
+        ]))
+        self.assertEqual(self.alerts(self.alice), [])
+
+
+class TestWatchlistsRouter(unittest.TestCase):
+    def setUp(self):
+        self.db = memory_session()
+        self.addCleanup(self.db.close)
+        app = FastAPI()
+        app.include_router(watchlists_router.router, prefix="/api/v1")
+        app.dependency_overrides[get_db] = lambda: self.db
+        app.dependency_overrides[get_current_user] = lambda: SimpleNamespace(id=1, username='alice')
+        self.client = TestClient(app)
+
+    def test_watchlist_and_rule_endpoints(self):
+        response = self.client.post('/api/v1/watchlists', json={'name': 'core', 'funds': ['1067983'],
+                                                                 'securities': ['037833100']})
+        self.assertEqual(response.status_code, 201)
+        watchlist = response.json()
+        self.assertEqual([(i['kind'], i['value']) for i in watchlist['items']],
+                         [('fund', '0001067983'), ('security', '037833100')])
+        self.assertEqual(self.client.post('/api/v1/watchlists', json={'name': 'core'}).status_code, 400)
+
+        item = self.client.post(f"/api/v1/watchlists/{watchlist['id']}/items",
+                                json={'kind': 'security', 'value': '594918104'})
+        self.assertEqual(item.status_code, 201)
+        self.assertEqual(self.client.post('/api/v1/watchlists/999/items',
+                                          json={'kind': 'fund', 'value': '1'}).status_code, 404)
+
+        rule = self.client.post('/api/v1/alerts/rules', json={'kind': 'position_change', 'cik': '1067983',
+                                                              'cusip': '037833100', 'threshold_pct': 20})
+        self.assertEqual(rule.status_code, 201)
+        self.assertEqual(rule.json()['cik'], '0001067983')
+        self.assertEqual(self.client.post('/api/v1/alerts/rules',
+                                          json={'kind': 'position_change', 'cik': '1'}).status_code, 400)
+        self.assertEqual(self.client.get('/api/v1/alerts').json(), [])
+
+        self.assertEqual(self.client.delete(f"/api/v1/watchlists/{watchlist['id']}").status_code, 204)
+        self.assertEqual(self.client.get('/api/v1/watchlists').json(), [])
+        self.assertEqual(len(self.client.get('/api/v1/alerts/rules').json()), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()